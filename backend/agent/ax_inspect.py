@@ -0,0 +1,242 @@
+# backend/agent/ax_inspect.py
+"""
+Backend alternativo di inspect_interactive_elements basato sull'albero di accessibilità
+calcolato dal browser (PLAYWRIGHT_INSPECT_BACKEND=ax, solo Chromium).
+
+Per frame due sole chiamate CDP:
+- Accessibility.getFullAXTree: ruoli e nomi accessibili calcolati da Chromium (label,
+  aria-labelledby, mat-label, testo) invece della stima in JS di dom_harvest;
+- DOMSnapshot.captureSnapshot: attributi (id, name, placeholder, aria-label, data-tfa,
+  type) dei nodi, collegati ai nodi AX tramite backendDOMNodeId.
+
+I nodi vengono tradotti nello stesso formato grezzo di HARVEST_JS, così
+build_inspect_sections produce le stesse sezioni e playwright_suggestions del backend DOM.
+Differenze volute: i nodi ignorati dall'albero AX (display:none, aria-hidden) non sono
+riportati e i campi form sono solo quelli testuali (textbox/searchbox/spinbutton/combobox).
+I blocchi custom senza ruolo (registro INSPECT_EXTRA_CLICKABLE_SELECTORS) non hanno un
+nodo AX utile: restano raccolti da HARVEST_JS, limitato a quei selettori.
+"""
+
+from typing import Any, Dict, List, Optional
+
+CLICKABLE_ROLES = ("button", "link", "menuitem", "menuitemcheckbox", "menuitemradio", "option")
+INTERACTIVE_ROLES = ("checkbox", "radio", "switch", "tab", "combobox", "PopUpButton", "slider")
+FIELD_ROLES = ("textbox", "searchbox", "spinbutton", "combobox")
+FIELD_TAGS = ("input", "select", "textarea")
+# Tag/ruoli con nodo AX proprio: esclusi dalla raccolta DOM del registro extra
+EXTRA_EXCLUDE = "button, a[href], input, select, textarea, [role]"
+
+
+def extra_clickable_selector(selectors) -> Optional[str]:
+    """Selettore del registro extra senza gli elementi già coperti dall'albero AX."""
+    if not selectors:
+        return None
+    return ", ".join(f"{s}:not({EXTRA_EXCLUDE})" for s in selectors)
+
+
+async def frame_session(context, page, frame, page_session):
+    """
+    (session, frame_id, propria) per leggere l'albero AX di `frame`: sessione dedicata
+    (da chiudere) per gli iframe out-of-process, altrimenti la sessione della pagina +
+    frameId dal frame tree.
+    """
+    if frame is None or frame == page.main_frame:
+        return page_session, None, False
+    try:
+        return await context.new_cdp_session(frame), None, True
+    except Exception:
+        pass  # frame nello stesso processo della pagina
+    tree = (await page_session.send("Page.getFrameTree"))["frameTree"]
+    frame_id = _match_frame_id(tree, frame, page.main_frame)
+    if frame_id is None:
+        raise RuntimeError(f"frame CDP non individuabile per {frame.url}")
+    return page_session, frame_id, False
+
+
+def _match_frame_id(tree: dict, frame, main_frame) -> Optional[str]:
+    """Scende il frame tree CDP seguendo la catena (name, url) del frame Playwright."""
+    chain = []
+    current = frame
+    while current is not None and current != main_frame:
+        chain.append(current)
+        current = current.parent_frame
+    node = tree
+    for f in reversed(chain):
+        matches = [
+            child
+            for child in node.get("childFrames") or []
+            if child["frame"].get("url") == f.url and (child["frame"].get("name") or "") == (f.name or "")
+        ]
+        if len(matches) != 1:
+            return None  # frame fratelli indistinguibili: meglio il backend DOM
+        node = matches[0]
+    return node["frame"]["id"]
+
+
+async def ax_harvest(session, frame_id: Optional[str] = None) -> Dict[str, list]:
+    """Dati grezzi (formato HARVEST_JS: iframes, clickables, rows, fields, interactives)."""
+    params = {"frameId": frame_id} if frame_id else {}
+    ax = await session.send("Accessibility.getFullAXTree", params)
+    snapshot = await session.send("DOMSnapshot.captureSnapshot", {"computedStyles": []})
+    return build_raw_from_ax(ax.get("nodes") or [], _DomIndex(snapshot))
+
+
+class _DomIndex:
+    """Attributi e parentela degli elementi di un DOMSnapshot, per backendNodeId."""
+
+    def __init__(self, snapshot: dict):
+        strings = snapshot.get("strings") or []
+        self._docs: List[dict] = []
+        self._by_backend: Dict[int, tuple] = {}
+        self._tables: Dict[int, Dict[int, List[int]]] = {}
+        for d, doc in enumerate(snapshot.get("documents") or []):
+            nodes = doc.get("nodes") or {}
+            names = [strings[i] if i >= 0 else "" for i in nodes.get("nodeName") or []]
+            self._docs.append({"names": names, "parents": nodes.get("parentIndex") or []})
+            attributes = nodes.get("attributes") or []
+            for i, backend_id in enumerate(nodes.get("backendNodeId") or []):
+                if i >= len(names) or names[i].startswith("#"):
+                    continue
+                raw = attributes[i] if i < len(attributes) else []
+                attrs = {strings[raw[k]]: strings[raw[k + 1]] for k in range(0, len(raw) - 1, 2)}
+                self._by_backend[backend_id] = (d, i, attrs)
+
+    def element(self, backend_id: Optional[int]) -> Optional[dict]:
+        entry = self._by_backend.get(backend_id)
+        if entry is None:
+            return None
+        d, i, attrs = entry
+        return {"tag": self._docs[d]["names"][i].lower(), "attrs": attrs}
+
+    def row_nth_selector(self, backend_id: Optional[int]) -> Optional[str]:
+        """Come HARVEST_JS: `tbody tr:nth-of-type(n)` rispetto alle righe tbody della tabella."""
+        entry = self._by_backend.get(backend_id)
+        if entry is None:
+            return None
+        d, i, _ = entry
+        names, parents = self._docs[d]["names"], self._docs[d]["parents"]
+        if names[i] != "TR" or parents[i] < 0 or names[parents[i]] != "TBODY":
+            return None
+        table = self._closest(d, parents[i], "TABLE")
+        if table is None:
+            return None
+        rows = self._table_rows(d).get(table, [])
+        return f"tbody tr:nth-of-type({rows.index(i) + 1})" if i in rows else None
+
+    def _closest(self, d: int, index: int, name: str) -> Optional[int]:
+        names, parents = self._docs[d]["names"], self._docs[d]["parents"]
+        while index >= 0:
+            if names[index] == name:
+                return index
+            index = parents[index]
+        return None
+
+    def _table_rows(self, d: int) -> Dict[int, List[int]]:
+        if d not in self._tables:
+            names, parents = self._docs[d]["names"], self._docs[d]["parents"]
+            tables: Dict[int, List[int]] = {}
+            for i, name in enumerate(names):
+                if name == "TR" and parents[i] >= 0 and names[parents[i]] == "TBODY":
+                    table = self._closest(d, parents[i], "TABLE")
+                    if table is not None:
+                        tables.setdefault(table, []).append(i)
+            self._tables[d] = tables
+        return self._tables[d]
+
+
+def _value(node: dict, key: str) -> Any:
+    return (node.get(key) or {}).get("value")
+
+
+def _properties(node: dict) -> Dict[str, Any]:
+    return {p.get("name"): (p.get("value") or {}).get("value") for p in node.get("properties") or []}
+
+
+def build_raw_from_ax(nodes: List[dict], dom: _DomIndex) -> Dict[str, list]:
+    """Nodi AX (+ attributi DOM) → dati grezzi nel formato di HARVEST_JS."""
+    by_id = {n.get("nodeId"): n for n in nodes}
+    out: Dict[str, list] = {"iframes": [], "clickables": [], "rows": [], "fields": [], "interactives": []}
+    for node in nodes:
+        if node.get("ignored"):
+            continue
+        role = _value(node, "role")
+        if role not in ("Iframe", "row") + CLICKABLE_ROLES + INTERACTIVE_ROLES + FIELD_ROLES:
+            continue
+        element = dom.element(node.get("backendDOMNodeId"))
+        if element is None:
+            continue
+        tag, attrs = element["tag"], element["attrs"]
+        name = (_value(node, "name") or "").strip() or None
+        props = _properties(node)
+
+        if role == "Iframe":
+            out["iframes"].append(
+                {"src": attrs.get("src"), "title": attrs.get("title"), "name": attrs.get("name")}
+            )
+        elif role == "row":
+            children = [by_id.get(c) for c in node.get("childIds") or []]
+            header = any(_value(c, "role") == "columnheader" for c in children if c)
+            out["rows"].append(
+                {"in_header": header, "inner_text": name, "nth_selector": dom.row_nth_selector(node.get("backendDOMNodeId"))}
+            )
+        elif role in CLICKABLE_ROLES:
+            out["clickables"].append(
+                {
+                    "tag": tag,
+                    "accessible_name": name,
+                    # ruolo calcolato dal browser (anche senza attributo role)
+                    "role": role,
+                    "aria_label": attrs.get("aria-label"),
+                    "data_tfa": attrs.get("data-tfa"),
+                    "inner_text": name,
+                    "kpi_heading": None,
+                }
+            )
+        if role in FIELD_ROLES and tag in FIELD_TAGS:
+            out["fields"].append(
+                {
+                    "tag": tag,
+                    "type": attrs.get("type"),
+                    "accessible_name": name,
+                    "aria_label": attrs.get("aria-label"),
+                    "placeholder": attrs.get("placeholder"),
+                    "name": attrs.get("name"),
+                    "id": attrs.get("id"),
+                    "data_tfa": attrs.get("data-tfa"),
+                }
+            )
+        if role in INTERACTIVE_ROLES:
+            # input/select nativi: tipo dal tag/type come nel backend DOM (range, select, ...)
+            explicit_role = attrs.get("role") or (None if tag in ("input", "select") else role)
+            out["interactives"].append(
+                {
+                    "tag": tag,
+                    "type": attrs.get("type"),
+                    "role": explicit_role,
+                    "accessible_name": name,
+                    "aria_label": attrs.get("aria-label"),
+                    "name": attrs.get("name"),
+                    "id": attrs.get("id"),
+                    "data_tfa": attrs.get("data-tfa"),
+                    "checked": props.get("checked") in ("true", True) if "checked" in props else None,
+                    "aria_selected": "true" if props.get("selected") is True else attrs.get("aria-selected"),
+                    "options": _select_options(node, by_id, dom) if tag == "select" else [],
+                }
+            )
+    return out
+
+
+def _select_options(node: dict, by_id: Dict[Any, dict], dom: _DomIndex) -> List[dict]:
+    """Opzioni di una <select> nativa: nodi MenuListOption sotto il MenuListPopup."""
+    options = []
+    stack = list(reversed(node.get("childIds") or []))
+    while stack:
+        child = by_id.get(stack.pop())
+        if child is None:
+            continue
+        if _value(child, "role") in ("MenuListOption", "option"):
+            element = dom.element(child.get("backendDOMNodeId")) or {"attrs": {}}
+            options.append({"text": _value(child, "name") or "", "value": element["attrs"].get("value")})
+        else:
+            stack.extend(reversed(child.get("childIds") or []))
+    return options
@@ -0,0 +1,129 @@
+# backend/agent/background_loop.py
+"""
+Event loop asyncio di lunga durata su un thread dedicato.
+
+Il codice sincrono (handler Flask, job) vi sottomette coroutine con submit() e riceve
+un concurrent.futures.Future: client MCP, runtime agent e connessioni HTTP create nel
+loop sopravvivono tra una richiesta e l'altra invece di morire con un loop per chiamata.
+
+Tutti i wrapper sincroni (TestAgentMCP.run_test, run_full_sync, run_batch_sync, endpoint
+e generator SSE di app.py) passano da run_sync()/iterate().
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, AsyncIterator, Callable, Coroutine, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BackgroundLoop:
+    """Loop asyncio in un thread daemon; submit()/call_soon() sono thread-safe."""
+
+    def __init__(self, name: str = "agent-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    def start(self):
+        """Avvia il thread del loop (idempotente)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            ready = threading.Event()
+
+            def _run():
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                self._loop = loop
+                ready.set()
+                try:
+                    loop.run_forever()
+                finally:
+                    loop.close()
+
+            self._thread = threading.Thread(target=_run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """
+        Esegue la coroutine nel loop e restituisce un concurrent.futures.Future.
+        Il task eredita le ContextVar del chiamante (es. span di tracing corrente).
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_sync(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """
+        Esegue la coroutine nel loop e attende il risultato (eccezioni rilanciate).
+        Non chiamabile dal thread del loop: il loop resterebbe bloccato su se stesso.
+        """
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError(
+                f"run_sync() chiamato dal thread del loop '{self.name}': usare await"
+            )
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # timeout / KeyboardInterrupt nel chiamante: non lasciare la run orfana
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator[T]) -> Iterator[T]:
+        """
+        Consuma un async generator dal codice sincrono (es. generator SSE di Flask):
+        ogni elemento è prodotto nel loop. Se il consumer chiude il generator
+        (client disconnesso) viene chiuso anche l'async generator.
+        """
+        try:
+            while True:
+                try:
+                    yield self.run_sync(_await(agen.__anext__()))
+                except StopAsyncIteration:
+                    return
+        finally:
+            aclose = getattr(agen, "aclose", None)
+            if aclose is not None and self._loop is not None:
+                try:
+                    self.run_sync(_await(aclose()), timeout=5)
+                except Exception:
+                    pass
+
+    def call_soon(self, callback: Callable[..., Any], *args):
+        """Pianifica una callback nel thread del loop."""
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self, timeout: float = 5.0):
+        """Ferma il loop e attende il thread."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is None or thread is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+
+
+async def _await(awaitable):
+    # run_coroutine_threadsafe accetta solo coroutine (non l'awaitable di __anext__/aclose)
+    return await awaitable
+
+
+_BACKGROUND_LOOP = BackgroundLoop()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Loop di processo condiviso (avviato alla prima richiesta)."""
+    return _BACKGROUND_LOOP
@@ -0,0 +1,350 @@
+# backend/agent/browser_pool.py
+"""
+Browser condiviso + sessioni isolate per i server MCP.
+
+- BrowserPool: processi Playwright/Chromium tenuti vivi tra gli scenari (fino a
+  PLAYWRIGHT_POOL_BROWSERS per valore di headless) e BrowserContext pre-creati in
+  background (PLAYWRIGHT_POOL_WARM_CONTEXTS) con le opzioni di build_context_options():
+  start_browser prende un contesto già pronto invece di lanciare Chromium e crearne uno.
+  I contesti sono monouso (close_browser li chiude: nessuno stato tra scenari); un
+  browser che ha servito PLAYWRIGHT_POOL_RECYCLE_AFTER contesti viene sostituito e
+  chiuso quando l'ultimo suo contesto viene rilasciato.
+- BrowserSessionRegistry: mappa session_id -> PlaywrightTools, con cap sulle sessioni
+  concorrenti ed eviction delle sessioni inattive. Le chiamate della stessa sessione
+  sono serializzate (una pagina non va pilotata da due tool insieme), sessioni diverse
+  procedono in parallelo.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from playwright.async_api import async_playwright
+
+from agent.tools import BROWSER_LAUNCH_ARGS, PlaywrightTools, build_context_options
+from config.settings import AppConfig
+
+
+class SessionLimitError(RuntimeError):
+    """Raggiunto il numero massimo di sessioni browser concorrenti."""
+
+
+@dataclass
+class _PooledBrowser:
+    browser: object
+    headless: bool
+    served: int = 0  # contesti creati (warm inclusi)
+    active: int = 0  # contesti consegnati e non ancora rilasciati
+    retired: bool = False
+
+
+class BrowserPool:
+    """Browser condivisi + contesti pre-creati, avviati in modo lazy al primo start_browser."""
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        warm_contexts: Optional[int] = None,
+        recycle_after: Optional[int] = None,
+    ):
+        cfg = AppConfig.PLAYWRIGHT
+        self.size = max(cfg.POOL_BROWSERS if size is None else size, 1)
+        self.warm_contexts = max(cfg.POOL_WARM_CONTEXTS if warm_contexts is None else warm_contexts, 0)
+        self.recycle_after = max(cfg.POOL_RECYCLE_AFTER if recycle_after is None else recycle_after, 0)
+        self._playwright = None
+        self._browsers: Dict[bool, List[_PooledBrowser]] = {}
+        # contesti pronti (senza pagina), per valore di headless
+        self._warm: Dict[bool, List[tuple]] = {}
+        self._owners: Dict[int, _PooledBrowser] = {}  # id(context) -> browser
+        self._refill: Dict[bool, asyncio.Task] = {}
+        self._lock = asyncio.Lock()
+        self._stats = {"warm_hits": 0, "cold_starts": 0, "launched": 0, "recycled": 0}
+
+    # ---------------- browser ----------------
+
+    async def get_browser(self, headless: bool = False):
+        """Restituisce un browser per quel valore di headless (lo avvia se serve)."""
+        async with self._lock:
+            return (await self._pick_browser_locked(bool(headless))).browser
+
+    async def _pick_browser_locked(self, headless: bool) -> _PooledBrowser:
+        """Browser meno carico; ne lancia uno nuovo se sono tutti occupati e c'è posto."""
+        pool = self._browsers.setdefault(headless, [])
+        for pb in [pb for pb in pool if not pb.browser.is_connected()]:
+            pool.remove(pb)
+        live = [pb for pb in pool if not pb.retired]
+        best = min(live, key=lambda pb: pb.active, default=None)
+        if best is not None and (best.active == 0 or len(live) >= self.size):
+            return best
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(
+            headless=headless, args=BROWSER_LAUNCH_ARGS
+        )
+        pb = _PooledBrowser(browser=browser, headless=headless)
+        pool.append(pb)
+        self._stats["launched"] += 1
+        return pb
+
+    async def _new_context_locked(self, headless: bool, storage_state: Optional[dict] = None):
+        pb = await self._pick_browser_locked(headless)
+        options = build_context_options()
+        if storage_state:
+            options["storage_state"] = storage_state
+        context = await pb.browser.new_context(**options)
+        pb.served += 1
+        if self.recycle_after and pb.served >= self.recycle_after:
+            pb.retired = True  # i prossimi contesti vanno su un browser nuovo
+            self._stats["recycled"] += 1
+        self._owners[id(context)] = pb
+        return context
+
+    # ---------------- contesti ----------------
+
+    async def acquire_context(self, headless: bool = False, storage_state: Optional[dict] = None):
+        """
+        BrowserContext pronto per una sessione: uno pre-creato se disponibile (solo senza
+        storage_state, che va impostato alla creazione), altrimenti uno nuovo. Avvia in
+        background il ripristino dei contesti warm.
+        """
+        headless = bool(headless)
+        async with self._lock:
+            context = None
+            if not storage_state:
+                warm = self._warm.setdefault(headless, [])
+                while warm and context is None:
+                    candidate, pb = warm.pop(0)
+                    if pb.browser.is_connected():
+                        context = candidate
+            if context is not None:
+                self._stats["warm_hits"] += 1
+            else:
+                context = await self._new_context_locked(headless, storage_state)
+                self._stats["cold_starts"] += 1
+            self._owners[id(context)].active += 1
+        self._schedule_refill(headless)
+        return context
+
+    async def release_context(self, context):
+        """Chiude il contesto di una sessione; chiude il browser se è da riciclare e libero."""
+        async with self._lock:
+            pb = self._owners.pop(id(context), None)
+            if pb is not None:
+                pb.active = max(pb.active - 1, 0)
+        try:
+            await context.close()
+        except Exception:
+            pass
+        if pb is not None and pb.retired and pb.active == 0:
+            await self._close_retired(pb)
+        if pb is not None:
+            self._schedule_refill(pb.headless)
+
+    async def _close_retired(self, pb: _PooledBrowser):
+        async with self._lock:
+            pool = self._browsers.get(pb.headless, [])
+            warm = self._warm.get(pb.headless, [])
+            # ancora in uso o con contesti warm da consegnare: si chiude all'ultimo rilascio
+            if pb not in pool or pb.active or any(owner is pb for _, owner in warm):
+                return
+            pool.remove(pb)
+        try:
+            await pb.browser.close()
+        except Exception:
+            pass
+
+    def warm_up(self, headless: bool = False):
+        """Avvia in background la creazione dei contesti warm (es. all'avvio del server)."""
+        self._schedule_refill(bool(headless))
+
+    def _schedule_refill(self, headless: bool):
+        if not self.warm_contexts:
+            return
+        task = self._refill.get(headless)
+        if task is not None and not task.done():
+            return
+        self._refill[headless] = asyncio.get_running_loop().create_task(
+            self._refill_warm(headless)
+        )
+
+    async def _refill_warm(self, headless: bool):
+        try:
+            while True:
+                async with self._lock:
+                    warm = self._warm.setdefault(headless, [])
+                    if len(warm) >= self.warm_contexts:
+                        return
+                    context = await self._new_context_locked(headless)
+                    warm.append((context, self._owners[id(context)]))
+        except Exception as e:
+            print(f"[MCP] pre-creazione contesti browser fallita: {e}")
+
+    async def close(self):
+        for task in self._refill.values():
+            task.cancel()
+        async with self._lock:
+            for pool in self._browsers.values():
+                for pb in pool:
+                    try:
+                        await pb.browser.close()
+                    except Exception:
+                        pass
+            self._browsers.clear()
+            self._warm.clear()
+            self._owners.clear()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    def render_prometheus(self) -> str:
+        """Contatori del pool in formato testo Prometheus (appesi a /metrics)."""
+        lines = []
+        for key, kind, help_text in (
+            ("warm_hits", "counter", "start_browser serviti da un contesto pre-creato."),
+            ("cold_starts", "counter", "start_browser che hanno dovuto creare il contesto."),
+            ("launched", "counter", "Processi browser lanciati."),
+            ("recycled", "counter", "Browser ritirati dopo PLAYWRIGHT_POOL_RECYCLE_AFTER contesti."),
+        ):
+            name = f"mcp_browser_pool_{key}_total"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {self._stats[key]}"]
+        lines += [
+            "# HELP mcp_browser_pool_warm_contexts Contesti pre-creati disponibili.",
+            "# TYPE mcp_browser_pool_warm_contexts gauge",
+            f"mcp_browser_pool_warm_contexts {sum(len(w) for w in self._warm.values())}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> dict:
+        return {
+            "browsers": {
+                ("headless" if headless else "headed"): [
+                    {"served": pb.served, "active": pb.active, "retired": pb.retired}
+                    for pb in pool
+                ]
+                for headless, pool in self._browsers.items()
+            },
+            "warm_contexts": {
+                ("headless" if headless else "headed"): len(warm)
+                for headless, warm in self._warm.items()
+            },
+            "warm_target": self.warm_contexts,
+            "recycle_after": self.recycle_after,
+            **self._stats,
+        }
+
+
+@dataclass
+class _Session:
+    tools: PlaywrightTools
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+
+
+class BrowserSessionRegistry:
+    """Sessioni PlaywrightTools indipendenti su un BrowserPool condiviso."""
+
+    def __init__(self, pool: BrowserPool, max_sessions: int = 8, idle_timeout_s: float = 900):
+        self.pool = pool
+        self.max_sessions = max_sessions
+        self.idle_timeout_s = idle_timeout_s
+        self._sessions: Dict[str, _Session] = {}
+        self._lock = asyncio.Lock()
+
+    def _pop_idle_locked(self) -> List[_Session]:
+        """Rimuove dal registry le sessioni inattive da più di idle_timeout_s (sotto _lock)."""
+        if not self.idle_timeout_s or self.idle_timeout_s <= 0:
+            return []
+        now = time.monotonic()
+        expired = [
+            sid
+            for sid, s in self._sessions.items()
+            if not s.in_use and now - s.last_used > self.idle_timeout_s
+        ]
+        for sid in expired:
+            print(f"[MCP] sessione browser '{sid}' chiusa per inattività")
+        return [self._sessions.pop(sid) for sid in expired]
+
+    @staticmethod
+    async def _close_sessions(sessions: List[_Session]):
+        """Chiude in parallelo le sessioni già rimosse dal registry (fuori da _lock)."""
+        results = await asyncio.gather(
+            *(s.tools.close_browser() for s in sessions), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                print(f"[MCP] errore chiusura sessione browser: {result}")
+
+    async def _acquire(self, session_id: str) -> _Session:
+        expired: List[_Session] = []
+        try:
+            async with self._lock:
+                expired = self._pop_idle_locked()
+                session = self._sessions.get(session_id)
+                if session is None:
+                    if len(self._sessions) >= self.max_sessions:
+                        raise SessionLimitError(
+                            f"Limite sessioni browser raggiunto ({self.max_sessions}): "
+                            f"riprova più tardi o chiudi una sessione con close_browser"
+                        )
+                    session = _Session(tools=PlaywrightTools(browser_pool=self.pool))
+                    self._sessions[session_id] = session
+                session.in_use += 1
+                return session
+        finally:
+            # le sessioni scadute si chiudono a lock rilasciato: le altre sessioni
+            # non aspettano la chiusura dei browser inattivi
+            if expired:
+                await self._close_sessions(expired)
+
+    @asynccontextmanager
+    async def use(self, session_id: str):
+        """
+        Context manager: restituisce il PlaywrightTools della sessione (creandola se serve)
+        tenendo il lock della sessione per tutta la durata della chiamata.
+        """
+        session = await self._acquire(session_id)
+        try:
+            async with session.lock:
+                yield session.tools
+        finally:
+            session.in_use -= 1
+            session.last_used = time.monotonic()
+
+    async def close_session(self, session_id: str) -> Optional[dict]:
+        """
+        Rimuove la sessione dal registry e ne chiude contesto e pagina
+        (attende l'eventuale chiamata in corso). None se la sessione non esiste.
+        """
+        async with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return None
+        async with session.lock:
+            return await session.tools.close_browser()
+
+    async def close_all(self):
+        async with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        await self._close_sessions(sessions)
+        await self.pool.close()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "pool": self.pool.stats(),
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_timeout_s": self.idle_timeout_s,
+            "active": {
+                sid: {
+                    "in_use": s.in_use,
+                    "idle_s": round(now - s.last_used, 1),
+                    "browser_started": s.tools.page is not None,
+                }
+                for sid, s in self._sessions.items()
+            },
+        }
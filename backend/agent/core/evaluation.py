@@ -35,6 +35,7 @@ INFRA_TOOLS: set[str] = {
 SOFT_TOOLS: set[str] = {
     "click_smart",
     "fill_smart",
+    "execute_plan",
     "scroll_to_bottom",
     "wait_for_clickable_by_name",
     "wait_for_field_by_name",
@@ -99,6 +100,22 @@ def step_from_tool_end(tool_name: str, output_obj: Any) -> dict:
     }
 
 
+# execute_plan: gli step interni (uno per azione/guard) entrano negli steps come tool call
+# autonome, così tolleranze, trace e replay vedono i singoli click_smart/fill_smart/wait;
+# lo step execute_plan resta solo come riepilogo (senza steps, errori già dagli step interni).
+PLAN_TOOL = "execute_plan"
+
+
+def plan_substeps(tool_name: str, output_obj: Any) -> Optional[list[dict]]:
+    """Step interni di un output execute_plan (None per gli altri tool o output non valido)."""
+    if tool_name != PLAN_TOOL or not isinstance(output_obj, dict):
+        return None
+    substeps = output_obj.get("steps")
+    if not isinstance(substeps, list):
+        return None
+    return [s for s in substeps if isinstance(s, dict) and s.get("tool")]
+
+
 def error_from_tool_output(tool_name: str, output_obj: dict) -> Optional[dict]:
     """Se output ha status=error, restituisce il dict errore.
     Gli errori di INFRA_TOOLS vengono ignorati a monte."""
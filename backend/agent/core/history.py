@@ -0,0 +1,200 @@
+"""
+Compattazione della message history dell'agent ReAct (pre_model_hook di create_react_agent).
+
+Gli output di inspect_* e get_frame restano nella lista messaggi per tutta la run: dopo
+qualche cambio pagina sono obsoleti ma vengono rimandati all'LLM a ogni chiamata.
+Il hook sostituisce, SOLO nell'input dell'LLM (lo stato LangGraph non cambia), gli output
+di discovery precedenti all'ultimo cambio pagina con uno stub di una riga; l'inspect più
+recente resta sempre completo.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+# Output di discovery: grandi e validi solo per lo stato pagina in cui sono stati presi
+DISCOVERY_TOOLS: set[str] = {
+    "inspect_interactive_elements",
+    "inspect_region",
+    "get_frame",
+}
+
+# Tool dopo i quali la pagina (o la parte che conta) può essere cambiata
+PAGE_CHANGE_TOOLS: set[str] = {
+    "start_browser",
+    "navigate_to_url",
+    "restore_storage_state",
+    "click_smart",
+    "click_and_wait_for_text",
+    "press_key",
+    # esegue lato server click_smart/click_and_wait_for_text/press_key (es. un login intero)
+    "execute_plan",
+}
+
+_INSPECT_TOOLS = {"inspect_interactive_elements", "inspect_region"}
+
+# Statistiche per run (thread_id -> lista chiamate LLM), lette da TestAgentMCP a fine run
+_STATS: Dict[str, List[Dict[str, int]]] = {}
+_STATS_LOCK = threading.Lock()
+
+_ENCODING = None
+
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part.get("text", "") if isinstance(part, dict) else str(part) for part in content
+        )
+    return str(content)
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """
+    Token stimati dei messaggi: tiktoken (cl100k_base) se disponibile, altrimenti chars/4.
+    Conta contenuto e argomenti delle tool call (è quello che pesa nel prompt).
+    """
+    global _ENCODING
+    text = []
+    for m in messages:
+        text.append(_content_text(getattr(m, "content", "")))
+        for call in getattr(m, "tool_calls", None) or []:
+            text.append(json.dumps(call.get("args") or {}, ensure_ascii=False))
+    joined = "\n".join(text)
+
+    if _ENCODING is None:
+        try:
+            import tiktoken
+
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _ENCODING = False
+    if _ENCODING:
+        return len(_ENCODING.encode(joined, disallowed_special=()))
+    return len(joined) // 4
+
+
+def _stub(message: ToolMessage, superseded_by: str) -> str:
+    text = _content_text(message.content)
+    summary = ""
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            summary = f" — {data.get('status')}: {data.get('message') or ''}".rstrip(": ")
+    except (ValueError, TypeError):
+        pass
+    return (
+        f"[output compattato: {message.name}{summary}; {len(text)} caratteri, "
+        f"obsoleto dopo {superseded_by}. Rifai inspect se ti servono i dettagli.]"
+    )
+
+
+def _inspect_data(message: BaseMessage) -> dict:
+    try:
+        data = json.loads(_content_text(message.content))
+    except (ValueError, TypeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _inspect_chain(messages: List[BaseMessage], last_inspect: Optional[int]) -> set:
+    """
+    Indici da non compattare: l'ultimo inspect_* e, se è un diff (since), gli inspect
+    da cui dipende (inspect_token == since), risalendo la catena.
+    """
+    keep = set()
+    idx = last_inspect
+    while idx is not None:
+        keep.add(idx)
+        data = _inspect_data(messages[idx])
+        since = data.get("since") if data.get("diff") else None
+        idx = next(
+            (
+                i
+                for i in range(idx - 1, -1, -1)
+                if since
+                and isinstance(messages[i], ToolMessage)
+                and messages[i].name in _INSPECT_TOOLS
+                and _inspect_data(messages[i]).get("inspect_token") == since
+            ),
+            None,
+        )
+    return keep
+
+
+def compact_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    Restituisce una nuova lista in cui gli output di DISCOVERY_TOOLS precedenti
+    all'ultimo tool di PAGE_CHANGE_TOOLS sono sostituiti da uno stub.
+    L'ultimo inspect_* resta completo anche se precede il cambio pagina, insieme agli
+    inspect su cui si basa se è un output incrementale (since).
+    """
+    last_change = None
+    last_inspect = None
+    for idx, m in enumerate(messages):
+        if not isinstance(m, ToolMessage):
+            continue
+        if m.name in PAGE_CHANGE_TOOLS:
+            last_change = idx
+        elif m.name in _INSPECT_TOOLS:
+            last_inspect = idx
+    if last_change is None:
+        return messages
+
+    superseded_by = messages[last_change].name
+    keep = _inspect_chain(messages, last_inspect)
+    compacted = []
+    for idx, m in enumerate(messages):
+        if (
+            isinstance(m, ToolMessage)
+            and m.name in DISCOVERY_TOOLS
+            and idx < last_change
+            and idx not in keep
+        ):
+            m = m.model_copy(update={"content": _stub(m, superseded_by)})
+        compacted.append(m)
+    return compacted
+
+
+def compact_history_hook(state: dict, config: Optional[dict] = None) -> dict:
+    """
+    pre_model_hook: passa all'LLM la history compattata (llm_input_messages) e registra
+    token prima/dopo per la run (thread_id della config).
+    """
+    messages = state["messages"]
+    compacted = compact_messages(messages)
+
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    if thread_id:
+        before = estimate_tokens(messages)
+        after = before if compacted is messages else estimate_tokens(compacted)
+        with _STATS_LOCK:
+            _STATS.setdefault(thread_id, []).append(
+                {"tokens_before": before, "tokens_after": after}
+            )
+    return {"llm_input_messages": compacted}
+
+
+def pop_history_stats(thread_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Statistiche di compattazione della run (e le rimuove): token per chiamata LLM
+    prima/dopo e totali. None se il hook non è stato usato.
+    """
+    with _STATS_LOCK:
+        calls = _STATS.pop(thread_id, None)
+    if not calls:
+        return None
+    before = sum(c["tokens_before"] for c in calls)
+    after = sum(c["tokens_after"] for c in calls)
+    return {
+        "llm_calls": len(calls),
+        "tokens_before": before,
+        "tokens_after": after,
+        "saved_pct": round(100 * (1 - after / before), 1) if before else 0.0,
+        "per_call": calls,
+    }
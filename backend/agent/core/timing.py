@@ -0,0 +1,243 @@
+"""
+Scomposizione dei tempi di una run: modello vs tool vs trasporto MCP.
+
+Per ogni step (tool call):
+- llm_ms: durata della chiamata LLM che ha prodotto la tool call (attribuita al primo
+  tool avviato dopo la risposta del modello; 0 per gli altri tool della stessa risposta);
+- input_tokens / output_tokens: token di quella chiamata LLM (usage_metadata);
+- tool_ms: durata della tool call vista dal client (on_tool_start → on_tool_end);
+- server_ms: tempo di esecuzione sul server MCP remoto (campo server_ms della risposta);
+- transport_ms: tool_ms - server_ms (HTTP, sessione MCP, serializzazione); None se il
+  server non riporta server_ms (MCP locale).
+
+summarize_timing() aggrega step e chiamate LLM di una o più run (totali + percentili).
+
+server_ms non arriva all'LLM: hide_server_ms() avvolge i tool MCP dell'agent e lo sposta
+dal contenuto del ToolMessage all'artifact (non inviato al modello), da cui lo legge
+RunTimer.tool_end().
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Campo aggiunto dal server MCP remoto a ogni risposta (ms di esecuzione lato server)
+SERVER_MS_KEY = "server_ms"
+
+_PERCENTILES = (50, 90, 99)
+
+
+def _ms(seconds: float) -> int:
+    return int(round(seconds * 1000))
+
+
+def percentiles(values: Iterable[float]) -> Optional[Dict[str, float]]:
+    """p50/p90/p99 (nearest-rank) e max; None se non ci sono valori."""
+    data = sorted(v for v in values if v is not None)
+    if not data:
+        return None
+    result = {}
+    for p in _PERCENTILES:
+        rank = max(1, math.ceil(p / 100 * len(data)))
+        result[f"p{p}"] = data[rank - 1]
+    result["max"] = data[-1]
+    return result
+
+
+def pop_server_ms(output_obj: Any) -> Optional[int]:
+    """Rimuove server_ms dall'output del tool (resta fuori da step/trace) e lo restituisce."""
+    if isinstance(output_obj, dict):
+        value = output_obj.pop(SERVER_MS_KEY, None)
+        if isinstance(value, (int, float)):
+            return int(value)
+    return None
+
+
+def strip_server_ms(content: Any) -> Tuple[Any, Optional[int]]:
+    """
+    Contenuto testuale di un tool MCP senza server_ms, più il valore rimosso. Il JSON è
+    riserializzato come to_json del server (compatto per format=compact, altrimenti indent=2).
+    """
+    if not isinstance(content, str) or SERVER_MS_KEY not in content:
+        return content, None
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content, None
+    server_ms = pop_server_ms(data)
+    if server_ms is None:
+        return content, None
+    if data.get("format") == "compact":
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")), server_ms
+    return json.dumps(data, indent=2, ensure_ascii=False), server_ms
+
+
+def hide_server_ms(tools: List[Any]) -> List[Any]:
+    """
+    Tool MCP (response_format content_and_artifact) il cui ToolMessage non contiene
+    server_ms: il valore passa nell'artifact ({"server_ms": ..., "mcp_artifact": ...}).
+    """
+    from langchain_core.tools import StructuredTool
+
+    wrapped = []
+    for tool in tools:
+        coroutine = getattr(tool, "coroutine", None)
+        if coroutine is None or getattr(tool, "response_format", None) != "content_and_artifact":
+            wrapped.append(tool)
+            continue
+
+        async def call(_coroutine=coroutine, **arguments):
+            content, artifact = await _coroutine(**arguments)
+            content, server_ms = strip_server_ms(content)
+            if server_ms is None:
+                return content, artifact
+            return content, {SERVER_MS_KEY: server_ms, "mcp_artifact": artifact}
+
+        wrapped.append(
+            StructuredTool(
+                name=tool.name,
+                description=tool.description,
+                args_schema=tool.args_schema,
+                coroutine=call,
+                response_format="content_and_artifact",
+                metadata=tool.metadata,
+            )
+        )
+    return wrapped
+
+
+def _artifact_server_ms(output: Any) -> Optional[int]:
+    artifact = getattr(output, "artifact", None)
+    if isinstance(artifact, dict):
+        value = artifact.get(SERVER_MS_KEY)
+        if isinstance(value, (int, float)):
+            return int(value)
+    return None
+
+
+def tool_timing(tool_ms: int, server_ms: Optional[int], llm: Optional[dict] = None) -> dict:
+    """Campi di timing di uno step."""
+    llm = llm or {}
+    return {
+        "llm_ms": llm.get("ms", 0),
+        "input_tokens": llm.get("input_tokens", 0),
+        "output_tokens": llm.get("output_tokens", 0),
+        "tool_ms": tool_ms,
+        "server_ms": server_ms,
+        "transport_ms": max(tool_ms - server_ms, 0) if server_ms is not None else None,
+    }
+
+
+class RunTimer:
+    """
+    Misura chiamate LLM e tool call dagli eventi di astream_events (v2) di una run e
+    fornisce i campi di timing degli step costruiti su on_tool_end.
+    """
+
+    def __init__(self):
+        self.llm_calls: List[Dict[str, int]] = []
+        self._llm_started: Dict[str, float] = {}
+        self._tool_started: Dict[str, float] = {}
+        self._tool_llm: Dict[str, dict] = {}
+        self._pending_llm: Optional[dict] = None
+
+    def on_event(self, ev: dict):
+        event_type = ev.get("event")
+        run_id = str(ev.get("run_id"))
+        now = time.perf_counter()
+        if event_type == "on_chat_model_start":
+            self._llm_started[run_id] = now
+        elif event_type == "on_chat_model_end":
+            started = self._llm_started.pop(run_id, None)
+            if started is None:
+                return
+            output = (ev.get("data") or {}).get("output")
+            usage = getattr(output, "usage_metadata", None) or {}
+            call = {
+                "ms": _ms(now - started),
+                "input_tokens": usage.get("input_tokens") or 0,
+                "output_tokens": usage.get("output_tokens") or 0,
+            }
+            self.llm_calls.append(call)
+            self._pending_llm = call
+        elif event_type == "on_tool_start":
+            self._tool_started[run_id] = now
+            if self._pending_llm is not None:
+                self._tool_llm[run_id] = self._pending_llm
+                self._pending_llm = None
+
+    def tool_end(self, ev: dict, output_obj: Any) -> dict:
+        """
+        Campi di timing dello step di un on_tool_end: server_ms dall'artifact del
+        ToolMessage (hide_server_ms) o, per tool non avvolti, rimosso dall'output.
+        """
+        run_id = str(ev.get("run_id"))
+        started = self._tool_started.pop(run_id, None)
+        tool_ms = _ms(time.perf_counter() - started) if started is not None else 0
+        server_ms = pop_server_ms(output_obj)
+        if server_ms is None:
+            server_ms = _artifact_server_ms((ev.get("data") or {}).get("output"))
+        return tool_timing(tool_ms, server_ms, self._tool_llm.pop(run_id, None))
+
+
+def summarize_timing(
+    steps: List[dict], duration_ms: int, llm_calls: Optional[List[dict]] = None
+) -> Dict[str, Any]:
+    """
+    Totali e percentili di una run (o di più run concatenate). Gli step senza tool_ms
+    (es. step interni di execute_plan) non entrano nei conteggi dei tool.
+    `llm_calls` include anche le chiamate LLM che non hanno prodotto tool call.
+    """
+    timed = [s for s in steps if isinstance(s, dict) and s.get("tool_ms") is not None]
+    llm_calls = llm_calls or []
+    transports = [s["transport_ms"] for s in timed if s.get("transport_ms") is not None]
+
+    llm_ms = sum(c.get("ms", 0) for c in llm_calls)
+    tool_ms = sum(s["tool_ms"] for s in timed)
+    server = [s["server_ms"] for s in timed if s.get("server_ms") is not None]
+    return {
+        "duration_ms": duration_ms,
+        "llm_ms": llm_ms,
+        "tool_ms": tool_ms,
+        "server_ms": sum(server) if server else None,
+        "transport_ms": sum(transports) if transports else None,
+        # resto: grafo LangGraph, hook, orchestrazione (negativo → 0 con tool in parallelo)
+        "other_ms": max(duration_ms - llm_ms - tool_ms, 0),
+        "llm_share": round(llm_ms / duration_ms, 3) if duration_ms else None,
+        "llm_calls": len(llm_calls),
+        "tool_calls": len(timed),
+        "input_tokens": sum(c.get("input_tokens", 0) for c in llm_calls),
+        "output_tokens": sum(c.get("output_tokens", 0) for c in llm_calls),
+        "percentiles": {
+            "llm_ms": percentiles(c.get("ms", 0) for c in llm_calls),
+            "tool_ms": percentiles(s["tool_ms"] for s in timed),
+            "transport_ms": percentiles(transports),
+        },
+        "llm_call_list": llm_calls,
+    }
+
+
+def rollup_timing(runs: Iterable[Optional[dict]]) -> Optional[Dict[str, Any]]:
+    """
+    Timing aggregato di più risultati run_test_async (prefix + scenario, batch):
+    step e chiamate LLM concatenati, durate sommate. None se nessuna run ha timing.
+    """
+    steps: List[dict] = []
+    llm_calls: List[dict] = []
+    duration_ms = 0
+    found = False
+    for run in runs:
+        if not isinstance(run, dict) or not isinstance(run.get("timing"), dict):
+            continue
+        found = True
+        steps.extend(run.get("steps") or [])
+        llm_calls.extend(run["timing"].get("llm_call_list") or [])
+        duration_ms += run["timing"].get("duration_ms") or 0
+    if not found:
+        return None
+    summary = summarize_timing(steps, duration_ms, llm_calls)
+    del summary["llm_call_list"]
+    return summary
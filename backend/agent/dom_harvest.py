@@ -0,0 +1,882 @@
+# backend/agent/dom_harvest.py
+"""
+Harvesting DOM in un solo round-trip per inspect_interactive_elements / inspect_region.
+
+Invece di N chiamate CDP per elemento (evaluate + get_attribute + inner_text),
+uno script in-page raccoglie in una sola evaluate tutti i dati grezzi dei candidati
+(tag, accessible name, role, aria-label, data-tfa, testo visibile, KPI heading,
+checked/selected, options). Python costruisce poi le `playwright_suggestions`
+con la stessa logica di prima, così l'output resta identico.
+
+Note di fedeltà rispetto alla versione per-elemento:
+- la query dei candidati attraversa gli shadow root aperti nello stesso ordine
+  del motore CSS di Playwright (`locator(css).all()`);
+- trim/normalizzazione del testo visibile restano in Python (`str.strip`, `split`);
+- `checked` replica `Locator.is_checked` (retarget follow-label + aria-checked) e,
+  come Playwright, fallisce su elementi non checkable: l'errore viene riportato
+  per-elemento e l'elemento saltato (stessi indici di prima).
+"""
+
+import re
+from typing import Dict, List
+
+# Stesso set di _build_clickable_selector_for_inspect per righe e controlli
+ROW_SELECTOR = "table tbody tr, tr[role='row'], .mat-row, .mat-mdc-row, .cdk-row"
+FIELD_SELECTOR = "input, select, textarea"
+INTERACTIVE_SELECTOR = """
+    input[type='checkbox'], input[type='radio'], select, input[type='file'],
+    input[type='range'], input[type='color'],
+    [role='checkbox'], [role='radio'], [role='switch'], [role='tab'], [role='combobox']
+"""
+
+# Funzione JS (root, opts) → dati grezzi. `root` è un Document (pagina/frame) o un Element
+# (regione). opts: {clickable, rows, fields, interactives, iframes: bool, visibility: bool}.
+HARVEST_JS = r"""
+(root, opts) => {
+    const deepQuery = (scope, css) => {
+        let result = [];
+        const query = (r) => {
+            result = result.concat([...r.querySelectorAll(css)]);
+            if (r.shadowRoot) query(r.shadowRoot);
+            for (const el of r.querySelectorAll('*')) {
+                if (el.shadowRoot) query(el.shadowRoot);
+            }
+        };
+        query(scope);
+        return result;
+    };
+    const errMsg = (e) => (e && e.message) ? e.message : String(e);
+    const innerText = (el) => {
+        if (el.namespaceURI !== 'http://www.w3.org/1999/xhtml') return null;
+        return el.innerText;
+    };
+    const attr = (el, name) => el.getAttribute(name);
+
+    // Replica Locator.is_checked: retarget(follow-label) + getChecked
+    const kAriaCheckedRoles = ['checkbox', 'menuitemcheckbox', 'option', 'radio', 'switch', 'menuitemradio', 'treeitem'];
+    const ariaRole = (el) => {
+        const explicit = (el.getAttribute('role') || '').split(' ').map(r => r.trim()).filter(Boolean)[0];
+        if (explicit) return explicit;
+        const t = el.tagName;
+        if (t === 'INPUT' && el.type === 'checkbox') return 'checkbox';
+        if (t === 'INPUT' && el.type === 'radio') return 'radio';
+        if (t === 'OPTION') return 'option';
+        return null;
+    };
+    const isChecked = (node) => {
+        let el = node;
+        if (!el.matches('input, textarea, select') && !el.isContentEditable) {
+            el = el.closest('button, [role=button], [role=checkbox], [role=radio]') || el;
+        }
+        if (!el.matches('a, input, textarea, button, select, [role=link], [role=button], [role=checkbox], [role=radio]') && !el.isContentEditable) {
+            el = el.closest('label') || el;
+        }
+        if (el.nodeName === 'LABEL') el = el.control || el;
+        if (el.tagName === 'INPUT' && ['checkbox', 'radio'].includes(el.type)) return el.checked;
+        if (kAriaCheckedRoles.includes(ariaRole(el) || '')) return el.getAttribute('aria-checked') === 'true';
+        throw new Error('Not a checkbox or radio button');
+    };
+
+    const labelledBy = (el) => {
+        const labelId = el.getAttribute('aria-labelledby');
+        const labelEl = document.getElementById(labelId);
+        return labelEl ? labelEl.textContent.trim() : null;
+    };
+    const labelFor = (el) => {
+        const label = document.querySelector(`label[for="${el.id}"]`);
+        return label ? label.textContent.trim() : null;
+    };
+    const clickableName = (el) => {
+        if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
+        if (el.getAttribute('aria-labelledby')) {
+            const v = labelledBy(el);
+            if (v !== null) return v;
+        }
+        if (el.textContent && el.textContent.trim()) return el.textContent.trim();
+        if (el.title) return el.title;
+        if (el.value) return el.value;
+        return null;
+    };
+    const fieldName = (el) => {
+        if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
+        if (el.id) {
+            const v = labelFor(el);
+            if (v !== null) return v;
+        }
+        if (el.placeholder) return el.placeholder;
+        if (el.name) return el.name;
+        return null;
+    };
+    const controlName = (el) => {
+        if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
+        if (el.id) {
+            const v = labelFor(el);
+            if (v !== null) return v;
+        }
+        if (el.getAttribute('aria-labelledby')) {
+            const v = labelledBy(el);
+            if (v !== null) return v;
+        }
+        if (el.title) return el.title;
+        if (el.name) return el.name;
+        return null;
+    };
+    const kpiHeading = (el) => {
+        if (!el.classList || !el.classList.contains('circle-card')
+            || !el.classList.contains('pointer')) return null;
+        const h4 = el.querySelector('h4');
+        return h4 ? h4.textContent.trim() : null;
+    };
+    // opts.visibility: aggiunge `visible` (box non vuoto + visibility CSS) a ogni voce
+    const isVisible = (el) => {
+        if (getComputedStyle(el).visibility !== 'visible') return false;
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0;
+    };
+    const each = (elements, fn) => elements.map((el) => {
+        try {
+            const entry = fn(el);
+            if (opts.visibility) entry.visible = isVisible(el);
+            return entry;
+        } catch (e) { return { error: errMsg(e) }; }
+    });
+
+    const out = {};
+    if (opts.iframes) {
+        out.iframes = each(deepQuery(root, 'iframe'), (el) => ({
+            src: attr(el, 'src'), title: attr(el, 'title'), name: attr(el, 'name'),
+        }));
+    }
+    if (opts.clickable) {
+        out.clickables = each(deepQuery(root, opts.clickable), (el) => {
+            const tag = el.tagName.toLowerCase();
+            return {
+                tag,
+                accessible_name: clickableName(el),
+                role: attr(el, 'role'),
+                aria_label: attr(el, 'aria-label'),
+                data_tfa: attr(el, 'data-tfa'),
+                inner_text: innerText(el),
+                kpi_heading: tag === 'div' ? kpiHeading(el) : null,
+            };
+        });
+    }
+    if (opts.rows) {
+        const tableRows = new Map();
+        out.rows = each(deepQuery(root, opts.rows), (el) => {
+            if (el.closest('thead')) return { in_header: true };
+            let nth = null;
+            const table = el.closest('table');
+            if (table) {
+                if (!tableRows.has(table)) tableRows.set(table, Array.from(table.querySelectorAll('tbody tr')));
+                const index = tableRows.get(table).indexOf(el);
+                if (index >= 0) nth = `tbody tr:nth-of-type(${index + 1})`;
+            }
+            return { in_header: false, inner_text: innerText(el), nth_selector: nth };
+        });
+    }
+    if (opts.fields) {
+        out.fields = each(deepQuery(root, opts.fields), (el) => ({
+            tag: el.tagName.toLowerCase(),
+            type: attr(el, 'type'),
+            accessible_name: fieldName(el),
+            aria_label: attr(el, 'aria-label'),
+            placeholder: attr(el, 'placeholder'),
+            name: attr(el, 'name'),
+            id: attr(el, 'id'),
+            data_tfa: attr(el, 'data-tfa'),
+        }));
+    }
+    if (opts.interactives) {
+        out.interactives = each(deepQuery(root, opts.interactives), (el) => {
+            const tag = el.tagName.toLowerCase();
+            const role = attr(el, 'role');
+            const effectiveType = role ? role : (tag === 'input' ? attr(el, 'type') : tag);
+            return {
+                tag,
+                type: attr(el, 'type'),
+                role,
+                accessible_name: controlName(el),
+                aria_label: attr(el, 'aria-label'),
+                name: attr(el, 'name'),
+                id: attr(el, 'id'),
+                data_tfa: attr(el, 'data-tfa'),
+                checked: ['checkbox', 'radio', 'switch'].includes(effectiveType) ? isChecked(el) : null,
+                aria_selected: attr(el, 'aria-selected'),
+                options: tag === 'select'
+                    ? deepQuery(el, 'option').map((o) => {
+                        const text = innerText(o);
+                        if (text === null) throw new Error('Node is not an HTMLElement');
+                        return { text, value: attr(o, 'value') };
+                    })
+                    : [],
+            };
+        });
+    }
+    return out;
+}
+"""
+
+
+# Matcher in-page per i wait_for_*_by_name: rivaluta il predicato sul nome a ogni batch
+# di mutazioni (più un controllo periodico leggero per cambi solo-CSS) e risolve appena
+# esiste un candidato visibile che matcha, restituendo l'harvest della categoria.
+# Python riapplica poi la stessa logica di selezione di prima sui dati restituiti.
+WAIT_FOR_MATCH_JS = (
+    r"""
+(args) => new Promise((resolve) => {
+    const harvest = ("""
+    + HARVEST_JS
+    + r""");
+    const ci = args.case_insensitive;
+    const norm = (v) => ci ? (v || '').toLowerCase() : (v || '');
+    const needle = norm(args.needle);
+    const ok = (e) => e && !e.error && e.visible;
+    const predicates = {
+        clickable: (raw) =>
+            (raw.clickables || []).some((e) => ok(e)
+                && norm(e.accessible_name || (e.inner_text || '').trim().slice(0, 100)).includes(needle))
+            || (raw.rows || []).some((e) => ok(e) && !e.in_header
+                && norm((e.inner_text || '').split(/\s+/).join(' ').trim().slice(0, 200)).includes(needle)),
+        control: (raw) =>
+            (raw.interactives || []).some((e) => ok(e)
+                && norm(e.role ? e.role : (e.tag === 'input' ? e.type : e.tag)) === norm(args.control_type)
+                && norm(e.accessible_name).includes(needle)),
+        field: (raw) =>
+            (raw.fields || []).some((e) => ok(e)
+                && [e.accessible_name, e.placeholder, e.name].some((v) => v && norm(v).includes(needle))),
+    };
+    const matches = predicates[args.category];
+
+    // Un solo harvest pendente per frame: i batch di mutation ravvicinati si fondono e tra
+    // due harvest passano almeno min_gap_ms. Il recheck periodico (cambi solo CSS, shadow
+    // DOM non osservato) parte solo dopo recheck_ms senza harvest.
+    let done = false;
+    let scheduled = false;
+    let lastRun = 0;
+    let observer = null;
+    let pending = null;
+    let idle = null;
+    let timer = null;
+    const finish = (result) => {
+        if (done) return;
+        done = true;
+        if (observer) observer.disconnect();
+        clearTimeout(pending);
+        clearTimeout(idle);
+        clearTimeout(timer);
+        resolve(result);
+    };
+    const check = () => {
+        scheduled = false;
+        if (done) return;
+        lastRun = performance.now();
+        clearTimeout(idle);
+        const raw = harvest(document, args.harvest);
+        if (matches(raw)) return finish({ matched: true, raw });
+        idle = setTimeout(schedule, args.recheck_ms);
+    };
+    const schedule = () => {
+        if (scheduled || done) return;
+        scheduled = true;
+        const wait = Math.max(0, lastRun + args.min_gap_ms - performance.now());
+        pending = setTimeout(check, wait);
+    };
+
+    check();
+    if (done) return;
+    observer = new MutationObserver(schedule);
+    // Document (non body) per sopravvivere a document.open/write; gli attributi sono
+    // limitati a quelli che cambiano nome, ruolo o visibilita' dei candidati.
+    observer.observe(document, {
+        subtree: true, childList: true, characterData: true, attributes: true,
+        attributeFilter: [
+            'class', 'style', 'hidden', 'open', 'disabled', 'type', 'role', 'name',
+            'placeholder', 'value', 'title', 'alt', 'for', 'aria-label', 'aria-labelledby',
+            'aria-hidden', 'aria-expanded', 'aria-selected',
+        ],
+    });
+    timer = setTimeout(() => finish({ matched: false }), args.timeout);
+})
+"""
+)
+
+_WAIT_HARVEST_KEYS = {
+    "clickable": ("clickable", "rows"),
+    "control": ("interactives",),
+    "field": ("fields",),
+}
+
+
+async def wait_for_match(
+    context,
+    category: str,
+    needle: str,
+    timeout: int,
+    clickable_selector: str,
+    case_insensitive: bool = True,
+    control_type: str = None,
+    recheck_ms: int = 250,
+    min_gap_ms: int = 50,
+) -> dict:
+    """
+    Attende in-page un candidato visibile della categoria ("clickable" | "control" | "field")
+    il cui nome contiene `needle`. Ritorna {"matched": bool, "raw": harvest della categoria}.
+    Gli harvest sono coalescenti: al massimo uno ogni `min_gap_ms`, piu' un recheck dopo
+    `recheck_ms` di quiete.
+    """
+    all_opts = harvest_options(clickable_selector, include_iframes=False)
+    keys = _WAIT_HARVEST_KEYS[category]
+    harvest = {k: (all_opts[k] if k in keys else None) for k in all_opts}
+    harvest["visibility"] = True
+    return await context.evaluate(
+        WAIT_FOR_MATCH_JS,
+        {
+            "category": category,
+            "needle": needle,
+            "case_insensitive": case_insensitive,
+            "control_type": control_type,
+            "timeout": max(int(timeout), 0),
+            "recheck_ms": recheck_ms,
+            "min_gap_ms": min_gap_ms,
+            "harvest": harvest,
+        },
+    )
+
+
+def visible_sections(raw: Dict[str, list], sections: Dict[str, list]) -> Dict[str, list]:
+    """
+    Filtra le sezioni costruite da build_inspect_sections tenendo solo gli elementi
+    marcati `visible` nell'harvest (opts.visibility). Gli indici restano quelli dell'inspect.
+    """
+
+    def is_visible(raw_list, pos):
+        return 0 <= pos < len(raw_list) and raw_list[pos].get("visible", True)
+
+    raw_clickables = raw.get("clickables") or []
+    raw_rows = raw.get("rows") or []
+    clickable_elements = sections["clickable_elements"]
+    # build_inspect_sections mette prima i clickable (index = posizione raw) e poi le
+    # righe (index = base + posizione raw, con base = numero di clickable costruiti)
+    base = len([c for c in raw_clickables if not c.get("error")])
+    visible_clickables = [
+        e for e in clickable_elements[:base] if is_visible(raw_clickables, e["index"])
+    ] + [
+        e
+        for e in clickable_elements[base:]
+        if is_visible(raw_rows, e["index"] - base)
+    ]
+    return {
+        "iframes": sections["iframes"],
+        "clickable_elements": visible_clickables,
+        "interactive_controls": [
+            e
+            for e in sections["interactive_controls"]
+            if is_visible(raw.get("interactives") or [], e["index"])
+        ],
+        "form_fields": [
+            e
+            for e in sections["form_fields"]
+            if is_visible(raw.get("fields") or [], e["index"])
+        ],
+    }
+
+
+# Nome della binding esposta al contesto e init script che la usa: un MutationObserver
+# per documento incrementa `window.__aitaDomGen` e notifica Python (al più una notifica
+# in volo alla volta) così la cache degli inspect sa quando il DOM del frame è cambiato.
+DOM_GENERATION_BINDING = "__aitaDomMutated"
+
+DOM_GENERATION_INIT_JS = r"""
+(() => {
+    if (window.__aitaDomGen !== undefined) return;
+    window.__aitaDomGen = 0;
+    let pending = false;
+    let again = false;
+    const notify = () => {
+        const binding = window.__aitaDomMutated;
+        if (typeof binding !== 'function') return;
+        if (pending) { again = true; return; }
+        pending = true;
+        Promise.resolve(binding(window.__aitaDomGen)).catch(() => {}).finally(() => {
+            pending = false;
+            if (again) { again = false; notify(); }
+        });
+    };
+    // Osserva il Document (non documentElement): sopravvive anche a document.open/write
+    new MutationObserver(() => {
+        window.__aitaDomGen++;
+        notify();
+    }).observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+    // Notifica iniziale: segnala a Python che questo frame è tracciato
+    notify();
+})();
+"""
+
+
+def harvest_options(
+    clickable_selector: str, include_iframes: bool = True
+) -> Dict[str, object]:
+    """Opzioni per HARVEST_JS: selettori delle quattro categorie (+ iframe opzionali)."""
+    return {
+        "iframes": include_iframes,
+        "clickable": clickable_selector,
+        "rows": ROW_SELECTOR,
+        "fields": FIELD_SELECTOR,
+        "interactives": INTERACTIVE_SELECTOR,
+    }
+
+
+async def harvest_document(context, opts: Dict[str, object]) -> Dict[str, list]:
+    """Una sola evaluate sul documento di una Page/Frame."""
+    return await context.evaluate(
+        f"(opts) => ({HARVEST_JS})(document, opts)", opts
+    )
+
+
+async def harvest_element(locator, opts: Dict[str, object]) -> Dict[str, list]:
+    """Una sola evaluate con radice un elemento (regione)."""
+    return await locator.evaluate(HARVEST_JS, opts)
+
+
+# =====================================================================
+# Builders: dati grezzi → stessa struttura di inspect_interactive_elements
+# =====================================================================
+
+
+def _strip_material_icon_prefix(name: str) -> str:
+    """
+    Rimuove il prefisso di icona Material da un accessible_name concatenato.
+    Es: "addAggiungi filtro" → "Aggiungi filtro"
+        "editModifica"       → "Modifica"
+        "add\nAGGIUNGI"      → "AGGIUNGI"  (già gestito dal split \n)
+    Lascia invariato se non c'è un prefisso riconoscibile.
+    """
+    if not name:
+        return name
+    # Caso 1: separato da newline → prendi l'ultima parte non vuota
+    if "\n" in name:
+        parts = [p.strip() for p in name.split("\n") if p.strip()]
+        return parts[-1] if parts else name
+    # Caso 2: concatenato senza separatore: parola lowercase breve (2-8 char)
+    # seguita da testo che inizia con maiuscola o uppercase
+    m = re.match(r"^[a-z_]{2,8}([A-Z].+)$", name)
+    if m:
+        return m.group(1).strip()
+    return name
+
+
+def build_iframe_info(raw_iframes: List[dict]) -> List[dict]:
+    iframe_info = []
+    for idx, raw in enumerate(raw_iframes or []):
+        if raw.get("error"):
+            print(f"Error inspecting iframe {idx}: {raw['error']}")
+            continue
+        src = raw.get("src") or ""
+        title = raw.get("title") or ""
+        name = raw.get("name") or ""
+        iframe_info.append(
+            {
+                "index": idx,
+                "src": src,
+                "title": title,
+                "name": name,
+                "selector": (
+                    f"iframe[src*='{src.split('/')[-1][:30]}']"
+                    if src
+                    else f"iframe >> nth={idx}"
+                ),
+            }
+        )
+    return iframe_info
+
+
+def build_clickable_info(
+    raw_clickables: List[dict], error_label: str = "clickable"
+) -> List[dict]:
+    clickable_info = []
+    for idx, raw in enumerate(raw_clickables or []):
+        if raw.get("error"):
+            print(f"Error inspecting {error_label} {idx}: {raw['error']}")
+            continue
+        tag = raw.get("tag")
+        accessible_name = raw.get("accessible_name")
+        role = raw.get("role")
+        aria_label = raw.get("aria_label")
+        data_tfa = raw.get("data_tfa")
+        effective_role = (
+            role
+            if role
+            else {"button": "button", "a": "link", "input": "button"}.get(tag, None)
+        )
+        visible_text = (raw.get("inner_text") or "").strip()[:100]
+        suggestions = []
+        # KPI dashboard cerchi: div senza role; il titolo navigabile è in h4 (es. "Campioni con Check-in")
+        kpi_heading = raw.get("kpi_heading")
+        if tag == "div" and kpi_heading:
+            suggestions.append(
+                {
+                    "strategy": "text_kpi_heading",
+                    "click_smart": {"by": "text", "text": kpi_heading},
+                }
+            )
+        if effective_role and accessible_name:
+            clean_name = _strip_material_icon_prefix(accessible_name)
+            suggestions.append(
+                {
+                    "strategy": "role",
+                    "click_smart": {
+                        "by": "role",
+                        "role": effective_role,
+                        "name": clean_name,
+                    },
+                }
+            )
+        if aria_label:
+            suggestions.append(
+                {
+                    "strategy": "css_aria",
+                    "click_smart": {
+                        "by": "css",
+                        "selector": f'[aria-label="{aria_label}"]',
+                    },
+                }
+            )
+        # Icon+label buttons (e.g. "add\n\nAGGIUNGI FILTRO"): add text with label only first,
+        # so get_by_text("AGGIUNGI FILTRO") is tried before the full string (which often times out).
+        if visible_text and "\n" in visible_text:
+            parts = [p.strip() for p in visible_text.split("\n") if p.strip()]
+            if parts:
+                label_only = parts[-1]
+                if len(label_only) >= 2 and label_only != visible_text.strip():
+                    suggestions.append(
+                        {
+                            "strategy": "text",
+                            "click_smart": {"by": "text", "text": label_only},
+                        }
+                    )
+        if visible_text:
+            suggestions.append(
+                {
+                    "strategy": "text",
+                    "click_smart": {"by": "text", "text": visible_text},
+                }
+            )
+        if data_tfa:
+            suggestions.append(
+                {
+                    "strategy": "tfa",
+                    "click_smart": {"by": "tfa", "tfa": data_tfa},
+                }
+            )
+        clickable_info.append(
+            {
+                "index": idx,
+                "tag": tag,
+                "role": effective_role,
+                "accessible_name": accessible_name,
+                "text": visible_text,
+                "aria_label": aria_label,
+                "data_tfa": data_tfa,
+                "playwright_suggestions": suggestions,
+            }
+        )
+    return clickable_info
+
+
+def build_row_info(
+    raw_rows: List[dict], base_index: int, error_label: str = "table row"
+) -> List[dict]:
+    row_info = []
+    for r_idx, raw in enumerate(raw_rows or []):
+        if raw.get("error"):
+            print(f"Error inspecting {error_label} {r_idx}: {raw['error']}")
+            continue
+        # Salta eventuali righe di intestazione
+        if raw.get("in_header"):
+            continue
+        full_text = raw.get("inner_text") or ""
+        if not full_text:
+            continue
+
+        # Normalizza e tronca il testo per usarlo come "nome" riga
+        normalized = " ".join(full_text.split()).strip()
+        if not normalized:
+            continue
+        short_text = normalized[:200]
+
+        suggestions = []
+        nth_selector = raw.get("nth_selector")
+        if nth_selector:
+            suggestions.append(
+                {
+                    "strategy": "css_row",
+                    "click_smart": {"by": "css", "selector": nth_selector},
+                }
+            )
+
+        row_info.append(
+            {
+                "index": base_index + r_idx,
+                "tag": "tr",
+                "role": "row",
+                "accessible_name": short_text,
+                "text": short_text,
+                "aria_label": None,
+                "data_tfa": None,
+                "playwright_suggestions": suggestions,
+            }
+        )
+    return row_info
+
+
+_FIELD_ROLE_MAP = {
+    "text": "textbox",
+    "email": "textbox",
+    "password": "textbox",
+    "search": "searchbox",
+    "tel": "textbox",
+    "url": "textbox",
+    "select": "combobox",
+    "textarea": "textbox",
+}
+
+
+def build_field_info(raw_fields: List[dict], error_label: str = "field") -> List[dict]:
+    field_info = []
+    for idx, raw in enumerate(raw_fields or []):
+        if raw.get("error"):
+            print(f"Error inspecting {error_label} {idx}: {raw['error']}")
+            continue
+        tag = raw.get("tag")
+        field_type = raw.get("type") if tag == "input" else tag
+        accessible_name = raw.get("accessible_name")
+        aria_label = raw.get("aria_label")
+        placeholder = raw.get("placeholder") or ""
+        name = raw.get("name") or ""
+        input_id = raw.get("id") or ""
+        suggestions = []
+        if accessible_name:
+            suggestions.append(
+                {
+                    "strategy": "label",
+                    "fill_smart": {"by": "label", "label": accessible_name},
+                }
+            )
+        if placeholder:
+            suggestions.append(
+                {
+                    "strategy": "placeholder",
+                    "fill_smart": {"by": "placeholder", "placeholder": placeholder},
+                }
+            )
+        if field_type:
+            role_name = _FIELD_ROLE_MAP.get(field_type)
+            if role_name and accessible_name:
+                suggestions.append(
+                    {
+                        "strategy": "role",
+                        "fill_smart": {
+                            "by": "role",
+                            "role": role_name,
+                            "name": accessible_name,
+                        },
+                    }
+                )
+        if name:
+            suggestions.append(
+                {
+                    "strategy": "css_name",
+                    "fill_smart": {"by": "css", "selector": f'[name="{name}"]'},
+                }
+            )
+        if input_id:
+            suggestions.append(
+                {
+                    "strategy": "css_id",
+                    "fill_smart": {"by": "css", "selector": f"#{input_id}"},
+                }
+            )
+        if aria_label:
+            suggestions.append(
+                {
+                    "strategy": "css_aria",
+                    "fill_smart": {
+                        "by": "css",
+                        "selector": f'[aria-label="{aria_label}"]',
+                    },
+                }
+            )
+        data_tfa = raw.get("data_tfa")
+        if data_tfa:
+            suggestions.append(
+                {
+                    "strategy": "tfa",
+                    "fill_smart": {"by": "tfa", "tfa": data_tfa},
+                }
+            )
+        field_info.append(
+            {
+                "index": idx,
+                "tag": tag,
+                "type": field_type,
+                "accessible_name": accessible_name,
+                "aria_label": aria_label,
+                "placeholder": placeholder,
+                "name": name,
+                "id": input_id,
+                "playwright_suggestions": suggestions,
+            }
+        )
+    return field_info
+
+
+def build_interactive_info(
+    raw_interactives: List[dict], error_label: str = "interactive"
+) -> List[dict]:
+    interactive_info = []
+    for idx, raw in enumerate(raw_interactives or []):
+        if raw.get("error"):
+            print(f"Error inspecting {error_label} {idx}: {raw['error']}")
+            continue
+        tag = raw.get("tag")
+        elem_type = raw.get("type") if tag == "input" else tag
+        role = raw.get("role")
+        effective_type = role if role else elem_type
+        accessible_name = raw.get("accessible_name")
+        aria_label = raw.get("aria_label")
+        name = raw.get("name") or ""
+        elem_id = raw.get("id") or ""
+        data_tfa = raw.get("data_tfa")
+        checked = None
+        if effective_type in ["checkbox", "radio", "switch"]:
+            checked = raw.get("checked")
+        selected = None
+        if effective_type == "tab":
+            selected = raw.get("aria_selected") == "true"
+        options = []
+        if tag == "select":
+            for opt in raw.get("options") or []:
+                options.append(
+                    {"text": (opt.get("text") or "").strip(), "value": opt.get("value")}
+                )
+        suggestions = []
+        if effective_type in ["checkbox", "radio", "switch", "tab"]:
+            if accessible_name:
+                suggestions.append(
+                    {
+                        "strategy": "role",
+                        "click_smart": {
+                            "by": "role",
+                            "role": effective_type,
+                            "name": accessible_name,
+                        },
+                    }
+                )
+            if accessible_name and tag == "input":
+                suggestions.append(
+                    {
+                        "strategy": "label",
+                        "click_smart": {"by": "label", "label": accessible_name},
+                    }
+                )
+            if accessible_name:
+                suggestions.append(
+                    {
+                        "strategy": "text",
+                        "click_smart": {"by": "text", "text": accessible_name},
+                    }
+                )
+            if aria_label:
+                suggestions.append(
+                    {
+                        "strategy": "css_aria",
+                        "click_smart": {
+                            "by": "css",
+                            "selector": f'[aria-label="{aria_label}"]',
+                        },
+                    }
+                )
+            if name:
+                suggestions.append(
+                    {
+                        "strategy": "css_name",
+                        "click_smart": {"by": "css", "selector": f'[name="{name}"]'},
+                    }
+                )
+            if data_tfa:
+                suggestions.append(
+                    {
+                        "strategy": "tfa",
+                        "click_smart": {"by": "tfa", "tfa": data_tfa},
+                    }
+                )
+        elif tag == "select":
+            suggestions.append(
+                {
+                    "strategy": "note",
+                    "action": "select_option",
+                    "message": "Use fill_smart with value, or click_smart to open dropdown then click option",
+                }
+            )
+        elif elem_type == "file":
+            suggestions.append(
+                {
+                    "strategy": "note",
+                    "action": "set_input_files",
+                    "message": "File upload requires dedicated tool (not yet implemented)",
+                }
+            )
+        elif elem_type in ["range", "color"] and accessible_name:
+            suggestions.append(
+                {
+                    "strategy": "fill",
+                    "fill_smart": {"by": "label", "label": accessible_name},
+                }
+            )
+        interactive_info.append(
+            {
+                "index": idx,
+                "tag": tag,
+                "type": effective_type,
+                "accessible_name": accessible_name,
+                "aria_label": aria_label,
+                "name": name,
+                "id": elem_id,
+                "data_tfa": data_tfa,
+                "checked": checked,
+                "selected": selected,
+                "options": options if options else None,
+                "playwright_suggestions": suggestions,
+            }
+        )
+    return interactive_info
+
+
+def build_inspect_sections(raw: Dict[str, list], region: bool = False) -> Dict[str, list]:
+    """
+    Costruisce le sezioni di output (stesse chiavi/ordine di inspect_interactive_elements)
+    a partire dal risultato di HARVEST_JS. `region=True` usa le etichette di log di inspect_region.
+    """
+    clickable_info = build_clickable_info(
+        raw.get("clickables"), "regional clickable" if region else "clickable"
+    )
+    clickable_info.extend(
+        build_row_info(
+            raw.get("rows"),
+            base_index=len(clickable_info),
+            error_label="table row in region" if region else "table row",
+        )
+    )
+    field_info = build_field_info(
+        raw.get("fields"), "regional field" if region else "field"
+    )
+    interactive_info = build_interactive_info(
+        raw.get("interactives"), "regional interactive" if region else "interactive"
+    )
+    return {
+        "iframes": build_iframe_info(raw.get("iframes")),
+        "clickable_elements": clickable_info,
+        "interactive_controls": interactive_info,
+        "form_fields": field_info,
+    }
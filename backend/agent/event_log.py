@@ -0,0 +1,193 @@
+# backend/agent/event_log.py
+"""
+Log di eventi di progress per gli stream SSE (job, batch stream).
+
+Ogni run scrive su un EventLog: eventi numerati (seq crescente da 1) in un ring buffer
+limitato, opzionalmente riversati su disco (JSONL) per recuperare anche gli eventi
+usciti dal buffer. Qualsiasi numero di subscriber legge con events_after(seq): attesa
+su threading.Condition (nessun polling) e ripresa da Last-Event-ID.
+
+EventLogRegistry tiene i log delle run in corso e delle ultime run finite, per
+riagganciarsi a uno stream dopo una disconnessione o seguirlo da un secondo client.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent.utils import make_json_serializable
+from config.settings import AppConfig
+
+_RUN_ID_RE = re.compile(r"^[0-9a-f]{12}$")
+
+
+class EventLog:
+    """Eventi di una run; emit() e events_after() sono thread-safe."""
+
+    def __init__(self, capacity: int = 1000, spill_path: Optional[str] = None):
+        self._events: deque = deque(maxlen=max(capacity, 1))
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.spill_path = spill_path
+        self._spill_file = None
+        if spill_path:
+            os.makedirs(os.path.dirname(spill_path) or ".", exist_ok=True)
+            # Gli eventi possono contenere dati della run (URL, input): solo l'utente.
+            # Un solo handle per tutta la run, line-buffered: ogni evento è subito
+            # leggibile da _read_spill senza riaprire il file a ogni emit()
+            fd = os.open(spill_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o600)
+            self._spill_file = os.fdopen(fd, "a", encoding="utf-8", buffering=1)
+
+    @classmethod
+    def from_spill(cls, path: str, capacity: int = 1000) -> "EventLog":
+        """Log (chiuso) ricostruito dal file su disco di una run non più in memoria."""
+        log = cls(capacity)
+        log.spill_path = path
+        for ev in log._read_spill(0):
+            log._events.append(ev)
+            log._seq = ev["seq"]
+        log._closed = True
+        return log
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def emit(self, event: str, data: Optional[Dict[str, Any]] = None) -> int:
+        """Accoda un evento (firma compatibile con progress_callback) e ne restituisce il seq."""
+        with self._cond:
+            if self._closed:
+                return self._seq
+            self._seq += 1
+            ev = {"seq": self._seq, "event": event, "data": data or {}, "ts": time.time()}
+            self._events.append(ev)
+            if self._spill_file is not None:
+                self._spill(ev)
+            self._cond.notify_all()
+            return self._seq
+
+    def close(self):
+        """Fine della run: i subscriber ricevono gli ultimi eventi e chiudono lo stream."""
+        with self._cond:
+            self._closed = True
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+            self._cond.notify_all()
+
+    def events_after(self, seq: int, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Eventi con seq > `seq`; se non ce ne sono e il log è aperto attende fino a
+        `timeout` secondi un nuovo evento. Lista vuota = timeout (keepalive).
+        Gli eventi già usciti dal ring buffer sono riletti dal file di spill, se c'è.
+        """
+        with self._cond:
+            if self._seq <= seq and not self._closed and timeout:
+                self._cond.wait_for(lambda: self._seq > seq or self._closed, timeout)
+            buffered = [e for e in self._events if e["seq"] > seq]
+        if buffered and buffered[0]["seq"] > seq + 1 and self.spill_path:
+            missing = [e for e in self._read_spill(seq) if e["seq"] < buffered[0]["seq"]]
+            return missing + buffered
+        return buffered
+
+    def _spill(self, ev: Dict[str, Any]):
+        line = json.dumps(make_json_serializable(ev), ensure_ascii=False)
+        try:
+            self._spill_file.write(line + "\n")
+        except OSError as e:
+            # disco pieno/non scrivibile: gli eventi restano nel ring buffer
+            print(f"⚠️  Spill eventi su {self.spill_path} disattivato: {e}")
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _read_spill(self, after_seq: int) -> List[Dict[str, Any]]:
+        events = []
+        try:
+            with open(self.spill_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        ev = json.loads(line)
+                    except ValueError:
+                        continue  # riga troncata (processo interrotto durante la scrittura)
+                    if ev.get("seq", 0) > after_seq:
+                        events.append(ev)
+        except OSError:
+            pass
+        return events
+
+
+class EventLogRegistry:
+    """
+    Log delle run di stream (es. /api/test/batch/stream) per id: quelle in corso e le
+    ultime `retention` finite. Con spill_dir le run uscite dalla memoria restano
+    riagganciabili dal file <spill_dir>/<run_id>.jsonl.
+    """
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        retention: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ):
+        cfg = AppConfig.STREAM
+        self.capacity = capacity or cfg.EVENT_BUFFER
+        self.retention = max(retention or cfg.RETENTION, 1)
+        self.spill_dir = cfg.SPILL_DIR if spill_dir is None else spill_dir
+        self._logs: "OrderedDict[str, EventLog]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self) -> Tuple[str, EventLog]:
+        """Nuova run: (run_id, log su cui emettere gli eventi)."""
+        run_id = uuid.uuid4().hex[:12]
+        spill = os.path.join(self.spill_dir, f"{run_id}.jsonl") if self.spill_dir else None
+        log = EventLog(self.capacity, spill_path=spill)
+        with self._lock:
+            self._logs[run_id] = log
+            self._prune_locked()
+        return run_id, log
+
+    def get(self, run_id: str) -> Optional[EventLog]:
+        with self._lock:
+            log = self._logs.get(run_id)
+        if log is not None or not self.spill_dir or not _RUN_ID_RE.match(run_id):
+            return log
+        path = os.path.join(self.spill_dir, f"{run_id}.jsonl")
+        if not os.path.exists(path):
+            return None
+        return EventLog.from_spill(path, self.capacity)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._logs.items())
+        return [
+            {"run_id": run_id, "closed": log.closed, "last_event_seq": log.last_seq}
+            for run_id, log in reversed(items)
+        ]
+
+    def _prune_locked(self):
+        closed = [rid for rid, log in self._logs.items() if log.closed]
+        for rid in closed[: max(len(closed) - self.retention, 0)]:
+            del self._logs[rid]
+
+
+_STREAM_REGISTRY: Optional[EventLogRegistry] = None
+_STREAM_REGISTRY_LOCK = threading.Lock()
+
+
+def get_stream_registry() -> EventLogRegistry:
+    """Registry di processo degli stream di batch."""
+    global _STREAM_REGISTRY
+    with _STREAM_REGISTRY_LOCK:
+        if _STREAM_REGISTRY is None:
+            _STREAM_REGISTRY = EventLogRegistry()
+        return _STREAM_REGISTRY
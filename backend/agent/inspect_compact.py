@@ -0,0 +1,235 @@
+# backend/agent/inspect_compact.py
+"""
+Formato compatto (opt-in) dell'output di inspect_interactive_elements / inspect_region.
+
+Invece di un oggetto JSON per elemento con playwright_suggestions annidate, l'LLM riceve
+una riga per elemento con un id corto (la chiave stabile dell'elemento, agent/inspect_diff.py,
+quindi lo stesso id nei diff successivi con `since`):
+
+    c5e1a2f button "Causali"
+    f08b3c4 password "Password" ph="Password"
+    i9d27e0 tab "Storico" selected
+
+Le strategie restano lato server (ElementRefs): click_smart/fill_smart accettano
+{"by": "ref", "ref": "c5e1a2f"} e la espandono nei targets completi.
+Budget rigido: max_elements righe e max_chars caratteri.
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+# Prefissi id per sezione (ordine = priorità nel budget)
+_SECTIONS = (
+    ("iframes", "fr"),
+    ("form_fields", "f"),
+    ("interactive_controls", "i"),
+    ("clickable_elements", "c"),
+)
+
+_NAME_MAX = 60
+_TEXT_MAX = 60
+
+LEGEND = (
+    "id kind \"name\" [dettagli]. Usa l'id con click_smart/fill_smart: "
+    "targets=[{\"by\": \"ref\", \"ref\": \"<id>\"}] "
+    "(id = chiavi stabili: valide fino al prossimo inspect, uguali nei diff con since)"
+)
+
+
+def _q(value: Optional[str], limit: int) -> str:
+    """Stringa quotata JSON (escape di apici/newline), troncata a limit caratteri."""
+    text = " ".join(str(value).split())
+    if len(text) > limit:
+        text = text[: limit - 1] + "…"
+    return json.dumps(text, ensure_ascii=False)
+
+
+def _line(section: str, elem_id: str, elem: dict) -> str:
+    parts = [elem_id]
+    if section == "iframes":
+        parts.append("iframe")
+        if elem.get("title") or elem.get("name"):
+            parts.append(_q(elem.get("title") or elem.get("name"), _NAME_MAX))
+        parts.append(f"sel={_q(elem.get('selector'), 80)}")
+        return " ".join(parts)
+
+    name = elem.get("accessible_name") or ""
+    if section == "clickable_elements":
+        parts.append(elem.get("role") or elem.get("tag") or "?")
+        if name:
+            parts.append(_q(name, _NAME_MAX))
+        text = elem.get("text") or ""
+        if text and " ".join(text.split()) != " ".join(name.split()):
+            parts.append(f"text={_q(text, _TEXT_MAX)}")
+    elif section == "form_fields":
+        parts.append(elem.get("type") or elem.get("tag") or "?")
+        if name:
+            parts.append(_q(name, _NAME_MAX))
+        if elem.get("placeholder") and elem.get("placeholder") != name:
+            parts.append(f"ph={_q(elem['placeholder'], _TEXT_MAX)}")
+        if not name and elem.get("name"):
+            parts.append(f"name={_q(elem['name'], _TEXT_MAX)}")
+    else:
+        parts.append(elem.get("type") or elem.get("tag") or "?")
+        if name:
+            parts.append(_q(name, _NAME_MAX))
+        if elem.get("checked"):
+            parts.append("checked")
+        if elem.get("selected"):
+            parts.append("selected")
+        options = elem.get("options") or []
+        if options:
+            shown = [o.get("text") or "" for o in options[:8]]
+            more = f"+{len(options) - 8}" if len(options) > 8 else ""
+            parts.append(f"opts={_q('|'.join(shown) + more, 120)}")
+
+    if elem.get("data_tfa"):
+        parts.append(f"tfa={_q(elem['data_tfa'], 40)}")
+    return " ".join(parts)
+
+
+def _ref_targets(section: str, elem: dict) -> Tuple[str, List[dict]]:
+    """Targets flat (già nel formato click_smart/fill_smart) per l'id dell'elemento."""
+    suggestions = elem.get("playwright_suggestions") or []
+    fill = [s["fill_smart"] for s in suggestions if "fill_smart" in s]
+    click = [s["click_smart"] for s in suggestions if "click_smart" in s]
+    if section == "form_fields":
+        return "fill", fill
+    return "click", click or fill
+
+
+def compact_inspect_result(
+    result: dict,
+    max_elements: int,
+    max_chars: int,
+    in_iframe: Optional[dict] = None,
+) -> Tuple[dict, Dict[str, dict]]:
+    """
+    Converte il risultato verbose di inspect_* nel formato compatto.
+
+    Returns:
+        (risultato compatto, refs) dove refs mappa id -> {"mode", "targets", "in_iframe"}.
+    """
+    lines: List[str] = []
+    refs: Dict[str, dict] = {}
+    omitted: Dict[str, int] = {}
+    used_chars = 0
+
+    for section, prefix in _SECTIONS:
+        elements = result.get(section) or []
+        for pos, elem in enumerate(elements):
+            # chiave stabile se presente (inspect_*), altrimenti posizionale
+            elem_id = elem.get("key") or f"{prefix}{pos}"
+            line = _line(section, elem_id, elem)
+            if len(lines) >= max_elements or used_chars + len(line) + 1 > max_chars:
+                omitted[section] = len(elements) - pos
+                break
+            lines.append(line)
+            used_chars += len(line) + 1
+            if section != "iframes":
+                mode, targets = _ref_targets(section, elem)
+                refs[elem_id] = {"mode": mode, "targets": targets, "in_iframe": in_iframe}
+
+    compact = {
+        "status": result.get("status", "success"),
+        "format": "compact",
+        "message": result.get("message"),
+        "page_info": result.get("page_info"),
+        "legend": LEGEND,
+        "elements": "\n".join(lines),
+    }
+    for key in ("root_selector", "fallback_used", "fallback_from", "cached", "inspect_token", "since_ignored"):
+        if key in result:
+            compact[key] = result[key]
+    if omitted:
+        compact["omitted"] = omitted
+        compact["hint"] = (
+            "Budget raggiunto: elementi omessi. Usa inspect_region(root_selector) "
+            "sulla parte di pagina che ti interessa."
+        )
+    return compact, refs
+
+
+def compact_diff_result(
+    diff: dict,
+    max_elements: int,
+    max_chars: int,
+) -> dict:
+    """
+    Formato compatto del risultato incrementale (inspect_* con since): una riga per
+    elemento aggiunto ("+") o cambiato ("~") con la chiave stabile come id, e le chiavi
+    degli elementi rimossi.
+    """
+    lines: List[str] = []
+    omitted = 0
+    used_chars = 0
+    for marker, group in (("+", diff.get("added") or {}), ("~", diff.get("changed") or {})):
+        for section, _ in _SECTIONS:
+            for elem in group.get(section) or []:
+                line = f"{marker} {_line(section, elem['key'], elem)}"
+                if len(lines) >= max_elements or used_chars + len(line) + 1 > max_chars:
+                    omitted += 1
+                    continue
+                lines.append(line)
+                used_chars += len(line) + 1
+
+    compact = {
+        "status": diff.get("status", "success"),
+        "format": "compact",
+        "diff": True,
+        "since": diff.get("since"),
+        "message": diff.get("message"),
+        "page_info": diff.get("page_info"),
+        "legend": LEGEND + "; + aggiunto, ~ cambiato, removed = chiavi non più presenti",
+        "elements": "\n".join(lines),
+        "removed": [key for keys in (diff.get("removed") or {}).values() for key in keys],
+    }
+    for key in ("root_selector", "fallback_used", "fallback_from", "cached", "inspect_token"):
+        if key in diff:
+            compact[key] = diff[key]
+    if omitted:
+        compact["omitted"] = omitted
+        compact["hint"] = "Budget raggiunto: rifai l'inspect senza since per l'elenco completo."
+    return compact
+
+
+def key_refs(index: Dict[str, tuple], in_iframe: Optional[dict] = None) -> Dict[str, dict]:
+    """Refs per chiave stabile (key -> targets) di tutti gli elementi di un inspect."""
+    refs: Dict[str, dict] = {}
+    for key, (section, elem) in index.items():
+        if section == "iframes":
+            continue
+        mode, targets = _ref_targets(section, elem)
+        refs[key] = {"mode": mode, "targets": targets, "in_iframe": in_iframe}
+    return refs
+
+
+def expand_ref_targets(
+    targets: List[Dict], refs: Dict[str, dict]
+) -> Tuple[Optional[List[Dict]], Optional[dict], Optional[str]]:
+    """
+    Sostituisce i target {"by": "ref", "ref": "<id>"} con le strategie salvate.
+
+    Returns:
+        (targets espansi, in_iframe dell'inspect d'origine o None, messaggio d'errore o None)
+    """
+    if not any(isinstance(t, dict) and t.get("by") == "ref" for t in targets or []):
+        return targets, None, None
+
+    expanded: List[Dict] = []
+    ref_iframe = None
+    for t in targets:
+        if not (isinstance(t, dict) and t.get("by") == "ref"):
+            expanded.append(t)
+            continue
+        ref = refs.get(str(t.get("ref") or "").strip())
+        if ref is None:
+            return None, None, (
+                f"Id elemento '{t.get('ref')}' sconosciuto: riesegui inspect_interactive_elements "
+                "(gli id valgono fino al prossimo inspect)"
+            )
+        if not ref["targets"]:
+            return None, None, f"Nessuna strategia disponibile per l'elemento '{t.get('ref')}'"
+        expanded.extend(ref["targets"])
+        ref_iframe = ref_iframe or ref.get("in_iframe")
+    return expanded, ref_iframe, None
@@ -0,0 +1,147 @@
+# backend/agent/inspect_diff.py
+"""
+Output incrementale di inspect_interactive_elements / inspect_region (parametro `since`).
+
+Ogni inspect riuscito restituisce un `inspect_token` e una chiave stabile (`key`) per
+elemento. Il server tiene gli ultimi snapshot per token: passando `since=<token>` a un
+inspect successivo sullo stesso ambito (stesso root_selector / in_iframe) l'output
+contiene solo gli elementi aggiunti, rimossi e cambiati, così il payload verso l'LLM è
+proporzionale a ciò che è cambiato e non alla dimensione della pagina.
+
+Chiave: prefisso di sezione (come il formato compatto) + hash dei tratti che identificano
+l'elemento (ruolo, nome accessibile, name, data-tfa, ...). Gli attributi volatili (id
+Angular come mat-input-17, checked, selected, opzioni) non entrano nella chiave: se
+cambiano l'elemento è "changed". A parità di tratti si aggiunge l'occorrenza (-2, -3).
+"""
+
+import hashlib
+import json
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+SECTIONS = ("iframes", "form_fields", "interactive_controls", "clickable_elements")
+
+_PREFIX = {
+    "iframes": "fr",
+    "form_fields": "f",
+    "interactive_controls": "i",
+    "clickable_elements": "c",
+}
+
+# Tratti che identificano un elemento tra due inspect (il resto è contenuto confrontato)
+_IDENTITY = {
+    "iframes": ("src", "name", "title"),
+    "form_fields": ("tag", "type", "name", "accessible_name", "placeholder", "data_tfa"),
+    "interactive_controls": ("tag", "type", "name", "accessible_name", "data_tfa"),
+    "clickable_elements": ("tag", "role", "accessible_name", "aria_label", "data_tfa"),
+}
+
+# Campi che non contano come modifica (posizione nella lista, chiave stessa)
+_IGNORED = ("index", "key")
+
+SNAPSHOTS_MAX = 32
+
+Index = "OrderedDict[str, Tuple[str, dict]]"
+
+
+def add_element_keys(result: dict) -> Tuple[dict, Index]:
+    """
+    Copia del risultato con `key` su ogni elemento (il risultato in cache non viene
+    toccato) e indice key -> (sezione, elemento) nell'ordine di output.
+    """
+    keyed = dict(result)
+    index: Index = OrderedDict()
+    for section in SECTIONS:
+        if section not in result:
+            continue
+        seen: Dict[str, int] = {}
+        elements = []
+        for elem in result.get(section) or []:
+            identity = [elem.get(k) for k in _IDENTITY[section]]
+            if section == "clickable_elements" and not elem.get("accessible_name"):
+                identity.append(elem.get("text"))
+            digest = hashlib.sha1(
+                json.dumps(identity, ensure_ascii=False).encode("utf-8")
+            ).hexdigest()[:6]
+            base = f"{_PREFIX[section]}{digest}"
+            seen[base] = seen.get(base, 0) + 1
+            key = base if seen[base] == 1 else f"{base}-{seen[base]}"
+            elem = {**elem, "key": key}
+            elements.append(elem)
+            index[key] = (section, elem)
+        keyed[section] = elements
+    return keyed, index
+
+
+def _content(elem: dict) -> dict:
+    return {k: v for k, v in elem.items() if k not in _IGNORED}
+
+
+def diff_inspect(result: dict, old_index: Index, new_index: Index, since: str) -> dict:
+    """Risultato incrementale: added/changed (elementi completi) e removed (solo chiavi)."""
+    added: Dict[str, List[dict]] = {}
+    changed: Dict[str, List[dict]] = {}
+    removed: Dict[str, List[str]] = {}
+    unchanged = 0
+    for key, (section, elem) in new_index.items():
+        previous = old_index.get(key)
+        if previous is None:
+            added.setdefault(section, []).append(elem)
+        elif _content(previous[1]) != _content(elem):
+            changed.setdefault(section, []).append(elem)
+        else:
+            unchanged += 1
+    for key, (section, _) in old_index.items():
+        if key not in new_index:
+            removed.setdefault(section, []).append(key)
+
+    n_added = sum(len(v) for v in added.values())
+    n_changed = sum(len(v) for v in changed.values())
+    n_removed = sum(len(v) for v in removed.values())
+    diff = {
+        "status": "success",
+        "diff": True,
+        "since": since,
+        "message": (
+            f"Diff da {since}: {n_added} aggiunti, {n_removed} rimossi, "
+            f"{n_changed} cambiati, {unchanged} invariati"
+        ),
+        "page_info": result.get("page_info"),
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "unchanged": unchanged,
+    }
+    for key in ("root_selector", "fallback_used", "fallback_from", "cached", "backend"):
+        if key in result:
+            diff[key] = result[key]
+    return diff
+
+
+class InspectSnapshots:
+    """Ultimi snapshot di inspect per token (per sessione browser, limitati a SNAPSHOTS_MAX)."""
+
+    def __init__(self, capacity: int = SNAPSHOTS_MAX):
+        self.capacity = capacity
+        self._items: "OrderedDict[str, Tuple[str, Index]]" = OrderedDict()
+
+    @staticmethod
+    def scope(root_selector: Optional[str], in_iframe: Optional[dict]) -> str:
+        return json.dumps({"root": root_selector, "in_iframe": in_iframe}, sort_keys=True, default=str)
+
+    def put(self, scope: str, index: Index) -> str:
+        token = uuid.uuid4().hex[:10]
+        self._items[token] = (scope, index)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+        return token
+
+    def get(self, token: str, scope: str) -> Tuple[Optional[Index], Optional[str]]:
+        """(indice, None) oppure (None, motivo per cui il token non è usabile)."""
+        entry = self._items.get(token)
+        if entry is None:
+            return None, f"token '{token}' sconosciuto o scaduto"
+        if entry[0] != scope:
+            return None, f"token '{token}' di un altro ambito (root_selector/in_iframe diversi)"
+        return entry[1], None
@@ -0,0 +1,311 @@
+# backend/agent/jobs.py
+"""
+Job asincroni per le run lunghe (agent, LAB full, batch, script Playwright).
+
+POST /api/jobs crea un Job e risponde subito; un pool limitato di worker sul loop di
+background (agent/background_loop.py) esegue i job in ordine FIFO. Il web tier resta
+libero: i client leggono stato/risultato con GET /api/jobs/<id> e il progress via SSE.
+
+- Admission control: oltre JOBS_MAX_QUEUED job in coda submit() solleva JobQueueFull (429).
+- Cancellazione: un job in coda viene scartato, uno in esecuzione riceve task.cancel()
+  (anche se la richiesta arriva prima che il worker abbia creato il task).
+- Eventi: ogni job ha un EventLog (agent/event_log.py), buffer limitato di eventi
+  numerati (seq) su cui i subscriber SSE attendono senza polling.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agent import tracing
+from agent.background_loop import BackgroundLoop, get_background_loop
+from agent.event_log import EventLog
+from config.settings import AppConfig
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+JobHandler = Callable[["Job"], Awaitable[Dict[str, Any]]]
+JobPrepare = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+class JobQueueFull(Exception):
+    """Coda job piena (admission control)."""
+
+
+def _public_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Parametri mostrati nello stato del job (mai le credenziali)."""
+    return {
+        k: ("***" if "password" in k.lower() else v)
+        for k, v in params.items()
+        if not k.startswith("_")
+    }
+
+
+class Job:
+    """Stato di un job; i metodi sono chiamati sia dal loop sia dai thread Flask."""
+
+    def __init__(self, kind: str, params: Dict[str, Any], event_buffer: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._started_mono: Optional[float] = None
+        self._duration_ms: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        # cancel() arrivato quando il job è RUNNING ma il task non esiste ancora
+        self._cancel_requested = False
+        # ContextVar di chi ha sottomesso il job (es. span della richiesta HTTP)
+        self._context = contextvars.copy_context()
+        self.log = EventLog(event_buffer)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def emit(self, event: str, data: Optional[Dict[str, Any]] = None):
+        """Accoda un evento di progress (firma compatibile con progress_callback)."""
+        self.log.emit(event, data)
+
+    def _set_status(self, status: str, **data):
+        self.status = status
+        if status == RUNNING:
+            self.started_at = datetime.now().isoformat()
+            self._started_mono = time.monotonic()
+        elif status in FINISHED_STATES:
+            self.finished_at = datetime.now().isoformat()
+            if self._started_mono is not None:
+                self._duration_ms = int((time.monotonic() - self._started_mono) * 1000)
+        self.emit("job_status", {"status": status, **data})
+        if status in FINISHED_STATES:
+            self.log.close()
+
+    def to_dict(self, include_result: bool = True, queue_position: Optional[int] = None) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": _public_params(self.params),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_ms": self._duration_ms,
+            "error": self.error,
+            "last_event_seq": self.log.last_seq,
+        }
+        if queue_position is not None:
+            data["queue_position"] = queue_position
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Registro job + pool di worker asyncio. I tipi di job si registrano con register();
+    ogni handler riceve il Job (params, emit) e restituisce il dict risultato.
+    """
+
+    def __init__(
+        self,
+        background: Optional[BackgroundLoop] = None,
+        max_workers: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        retention: Optional[int] = None,
+        event_buffer: Optional[int] = None,
+    ):
+        cfg = AppConfig.JOBS
+        self._background = background or get_background_loop()
+        self.max_workers = max(cfg.MAX_WORKERS if max_workers is None else max_workers, 1)
+        self.max_queued = max(cfg.MAX_QUEUED if max_queued is None else max_queued, 0)
+        self.retention = max(cfg.RETENTION if retention is None else retention, 1)
+        self.event_buffer = event_buffer or cfg.EVENT_BUFFER
+        self._handlers: Dict[str, JobHandler] = {}
+        self._prepare: Dict[str, JobPrepare] = {}
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending: deque = deque()  # id dei job in coda, ordine FIFO
+        self._lock = threading.Lock()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers_started = False
+
+    # ---------------- registrazione / submit ----------------
+
+    def register(self, kind: str, handler: JobHandler, prepare: Optional[JobPrepare] = None):
+        """`prepare` valida/normalizza i parametri al submit (ValueError → richiesta rifiutata)."""
+        self._handlers[kind] = handler
+        if prepare is not None:
+            self._prepare[kind] = prepare
+
+    @property
+    def kinds(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def submit(self, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        Crea il job e lo mette in coda. ValueError se il tipo non esiste o i parametri non
+        sono validi, JobQueueFull se la coda è piena.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo di job '{kind}' non supportato (disponibili: {', '.join(self.kinds)})")
+        params = dict(params or {})
+        if kind in self._prepare:
+            params = self._prepare[kind](params)
+        job = Job(kind, params, self.event_buffer)
+        with self._lock:
+            if len(self._pending) >= self.max_queued:
+                raise JobQueueFull(
+                    f"Coda job piena ({len(self._pending)} in attesa, max {self.max_queued})"
+                )
+            self._jobs[job.id] = job
+            self._pending.append(job.id)
+            self._prune_locked()
+        job.emit("job_status", {"status": QUEUED})
+        self._ensure_workers()
+        self._background.call_soon(self._queue.put_nowait, job)
+        return job
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._workers_started:
+                return
+            self._workers_started = True
+            self._queue = asyncio.Queue()
+        # contesto vuoto: i worker non ereditano lo span della prima richiesta
+        for i in range(self.max_workers):
+            contextvars.Context().run(self._background.submit, self._worker(i))
+
+    def _prune_locked(self):
+        """Rimuove i job finiti più vecchi oltre la retention."""
+        finished = [jid for jid, j in self._jobs.items() if j.finished]
+        for jid in finished[: max(len(finished) - self.retention, 0)]:
+            del self._jobs[jid]
+
+    # ---------------- lettura / cancellazione ----------------
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job: Job) -> Optional[int]:
+        """Posizione 1-based in coda (None se non è in coda)."""
+        with self._lock:
+            try:
+                return self._pending.index(job.id) + 1
+            except ValueError:
+                return None
+
+    def describe(self, job: Job, include_result: bool = True) -> Dict[str, Any]:
+        return job.to_dict(include_result, self.queue_position(job))
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [
+            self.describe(j, include_result=False)
+            for j in reversed(jobs)
+            if status is None or j.status == status
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for j in self._jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+        return {
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "queued": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "by_status": counts,
+        }
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Annulla un job in coda o in esecuzione (no-op se già finito). None se non esiste."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        with self._lock:
+            if job.status == QUEUED:
+                if job.id in self._pending:
+                    self._pending.remove(job.id)
+                job._set_status(CANCELLED)
+                return job
+            # Il worker legge il flag sotto lo stesso lock subito dopo aver creato il task
+            job._cancel_requested = True
+            task = job._task
+        if task is not None:
+            self._background.call_soon(task.cancel)
+        return job
+
+    # ---------------- esecuzione ----------------
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                with self._lock:
+                    if job.status != QUEUED:
+                        continue  # annullato mentre era in coda
+                    if job.id in self._pending:
+                        self._pending.remove(job.id)
+                    job._set_status(RUNNING, worker=index)
+                task = asyncio.get_running_loop().create_task(
+                    self._run(job), context=job._context
+                )
+                with self._lock:
+                    job._task = task
+                    if job._cancel_requested:
+                        task.cancel()
+                # gather(return_exceptions): la cancellazione del job non ferma il worker
+                await asyncio.gather(job._task, return_exceptions=True)
+                if not job.finished:
+                    # annullato prima che il task partisse
+                    job.error = "Job annullato"
+                    job._set_status(CANCELLED)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        handler = self._handlers[job.kind]
+        with tracing.span(f"job {job.kind}", cat="job", lane=("job", job.id), job_id=job.id):
+            try:
+                result = await handler(job)
+            except asyncio.CancelledError:
+                job.error = "Job annullato"
+                job._set_status(CANCELLED)
+                raise
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                job._set_status(FAILED, error=job.error)
+                return
+        job.result = result
+        # Il risultato applicativo può essere un fallimento (es. test non passato):
+        # il job è comunque completato, lo stato logico resta in result
+        job._set_status(SUCCEEDED)
+
+
+_JOB_MANAGER: Optional[JobManager] = None
+_JOB_MANAGER_LOCK = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """JobManager di processo (creato alla prima richiesta)."""
+    global _JOB_MANAGER
+    with _JOB_MANAGER_LOCK:
+        if _JOB_MANAGER is None:
+            _JOB_MANAGER = JobManager()
+        return _JOB_MANAGER
@@ -0,0 +1,236 @@
+# backend/agent/locator_stats.py
+"""
+Store persistente (SQLite) dell'esito delle strategie di click_smart/fill_smart.
+
+Chiave: origin dell'app + identità normalizzata dell'elemento + target canonico.
+Per ogni strategia registra successi, fallimenti e latenza media; click_smart/fill_smart
+lo usano per riordinare i targets ricevuti prima di provarli (e il codegen per scegliere
+il locator dello script generato, best_target):
+- prima le strategie note come affidabili (success rate alto, latenza bassa),
+- poi quelle mai viste, nell'ordine originale,
+- in coda quelle che finora hanno solo/soprattutto fallito.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from agent.dom_harvest import _strip_material_icon_prefix
+from config.settings import AppConfig
+
+# Campi che identificano "quale elemento" (in ordine di preferenza)
+_NAME_FIELDS = ("name", "label", "text", "placeholder")
+_FALLBACK_FIELDS = ("tfa", "selector", "id", "xpath")
+
+# Sotto questo success rate la strategia va in coda
+_BAD_RATE = 0.5
+
+
+def origin_of(url: str) -> str:
+    """scheme://host[:port] dell'URL (stringa vuota se non parsabile)."""
+    try:
+        parsed = urlparse(url or "")
+    except Exception:
+        return ""
+    if not parsed.scheme or not parsed.netloc:
+        return ""
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _normalize_text(value: str) -> str:
+    value = _strip_material_icon_prefix(str(value))
+    return " ".join(value.split()).casefold()
+
+
+def element_key(targets: List[Dict], mode: str) -> Optional[str]:
+    """
+    Identità normalizzata dell'elemento a partire dai targets (nome accessibile,
+    label, testo o placeholder; in mancanza tfa/selettore). Indipendente dall'ordine
+    dei targets: per il primo campo presente si prende il valore minore, così il
+    riordino non sposta le statistiche su un'altra chiave. None se non ricavabile.
+    """
+    for fields in (_NAME_FIELDS, _FALLBACK_FIELDS):
+        for field in fields:
+            values = [_normalize_text(t[field]) for t in targets if t.get(field)]
+            if values:
+                return f"{mode}:{min(values)}"
+    return None
+
+
+def target_key(target: Dict) -> str:
+    """Target canonico (senza scope/metadati di runtime), JSON ordinato."""
+    canonical = {
+        k: (re.sub(r"\s+", " ", v).strip() if isinstance(v, str) else v)
+        for k, v in target.items()
+        if k not in ("scope",)
+    }
+    return json.dumps(canonical, sort_keys=True, ensure_ascii=False)
+
+
+class LocatorStatsStore:
+    """Store SQLite thread-safe (una connessione condivisa protetta da lock)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS locator_stats (
+                    origin TEXT NOT NULL,
+                    element_key TEXT NOT NULL,
+                    target_key TEXT NOT NULL,
+                    strategy TEXT,
+                    successes INTEGER NOT NULL DEFAULT 0,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    latency_total_ms REAL NOT NULL DEFAULT 0,
+                    latency_samples INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT,
+                    PRIMARY KEY (origin, element_key, target_key)
+                )
+                """
+            )
+            self._conn.commit()
+
+    def _load(self, origin: str, elem_key: str) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT target_key, successes, failures, latency_total_ms, latency_samples
+                FROM locator_stats WHERE origin = ? AND element_key = ?
+                """,
+                (origin, elem_key),
+            ).fetchall()
+        return {
+            row[0]: {
+                "successes": row[1],
+                "failures": row[2],
+                "avg_latency_ms": (row[3] / row[4]) if row[4] else None,
+            }
+            for row in rows
+        }
+
+    def reorder(self, origin: str, targets: List[Dict], elem_key: Optional[str]) -> List[Dict]:
+        """Riordina i targets per esito storico (stabile rispetto all'ordine dato)."""
+        if not origin or not elem_key or len(targets) < 2:
+            return targets
+        stats = self._load(origin, elem_key)
+        if not stats:
+            return targets
+
+        good, unknown, bad = [], [], []
+        for pos, target in enumerate(targets):
+            s = stats.get(target_key(target))
+            attempts = (s["successes"] + s["failures"]) if s else 0
+            if not attempts:
+                unknown.append(target)
+                continue
+            rate = s["successes"] / attempts
+            if s["successes"] and rate >= _BAD_RATE:
+                latency = s["avg_latency_ms"]
+                good.append((-rate, latency if latency is not None else float("inf"), pos, target))
+            else:
+                bad.append((-rate, pos, target))
+        good.sort(key=lambda g: g[:3])
+        bad.sort(key=lambda b: b[:2])
+        return [g[-1] for g in good] + unknown + [b[-1] for b in bad]
+
+    def record(
+        self,
+        origin: str,
+        elem_key: Optional[str],
+        failed: List[Dict],
+        succeeded: Optional[Dict] = None,
+        latency_ms: Optional[float] = None,
+    ):
+        """
+        Registra i fallimenti e (se presente) il successo di una chiamata. Sincrono
+        (commit SQLite): dal loop asyncio va chiamato tramite asyncio.to_thread.
+        """
+        if not origin or not elem_key:
+            return
+        now = datetime.now().isoformat(timespec="seconds")
+        rows = [(t, 0, 1, 0.0, 0) for t in failed]
+        if succeeded is not None:
+            rows.append(
+                (
+                    succeeded,
+                    1,
+                    0,
+                    float(latency_ms or 0.0),
+                    1 if latency_ms is not None else 0,
+                )
+            )
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO locator_stats
+                    (origin, element_key, target_key, strategy, successes, failures,
+                     latency_total_ms, latency_samples, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (origin, element_key, target_key) DO UPDATE SET
+                    successes = successes + excluded.successes,
+                    failures = failures + excluded.failures,
+                    latency_total_ms = latency_total_ms + excluded.latency_total_ms,
+                    latency_samples = latency_samples + excluded.latency_samples,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (origin, elem_key, target_key(t), t.get("by"), s, f, lat, n, now)
+                    for t, s, f, lat, n in rows
+                ],
+            )
+            self._conn.commit()
+
+    def best_target(self, origin: str, elem_key: str) -> Optional[Dict]:
+        """Target più affidabile noto per un elemento (usato dal codegen, vedi script_generator)."""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT target_key FROM locator_stats
+                WHERE origin = ? AND element_key = ? AND successes > 0
+                ORDER BY CAST(successes AS REAL) / (successes + failures) DESC,
+                         -- come reorder(): a parità di rate, senza latenza nota in coda
+                         latency_samples = 0,
+                         CASE WHEN latency_samples > 0
+                              THEN latency_total_ms / latency_samples END ASC
+                LIMIT 1
+                """,
+                (origin, elem_key),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[LocatorStatsStore] = None
+_store_failed = False
+_store_lock = threading.Lock()
+
+
+def get_locator_stats_store() -> Optional[LocatorStatsStore]:
+    """Store condiviso di processo (None se AGENT_LOCATOR_LEARNING=false o non apribile)."""
+    global _store, _store_failed
+    if not AppConfig.AGENT.LOCATOR_LEARNING or _store_failed:
+        return None
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = LocatorStatsStore(AppConfig.AGENT.LOCATOR_STATS_PATH)
+            except Exception as e:
+                # Una sola segnalazione: senza store i tool funzionano come prima
+                print(f"Locator stats store non disponibile: {e}")
+                _store_failed = True
+                return None
+        return _store
@@ -0,0 +1,160 @@
+# backend/agent/metrics.py
+"""
+Metriche di latenza in-process per il server MCP (formato testo Prometheus).
+
+- per tool MCP: istogramma latenze, chiamate, errori e istogramma dimensione payload
+  (registrati dal wrapper dei tool in mcp_servers/playwright_server_remote.py);
+- per fase interna di PlaywrightTools: risoluzione frame, attesa locator, azione,
+  serializzazione (context manager timed_phase).
+
+Nessuna dipendenza esterna: gli istogrammi sono cumulativi come quelli di prometheus_client
+e render_prometheus() produce il formato di esposizione testuale 0.0.4.
+"""
+
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional, Tuple
+
+from agent import tracing
+
+# Bucket latenza (secondi) e payload (byte)
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+PAYLOAD_BUCKETS: Tuple[float, ...] = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+)
+
+
+class _Histogram:
+    """Istogramma cumulativo (conteggi per bucket le=..., somma, totale)."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def render(self, name: str, label: str, key: str) -> list:
+        lines = []
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{name}_bucket{{{label}="{key}",le="{_fmt(bound)}"}} {count}')
+        lines.append(f'{name}_bucket{{{label}="{key}",le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{label}="{key}"}} {_fmt(self.sum)}')
+        lines.append(f'{name}_count{{{label}="{key}"}} {self.count}')
+        return lines
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Registro thread-safe delle metriche di tool e fasi."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tool_latency: Dict[str, _Histogram] = {}
+        self._tool_payload: Dict[str, _Histogram] = {}
+        self._tool_errors: Dict[str, int] = {}
+        self._phase_latency: Dict[str, _Histogram] = {}
+        self._started = time.time()
+
+    def observe_tool(self, tool: str, seconds: float, error: bool, payload_bytes: Optional[int]):
+        with self._lock:
+            self._tool_latency.setdefault(tool, _Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self._tool_errors[tool] = self._tool_errors.get(tool, 0) + (1 if error else 0)
+            if payload_bytes is not None:
+                self._tool_payload.setdefault(tool, _Histogram(PAYLOAD_BUCKETS)).observe(
+                    payload_bytes
+                )
+
+    def observe_phase(self, phase: str, seconds: float):
+        with self._lock:
+            self._phase_latency.setdefault(phase, _Histogram(LATENCY_BUCKETS)).observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._tool_latency.clear()
+            self._tool_payload.clear()
+            self._tool_errors.clear()
+            self._phase_latency.clear()
+
+    def render_prometheus(self) -> str:
+        """Snapshot in formato testo Prometheus."""
+        with self._lock:
+            lines = [
+                "# HELP mcp_tool_duration_seconds Latenza dei tool MCP (wrapper, incl. serializzazione).",
+                "# TYPE mcp_tool_duration_seconds histogram",
+            ]
+            for tool in sorted(self._tool_latency):
+                lines += self._tool_latency[tool].render(
+                    "mcp_tool_duration_seconds", "tool", _escape(tool)
+                )
+            lines += [
+                "# HELP mcp_tool_errors_total Chiamate terminate con status=error o eccezione.",
+                "# TYPE mcp_tool_errors_total counter",
+            ]
+            for tool in sorted(self._tool_errors):
+                lines.append(
+                    f'mcp_tool_errors_total{{tool="{_escape(tool)}"}} {self._tool_errors[tool]}'
+                )
+            lines += [
+                "# HELP mcp_tool_payload_bytes Dimensione della risposta dei tool MCP (byte UTF-8).",
+                "# TYPE mcp_tool_payload_bytes histogram",
+            ]
+            for tool in sorted(self._tool_payload):
+                lines += self._tool_payload[tool].render(
+                    "mcp_tool_payload_bytes", "tool", _escape(tool)
+                )
+            lines += [
+                "# HELP playwright_phase_duration_seconds Latenza delle fasi interne di PlaywrightTools.",
+                "# TYPE playwright_phase_duration_seconds histogram",
+            ]
+            for phase in sorted(self._phase_latency):
+                lines += self._phase_latency[phase].render(
+                    "playwright_phase_duration_seconds", "phase", _escape(phase)
+                )
+            lines += [
+                "# HELP mcp_process_start_time_seconds Avvio del processo (epoch).",
+                "# TYPE mcp_process_start_time_seconds gauge",
+                f"mcp_process_start_time_seconds {_fmt(round(self._started, 3))}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+_REGISTRY = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Registro di processo (condiviso da server MCP e PlaywrightTools)."""
+    return _REGISTRY
+
+
+@contextmanager
+def timed_phase(phase: str):
+    """
+    Misura il blocco come fase interna (es. "frame_resolution", "locator_wait", "action");
+    con tracing attivo e uno span in corso la fase è anche uno span figlio.
+    """
+    started = time.perf_counter()
+    traced = tracing.current_context() is not None
+    try:
+        with tracing.span(phase, cat="phase") if traced else nullcontext():
+            yield
+    finally:
+        _REGISTRY.observe_phase(phase, time.perf_counter() - started)
@@ -1,15 +1,25 @@
 """
-Batch Test Runner - Esegue più scenari LAB in sequenza.
+Batch Test Runner - Esegue più scenari LAB in sequenza o in parallelo (max_concurrency).
 """
 
 import asyncio
+import hashlib
+import time
+import uuid
 from typing import List, Dict, Optional, Callable
 from datetime import datetime
 from pathlib import Path
 import json
 
 from agent.lab_scenarios import LabScenario
+from config.settings import AppConfig
 from agent.pipelines.lab import run_prefix_to_home, run_lab_scenario
+from agent.runtime import get_shared_runtime
+from agent.setup import browser_session
+from agent.core.timing import rollup_timing
+from agent import resource_filter
+from agent import tracing
+from agent.background_loop import get_background_loop
 from agent.utils import make_json_serializable
 
 
@@ -22,7 +32,12 @@ class BatchTestRunner:
                  password: Optional[str] = None,
                  module_label: Optional[str] = None,
                  module_label_alt: Optional[str] = None,
-                 progress_callback: Optional[Callable] = None):
+                 progress_callback: Optional[Callable] = None,
+                 max_concurrency: Optional[int] = None,
+                 reuse_login: Optional[bool] = None,
+                 replay: Optional[bool] = None,
+                 har_mode: Optional[str] = None,
+                 session_id: Optional[str] = None):
         """
         Args:
             url: URL dell'applicazione (None = usa config)
@@ -30,6 +45,19 @@ class BatchTestRunner:
             password: Password per login (None = usa config)
             module_label / module_label_alt: titoli tile home dopo Continua (vedi orchestrator)
             progress_callback: Funzione chiamata per eventi di progress (event_type, data)
+            max_concurrency: Scenari eseguiti in parallelo (None = AGENT_BATCH_MAX_CONCURRENCY).
+                             Con valori > 1 ogni scenario ha la sua sessione browser sul
+                             server MCP remoto; in modalità locale si esegue in sequenza.
+            reuse_login: Riusa la sessione autenticata del primo prefix riuscito
+                         (None = AGENT_BATCH_REUSE_LOGIN). Il prefix completo viene
+                         rieseguito solo se la sessione ripristinata è rifiutata o scaduta.
+            replay: Riesegue senza LLM la trace salvata degli scenari già passati
+                    (None = AGENT_REPLAY_TRACES); fallback all'agent se uno step diverge.
+            har_mode: "record" salva il traffico di rete di ogni scenario in un HAR
+                      (<id scenario>.har.zip sul server MCP), "replay" lo riserve senza
+                      rete per benchmark offline dei tool (None = PLAYWRIGHT_HAR_MODE del server).
+            session_id: Sessione browser sul server MCP remoto degli scenari in sequenza
+                        (None = sessione di default); in parallelo ogni scenario ha la sua.
         """
         self.url = url
         self.username = username
@@ -38,6 +66,15 @@ class BatchTestRunner:
         self.module_label_alt = module_label_alt
         self.results = []
         self.progress_callback = progress_callback
+        self.max_concurrency = max_concurrency
+        self.reuse_login = (
+            AppConfig.AGENT.BATCH_REUSE_LOGIN if reuse_login is None else reuse_login
+        )
+        self.replay = replay
+        self.har_mode = har_mode
+        self.session_id = session_id
+        self._login_leader_claimed = False
+        self._first_login_done = asyncio.Event()
         
     def _emit_progress(self, event_type: str, data: Dict):
         """Emette un evento di progress se callback è definito."""
@@ -47,19 +84,175 @@ class BatchTestRunner:
             except Exception as e:
                 print(f"⚠️  Progress callback error: {e}")
     
-    async def run_single_scenario(self, scenario: LabScenario, scenario_index: int, total_scenarios: int, verbose: bool = True) -> Dict:
+    def _resolve_concurrency(self, max_concurrency: Optional[int], total_scenarios: int) -> int:
+        """Parallelismo effettivo: >= 1, non oltre il numero di scenari, 1 se MCP locale."""
+        requested = max_concurrency if max_concurrency is not None else self.max_concurrency
+        if requested is None:
+            requested = AppConfig.AGENT.BATCH_MAX_CONCURRENCY
+        concurrency = max(1, min(int(requested), max(total_scenarios, 1)))
+        if concurrency > 1 and not AppConfig.MCP.use_remote():
+            print("⚠️  max_concurrency > 1 richiede MCP_MODE=remote: esecuzione in sequenza")
+            return 1
+        # Una sessione browser per scenario: non oltre MCP_MAX_SESSIONS (meno quella del job)
+        max_sessions = max(AppConfig.MCP.MAX_SESSIONS - (1 if self.session_id else 0), 1)
+        if concurrency > max_sessions:
+            print(f"⚠️  max_concurrency {concurrency} ridotto a {max_sessions} (MCP_MAX_SESSIONS)")
+            concurrency = max_sessions
+        return concurrency
+
+    def _login_snapshot_name(self) -> str:
+        """Nome dello snapshot di sessione: uno per combinazione url/utente/modulo."""
+        key = "|".join(
+            str(v or "") for v in (self.url, self.username, self.module_label, self.module_label_alt)
+        )
+        return "lab-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    async def _call_session_tool(self, session_id: Optional[str], name: str) -> Dict:
+        """Chiama un tool di snapshot sessione sul server MCP, senza LLM."""
+        try:
+            with browser_session(session_id):
+                return await get_shared_runtime().call_tool(name, name=self._login_snapshot_name())
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
+
+    async def _configure_har(self, session_id: Optional[str], mode: str, name: str) -> Dict:
+        """Imposta il HAR dei prossimi start_browser della sessione sul server MCP."""
+        try:
+            with browser_session(session_id):
+                return await get_shared_runtime().call_tool('configure_har', mode=mode, name=name)
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
+
+    async def _finish_har(self, scenario: LabScenario, session_id: Optional[str]) -> Dict:
+        """
+        Chiude il browser dello scenario (Playwright scrive la registrazione HAR alla
+        chiusura del contesto) e riporta la sessione a PLAYWRIGHT_HAR_MODE.
+        """
+        har = {'mode': self.har_mode, 'name': scenario.id}
+        try:
+            with browser_session(session_id):
+                closed = await get_shared_runtime().call_tool('close_browser')
+            if isinstance(closed.get('har'), dict):
+                har.update(closed['har'])
+        except Exception as e:
+            har['error'] = str(e)
+        await self._configure_har(session_id, '', scenario.id)
+        return har
+
+    async def _resource_filter_stats(self, scenario_result: Dict, session_id: Optional[str]) -> Optional[Dict]:
+        """
+        Richieste/byte risparmiati dal filtro risorse nello scenario: dall'output di
+        close_browser se il browser è già stato chiuso, altrimenti dal server MCP.
+        """
+        if not resource_filter.is_enabled():
+            return None
+        for phase in ('scenario_result', 'prefix_result'):
+            for step in reversed((scenario_result.get(phase) or {}).get('steps') or []):
+                output = step.get('output') if step.get('tool') == 'close_browser' else None
+                if isinstance(output, dict) and output.get('resource_filter'):
+                    return output['resource_filter']
+        try:
+            with browser_session(session_id):
+                stats = await get_shared_runtime().call_tool('get_resource_filter_stats')
+        except Exception:
+            return None
+        return stats if stats.get('enabled') else None
+
+    async def _run_prefix(self, verbose: bool, session_id: Optional[str]) -> Dict:
+        """
+        Fase 1: ripristina la sessione salvata (se reuse_login) oppure esegue il prefix
+        completo e ne salva la sessione. Con scenari in parallelo gli altri task attendono
+        il primo login, così non ripetono tutti il prefix.
+        """
+        leader = False
+        try:
+            if self.reuse_login:
+                if self._login_leader_claimed:
+                    await self._first_login_done.wait()
+                else:
+                    self._login_leader_claimed = True
+                    leader = True
+
+                started = time.monotonic()
+                restored = await self._call_session_tool(session_id, 'restore_storage_state')
+                if restored.get('status') == 'success':
+                    if verbose:
+                        print(f"♻️  Sessione ripristinata: {restored.get('url')}")
+                    return {
+                        'phase': 'prefix',
+                        'passed': True,
+                        'restored_session': True,
+                        'url': restored.get('url'),
+                        'steps': [],
+                        'errors': [],
+                        'artifacts': [],
+                        'notes': restored.get('message', ''),
+                        'duration_ms': int((time.monotonic() - started) * 1000),
+                    }
+                if verbose:
+                    print(f"↩️  Sessione salvata non riutilizzabile ({restored.get('message')}): prefix completo")
+
+            prefix_result = await run_prefix_to_home(
+                verbose=verbose,
+                url=self.url,
+                user=self.username,
+                password=self.password,
+                module_label=self.module_label,
+                module_label_alt=self.module_label_alt,
+                session_id=session_id,
+            )
+            if self.reuse_login and prefix_result.get('passed', False):
+                saved = await self._call_session_tool(session_id, 'save_storage_state')
+                if verbose and saved.get('status') != 'success':
+                    print(f"⚠️  Salvataggio sessione non riuscito: {saved.get('message')}")
+            return prefix_result
+        finally:
+            if leader:
+                self._first_login_done.set()
+
+    async def run_single_scenario(self, scenario: LabScenario, scenario_index: int, total_scenarios: int, verbose: bool = True, session_id: Optional[str] = None, close_session: bool = False) -> Dict:
         """
         Esegue un singolo scenario completo (prefix + scenario).
+        Con tracing attivo lo scenario è uno span su una corsia propria (scenari in parallelo).
         
         Args:
             scenario: LabScenario da eseguire
             scenario_index: Indice scenario corrente (1-based)
             total_scenarios: Numero totale di scenari
             verbose: Se True stampa log durante esecuzione
+            session_id: Sessione browser sul server MCP remoto (None = sessione di default)
+            close_session: Sessione propria dello scenario: chiusa a fine scenario anche
+                           su errore/annullamento o se l'agent non chiama close_browser
         
         Returns:
             Dict con risultato del test
         """
+        with tracing.span(
+            f"scenario {scenario.id}",
+            cat="batch",
+            lane=("scenario", scenario.id, scenario_index, session_id),
+            scenario_id=scenario.id,
+            session_id=session_id,
+        ) as span, browser_session(session_id):
+            try:
+                result = await self._run_single_scenario(scenario, scenario_index, total_scenarios, verbose, session_id)
+            finally:
+                if close_session and session_id:
+                    await self._close_session(session_id)
+            if span is not None:
+                span.set(status=result.get('overall_status'), replay=result.get('replay'))
+            return result
+
+    async def _close_session(self, session_id: str):
+        """Chiude la sessione browser dello scenario sul server MCP (no-op se già chiusa)."""
+        try:
+            with browser_session(session_id):
+                await get_shared_runtime().call_tool('close_browser')
+        except Exception as e:
+            print(f"⚠️  Chiusura sessione browser {session_id} fallita: {e}")
+
+    async def _run_single_scenario(self, scenario: LabScenario, scenario_index: int, total_scenarios: int, verbose: bool, session_id: Optional[str]) -> Dict:
+        started = time.monotonic()
         scenario_result = {
             'scenario_id': scenario.id,
             'scenario_name': scenario.name,
@@ -67,7 +260,10 @@ class BatchTestRunner:
             'prefix_result': None,
             'scenario_result': None,
             'overall_status': 'unknown',
-            'error': None
+            'error': None,
+            'session_id': session_id,
+            'replay': None,
+            'har': None
         }
         
         # Emetti evento scenario_start
@@ -94,14 +290,12 @@ class BatchTestRunner:
                 'message': 'Login e navigazione modulo LAB...'
             })
             
-            prefix_result = await run_prefix_to_home(
-                verbose=verbose,
-                url=self.url,
-                user=self.username,
-                password=self.password,
-                module_label=self.module_label,
-                module_label_alt=self.module_label_alt,
-            )
+            if self.har_mode:
+                configured = await self._configure_har(session_id, self.har_mode, scenario.id)
+                if configured.get('status') != 'success':
+                    raise RuntimeError(f"HAR non configurabile: {configured.get('message')}")
+
+            prefix_result = await self._run_prefix(verbose, session_id)
             scenario_result['prefix_result'] = make_json_serializable(prefix_result)
             
             # Emetti step updates dal prefix
@@ -142,8 +336,11 @@ class BatchTestRunner:
             })
             
             # Fase 2: Scenario specifico (passa l'oggetto scenario diretto)
-            scenario_exec_result = await run_lab_scenario(scenario=scenario, verbose=verbose)
+            scenario_exec_result = await run_lab_scenario(
+                scenario=scenario, verbose=verbose, session_id=session_id, replay=self.replay
+            )
             scenario_result['scenario_result'] = make_json_serializable(scenario_exec_result)
+            scenario_result['replay'] = scenario_exec_result.get('replay')
             
             # Emetti step updates dallo scenario
             if 'steps' in scenario_exec_result:
@@ -189,31 +386,47 @@ class BatchTestRunner:
         
         finally:
             scenario_result['completed_at'] = datetime.now().isoformat()
+            scenario_result['duration_ms'] = int((time.monotonic() - started) * 1000)
+            # LLM vs tool vs trasporto di prefix + scenario
+            scenario_result['timing'] = rollup_timing(
+                [scenario_result['prefix_result'], scenario_result['scenario_result']]
+            )
+            scenario_result['resource_filter'] = await self._resource_filter_stats(
+                scenario_result, session_id
+            )
+            if self.har_mode:
+                scenario_result['har'] = await self._finish_har(scenario, session_id)
             
             # Emetti evento scenario_complete
             self._emit_progress('scenario_complete', {
                 'scenario_id': scenario.id,
                 'scenario_name': scenario.name,
                 'status': scenario_result['overall_status'],
-                'error': scenario_result.get('error')
+                'error': scenario_result.get('error'),
+                'replay': scenario_result.get('replay')
             })
         
         return scenario_result
     
-    async def run_batch(self, scenarios: List[LabScenario], verbose: bool = True) -> Dict:
+    async def run_batch(self, scenarios: List[LabScenario], verbose: bool = True, max_concurrency: Optional[int] = None) -> Dict:
         """
-        Esegue una batch di scenari in sequenza.
+        Esegue una batch di scenari, in sequenza o fino a max_concurrency alla volta.
         
         Args:
             scenarios: Lista di LabScenario da eseguire
             verbose: Se True stampa log durante esecuzione
+            max_concurrency: Override del parallelismo impostato nel costruttore
         
         Returns:
-            Dict con risultati aggregati di tutti gli scenari
+            Dict con risultati aggregati di tutti gli scenari (nello stesso ordine di input)
         """
+        concurrency = self._resolve_concurrency(max_concurrency, len(scenarios))
+        self._login_leader_claimed = False
+        self._first_login_done = asyncio.Event()
         batch_result = {
             'started_at': datetime.now().isoformat(),
             'total_scenarios': len(scenarios),
+            'max_concurrency': concurrency,
             'scenarios': [],
             'summary': {
                 'success': 0,
@@ -223,29 +436,75 @@ class BatchTestRunner:
         }
         
         if verbose:
-            print(f"\n🔄 Avvio batch test: {len(scenarios)} scenari")
+            mode = "in sequenza" if concurrency == 1 else f"{concurrency} in parallelo"
+            print(f"\n🔄 Avvio batch test: {len(scenarios)} scenari ({mode})")
             print(f"{'=' * 80}\n")
         
-        for idx, scenario in enumerate(scenarios, 1):
-            if verbose:
-                print(f"\n📊 Scenario {idx}/{len(scenarios)}")
+        started = time.monotonic()
+        if concurrency == 1:
+            results = []
+            for idx, scenario in enumerate(scenarios, 1):
+                if verbose:
+                    print(f"\n📊 Scenario {idx}/{len(scenarios)}")
+                
+                results.append(await self.run_single_scenario(
+                    scenario, 
+                    scenario_index=idx,
+                    total_scenarios=len(scenarios),
+                    verbose=verbose,
+                    session_id=self.session_id
+                ))
+                
+                if verbose:
+                    print(f"\n{'─' * 80}")
+        else:
+            # Un semaforo per run e una sessione browser per scenario: i task non condividono
+            # pagina né contesto; gather mantiene l'ordine degli scenari in input
+            run_id = uuid.uuid4().hex[:8]
+            semaphore = asyncio.Semaphore(concurrency)
             
-            result = await self.run_single_scenario(
-                scenario, 
-                scenario_index=idx,
-                total_scenarios=len(scenarios),
-                verbose=verbose
+            async def run_bounded(idx: int, scenario: LabScenario) -> Dict:
+                async with semaphore:
+                    if verbose:
+                        print(f"\n📊 Scenario {idx}/{len(scenarios)} avviato ({scenario.id})")
+                    return await self.run_single_scenario(
+                        scenario,
+                        scenario_index=idx,
+                        total_scenarios=len(scenarios),
+                        verbose=verbose,
+                        session_id=f"batch-{run_id}-{idx}",
+                        close_session=True
+                    )
+            
+            results = await asyncio.gather(
+                *(run_bounded(idx, scenario) for idx, scenario in enumerate(scenarios, 1))
             )
+        
+        for result in results:
             batch_result['scenarios'].append(result)
             
             # Aggiorna summary
             status = result['overall_status']
             if status in batch_result['summary']:
                 batch_result['summary'][status] += 1
-            
-            if verbose:
-                print(f"\n{'─' * 80}")
         
+        # Tempo reale della batch vs somma delle durate dei singoli scenari
+        wall_clock_ms = int((time.monotonic() - started) * 1000)
+        scenarios_total_ms = sum(r.get('duration_ms', 0) for r in batch_result['scenarios'])
+        batch_result['summary']['wall_clock_ms'] = wall_clock_ms
+        batch_result['summary']['scenarios_total_ms'] = scenarios_total_ms
+        batch_result['summary']['speedup'] = (
+            round(scenarios_total_ms / wall_clock_ms, 2) if wall_clock_ms else None
+        )
+        # Timing aggregato (totali + percentili per step/chiamata LLM) di tutte le run
+        batch_result['summary']['timing'] = rollup_timing(
+            run
+            for r in batch_result['scenarios']
+            for run in (r.get('prefix_result'), r.get('scenario_result'))
+        )
+        batch_result['summary']['resource_filter'] = resource_filter.merge_resource_filter_stats(
+            r.get('resource_filter') for r in batch_result['scenarios']
+        )
         batch_result['completed_at'] = datetime.now().isoformat()
         
         # Emetti evento batch_complete
@@ -264,6 +523,21 @@ class BatchTestRunner:
             print(f"✅ Successo: {batch_result['summary']['success']}")
             print(f"❌ Falliti: {batch_result['summary']['failed']}")
             print(f"💥 Errori: {batch_result['summary']['error']}")
+            print(
+                f"⏱️  Tempo reale: {wall_clock_ms / 1000:.1f}s | "
+                f"somma scenari: {scenarios_total_ms / 1000:.1f}s | "
+                f"parallelismo: {concurrency}"
+            )
+            timing = batch_result['summary']['timing']
+            if timing:
+                tool_p90 = (timing['percentiles']['tool_ms'] or {}).get('p90')
+                llm_p90 = (timing['percentiles']['llm_ms'] or {}).get('p90')
+                print(
+                    f"🧠 LLM: {timing['llm_ms'] / 1000:.1f}s in {timing['llm_calls']} chiamate "
+                    f"(p90 {llm_p90}ms, {timing['input_tokens']}+{timing['output_tokens']} token) | "
+                    f"🛠️  tool: {timing['tool_ms'] / 1000:.1f}s in {timing['tool_calls']} chiamate "
+                    f"(p90 {tool_p90}ms, trasporto {timing['transport_ms']}ms)"
+                )
             print(f"{'=' * 80}\n")
         
         return batch_result
@@ -299,7 +573,11 @@ def run_batch_sync(
     module_label: Optional[str] = None,
     module_label_alt: Optional[str] = None,
     verbose: bool = True,
-    save_results: bool = True
+    save_results: bool = True,
+    max_concurrency: Optional[int] = None,
+    reuse_login: Optional[bool] = None,
+    replay: Optional[bool] = None,
+    har_mode: Optional[str] = None
 ) -> Dict:
     """
     Esegue batch di scenari (versione sincrona per Flask).
@@ -312,6 +590,10 @@ def run_batch_sync(
         module_label / module_label_alt: tile home dopo login (opzionale, vedi orchestrator)
         verbose: Se True stampa log
         save_results: Se True salva risultati su file
+        max_concurrency: Scenari in parallelo (None = AGENT_BATCH_MAX_CONCURRENCY)
+        reuse_login: Riusa la sessione del primo login (None = AGENT_BATCH_REUSE_LOGIN)
+        replay: Replay delle trace salvate (None = AGENT_REPLAY_TRACES)
+        har_mode: "record"/"replay" HAR di rete per scenario (None = PLAYWRIGHT_HAR_MODE)
     
     Returns:
         Dict con risultati del batch
@@ -322,16 +604,14 @@ def run_batch_sync(
         password=password,
         module_label=module_label,
         module_label_alt=module_label_alt,
+        max_concurrency=max_concurrency,
+        reuse_login=reuse_login,
+        replay=replay,
+        har_mode=har_mode,
     )
     
-    # Esegui in asyncio event loop
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    
-    results = loop.run_until_complete(runner.run_batch(scenarios, verbose=verbose))
+    # Esegui sul loop di background di processo (runtime/client MCP riusati)
+    results = get_background_loop().run_sync(runner.run_batch(scenarios, verbose=verbose))
     
     if save_results:
         filepath = runner.save_results(results)
@@ -353,6 +633,7 @@ if __name__ == "__main__":
         print("  python -m agent.pipelines.batch scenario_1")
         print("  python -m agent.pipelines.batch scenario_1 scenario_2 scenario_3")
         print("  python -m agent.pipelines.batch all  # esegue tutti gli scenari")
+        print("  AGENT_BATCH_MAX_CONCURRENCY=4 python -m agent.pipelines.batch all  # 4 scenari in parallelo (MCP remoto)")
         print(f"\nScenari disponibili: {', '.join([s.id for s in LAB_SCENARIOS])}")
         sys.exit(1)
     
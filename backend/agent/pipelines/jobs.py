@@ -0,0 +1,248 @@
+"""
+Tipi di job per /api/jobs: stessa logica degli endpoint bloccanti (agent MCP, LAB full,
+batch, script Playwright) eseguita come coroutine sul loop di background.
+
+Ogni tipo ha un prepare(params) sincrono (validazione nel thread Flask, ValueError → 400)
+e un handler async(job) che restituisce il risultato; il progress passa da job.emit().
+
+I job che pilotano il browser (agent_test, lab_full, batch) usano una sessione browser
+propria sul server MCP remoto (`job-<id>`), chiusa a fine job: job in parallelo
+(JOBS_MAX_WORKERS > 1) non agiscono sulla stessa pagina.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from agent.jobs import Job, JobManager
+from agent.lab_scenarios import LAB_SCENARIOS, LabScenario
+from agent.pipelines.batch import BatchTestRunner
+from agent.pipelines.lab import run_full
+from agent.runtime import get_shared_runtime
+from agent.setup import browser_session
+from agent.test_agent_mcp import TestAgentMCP
+from agent.utils import make_json_serializable
+from codegen.script_generator import generate_playwright_script
+from config.settings import AppConfig
+
+
+def parse_batch_scenarios(items: Any) -> List[LabScenario]:
+    """Scenari del body batch (id di LAB_SCENARIOS o dict completi) → LabScenario."""
+    if not isinstance(items, list) or not items:
+        raise ValueError("'scenarios' deve essere una lista non vuota")
+    scenarios = []
+    for item in items:
+        if isinstance(item, str):
+            existing = next((s for s in LAB_SCENARIOS if s.id == item), None)
+            if existing is None:
+                raise ValueError(f"Scenario ID '{item}' non trovato")
+            scenarios.append(existing)
+        elif isinstance(item, dict):
+            scenarios.append(
+                LabScenario(
+                    id=item.get("id", f"dynamic_{len(scenarios) + 1}"),
+                    name=item.get("name", "Unnamed"),
+                    execution_steps=item.get("execution_steps", []),
+                    expected_results=item.get("expected_results", []),
+                    prompt_hints=item.get("prompt_hints"),
+                )
+            )
+        else:
+            raise ValueError(f"Formato scenario non valido: {type(item)}")
+    return scenarios
+
+
+def attach_generated_scripts(results: Dict[str, Any], scenarios: List[LabScenario]):
+    """Script Playwright per ogni scenario riuscito del batch (/api/test/batch, stream e job)."""
+    try:
+        scenario_results = results.get("scenarios", [])
+        generated_count = 0
+        for idx, scenario_data in enumerate(scenario_results):
+            if scenario_data.get("overall_status") != "success":
+                continue
+            sr = scenario_data.get("scenario_result") or {}
+            if not sr:
+                continue
+            scenario_id = scenario_data.get("scenario_id") or (
+                scenarios[idx].id if idx < len(scenarios) else f"scenario_{idx+1}"
+            )
+            scenario_name = scenario_data.get("scenario_name") or (
+                scenarios[idx].name if idx < len(scenarios) else scenario_id
+            )
+            script = generate_playwright_script(
+                scenario_result=sr, scenario_id=scenario_id, scenario_name=scenario_name
+            )
+            scenario_data["playwright_script"] = script or ""
+            generated_count += 1
+        results["generated_scripts_count"] = generated_count
+    except Exception as e:
+        results["codegen_error"] = str(e)
+
+
+@asynccontextmanager
+async def _job_browser_session(job: Job):
+    """Sessione browser `job-<id>` per le tool call del job; chiusa alla fine (anche se annullato)."""
+    session_id = f"job-{job.id}"
+    with browser_session(session_id):
+        try:
+            yield session_id
+        finally:
+            # In locale (stdio) non ci sono sessioni da chiudere sul server
+            if AppConfig.MCP.use_remote():
+                try:
+                    await get_shared_runtime().call_tool("close_browser")
+                except Exception as e:
+                    print(f"⚠️  Chiusura sessione browser {session_id} fallita: {e}")
+
+
+# ---------------- agent_test ----------------
+
+
+def _prepare_agent_test(params: Dict[str, Any]) -> Dict[str, Any]:
+    if not params.get("test_description"):
+        raise ValueError("test_description mancante")
+    return params
+
+
+async def _run_agent_test(job: Job) -> Dict[str, Any]:
+    agent = TestAgentMCP(runtime=get_shared_runtime())
+    job.emit("phase_update", {"phase": "agent", "message": "Esecuzione test agent MCP..."})
+    async with _job_browser_session(job):
+        result = await agent.run_test_async(job.params["test_description"], verbose=True)
+    return make_json_serializable(result)
+
+
+# ---------------- lab_full ----------------
+
+
+def _prepare_lab_full(params: Dict[str, Any]) -> Dict[str, Any]:
+    if not params.get("scenario_id"):
+        raise ValueError("scenario_id mancante")
+    return params
+
+
+async def _run_lab_full(job: Job) -> Dict[str, Any]:
+    p = job.params
+    scenario_id = p["scenario_id"]
+    job.emit("phase_update", {"phase": "full", "message": f"Prefix + scenario {scenario_id}..."})
+    async with _job_browser_session(job) as session_id:
+        result = await run_full(
+            scenario_id,
+            verbose=True,
+            url=p.get("url") or p.get("lab_url"),
+            user=p.get("username") or p.get("lab_username"),
+            password=p.get("password") or p.get("lab_password"),
+            module_label=p.get("module_label") or p.get("home_module_label"),
+            module_label_alt=p.get("module_label_alt") or p.get("home_module_label_alt"),
+            session_id=session_id,
+        )
+    result = make_json_serializable(result)
+    if p.get("generate_script") and result.get("passed") and result.get("scenario"):
+        try:
+            result["playwright_script"] = generate_playwright_script(
+                scenario_result=result["scenario"],
+                scenario_id=scenario_id,
+                scenario_name=result["scenario"].get("scenario_name", scenario_id),
+                prefix_result=result.get("prefix"),
+            ) or ""
+        except Exception as e:
+            result["playwright_script"] = None
+            result["codegen_error"] = str(e)
+    return result
+
+
+# ---------------- batch ----------------
+
+
+def _prepare_batch(params: Dict[str, Any]) -> Dict[str, Any]:
+    if "scenarios" not in params:
+        raise ValueError("Campo 'scenarios' richiesto")
+    # LabScenario già validati, fuori dai parametri pubblici del job
+    return {**params, "_scenarios": parse_batch_scenarios(params["scenarios"])}
+
+
+async def _run_batch(job: Job) -> Dict[str, Any]:
+    p = job.params
+    scenarios = p["_scenarios"]
+    async with _job_browser_session(job) as session_id:
+        runner = BatchTestRunner(
+            url=p.get("url"),
+            username=p.get("username"),
+            password=p.get("password"),
+            module_label=p.get("module_label") or p.get("home_module_label"),
+            module_label_alt=p.get("module_label_alt") or p.get("home_module_label_alt"),
+            progress_callback=job.emit,
+            max_concurrency=p.get("max_concurrency"),
+            reuse_login=p.get("reuse_login"),
+            replay=p.get("replay"),
+            har_mode=p.get("har_mode"),
+            session_id=session_id,
+        )
+        results = await runner.run_batch(scenarios, verbose=True)
+    if p.get("generate_script"):
+        attach_generated_scripts(results, scenarios)
+    if p.get("save_results", True):
+        results["saved_to"] = runner.save_results(results)
+    return make_json_serializable(results)
+
+
+# ---------------- playwright_script ----------------
+
+
+def _prepare_playwright_script(params: Dict[str, Any]) -> Dict[str, Any]:
+    if not params.get("script"):
+        raise ValueError("script mancante nel body")
+    return params
+
+
+async def _run_playwright_script(job: Job) -> Dict[str, Any]:
+    scenario_id = job.params.get("scenario_id", "scenario")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = f"test_{scenario_id}.py"
+        path = os.path.join(tmpdir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(job.params["script"])
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "pytest", path, "-q",
+                cwd=tmpdir,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError as e:
+            return {
+                "status": "error",
+                "message": "pytest non trovato. Assicurati che sia installato nel venv.",
+                "detail": str(e),
+            }
+        try:
+            stdout, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            proc.kill()
+            await proc.wait()
+            raise
+    return {
+        "status": "success" if proc.returncode == 0 else "error",
+        "return_code": proc.returncode,
+        "stdout": stdout.decode("utf-8", errors="replace"),
+        "stderr": stderr.decode("utf-8", errors="replace"),
+        "filename": filename,
+    }
+
+
+JOB_KINDS = {
+    "agent_test": (_prepare_agent_test, _run_agent_test),
+    "lab_full": (_prepare_lab_full, _run_lab_full),
+    "batch": (_prepare_batch, _run_batch),
+    "playwright_script": (_prepare_playwright_script, _run_playwright_script),
+}
+
+
+def register_job_kinds(manager: JobManager):
+    """Registra i tipi di job degli endpoint bloccanti sul JobManager."""
+    for kind, (prepare, handler) in JOB_KINDS.items():
+        manager.register(kind, handler, prepare=prepare)
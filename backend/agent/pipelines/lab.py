@@ -7,14 +7,24 @@ separata dall'infrastruttura runtime e dai prompt stessi.
 
 from __future__ import annotations
 
-import asyncio
 from typing import Optional, Tuple
 
 from agent.prompts.lab import get_lab_optimized_prompt
 from agent.prompts.lab_prefix import build_lab_prefix_prompt
-from agent.runtime import MCPAgentRuntime
+from agent.runtime import get_shared_runtime
+from agent.setup import browser_session
 from agent.test_agent_mcp import TestAgentMCP
 from agent.lab_scenarios import get_scenario_by_id, LabScenario
+from agent.core.evaluation import evaluate_passed, error_from_tool_output
+from agent.background_loop import get_background_loop
+from agent.core.timing import rollup_timing, summarize_timing
+from agent.pipelines.replay import (
+    divergence_instruction,
+    load_trace,
+    replay_stats,
+    replay_trace,
+    save_trace,
+)
 from codegen.trace_extractor import extract_trace
 from codegen.trace_to_playwright import summarize_trace
 from config.settings import AppConfig
@@ -96,14 +106,16 @@ async def run_prefix_to_home(
     password: Optional[str] = None,
     module_label: Optional[str] = None,
     module_label_alt: Optional[str] = None,
+    session_id: Optional[str] = None,
 ) -> dict:
     """
     Esegue il Prefix Agent: login → selezione organizzazione → Continua → apertura tile modulo su home.
     Non chiude il browser; il server MCP (remoto o locale) mantiene la sessione.
+    session_id: sessione browser sul server MCP remoto (None = sessione del contesto/default).
     """
     primary, alt = _resolve_home_tile(module_label, module_label_alt)
     prefix_prompt = build_lab_prefix_prompt(tile_primary=primary, tile_alternate=alt)
-    runtime = MCPAgentRuntime()
+    runtime = get_shared_runtime()
     agent = TestAgentMCP(custom_prompt=prefix_prompt, runtime=runtime)
     instruction = _prefix_instruction(
         url=url,
@@ -112,7 +124,8 @@ async def run_prefix_to_home(
         module_label=module_label,
         module_label_alt=module_label_alt,
     )
-    result = await agent.run_test_async(instruction, verbose=verbose)
+    with browser_session(session_id):
+        result = await agent.run_test_async(instruction, verbose=verbose)
     result["phase"] = "prefix"
     return result
 
@@ -121,10 +134,16 @@ async def run_lab_scenario(
     scenario_id: Optional[str] = None,
     scenario: Optional[LabScenario] = None,
     verbose: bool = True,
+    session_id: Optional[str] = None,
+    replay: Optional[bool] = None,
 ) -> dict:
     """
     Esegue lo scenario LAB dalla home. Presuppone che il browser sia già sulla home
-    (dopo run_prefix_to_home sullo stesso server MCP).
+    (dopo run_prefix_to_home sullo stesso server MCP e con lo stesso session_id).
+
+    replay (None = AGENT_REPLAY_TRACES): se esiste la trace di una run passata la riesegue
+    senza LLM; al primo step divergente passa all'agent con gli step rimanenti.
+    Le run passate salvano sempre la propria trace per i replay successivi.
     """
     if scenario is None:
         if scenario_id is None:
@@ -160,10 +179,20 @@ async def run_lab_scenario(
                 "scenario_id": scenario_id,
             }
 
-    runtime = MCPAgentRuntime()
-    agent = TestAgentMCP(custom_prompt=get_lab_optimized_prompt(), runtime=runtime)
+    runtime = get_shared_runtime()
     instruction = _scenario_instruction(scenario)
-    result = await agent.run_test_async(instruction, verbose=verbose)
+    if replay is None:
+        replay = AppConfig.AGENT.REPLAY_TRACES
+    stored_trace = load_trace(scenario) if replay else None
+
+    with browser_session(session_id):
+        if stored_trace:
+            result = await _replay_lab_scenario(
+                runtime, scenario, stored_trace, instruction, verbose
+            )
+        else:
+            agent = TestAgentMCP(custom_prompt=get_lab_optimized_prompt(), runtime=runtime)
+            result = await agent.run_test_async(instruction, verbose=verbose)
     result["phase"] = "scenario"
     result["scenario_id"] = scenario.id
     result["scenario_name"] = scenario.name
@@ -175,11 +204,74 @@ async def run_lab_scenario(
         result["trace_summary"] = summarize_trace(
             trace, scenario_id=scenario_id, scenario_name=scenario.name
         )
+        if result.get("passed"):
+            try:
+                save_trace(scenario, trace)
+            except OSError as e:
+                print(f"⚠️  Trace non salvata per {scenario.id}: {e}")
     if model_notes:
         result["notes"] = model_notes
     return result
 
 
+async def _replay_lab_scenario(
+    runtime,
+    scenario: LabScenario,
+    trace: list,
+    instruction: str,
+    verbose: bool,
+) -> dict:
+    """
+    Replay della trace sui tool MCP; se uno step diverge, l'agent ReAct completa lo
+    scenario partendo dallo stato corrente. Il risultato ha lo stesso formato di
+    run_test_async più la chiave "replay" (hit rate per scenario).
+    """
+    if verbose:
+        print(f"♻️  Replay trace scenario {scenario.id}: {len(trace)} step")
+    replayed = await replay_trace(runtime.call_tool, trace, verbose=verbose)
+
+    if replayed["diverged_at"] is None:
+        closed = await runtime.call_tool("close_browser")
+        steps = replayed["steps"] + [
+            {"type": "tool_end", "tool": "close_browser", "output": closed, "input": {}}
+        ]
+        errors = [
+            err
+            for s in steps
+            if (err := error_from_tool_output(s["tool"], s["output"])) is not None
+        ]
+        passed, errors_final = evaluate_passed(steps, errors)
+        return {
+            "passed": passed,
+            "errors": errors_final,
+            "artifacts": [],
+            "steps": steps,
+            "notes": "Scenario rieseguito dalla trace salvata (nessuna chiamata LLM).",
+            "duration_ms": replayed["duration_ms"],
+            "timing": summarize_timing(steps, replayed["duration_ms"]),
+            "mcp_mode": AppConfig.MCP.MODE,
+            "replay": replay_stats(replayed, fallback_used=False),
+        }
+
+    if verbose:
+        print(
+            f"↪️  Replay divergente allo step {replayed['diverged_at'] + 1}: "
+            "fallback all'agent con gli step rimanenti"
+        )
+    agent = TestAgentMCP(custom_prompt=get_lab_optimized_prompt(), runtime=runtime)
+    result = await agent.run_test_async(
+        divergence_instruction(instruction, replayed), verbose=verbose
+    )
+    # Lo step fallito del replay resta fuori: l'agent lo ha ritentato/sostituito
+    result["steps"] = replayed["steps"][:-1] + (result.get("steps") or [])
+    result["duration_ms"] = replayed["duration_ms"] + (result.get("duration_ms") or 0)
+    result["timing"] = summarize_timing(
+        result["steps"], result["duration_ms"], (result.get("timing") or {}).get("llm_call_list")
+    )
+    result["replay"] = replay_stats(replayed, fallback_used=True)
+    return result
+
+
 async def run_full(
     scenario_id: str,
     verbose: bool = True,
@@ -189,11 +281,13 @@ async def run_full(
     password: Optional[str] = None,
     module_label: Optional[str] = None,
     module_label_alt: Optional[str] = None,
+    session_id: Optional[str] = None,
 ) -> dict:
     """
     Esegue prefix + scenario LAB usando un runtime condiviso (stessa sessione MCP/browser).
+    session_id: sessione browser sul server MCP remoto (None = sessione del contesto/default).
     """
-    runtime = MCPAgentRuntime()
+    runtime = get_shared_runtime()
 
     primary, alt = _resolve_home_tile(module_label, module_label_alt)
     prefix_prompt = build_lab_prefix_prompt(tile_primary=primary, tile_alternate=alt)
@@ -205,7 +299,8 @@ async def run_full(
         module_label=module_label,
         module_label_alt=module_label_alt,
     )
-    prefix_result = await prefix_agent.run_test_async(prefix_instruction, verbose=verbose)
+    with browser_session(session_id):
+        prefix_result = await prefix_agent.run_test_async(prefix_instruction, verbose=verbose)
     prefix_result["phase"] = "prefix"
     if not prefix_result.get("passed", False):
         return {
@@ -235,9 +330,10 @@ async def run_full(
         }
 
     scenario_instruction = _scenario_instruction(scenario_obj)
-    scenario_result = await scenario_agent.run_test_async(
-        scenario_instruction, verbose=verbose
-    )
+    with browser_session(session_id):
+        scenario_result = await scenario_agent.run_test_async(
+            scenario_instruction, verbose=verbose
+        )
     scenario_result["phase"] = "scenario"
     scenario_result["scenario_id"] = scenario_obj.id
     scenario_result["scenario_name"] = scenario_obj.name
@@ -262,6 +358,7 @@ async def run_full(
         "artifacts": artifacts,
         "duration_ms": prefix_result.get("duration_ms", 0)
         + scenario_result.get("duration_ms", 0),
+        "timing": rollup_timing([prefix_result, scenario_result]),
     }
 
 
@@ -274,38 +371,19 @@ def run_full_sync(
     module_label: Optional[str] = None,
     module_label_alt: Optional[str] = None,
 ) -> dict:
-    """Versione sincrona di run_full (per Flask o script non-async)."""
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop.run_until_complete(
-            run_full(
-                scenario_id,
-                verbose=verbose,
-                url=url,
-                user=user,
-                password=password,
-                module_label=module_label,
-                module_label_alt=module_label_alt,
-            )
-        )
-
-    import concurrent.futures
-
-    with concurrent.futures.ThreadPoolExecutor() as pool:
-        future = pool.submit(
-            asyncio.run,
-            run_full(
-                scenario_id,
-                verbose=verbose,
-                url=url,
-                user=user,
-                password=password,
-                module_label=module_label,
-                module_label_alt=module_label_alt,
-            ),
+    """
+    Versione sincrona di run_full (per Flask o script non-async), eseguita sul loop
+    di background di processo (runtime e sessioni MCP riusati tra le chiamate).
+    """
+    return get_background_loop().run_sync(
+        run_full(
+            scenario_id,
+            verbose=verbose,
+            url=url,
+            user=user,
+            password=password,
+            module_label=module_label,
+            module_label_alt=module_label_alt,
         )
-        return future.result()
+    )
 
@@ -0,0 +1,188 @@
+"""
+Replay deterministico di una trace di scenario LAB già passato.
+
+Dopo una run riuscita la trace (extract_trace: click_smart/fill_smart/wait_* andati a buon
+fine, con il target che ha funzionato) viene salvata su file. Alla rerun gli step vengono
+rieseguiti direttamente sui tool MCP, senza LLM; al primo step che fallisce il chiamante
+torna all'agent ReAct passandogli gli step rimanenti (vedi run_lab_scenario).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agent.core.timing import pop_server_ms, tool_timing
+from agent.lab_scenarios import LabScenario
+from agent.utils import make_json_serializable
+from config.settings import AppConfig
+
+# Tool della trace con un target "vincente" da provare per primo
+_TARGET_TOOLS = {"click_smart", "fill_smart", "click_and_wait_for_text"}
+
+
+def scenario_trace_key(scenario: LabScenario) -> str:
+    """
+    Chiave della trace: id scenario + hash del contenuto (passi, risultati attesi, hints),
+    così una modifica allo scenario invalida la trace salvata.
+    """
+    content = json.dumps(
+        [scenario.execution_steps, scenario.expected_results, scenario.prompt_hints],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    digest = hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+    safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in scenario.id)
+    return f"{safe_id}-{digest}"
+
+
+def _trace_path(scenario: LabScenario) -> str:
+    return os.path.join(AppConfig.AGENT.TRACE_STORE_DIR, f"{scenario_trace_key(scenario)}.json")
+
+
+def load_trace(scenario: LabScenario) -> Optional[List[Dict[str, Any]]]:
+    """Trace salvata per lo scenario (None se assente o non leggibile)."""
+    try:
+        with open(_trace_path(scenario), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    trace = data.get("trace")
+    return trace if isinstance(trace, list) and trace else None
+
+
+def save_trace(scenario: LabScenario, trace: List[Dict[str, Any]]) -> Optional[str]:
+    """Salva la trace di una run passata (scrittura atomica). Restituisce il path."""
+    if not trace:
+        return None
+    path = _trace_path(scenario)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    payload = {
+        "scenario_id": scenario.id,
+        "scenario_name": scenario.name,
+        "saved_at": datetime.now().isoformat(timespec="seconds"),
+        "trace": make_json_serializable(trace),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _replay_args(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Args dello step; per i tool a targets mette prima il target che ha funzionato."""
+    args = dict(entry.get("args") or {})
+    winner = (entry.get("result") or {}).get("target")
+    targets = args.get("targets")
+    if entry.get("tool") in _TARGET_TOOLS and isinstance(winner, dict) and isinstance(targets, list):
+        # gli id "ref" del formato compatto valgono solo per l'inspect che li ha prodotti
+        args["targets"] = [winner] + [
+            t for t in targets if t != winner and not (isinstance(t, dict) and t.get("by") == "ref")
+        ]
+    return args
+
+
+async def replay_trace(
+    call_tool: Callable[..., Awaitable[dict]],
+    trace: List[Dict[str, Any]],
+    verbose: bool = True,
+) -> Dict[str, Any]:
+    """
+    Riesegue la trace step per step tramite call_tool(tool_name, **args).
+    Si ferma al primo step con status != success.
+
+    Returns:
+        {
+          "steps": [...],           # nello stesso formato degli step dell'agent (type=tool_end)
+          "replayed": int,          # step rieseguiti con successo
+          "total": int,
+          "diverged_at": int|None,  # indice (0-based) dello step fallito
+          "remaining": [...],       # step della trace non rieseguiti (incluso quello fallito)
+          "duration_ms": int,
+        }
+    """
+    started = time.monotonic()
+    steps: List[Dict[str, Any]] = []
+    diverged_at = None
+
+    for idx, entry in enumerate(trace):
+        tool = entry.get("tool")
+        args = _replay_args(entry)
+        call_started = time.perf_counter()
+        try:
+            output = await call_tool(tool, **args)
+        except Exception as e:
+            output = {"status": "error", "message": str(e)}
+        tool_ms = int((time.perf_counter() - call_started) * 1000)
+
+        steps.append(
+            {
+                "type": "tool_end",
+                "tool": tool,
+                "output": output,
+                "input": args,
+                "replayed": True,
+                **tool_timing(tool_ms, pop_server_ms(output)),
+            }
+        )
+        if verbose:
+            print(f"[replay {idx + 1}/{len(trace)}] {tool}: {output.get('status')}")
+        if output.get("status") != "success":
+            diverged_at = idx
+            break
+
+    replayed = len(trace) if diverged_at is None else diverged_at
+    return {
+        "steps": steps,
+        "replayed": replayed,
+        "total": len(trace),
+        "diverged_at": diverged_at,
+        "remaining": [] if diverged_at is None else trace[diverged_at:],
+        "duration_ms": int((time.monotonic() - started) * 1000),
+    }
+
+
+def divergence_instruction(base_instruction: str, replay: Dict[str, Any]) -> str:
+    """
+    Istruzione per l'agent di fallback: scenario originale + step già eseguiti in replay
+    + step rimanenti della trace come riferimento (il primo è quello fallito).
+    """
+    done = [
+        f"- {s['tool']}({json.dumps(s.get('input') or {}, ensure_ascii=False)})"
+        for s in replay["steps"]
+        if (s.get("output") or {}).get("status") == "success"
+    ]
+    failed = replay["steps"][-1] if replay["steps"] else {}
+    remaining = [
+        f"- {e.get('tool')}({json.dumps(e.get('args') or {}, ensure_ascii=False)})"
+        for e in replay["remaining"]
+    ]
+    return (
+        f"{base_instruction}\n\n"
+        "REPLAY STATUS: i primi passi dello scenario sono già stati eseguiti automaticamente "
+        "(NON ripeterli), la pagina è nello stato risultante.\n"
+        "Tool già eseguiti con successo:\n"
+        + ("\n".join(done) if done else "- (nessuno)")
+        + f"\n\nQuesto tool è FALLITO: {failed.get('tool')} → "
+        f"{(failed.get('output') or {}).get('message', 'errore')}\n"
+        "Passi rimanenti della run precedente (riferimento, verifica la pagina con inspect prima di agire):\n"
+        + "\n".join(remaining)
+    )
+
+
+def replay_stats(replay: Dict[str, Any], fallback_used: bool) -> Dict[str, Any]:
+    """Statistiche di replay per scenario (hit rate = step rieseguiti / step della trace)."""
+    total = replay["total"]
+    return {
+        "steps_total": total,
+        "steps_replayed": replay["replayed"],
+        "hit_rate": round(replay["replayed"] / total, 3) if total else 0.0,
+        "diverged_at": replay["diverged_at"],
+        "fallback_used": fallback_used,
+        "replay_ms": replay["duration_ms"],
+    }
@@ -0,0 +1,207 @@
+# backend/agent/resource_filter.py
+"""
+Filtro delle risorse di rete del BrowserContext (PLAYWRIGHT_RESOURCE_FILTER).
+
+Le pagine LAB/AMC caricano font, immagini, icone e beacon di analytics su cui i test
+non asseriscono mai: in ambienti lenti rallentano navigate_to_url e wait_for_load_state.
+Le regole vengono dal registro per profilo app in config/ui_overrides.py:
+- block: la richiesta viene abortita (font, media, analytics);
+- stub: risposta locale vuota (pixel trasparente per le immagini), così l'elemento resta
+  nel DOM e gli eventi load scattano.
+La navigazione del frame principale e i tipi document/script/xhr/fetch non sono mai
+filtrati per tipo. Con PLAYWRIGHT_RESOURCE_FILTER=auto il profilo segue l'host della
+pagina aperta da navigate_to_url.
+
+Le richieste non filtrate passano con route.fallback(): altri handler del contesto
+(es. replay HAR) restano in catena.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from config.settings import AppConfig
+from config.ui_overrides import UIOverridesConfig
+
+_OFF_VALUES = ("", "off", "false", "none", "0")
+
+# GIF 1x1 trasparente per lo stub delle immagini
+_TRANSPARENT_GIF = bytes.fromhex(
+    "47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b"
+)
+
+# Tipi di cui ha senso misurare la dimensione (HEAD); i beacon non hanno un corpo utile
+_MEASURED_TYPES = ("image", "font", "media", "stylesheet", "other")
+
+# Dimensioni note per URL (Content-Length da HEAD), condivise tra le run del processo
+_SIZE_CACHE: "OrderedDict[str, Optional[int]]" = OrderedDict()
+_SIZE_CACHE_MAX = 5000
+
+
+def is_enabled() -> bool:
+    """True se PLAYWRIGHT_RESOURCE_FILTER attiva il filtro."""
+    return AppConfig.PLAYWRIGHT.RESOURCE_FILTER not in _OFF_VALUES
+
+
+def _stub_response(resource_type: str) -> dict:
+    if resource_type == "image":
+        return {"status": 200, "content_type": "image/gif", "body": _TRANSPARENT_GIF}
+    if resource_type == "stylesheet":
+        return {"status": 200, "content_type": "text/css", "body": ""}
+    return {"status": 204, "body": ""}
+
+
+class ResourceFilter:
+    """Route handler di un BrowserContext + contatori di richieste e byte risparmiati."""
+
+    def __init__(self, mode: str, measure: Optional[bool] = None):
+        self.mode = mode
+        self.profile = "default" if mode == "auto" else mode
+        self.rules = UIOverridesConfig.get_resource_filter_profile(self.profile)
+        self.measure = AppConfig.PLAYWRIGHT.RESOURCE_FILTER_MEASURE if measure is None else measure
+        self._context = None
+        self._counts = {"total": 0, "allowed": 0, "blocked": 0, "stubbed": 0}
+        self._by_type: Dict[str, Dict[str, int]] = {}
+        self._by_rule: Dict[str, int] = {}
+        self._saved_urls: Dict[str, int] = {}
+        self._measuring: set = set()
+
+    @classmethod
+    def from_config(cls) -> Optional["ResourceFilter"]:
+        """Filtro per PLAYWRIGHT_RESOURCE_FILTER (None se disattivato o profilo sconosciuto)."""
+        if not is_enabled():
+            return None
+        mode = AppConfig.PLAYWRIGHT.RESOURCE_FILTER
+        if mode != "auto" and UIOverridesConfig.get_resource_filter_profile(mode) is None:
+            print(f"⚠️  PLAYWRIGHT_RESOURCE_FILTER: profilo '{mode}' non trovato, filtro disattivato")
+            return None
+        return cls(mode)
+
+    async def install(self, context):
+        """Registra il route handler sul contesto (prima di aprire la pagina)."""
+        self._context = context
+        await context.route("**/*", self._handle)
+
+    def select_for_url(self, url: str):
+        """Modalità auto: profilo dell'app della pagina che si sta aprendo."""
+        if self.mode != "auto":
+            return
+        profile = UIOverridesConfig.get_resource_filter_profile_for_url(url)
+        if profile != self.profile:
+            self.profile = profile
+            self.rules = UIOverridesConfig.get_resource_filter_profile(profile)
+
+    def decide(self, url: str, resource_type: str) -> Tuple[Optional[str], Optional[str]]:
+        """(azione, regola): azione "block"/"stub" o None se la richiesta passa."""
+        rules = self.rules
+        match = UIOverridesConfig.url_matches
+        if any(match(url, p) for p in rules["allow_url_patterns"]):
+            return None, None
+        for p in rules["block_url_patterns"]:
+            if match(url, p):
+                return "block", p
+        for p in rules["stub_url_patterns"]:
+            if match(url, p):
+                return "stub", p
+        if resource_type in rules["block_types"]:
+            return "block", f"type:{resource_type}"
+        if resource_type in rules["stub_types"]:
+            return "stub", f"type:{resource_type}"
+        return None, None
+
+    async def _handle(self, route):
+        request = route.request
+        resource_type = request.resource_type
+        action, rule = (None, None)
+        if not (request.is_navigation_request() and resource_type == "document"):
+            action, rule = self.decide(request.url, resource_type)
+        self._counts["total"] += 1
+        try:
+            if action is None:
+                self._counts["allowed"] += 1
+                await route.fallback()
+                return
+            if action == "block":
+                await route.abort("blockedbyclient")
+            else:
+                await route.fulfill(**_stub_response(resource_type))
+        except Exception:
+            return  # pagina/contesto chiusi durante la richiesta
+        self._record(request.url, resource_type, action, rule)
+
+    def _record(self, url: str, resource_type: str, action: str, rule: str):
+        key = "blocked" if action == "block" else "stubbed"
+        self._counts[key] += 1
+        per_type = self._by_type.setdefault(resource_type, {"blocked": 0, "stubbed": 0})
+        per_type[key] += 1
+        self._by_rule[rule] = self._by_rule.get(rule, 0) + 1
+        self._saved_urls[url] = self._saved_urls.get(url, 0) + 1
+        if (
+            self.measure
+            and resource_type in _MEASURED_TYPES
+            and url.startswith(("http://", "https://"))
+            and url not in _SIZE_CACHE
+            and url not in self._measuring
+        ):
+            self._measuring.add(url)
+            asyncio.get_running_loop().create_task(self._measure_size(url))
+
+    async def _measure_size(self, url: str):
+        """HEAD in background (la richiesta originale è già stata bloccata): Content-Length."""
+        size = None
+        try:
+            response = await self._context.request.head(url, timeout=5000)
+            length = response.headers.get("content-length")
+            size = int(length) if length and length.isdigit() else None
+            await response.dispose()
+        except Exception:
+            pass
+        finally:
+            self._measuring.discard(url)
+        _SIZE_CACHE[url] = size
+        while len(_SIZE_CACHE) > _SIZE_CACHE_MAX:
+            _SIZE_CACHE.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Richieste (e byte, se misurati) risparmiati dall'avvio del contesto."""
+        known = [
+            (count, _SIZE_CACHE[url])
+            for url, count in self._saved_urls.items()
+            if _SIZE_CACHE.get(url) is not None
+        ]
+        return {
+            "mode": self.mode,
+            "profile": self.profile,
+            "requests_total": self._counts["total"],
+            "requests_allowed": self._counts["allowed"],
+            "requests_blocked": self._counts["blocked"],
+            "requests_stubbed": self._counts["stubbed"],
+            "requests_saved": self._counts["blocked"] + self._counts["stubbed"],
+            # solo richieste con Content-Length noto (PLAYWRIGHT_RESOURCE_FILTER_MEASURE)
+            "bytes_saved": sum(count * size for count, size in known) if self.measure else None,
+            "bytes_saved_requests": sum(count for count, _ in known) if self.measure else None,
+            "by_type": self._by_type,
+            "by_rule": dict(sorted(self._by_rule.items(), key=lambda kv: -kv[1])),
+        }
+
+
+def merge_resource_filter_stats(items) -> Optional[dict]:
+    """Somma dei contatori di più run (es. scenari di una batch); None se nessuna ha stats."""
+    total = None
+    for item in items:
+        if not isinstance(item, dict) or "requests_total" not in item:
+            continue
+        if total is None:
+            total = {
+                "requests_total": 0,
+                "requests_allowed": 0,
+                "requests_blocked": 0,
+                "requests_stubbed": 0,
+                "requests_saved": 0,
+                "bytes_saved": None,
+            }
+        for key in ("requests_total", "requests_allowed", "requests_blocked", "requests_stubbed", "requests_saved"):
+            total[key] += item.get(key) or 0
+        if item.get("bytes_saved") is not None:
+            total["bytes_saved"] = (total["bytes_saved"] or 0) + item["bytes_saved"]
+    return total
@@ -1,10 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import threading
+import uuid
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
+from agent.core.evaluation import parse_tool_output
+from agent.core.history import compact_history_hook
+from agent.core.timing import hide_server_ms
+from agent import tracing
 from agent.setup import create_llm, create_mcp_config
 from config.settings import AppConfig
+from mcp_servers.tool_names import ORCHESTRATOR_TOOL_NAMES
 from langgraph.prebuilt import create_react_agent
 from langchain_mcp_adapters.client import MultiServerMCPClient
 
@@ -18,6 +27,9 @@ class MCPAgentRuntime:
     - cache dei grafi/agent per prompt
 
     Obiettivo: evitare re-init e doppia discovery tool tra prefix/scenario/execution.
+    Le pipeline lo ottengono da get_shared_runtime() (pool di processo). La sessione
+    browser sul server MCP remoto non fa parte del runtime: si sceglie per chiamata con
+    agent.setup.browser_session(session_id), così sessioni diverse condividono tool e agent.
     """
 
     llm: Any = field(default_factory=create_llm)
@@ -27,9 +39,16 @@ class MCPAgentRuntime:
     client: Optional[MultiServerMCPClient] = None
     tools: list[Any] = field(default_factory=list)
     tool_names: list[str] = field(default_factory=list)
+    # Tool chiamati dal codice (call_tool) e non passati all'agent
+    orchestrator_tools: Dict[str, Any] = field(default_factory=dict)
+    # Tool MCP originali per call_tool (output con server_ms per la scomposizione tempi)
+    _mcp_tools: Dict[str, Any] = field(default_factory=dict)
 
     _initialized: bool = False
     _agent_cache: Dict[str, Any] = field(default_factory=dict)
+    # Event loop in cui è stato inizializzato (il client HTTP dell'LLM è legato al loop)
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _init_lock: Optional[asyncio.Lock] = None
 
     def __post_init__(self):
         self.mcp_config = create_mcp_config(self.use_remote)
@@ -38,12 +57,56 @@ class MCPAgentRuntime:
         if self._initialized:
             return
 
-        self.client = MultiServerMCPClient(self.mcp_config)
-        tools = await self.client.get_tools()
-        self.tools = tools
-        self.tool_names = [t.name for t in tools]
+        # Più task sullo stesso runtime condiviso: una sola discovery
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if self._initialized:
+                return
 
-        self._initialized = True
+            self._loop = asyncio.get_running_loop()
+            self.client = MultiServerMCPClient(self.mcp_config)
+            tools = await self.client.get_tools()
+            self.orchestrator_tools = {
+                t.name: t for t in tools if t.name in ORCHESTRATOR_TOOL_NAMES
+            }
+            self._mcp_tools = {t.name: t for t in tools}
+            # Tool dell'agent: server_ms fuori dai ToolMessage (token), nell'artifact
+            self.tools = hide_server_ms(
+                [t for t in tools if t.name not in ORCHESTRATOR_TOOL_NAMES]
+            )
+            self.tool_names = [t.name for t in self.tools]
+
+            self._initialized = True
+
+    def is_usable(self, loop: Optional[asyncio.AbstractEventLoop]) -> bool:
+        """
+        Health check per il pool: un runtime inizializzato in un altro event loop
+        (es. thread Flask precedente, loop chiuso) non va riusato.
+        """
+        if self._loop is None:
+            return True
+        return not self._loop.is_closed() and (loop is None or self._loop is loop)
+
+    async def call_tool(self, tool_name: str, /, **kwargs) -> dict:
+        """
+        Invoca direttamente un tool MCP (senza LLM) e ne restituisce l'output come dict.
+        Usato dall'orchestrator per gli step deterministici (es. snapshot sessione).
+        """
+        await self.ensure_initialized()
+        tool = self._mcp_tools.get(tool_name)
+        if tool is None:
+            return {"status": "error", "message": f"Tool '{tool_name}' non disponibile sul server MCP"}
+        # run_id esplicito: lo span del tool è il parent di quello lato server MCP
+        run_id = uuid.uuid4()
+        with tracing.span(
+            f"tool.{tool_name}", cat="tool", span_id=tracing.span_id_for_run(run_id)
+        ):
+            raw = await tool.ainvoke(kwargs, config={"run_id": run_id})
+        output = parse_tool_output(raw)
+        if isinstance(output, dict):
+            return output
+        return {"status": "error", "message": f"Output non valido da {tool_name}: {output}"}
 
     def get_agent_for_prompt(self, prompt: str):
         """
@@ -51,7 +114,68 @@ class MCPAgentRuntime:
         """
         if prompt in self._agent_cache:
             return self._agent_cache[prompt]
-        agent = create_react_agent(self.llm, self.tools, prompt=prompt)
+        agent = create_react_agent(
+            self.llm,
+            self.tools,
+            prompt=prompt,
+            pre_model_hook=(
+                compact_history_hook if AppConfig.AGENT.HISTORY_COMPACTION else None
+            ),
+        )
         self._agent_cache[prompt] = agent
         return agent
 
+
+
+# =====================================================================
+# Pool di processo: un runtime per (MCP, LLM)
+# =====================================================================
+
+_RUNTIME_POOL: "OrderedDict[Tuple, MCPAgentRuntime]" = OrderedDict()
+_RUNTIME_POOL_LOCK = threading.Lock()
+
+
+def _llm_signature() -> Tuple:
+    """Parametri che identificano il client LLM creato da create_llm()."""
+    llm = AppConfig.LLM
+    provider = llm.get_provider()
+    model = {
+        "openrouter": llm.OPENROUTER_MODEL,
+        "azure": llm.AZURE_DEPLOYMENT,
+        "ollama": llm.OLLAMA_MODEL,
+    }.get(provider, llm.OPENAI_MODEL)
+    endpoint = {"azure": llm.AZURE_ENDPOINT, "ollama": llm.OLLAMA_ENDPOINT}.get(provider)
+    return (provider, model, endpoint, llm.TEMPERATURE, llm.MAX_TOKENS)
+
+
+def get_shared_runtime(use_remote: Optional[bool] = None) -> MCPAgentRuntime:
+    """
+    Restituisce il runtime condiviso per (modalità MCP, URL, config LLM), creandolo se
+    serve. La sessione browser si applica per chiamata (agent.setup.browser_session). L'inizializzazione resta lazy (ensure_initialized), quindi
+    tool discovery e compilazione degli agent per prompt avvengono una volta sola
+    finché il runtime è sano (stesso event loop, loop non chiuso).
+    """
+    if use_remote is None:
+        use_remote = AppConfig.MCP.use_remote()
+    url = AppConfig.MCP.get_remote_url() if use_remote else "stdio"
+    key = (use_remote, url, _llm_signature())
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    with _RUNTIME_POOL_LOCK:
+        runtime = _RUNTIME_POOL.get(key)
+        if runtime is not None and runtime.is_usable(loop):
+            _RUNTIME_POOL.move_to_end(key)
+            return runtime
+
+        runtime = MCPAgentRuntime(use_remote=use_remote)
+        _RUNTIME_POOL[key] = runtime
+        _RUNTIME_POOL.move_to_end(key)
+        # LRU: cambi di config LLM/MCP a runtime lasciano runtime inutilizzati
+        while len(_RUNTIME_POOL) > max(AppConfig.AGENT.RUNTIME_POOL_SIZE, 1):
+            _RUNTIME_POOL.popitem(last=False)
+        return runtime
+
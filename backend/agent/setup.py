@@ -4,6 +4,9 @@ Setup LLM e MCP per l'agent. Configurazione centralizzata da AppConfig.
 """
 import os
 import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
 
 from config.settings import AppConfig
 from langchain_openai import ChatOpenAI, AzureChatOpenAI
@@ -53,15 +56,70 @@ def create_llm(*, temperature: float | None = None, max_tokens: int | None = Non
     )
 
 
-def create_mcp_config(use_remote: bool):
-    """Crea la config MCP (remoto HTTP o locale stdio)."""
+# Sessione browser delle tool call del contesto corrente (header MCP_SESSION_HEADER)
+_browser_session: ContextVar[Optional[str]] = ContextVar("mcp_browser_session", default=None)
+
+
+@contextmanager
+def browser_session(session_id: Optional[str]):
+    """
+    Le tool call MCP remote eseguite nel blocco (anche nei task figli, es. tool node
+    dell'agent) usano la sessione browser `session_id` sul server. Con None resta
+    quella del contesto esterno (o la sessione di default).
+    """
+    if not session_id:
+        yield
+        return
+    token = _browser_session.set(session_id)
+    try:
+        yield
+    finally:
+        _browser_session.reset(token)
+
+
+def _mcp_http_client(headers=None, timeout=None, auth=None):
+    """
+    httpx client per il transport MCP che aggiunge a ogni richiesta, letti al momento
+    dell'invio dal contesto corrente: l'header della sessione browser (browser_session)
+    e, con TRACING_ENABLED, il traceparent dello span della tool call.
+    """
+    import httpx
+    from agent.tracing import outgoing_traceparent
+
+    async def inject_headers(request):
+        session_id = _browser_session.get()
+        if session_id:
+            request.headers[AppConfig.MCP.SESSION_HEADER] = session_id
+        if AppConfig.TRACING.ENABLED:
+            value = outgoing_traceparent()
+            if value:
+                request.headers[AppConfig.TRACING.HEADER] = value
+
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=timeout if timeout is not None else httpx.Timeout(30.0),
+        headers=headers,
+        auth=auth,
+        event_hooks={"request": [inject_headers]},
+    )
+
+
+def create_mcp_config(use_remote: bool, session_id: str | None = None):
+    """Crea la config MCP (remoto HTTP o locale stdio).
+
+    `session_id` (solo remoto) fissa la sessione browser del client; di norma la si
+    sceglie per chiamata con browser_session(), così client e tool sono condivisi tra
+    sessioni diverse sullo stesso server.
+    """
     if use_remote:
-        return {
-            "playwright": {
-                "url": AppConfig.MCP.get_remote_url(),
-                "transport": "streamable_http",
-            }
+        config = {
+            "url": AppConfig.MCP.get_remote_url(),
+            "transport": "streamable_http",
         }
+        if session_id:
+            config["headers"] = {AppConfig.MCP.SESSION_HEADER: session_id}
+        config["httpx_client_factory"] = _mcp_http_client
+        return {"playwright": config}
     script_dir = os.path.dirname(os.path.abspath(__file__))
     server_path = os.path.join(
         os.path.dirname(script_dir),
@@ -4,7 +4,6 @@ AI Test Automation Agent usando LangGraph e MCP (Model Context Protocol).
 Supporta OpenRouter, Azure OpenAI, OpenAI.
 """
 
-import asyncio
 import os
 import sys
 import time
@@ -13,8 +12,13 @@ import uuid
 from agent.setup import create_llm, create_mcp_config
 from agent.prompts.lab import get_lab_optimized_prompt
 from agent.utils import export_agent_graph, format_tool_io
+from agent.core.history import compact_history_hook, pop_history_stats
+from agent.core.timing import RunTimer, hide_server_ms, summarize_timing
+from agent import tracing
+from agent.background_loop import get_background_loop
 from agent.core.evaluation import (
     parse_tool_output,
+    plan_substeps,
     step_from_tool_end,
     error_from_tool_output,
     artifact_from_screenshot,
@@ -26,6 +30,7 @@ from codegen.trace_to_playwright import summarize_trace
 from config.settings import AppConfig
 from agent.runtime import MCPAgentRuntime
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from mcp_servers.tool_names import ORCHESTRATOR_TOOL_NAMES
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -87,7 +92,9 @@ class TestAgentMCP:
         self.client = MultiServerMCPClient(self.mcp_config)
 
         print("Caricamento tool da MCP Server...")
-        tools = await self.client.get_tools()
+        tools = hide_server_ms(
+            [t for t in await self.client.get_tools() if t.name not in ORCHESTRATOR_TOOL_NAMES]
+        )
         self.tools = tools
         self.tools_count = len(tools)
         self.tool_names = [t.name for t in tools]
@@ -98,7 +105,14 @@ class TestAgentMCP:
 
         from langgraph.prebuilt import create_react_agent
 
-        self.agent = create_react_agent(self.llm, tools, prompt=self.system_message)
+        self.agent = create_react_agent(
+            self.llm,
+            tools,
+            prompt=self.system_message,
+            pre_model_hook=(
+                compact_history_hook if AppConfig.AGENT.HISTORY_COMPACTION else None
+            ),
+        )
 
         print("Esportazione LangGraph visualization...")
         export_agent_graph(self.agent)
@@ -110,7 +124,16 @@ class TestAgentMCP:
         """
         Esegue un test descritto in linguaggio naturale (async).
         Pass/fail deciso dal codice (tool results), non dal modello.
+        Con tracing attivo la run è uno span (figli: chiamate LLM e tool call).
         """
+        with tracing.span("agent.run_test", cat="agent") as run_span:
+            result = await self._run_test_async(test_description, verbose)
+            if run_span is not None:
+                run_span.set(thread_id=result["thread_id"], passed=result["passed"])
+                result["trace_id"] = run_span.context.trace_id
+            return result
+
+    async def _run_test_async(self, test_description: str, verbose: bool) -> dict:
         thread_id = f"test-{uuid.uuid4()}"
 
         # Assicurati che l'agent sia inizializzato (avviene solo una volta):
@@ -135,6 +158,8 @@ class TestAgentMCP:
         artifacts: list[dict] = []
         final_answer: str = ""
         pending_inputs: dict = {}  # tool_name -> input, per allegare args agli step
+        open_spans: dict = {}  # run_id -> span aperto (chiamate LLM / tool call)
+        timer = RunTimer()  # llm_ms / tool_ms / transport_ms / token per step
 
         start_ts = time.monotonic()
 
@@ -148,6 +173,8 @@ class TestAgentMCP:
                 "configurable": {"thread_id": thread_id},
             },
         ):
+            tracing.trace_agent_event(ev, open_spans)
+            timer.on_event(ev)
             event_type = ev.get("event")
             tool_name = ev.get("name") or ev.get("metadata", {}).get("tool_name")
 
@@ -193,8 +220,25 @@ class TestAgentMCP:
             if event_type == "on_tool_end":
                 tool_name = ev.get("name") or ev.get("metadata", {}).get("tool_name")
                 output_obj = parse_tool_output(ev.get("data", {}).get("output"))
+                timing = timer.tool_end(ev, output_obj)
+                plan_input = pending_inputs.pop(tool_name, {})
+                substeps = plan_substeps(tool_name, output_obj)
+                if substeps:
+                    # execute_plan: uno step per azione/guard (schema tool_end) + riepilogo
+                    for sub in substeps:
+                        steps.append(sub)
+                        err = error_from_tool_output(sub["tool"], sub.get("output"))
+                        if err:
+                            errors.append(err)
+                    summary = {k: v for k, v in output_obj.items() if k != "steps"}
+                    step = step_from_tool_end(tool_name, summary)
+                    step["input"] = plan_input
+                    step.update(timing)
+                    steps.append(step)
+                    continue
                 step = step_from_tool_end(tool_name, output_obj)
-                step["input"] = pending_inputs.pop(tool_name, {})
+                step["input"] = plan_input
+                step.update(timing)
                 steps.append(step)
                 err = error_from_tool_output(tool_name, output_obj)
                 if err:
@@ -219,8 +263,12 @@ class TestAgentMCP:
                 if candidate:
                     final_answer = candidate
 
+        tracing.end_open_spans(open_spans)
         duration_ms = int((time.monotonic() - start_ts) * 1000)
         passed, errors_final = evaluate_passed(steps, errors)
+        # Token per chiamata LLM prima/dopo la compattazione della history (pre_model_hook)
+        history_stats = pop_history_stats(thread_id)
+        timing_stats = summarize_timing(steps, duration_ms, timer.llm_calls)
 
         # Summary deterministica a partire dalla trace MCP (utile anche per i test custom)
         trace_summary = None
@@ -243,6 +291,19 @@ class TestAgentMCP:
                 for e in errors_final:
                     print(f" - [{e.get('tool')}] {e.get('message')}")
             print(f"Artifacts: {artifacts}")
+            if history_stats:
+                print(
+                    f"LLM calls: {history_stats['llm_calls']}  tokens (history) "
+                    f"{history_stats['tokens_before']} → {history_stats['tokens_after']} "
+                    f"(-{history_stats['saved_pct']}%)"
+                )
+            transport = timing_stats["transport_ms"]
+            print(
+                f"Timing: LLM {timing_stats['llm_ms']}ms ({timing_stats['llm_calls']} call) | "
+                f"tool {timing_stats['tool_ms']}ms ({timing_stats['tool_calls']} call"
+                + (f", trasporto {transport}ms" if transport is not None else "")
+                + f") | altro {timing_stats['other_ms']}ms"
+            )
 
             # Filtra output "tool_call" legacy (es. <function=capture_screenshot>...)
             printable_notes = None
@@ -272,56 +333,20 @@ class TestAgentMCP:
             "notes": final_answer,
             "trace_summary": trace_summary,
             "duration_ms": duration_ms,
+            "history_compaction": history_stats,
+            "timing": timing_stats,
             "mcp_mode": AppConfig.MCP.MODE,
         }
 
     def run_test(self, test_description: str, verbose: bool = True) -> dict:
         """
         Esegue un test (versione sincrona - wrapper per async).
-        Robusto: se esiste già un event loop attivo, ne crea uno dedicato in modo sicuro.
+        Gira sul loop di background di processo: client MCP, LLM e runtime restano
+        validi tra una chiamata e l'altra (anche se il chiamante ha già un loop attivo).
         """
-        try:
-            # Se siamo già dentro un loop (es. Jupyter), questo solleverà RuntimeError
-            asyncio.get_running_loop()
-            has_running_loop = True
-        except RuntimeError:
-            has_running_loop = False
-
-        if not has_running_loop:
-            # Caso normale (CLI/Flask thread): possiamo usare un loop dedicato qui
-            loop = asyncio.new_event_loop()
-            try:
-                asyncio.set_event_loop(loop)
-                return loop.run_until_complete(
-                    self.run_test_async(test_description, verbose)
-                )
-            finally:
-                loop.close()
-        else:
-            # Siamo già dentro un loop: creiamo un nuovo loop in un thread separato
-            import threading
-
-            result_container = {"result": None, "error": None}
-
-            def _runner():
-                loop = asyncio.new_event_loop()
-                try:
-                    asyncio.set_event_loop(loop)
-                    result_container["result"] = loop.run_until_complete(
-                        self.run_test_async(test_description, verbose)
-                    )
-                except Exception as e:
-                    result_container["error"] = e
-                finally:
-                    loop.close()
-
-            t = threading.Thread(target=_runner, daemon=True)
-            t.start()
-            t.join()
-
-            if result_container["error"]:
-                raise result_container["error"]
-            return result_container["result"]
+        return get_background_loop().run_sync(
+            self.run_test_async(test_description, verbose)
+        )
 
     async def run_test_stream(self, test_description: str):
         """
@@ -4,15 +4,131 @@ Playwright Tools - ASYNC Version (compatibile con MCP asyncio)
 """
 import asyncio
 import base64
+import copy
 import datetime
 import json
+import os
+import time
 from playwright.async_api import async_playwright, Page
-import re
-from typing import Literal, Optional, List, Dict
-
+from typing import Any, Literal, Optional, List, Dict, Tuple
+from urllib.parse import urlparse
+
+from agent.dom_harvest import (
+    DOM_GENERATION_BINDING,
+    DOM_GENERATION_INIT_JS,
+    build_inspect_sections,
+    harvest_document,
+    harvest_element,
+    harvest_options,
+    visible_sections,
+    wait_for_match,
+)
+from agent.inspect_compact import (
+    compact_diff_result,
+    compact_inspect_result,
+    expand_ref_targets,
+    key_refs,
+)
+from agent.inspect_diff import InspectSnapshots, add_element_keys, diff_inspect
+from agent.ax_inspect import ax_harvest, extra_clickable_selector, frame_session
+from agent.metrics import timed_phase
+from agent import tracing
+from agent.locator_stats import element_key, get_locator_stats_store, origin_of
+from agent.resource_filter import ResourceFilter
 from config.settings import AppConfig
 
 
+# Args: disabilitano rilevamento automazione (navigator.webdriver, feature detection)
+BROWSER_LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-web-security",
+    "--disable-features=IsolateOrigins,site-per-process",
+    "--lang=it-IT",
+]
+
+
+def build_context_options() -> dict:
+    """Opzioni BrowserContext comuni (user agent, locale, timezone, viewport, lingua)."""
+    return {
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36",
+        "locale": AppConfig.PLAYWRIGHT.LOCALE,
+        "timezone_id": AppConfig.PLAYWRIGHT.TIMEZONE,
+        "viewport": {
+            "width": AppConfig.PLAYWRIGHT.VIEWPORT_WIDTH,
+            "height": AppConfig.PLAYWRIGHT.VIEWPORT_HEIGHT,
+        },
+        "extra_http_headers": {"Accept-Language": "it-IT,it;q=0.9"},
+    }
+
+
+# Tool eseguibili come azioni di execute_plan (interazioni e attese; niente lifecycle/discovery)
+PLAN_ACTION_TOOLS = {
+    "navigate_to_url",
+    "click_smart",
+    "fill_smart",
+    "press_key",
+    "scroll_to_bottom",
+    "click_and_wait_for_text",
+    "wait_for_load_state",
+    "wait_for_text_content",
+    "wait_for_element_state",
+    "wait_for_clickable_by_name",
+    "wait_for_field_by_name",
+    "wait_for_control_by_name_and_type",
+    "handle_cookie_banner",
+    "get_text",
+    "get_text_by_visible_content",
+}
+
+# Guard expect_dom_change: l'observer va armato PRIMA dell'azione, poi si attende il flag.
+# In un documento nuovo (navigazione) il flag non esiste più → conta come cambiamento.
+_PLAN_DOM_GUARD_ARM_JS = """
+([selector, key]) => {
+    const root = selector ? document.querySelector(selector) : document.body;
+    if (!root) return false;
+    window[key] = false;
+    const observer = new MutationObserver(() => { window[key] = true; observer.disconnect(); });
+    observer.observe(root, { attributes: true, childList: true, subtree: true });
+    return true;
+}
+"""
+_PLAN_DOM_GUARD_WAIT_JS = "key => window[key] !== false"
+
+
+def _storage_state_path(name: str) -> str:
+    """File dello snapshot di sessione (nome ripulito: solo alfanumerici, '-' e '_')."""
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in (name or "default"))
+    return os.path.join(AppConfig.PLAYWRIGHT.STORAGE_STATE_DIR, f"{safe}.json")
+
+
+HAR_MODES = ("off", "record", "replay")
+
+INSPECT_BACKENDS = ("dom", "ax")
+# Chiave di cache inspect del backend AX (stesso frame, risultato diverso dal DOM)
+_AX_CACHE_KEY = "::ax"
+
+
+def _har_path(name: str) -> str:
+    """Archivio HAR di una registrazione (zip: HAR + corpi delle risposte), nome ripulito."""
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in (name or "default"))
+    return os.path.join(AppConfig.PLAYWRIGHT.HAR_DIR, f"{safe}.har.zip")
+
+
+# Ripristina il sessionStorage dell'origin salvato (storage_state copre solo cookie e localStorage)
+_SESSION_STORAGE_RESTORE_JS = """
+(() => {
+  const snapshot = %s;
+  if (window.location.origin !== snapshot.origin) return;
+  for (const [k, v] of Object.entries(snapshot.items || {})) {
+    if (window.sessionStorage.getItem(k) === null) window.sessionStorage.setItem(k, v);
+  }
+})();
+"""
+
+
 def _build_clickable_selector_for_inspect() -> str:
     """
     Selettore composito per la discovery dei clickabili: set HTML/WCAG standard
@@ -65,26 +181,57 @@ def _normalize_targets_for_mode(targets: List[Dict], mode: str) -> List[Dict]:
     return normalized
 
 
-def _strip_material_icon_prefix(name: str) -> str:
+def _build_target_locator(context, target: dict, mode: str = "click"):
     """
-    Rimuove il prefisso di icona Material da un accessible_name concatenato.
-    Es: "addAggiungi filtro" → "Aggiungi filtro"
-        "editModifica"       → "Modifica"
-        "add\nAGGIUNGI"      → "AGGIUNGI"  (già gestito dal split \n)
-    Lascia invariato se non c'è un prefisso riconoscibile.
+    Costruisce il locator Playwright per un target flat ({"by": ...}).
+    mode="click" supporta anche by=text; fill_smart no. Ritorna None se la strategia
+    non è supportata o mancano i dati.
     """
-    if not name:
-        return name
-    # Caso 1: separato da newline → prendi l'ultima parte non vuota
-    if "\n" in name:
-        parts = [p.strip() for p in name.split("\n") if p.strip()]
-        return parts[-1] if parts else name
-    # Caso 2: concatenato senza separatore: parola lowercase breve (2-8 char)
-    # seguita da testo che inizia con maiuscola o uppercase
-    m = re.match(r"^[a-z_]{2,8}([A-Z].+)$", name)
-    if m:
-        return m.group(1).strip()
-    return name
+    by = target.get("by")
+
+    # Role-based (WCAG accessible)
+    if by == "role":
+        return context.get_by_role(target.get("role"), name=target.get("name"))
+    # Label (form fields)
+    if by == "label":
+        return context.get_by_label(target.get("label"))
+    if by == "placeholder":
+        return context.get_by_placeholder(target.get("placeholder"))
+    # Text content (solo click)
+    if by == "text" and mode == "click":
+        return context.get_by_text(target.get("text"))
+    # Test automation ID (data-tfa)
+    if by == "tfa":
+        return context.locator(f'[data-tfa="{target.get("tfa")}"]')
+    # CSS selector (fallback; accept css_name/css_id from model)
+    if by in ("css", "css_name", "css_id"):
+        selector = _normalize_css_selector(by, target)
+        return context.locator(selector) if selector else None
+    # XPath (last resort)
+    if by == "xpath":
+        return context.locator(f"xpath={target.get('xpath')}")
+    return None
+
+
+# Risale dai parent fino al primo container registrato (UI overrides) per il locator scoped
+_SCOPE_DETECTION_JS = """
+(el, scopeSelectors) => {
+    let current = el.parentElement;
+    while (current && current !== document.body) {
+        for (const sel of scopeSelectors) {
+            try {
+                if (current.matches(sel)) {
+                    const all = document.querySelectorAll(sel);
+                    const idx = Array.from(all).indexOf(current);
+                    return { selector: sel, index: idx, total: all.length };
+                }
+            } catch(e) {}
+        }
+        current = current.parentElement;
+    }
+    return null;
+}
+"""
 
 
 class PlaywrightTools:
@@ -99,74 +246,146 @@ class PlaywrightTools:
     - ADVANCED: wait_for_clickable_by_name, wait_for_control_by_name_and_type, wait_for_field_by_name, handle_cookie_banner, click_and_wait_for_text
     """
 
-    def __init__(self):
-        """Inizializza Playwright"""
+    def __init__(self, browser_pool=None):
+        """
+        Inizializza Playwright.
+
+        Args:
+            browser_pool: opzionale BrowserPool (agent/browser_pool.py) da cui ottenere un
+                          browser condiviso; None = processo browser dedicato (default).
+        """
+        self.browser_pool = browser_pool
         self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
+        self._reset_inspect_cache()
+        # id corti dell'ultimo inspect compatto -> strategie (vedi agent/inspect_compact.py)
+        self._element_refs: Dict[str, dict] = {}
+        # Filtro risorse del contesto corrente (resta leggibile dopo close_browser)
+        self._resource_filter: Optional[ResourceFilter] = None
+        # HAR della sessione impostato da configure_har (None = PLAYWRIGHT_HAR_MODE)
+        self._har_config: Optional[Dict[str, str]] = None
+        # HAR del contesto corrente: {"mode", "name", "path"}
+        self._har: Optional[Dict[str, str]] = None
 
     # =====================================================================
     # RAW - Lifecycle & pagina
     # =====================================================================
 
-    async def start_browser(self, headless=False):
+    async def start_browser(
+        self,
+        headless=False,
+        storage_state: Optional[dict] = None,
+        har_mode: Optional[str] = None,
+        har_name: Optional[str] = None,
+    ):
         """
-        Avvia il browser Chromium con cookie consent pre-impostato per Google
+        Avvia il browser Chromium con cookie consent pre-impostato per Google.
+        Con browser_pool (server MCP) prende dal pool un BrowserContext già creato su
+        un browser già avviato e apre solo la pagina di questa sessione.
+        storage_state: cookie/localStorage Playwright da pre-caricare nel contesto
+        (usato da restore_storage_state).
+        har_mode: "record" salva il traffico di rete in PLAYWRIGHT_HAR_DIR/<har_name>.har.zip
+        (scritto alla chiusura del contesto), "replay" serve le risposte da quell'archivio
+        senza rete, "off" nessun HAR. None = configure_har o PLAYWRIGHT_HAR_MODE.
         """
+        har = self._resolve_har(har_mode, har_name)
+        if har.get("status") == "error":
+            return har
         try:
-            self.playwright = await async_playwright().start()
-
-            # Args: disabilitano rilevamento automazione (navigator.webdriver, feature detection)
-            browser_args = [
-                "--disable-blink-features=AutomationControlled",
-                "--disable-dev-shm-usage",
-                "--no-sandbox",
-                "--disable-setuid-sandbox",
-                "--disable-web-security",
-                "--disable-features=IsolateOrigins,site-per-process",
-                "--lang=it-IT",  # <--- aggiungi questo
-            ]
+            if self.browser_pool is not None:
+                self.context = await self.browser_pool.acquire_context(
+                    headless=headless, storage_state=storage_state
+                )
+                self.browser = self.context.browser
+            else:
+                self.playwright = await async_playwright().start()
+                self.browser = await self.playwright.chromium.launch(
+                    headless=headless, args=BROWSER_LAUNCH_ARGS
+                )
 
-            self.browser = await self.playwright.chromium.launch(
-                headless=headless, args=browser_args
-            )
+                # SOLUZIONE COOKIE GOOGLE: Pre-imposta cookie di consenso
+                context_options = build_context_options()
+                if storage_state:
+                    context_options["storage_state"] = storage_state
+                self.context = await self.browser.new_context(**context_options)
 
-            # SOLUZIONE COOKIE GOOGLE: Pre-imposta cookie di consenso
-            self.context = await self.browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36",
-                locale=AppConfig.PLAYWRIGHT.LOCALE,
-                timezone_id=AppConfig.PLAYWRIGHT.TIMEZONE,
-                viewport={
-                    "width": AppConfig.PLAYWRIGHT.VIEWPORT_WIDTH,
-                    "height": AppConfig.PLAYWRIGHT.VIEWPORT_HEIGHT,
-                },
-                extra_http_headers={"Accept-Language": "it-IT,it;q=0.9"},
-            )
+            # HAR prima del filtro risorse: gli handler registrati dopo hanno la precedenza
+            # e il filtro lascia passare al replay con route.fallback()
+            self._har = None
+            if har["mode"] != "off":
+                await self._install_har(har)
 
+            self._resource_filter = ResourceFilter.from_config()
+            if self._resource_filter is not None:
+                await self._resource_filter.install(self.context)
+
+            self._reset_inspect_cache()
+            await self._install_dom_generation_tracking()
             self.page = await self.context.new_page()
+            self._attach_frame_listeners(self.page)
 
-            return {
+            result = {
                 "status": "success",
                 "message": "Browser avviato con successo (stealth mode)",
                 "headless": headless,
             }
+            if self._har is not None:
+                result["har"] = dict(self._har)
+            return result
         except Exception as e:
             return {
                 "status": "error",
                 "message": f"Errore nell'avviare il browser: {str(e)}",
             }
 
+    def _resolve_har(self, har_mode: Optional[str], har_name: Optional[str]) -> Dict[str, str]:
+        """Modalità/archivio HAR effettivi: argomenti > configure_har > PLAYWRIGHT_HAR_MODE."""
+        config = self._har_config or {}
+        mode = (har_mode or config.get("mode") or AppConfig.PLAYWRIGHT.HAR_MODE or "off").strip().lower()
+        if mode not in HAR_MODES:
+            return {
+                "status": "error",
+                "message": f"har_mode '{mode}' non valido (ammessi: {', '.join(HAR_MODES)})",
+            }
+        name = har_name or config.get("name") or "default"
+        path = _har_path(name)
+        if mode == "replay" and not os.path.exists(path):
+            return {
+                "status": "error",
+                "message": f"Archivio HAR non trovato: {path} (registralo prima con har_mode=record)",
+            }
+        return {"mode": mode, "name": name, "path": path}
+
+    async def _install_har(self, har: Dict[str, str]):
+        """route_from_har sul contesto: registrazione (update) o replay dell'archivio."""
+        if har["mode"] == "record":
+            # Contiene il traffico della sessione (anche POST di login): cartella solo utente
+            os.makedirs(os.path.dirname(har["path"]) or ".", mode=0o700, exist_ok=True)
+            await self.context.route_from_har(
+                har["path"], update=True, update_content="attach", update_mode="minimal"
+            )
+        else:
+            await self.context.route_from_har(
+                har["path"], not_found=AppConfig.PLAYWRIGHT.HAR_NOT_FOUND
+            )
+        self._har = {"mode": har["mode"], "name": har["name"], "path": har["path"]}
+
     async def close_browser(self):
         """
-        Chiude il browser e pulisce le risorse (ASYNC)
+        Chiude il browser e pulisce le risorse (ASYNC).
+        Con browser_pool restituisce il contesto al pool (che lo chiude): il processo
+        browser resta vivo per le sessioni successive.
         """
         try:
             if self.page:
                 await self.page.close()
-            if self.context:
+            if self.context and self.browser_pool is not None:
+                await self.browser_pool.release_context(self.context)
+            elif self.context:
                 await self.context.close()
-            if self.browser:
+            if self.browser and self.browser_pool is None:
                 await self.browser.close()
             if self.playwright:
                 await self.playwright.stop()
@@ -175,11 +394,219 @@ class PlaywrightTools:
             self.context = None
             self.browser = None
             self.playwright = None
+            self._reset_inspect_cache()
 
-            return {"status": "success", "message": "Browser chiuso correttamente"}
+            result = {"status": "success", "message": "Browser chiuso correttamente"}
+            if self._resource_filter is not None:
+                result["resource_filter"] = self._resource_filter.stats()
+            if self._har is not None:
+                result["har"] = self._finish_har()
+            return result
         except Exception as e:
             return {"status": "error", "message": f"Errore nella chiusura: {str(e)}"}
 
+    def _finish_har(self) -> Dict[str, Any]:
+        """HAR del contesto appena chiuso (Playwright scrive la registrazione al close)."""
+        har, self._har = self._har, None
+        info: Dict[str, Any] = dict(har)
+        if har["mode"] == "record" and os.path.exists(har["path"]):
+            os.chmod(har["path"], 0o600)
+            info["bytes"] = os.path.getsize(har["path"])
+        return info
+
+    async def configure_har(self, mode: str = "off", name: str = "default"):
+        """
+        Imposta il HAR dei prossimi start_browser della sessione (anche quelli chiamati
+        dall'LLM o da restore_storage_state). Chiamato dall'orchestrator (BatchTestRunner)
+        prima di ogni scenario, con name = id scenario. mode vuoto = torna a PLAYWRIGHT_HAR_MODE.
+        """
+        mode = (mode or "").strip().lower()
+        if not mode:
+            self._har_config = None
+            return {
+                "status": "success",
+                "message": "HAR della sessione da PLAYWRIGHT_HAR_MODE",
+                "har_mode": AppConfig.PLAYWRIGHT.HAR_MODE,
+            }
+        if mode not in HAR_MODES:
+            return {
+                "status": "error",
+                "message": f"har_mode '{mode}' non valido (ammessi: {', '.join(HAR_MODES)})",
+            }
+        self._har_config = {"mode": mode, "name": name or "default"}
+        path = _har_path(name)
+        return {
+            "status": "success",
+            "message": f"HAR {mode} ({name})",
+            "har_mode": mode,
+            "har_name": name,
+            "path": path,
+            "exists": os.path.exists(path),
+        }
+
+    async def get_resource_filter_stats(self):
+        """
+        Richieste (e byte, con PLAYWRIGHT_RESOURCE_FILTER_MEASURE) risparmiati dal filtro
+        risorse nel contesto corrente o nell'ultimo chiuso. Chiamato dall'orchestrator.
+        """
+        if self._resource_filter is None:
+            return {
+                "status": "success",
+                "enabled": False,
+                "message": "Filtro risorse non attivo (PLAYWRIGHT_RESOURCE_FILTER=off)",
+            }
+        return {"status": "success", "enabled": True, **self._resource_filter.stats()}
+
+    async def save_storage_state(self, name: str = "default"):
+        """
+        Salva lo stato autenticato della sessione (storage_state Playwright: cookie +
+        localStorage, più il sessionStorage dell'origin corrente) e l'URL di atterraggio.
+        Pensato per essere chiamato dopo un prefix riuscito (login → home modulo).
+        """
+        try:
+            if not self.page or not self.context:
+                return {"status": "error", "message": "Browser non avviato"}
+
+            url = self.page.url
+            storage_state = await self.context.storage_state()
+            try:
+                session_items = await self.page.evaluate(
+                    "() => Object.assign({}, window.sessionStorage)"
+                )
+            except Exception:
+                session_items = {}
+
+            now = datetime.datetime.now()
+            snapshot = {
+                "name": name,
+                "url": url,
+                "saved_at": now.isoformat(timespec="seconds"),
+                "saved_at_ts": now.timestamp(),
+                "storage_state": storage_state,
+                "session_storage": {
+                    "origin": origin_of(url),
+                    "items": session_items or {},
+                },
+            }
+
+            path = _storage_state_path(name)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            # Contiene credenziali di sessione: file leggibile solo dall'utente
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+            return {
+                "status": "success",
+                "message": f"Stato sessione salvato ({name})",
+                "name": name,
+                "url": url,
+                "cookies": len(storage_state.get("cookies") or []),
+                "saved_at": snapshot["saved_at"],
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Errore nel salvataggio dello stato sessione: {str(e)}",
+            }
+
+    async def restore_storage_state(
+        self,
+        name: str = "default",
+        max_age_s: Optional[int] = None,
+        headless: Optional[bool] = None,
+    ):
+        """
+        Avvia un contesto nuovo con lo stato salvato da save_storage_state e naviga
+        all'URL di atterraggio. Se la sessione viene rifiutata (redirect al login,
+        campo password visibile) chiude il contesto e restituisce status=error con
+        rejected=True: il chiamante deve rieseguire il login completo.
+
+        Args:
+            name: nome dello snapshot
+            max_age_s: età massima in secondi (None = AppConfig.PLAYWRIGHT.STORAGE_STATE_TTL, 0 = nessun limite)
+            headless: None = AppConfig.PLAYWRIGHT.HEADLESS
+        """
+        path = _storage_state_path(name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return {"status": "error", "message": f"Nessuno stato sessione salvato ({name})"}
+        except Exception as e:
+            return {"status": "error", "message": f"Stato sessione non leggibile: {str(e)}"}
+
+        ttl = AppConfig.PLAYWRIGHT.STORAGE_STATE_TTL if max_age_s is None else max_age_s
+        age_s = time.time() - float(snapshot.get("saved_at_ts") or 0)
+        if ttl and age_s > ttl:
+            return {
+                "status": "error",
+                "message": f"Stato sessione scaduto ({int(age_s)}s > {ttl}s)",
+                "expired": True,
+            }
+
+        if self.page:
+            await self.close_browser()
+
+        started = await self.start_browser(
+            headless=AppConfig.PLAYWRIGHT.HEADLESS if headless is None else headless,
+            storage_state=snapshot.get("storage_state"),
+        )
+        if started.get("status") != "success":
+            return started
+
+        session_storage = snapshot.get("session_storage") or {}
+        if session_storage.get("items"):
+            await self.context.add_init_script(
+                script=_SESSION_STORAGE_RESTORE_JS % json.dumps(session_storage)
+            )
+
+        landing_url = snapshot.get("url")
+        navigated = await self.navigate_to_url(landing_url)
+        reason = (
+            navigated.get("message")
+            if navigated.get("status") != "success"
+            else await self._session_rejected_reason(landing_url)
+        )
+        if reason:
+            await self.close_browser()
+            return {
+                "status": "error",
+                "message": f"Sessione ripristinata rifiutata: {reason}",
+                "rejected": True,
+            }
+
+        return {
+            "status": "success",
+            "message": f"Sessione ripristinata ({name})",
+            "url": self.page.url,
+            "page_title": await self.page.title(),
+            "age_s": int(age_s),
+        }
+
+    async def _session_rejected_reason(self, landing_url: str) -> Optional[str]:
+        """Motivo per cui la sessione ripristinata non è valida (None = sessione valida)."""
+        try:
+            # Le guardie di autenticazione delle SPA redirigono dopo il primo render
+            await self.page.wait_for_load_state("networkidle", timeout=5000)
+        except Exception:
+            pass
+
+        def route(url: str):
+            parsed = urlparse(url or "")
+            return (parsed.netloc, parsed.path.rstrip("/"), parsed.fragment.split("?")[0])
+
+        if route(self.page.url) != route(landing_url):
+            return f"redirect a {self.page.url}"
+        try:
+            if await self.page.locator("input[type='password']:visible").count():
+                return "form di login visibile"
+        except Exception:
+            pass
+        return None
+
     async def navigate_to_url(self, url):
         """
         Naviga a un URL specifico (ASYNC)
@@ -191,6 +618,10 @@ class PlaywrightTools:
                     "message": "Browser non avviato. Chiama prima start_browser()",
                 }
 
+            self._invalidate_inspect_cache()
+            if self._resource_filter is not None:
+                self._resource_filter.select_for_url(url)
+
             # Importante: NON usare più "networkidle" come default.
             # Molte app moderne (SPA, polling, WebSocket) non raggiungono mai
             # uno stato di rete completamente idle e causano timeout inutili.
@@ -286,6 +717,7 @@ class PlaywrightTools:
             if not self.page:
                 return {"status": "error", "message": "Browser non avviato"}
 
+            self._invalidate_inspect_cache()
             await self.page.keyboard.press(key)
 
             return {"status": "success", "message": f"Tasto premuto: {key}", "key": key}
@@ -373,6 +805,7 @@ class PlaywrightTools:
             if not self.page:
                 return {"status": "error", "message": "Browser non avviato"}
 
+            self._invalidate_inspect_cache()
             if selector:
                 sel_norm = selector.strip()
                 if AppConfig.UI.is_scroll_sample_table_wrapper(sel_norm):
@@ -663,6 +1096,38 @@ class PlaywrightTools:
         if not self.page:
             return {"status": "error", "message": "Browser non avviato"}
 
+        # Frame già risolto per la stessa spec e non più navigato/staccato: niente round-trip
+        cache_key = self._frame_cache_key(selector, url_pattern, iframe_path)
+        cached = self._frame_cache_get(cache_key)
+        if cached is not None:
+            result = dict(cached["result"])
+            result["frame_cached"] = True
+            if return_frame:
+                result["frame"] = cached["frame"]
+            return result
+
+        with timed_phase("frame_resolution"):
+            result = await self._resolve_frame(selector, url_pattern, iframe_path, timeout)
+        frame = result.pop("frame", None)
+        # Il fallback al primo iframe generico non va in cache: l'iframe cercato
+        # potrebbe comparire alla chiamata successiva
+        if frame is not None and (
+            iframe_path
+            or result.get("iframe_selector") == (selector or f'iframe[src*="{url_pattern}"]')
+        ):
+            self._frame_cache_put(cache_key, frame, result)
+        if return_frame and frame is not None:
+            result["frame"] = frame
+        return result
+
+    async def _resolve_frame(
+        self,
+        selector: Optional[str],
+        url_pattern: Optional[str],
+        iframe_path: Optional[list],
+        timeout: int,
+    ) -> dict:
+        """Risoluzione effettiva dell'iframe (senza cache); in caso di successo include "frame"."""
         try:
             # Determina strategia: iframe_path (annidati) o selector singolo
             if iframe_path:
@@ -715,8 +1180,7 @@ class PlaywrightTools:
                     "levels": len(iframe_path),
                     "timeout_ms": timeout,
                 }
-                if return_frame:
-                    result["frame"] = context  # frame più profondo
+                result["frame"] = context  # frame più profondo
                 return result
 
             else:
@@ -766,8 +1230,7 @@ class PlaywrightTools:
                     "frame_url": getattr(frame, "url", None),
                     "timeout_ms": timeout,
                 }
-                if return_frame:
-                    result["frame"] = frame
+                result["frame"] = frame
                 return result
 
         except Exception as e:
@@ -866,6 +1329,7 @@ class PlaywrightTools:
         targets: List[Dict],
         timeout_per_try: int = AppConfig.AGENT.DEFAULT_TIMEOUT_PER_TRY,
         in_iframe: dict = None,
+        race: bool = None,
     ) -> dict:
         """
         Click elemento con fallback chain automatico - prova tutte le strategie fino al successo.
@@ -884,6 +1348,9 @@ class PlaywrightTools:
             in_iframe: dict per iframe (singolo o annidati)
                 - Singolo: {"selector": "..."} o {"url_pattern": "..."}
                 - Annidati: {"iframe_path": [{"url_pattern": "..."}, {"selector": "..."}]}
+            race: se True risolve tutte le strategie in parallelo (un solo timeout_per_try
+                  complessivo) e agisce sulla più prioritaria attached+visible+enabled.
+                  None → AppConfig.AGENT.RACE_STRATEGIES (default False).
 
         Returns:
             dict con status, strategia usata, strategie provate
@@ -916,12 +1383,19 @@ class PlaywrightTools:
                 "message": "Browser non avviato. Chiama start_browser() prima.",
             }
 
+        self._invalidate_inspect_cache()
+
         if not targets or len(targets) == 0:
             return {
                 "status": "error",
                 "message": "Nessuna strategia fornita (targets vuoto)",
             }
 
+        # Id corti del formato compatto di inspect → strategie complete
+        targets, in_iframe, ref_error = self._expand_element_refs(targets, in_iframe)
+        if ref_error:
+            return {"status": "error", "message": ref_error}
+
         # Accept both flat targets and raw playwright_suggestions wrappers
         targets = _normalize_targets_for_mode(targets, mode="click")
 
@@ -935,6 +1409,24 @@ class PlaywrightTools:
                 return frame_result
             context = frame_result["frame"]
 
+        # Riordino per esito storico (store locator), poi racing o fallback chain
+        # Chiave elemento calcolata una volta sui targets originali (riordino e registrazione)
+        elem_key = element_key(targets, "click")
+        targets = await self._locator_stats_reorder(targets, elem_key)
+        started = time.perf_counter()
+        if race is None:
+            race = AppConfig.AGENT.RACE_STRATEGIES
+        if race and len(targets) > 1:
+            result = await self._click_smart_race(context, targets, timeout_per_try)
+        else:
+            result = await self._click_smart_chain(context, targets, timeout_per_try)
+        await self._locator_stats_record(targets, elem_key, result, started)
+        return result
+
+    async def _click_smart_chain(
+        self, context, targets: List[Dict], timeout_per_try: int
+    ) -> dict:
+        """Fallback chain sequenziale di click_smart."""
         # FALLBACK CHAIN: prova tutte le strategie fino al successo
         strategies_tried = []
         last_error_msg = ""
@@ -944,43 +1436,7 @@ class PlaywrightTools:
             strategies_tried.append(by)
 
             try:
-                locator = None
-
-                # Strategy 1: Role-based (WCAG accessible)
-                if by == "role":
-                    role = target.get("role")
-                    name = target.get("name")
-                    locator = context.get_by_role(role, name=name)
-
-                # Strategy 2: Label (form fields)
-                elif by == "label":
-                    label = target.get("label")
-                    locator = context.get_by_label(label)
-
-                # Strategy 3: Placeholder
-                elif by == "placeholder":
-                    placeholder = target.get("placeholder")
-                    locator = context.get_by_placeholder(placeholder)
-
-                # Strategy 4: Text content
-                elif by == "text":
-                    text = target.get("text")
-                    locator = context.get_by_text(text)
-
-                # Strategy 5: Test automation ID (data-tfa)
-                elif by == "tfa":
-                    tfa = target.get("tfa")
-                    locator = context.locator(f'[data-tfa="{tfa}"]')
-
-                # Strategy 6: CSS selector (fallback; accept css_name/css_id from model)
-                elif by in ("css", "css_name", "css_id"):
-                    selector = _normalize_css_selector(by, target)
-                    locator = context.locator(selector) if selector else None
-
-                # Strategy 7: XPath (last resort)
-                elif by == "xpath":
-                    xpath = target.get("xpath")
-                    locator = context.locator(f"xpath={xpath}")
+                locator = _build_target_locator(context, target, mode="click")
 
                 if not locator:
                     last_error_msg = f"Impossibile creare locator per strategia '{by}'"
@@ -990,94 +1446,30 @@ class PlaywrightTools:
                         break  # Ultima strategia - esci
 
                 # CLICK VELOCE - 2 tentativi (scroll+normale → JS)
-                # Try 1: SCROLL + CLICK NORMALE (preferito)
                 try:
-                    first = locator.first
-                    # Scroll nel viewport se necessario (menu lunghi, side nav, toolbar compressa)
-                    try:
-                        await first.scroll_into_view_if_needed()
-                    except Exception:
-                        # Se lo scroll fallisce non bloccare il test: prova comunque a cliccare
-                        pass
-
-                    await first.click(timeout=timeout_per_try)
-
-                    # Scope detection: se il locator matcha più elementi, trova il container
-                    # padre disambiguante per generare un locator scoped nel codegen.
-                    # Es: page.locator('card-group').last.get_by_role('button', name='Aggiungi filtro')
-                    scope_info = None
-                    try:
-                        count = await locator.count()
-                        if count > 1:
-                            element = await first.element_handle(timeout=1000)
-                            if element:
-                                scope_selectors = AppConfig.UI.get_scope_detection_selectors()
-                                scope_info = await element.evaluate(
-                                    f"""
-                                    el => {{
-                                        const scopeSelectors = {json.dumps(list(scope_selectors))};
-                                        let current = el.parentElement;
-                                        while (current && current !== document.body) {{
-                                            for (const sel of scopeSelectors) {{
-                                                try {{
-                                                    if (current.matches(sel)) {{
-                                                        const all = document.querySelectorAll(sel);
-                                                        const idx = Array.from(all).indexOf(current);
-                                                        return {{
-                                                            selector: sel,
-                                                            index: idx,
-                                                            total: all.length
-                                                        }};
-                                                    }}
-                                                }} catch(e) {{}}
-                                            }}
-                                            current = current.parentElement;
-                                        }}
-                                        return null;
-                                    }}
-                                    """
-                                )
-                    except Exception:
-                        # Scope detection è best-effort: se fallisce non blocca il test
-                        pass
-
+                    click_type, scope_info = await self._perform_click(
+                        locator,
+                        timeout_per_try,
+                        # Log solo per prima strategia
+                        log_label=f"Strategy {idx+1}/{len(targets)} ({by})" if idx == 0 else None,
+                    )
                     return_target = dict(target)
                     if scope_info:
                         return_target["scope"] = scope_info
 
                     return {
                         "status": "success",
-                        "message": f"Clicked using {by}",
+                        "message": (
+                            f"Clicked using {by}"
+                            if click_type == "normal"
+                            else f"Clicked (JS) using {by}"
+                        ),
                         "strategy": by,
                         "target": return_target,
-                        "click_type": "normal",
+                        "click_type": click_type,
                         "strategies_tried": strategies_tried,
                         "fallback_used": idx > 0,
                     }
-                except Exception as click_error:
-                    # Click normale fallito - prova JS
-                    error_msg = str(click_error)[:100]
-                    if idx == 0:  # Log solo per prima strategia
-                        print(
-                            f"   Strategy {idx+1}/{len(targets)} ({by}): normal click failed"
-                        )
-
-                # Try 2: JAVASCRIPT CLICK (fallback per strategia corrente)
-                try:
-                    element = await locator.first.element_handle(
-                        timeout=timeout_per_try
-                    )
-                    if element:
-                        await element.evaluate("el => el.click()")
-                        return {
-                            "status": "success",
-                            "message": f"Clicked (JS) using {by}",
-                            "strategy": by,
-                            "target": dict(target),
-                            "click_type": "js",
-                            "strategies_tried": strategies_tried,
-                            "fallback_used": idx > 0,
-                        }
                 except Exception as js_error:
                     last_error_msg = str(js_error)[:100]
                     # Se non è l'ultima strategia, continua con la prossima
@@ -1107,6 +1499,7 @@ class PlaywrightTools:
         timeout_per_try: int = AppConfig.AGENT.DEFAULT_TIMEOUT_PER_TRY,
         clear_first=True,
         in_iframe: dict = None,
+        race: bool = None,
     ) -> dict:
         """
         Compila input con fallback chain automatico - prova tutte le strategie fino al successo.
@@ -1126,6 +1519,9 @@ class PlaywrightTools:
             in_iframe: dict per iframe (singolo o annidati)
                 - Singolo: {"selector": "..."} o {"url_pattern": "..."}
                 - Annidati: {"iframe_path": [{"url_pattern": "..."}, {"selector": "..."}]}
+            race: se True risolve tutte le strategie in parallelo (un solo timeout_per_try
+                  complessivo) e agisce sulla più prioritaria attached+visible+enabled.
+                  None → AppConfig.AGENT.RACE_STRATEGIES (default False).
 
         Returns:
             dict con status, strategia usata, strategie provate
@@ -1157,12 +1553,19 @@ class PlaywrightTools:
         if not self.page:
             return {"status": "error", "message": "Browser non avviato"}
 
+        self._invalidate_inspect_cache()
+
         if not targets or len(targets) == 0:
             return {
                 "status": "error",
                 "message": "Nessuna strategia fornita (targets vuoto)",
             }
 
+        # Id corti del formato compatto di inspect → strategie complete
+        targets, in_iframe, ref_error = self._expand_element_refs(targets, in_iframe)
+        if ref_error:
+            return {"status": "error", "message": ref_error}
+
         # Accept both flat targets and raw playwright_suggestions wrappers
         targets = _normalize_targets_for_mode(targets, mode="fill")
 
@@ -1176,6 +1579,33 @@ class PlaywrightTools:
                 return frame_result
             context = frame_result["frame"]
 
+        # Riordino per esito storico (store locator), poi racing o fallback chain
+        # Chiave elemento calcolata una volta sui targets originali (riordino e registrazione)
+        elem_key = element_key(targets, "fill")
+        targets = await self._locator_stats_reorder(targets, elem_key)
+        started = time.perf_counter()
+        if race is None:
+            race = AppConfig.AGENT.RACE_STRATEGIES
+        if race and len(targets) > 1:
+            result = await self._fill_smart_race(
+                context, targets, value, timeout_per_try, clear_first
+            )
+        else:
+            result = await self._fill_smart_chain(
+                context, targets, value, timeout_per_try, clear_first
+            )
+        await self._locator_stats_record(targets, elem_key, result, started)
+        return result
+
+    async def _fill_smart_chain(
+        self,
+        context,
+        targets: List[Dict],
+        value: str,
+        timeout_per_try: int,
+        clear_first: bool,
+    ) -> dict:
+        """Fallback chain sequenziale di fill_smart."""
         # FALLBACK CHAIN: prova tutte le strategie fino al successo
         strategies_tried = []
         last_error_msg = ""
@@ -1185,24 +1615,8 @@ class PlaywrightTools:
             strategies_tried.append(by)
 
             try:
-                locator = None
-
-                # Stesse strategie di click_smart
-                if by == "role":
-                    locator = context.get_by_role(
-                        target.get("role"), name=target.get("name")
-                    )
-                elif by == "label":
-                    locator = context.get_by_label(target.get("label"))
-                elif by == "placeholder":
-                    locator = context.get_by_placeholder(target.get("placeholder"))
-                elif by == "tfa":
-                    locator = context.locator(f'[data-tfa="{target.get("tfa")}"]')
-                elif by in ("css", "css_name", "css_id"):
-                    selector = _normalize_css_selector(by, target)
-                    locator = context.locator(selector) if selector else None
-                elif by == "xpath":
-                    locator = context.locator(f"xpath={target.get('xpath')}")
+                # Stesse strategie di click_smart (senza by=text)
+                locator = _build_target_locator(context, target, mode="fill")
 
                 if not locator:
                     last_error_msg = f"Impossibile creare locator per strategia '{by}'"
@@ -1212,52 +1626,10 @@ class PlaywrightTools:
                         break  # Ultima strategia - esci
 
                 # FILL
-                
                 try:
-                    # Clear first (se possibile)
-                    if clear_first:
-                        try:
-                            await locator.first.clear(timeout=timeout_per_try)
-                        except:
-                            # Se clear fallisce (input readonly), continua
-                            pass
-
-                    # Fill
-                    await locator.first.fill(value, timeout=timeout_per_try)
-
-                    # Scope detection: se il locator matcha più elementi, trova il container
-                    # padre disambiguante per generare un locator scoped nel codegen.
-                    scope_info = None
-                    try:
-                        count = await locator.count()
-                        if count > 1:
-                            element = await locator.first.element_handle(timeout=1000)
-                            if element:
-                                scope_selectors = AppConfig.UI.get_scope_detection_selectors()
-                                scope_info = await element.evaluate(
-                                    f"""
-                                    el => {{
-                                        const scopeSelectors = {json.dumps(list(scope_selectors))};
-                                        let current = el.parentElement;
-                                        while (current && current !== document.body) {{
-                                            for (const sel of scopeSelectors) {{
-                                                try {{
-                                                    if (current.matches(sel)) {{
-                                                        const all = document.querySelectorAll(sel);
-                                                        const idx = Array.from(all).indexOf(current);
-                                                        return {{ selector: sel, index: idx, total: all.length }};
-                                                    }}
-                                                }} catch(e) {{}}
-                                            }}
-                                            current = current.parentElement;
-                                        }}
-                                        return null;
-                                    }}
-                                    """
-                                )
-                    except Exception:
-                        # Scope detection è best-effort: se fallisce non blocca il fill
-                        pass
+                    scope_info = await self._perform_fill(
+                        locator, value, timeout_per_try, clear_first
+                    )
 
                     return_target = dict(target)
                     if scope_info:
@@ -1288,50 +1660,647 @@ class PlaywrightTools:
                 if idx < len(targets) - 1:
                     continue
 
+        # Tutte le strategie fallite
+        return {
+            "status": "error",
+            "message": f"All {len(strategies_tried)} strategies failed. Last error: {last_error_msg}",
+            "strategies_tried": strategies_tried,
+            "last_error": last_error_msg,
+        }
+
     # =====================================================================
-    # INSPECTION - Scansione elementi interattivi (per smart/advanced)
+    # SMART LOCATORS - helper condivisi (azione, scope detection, racing)
     # =====================================================================
 
-    async def inspect_interactive_elements(self, in_iframe: dict = None):
+    async def _locator_stats_reorder(self, targets: List[Dict], elem_key: Optional[str]) -> List[Dict]:
         """
-        Scansiona TUTTI gli elementi interattivi della pagina usando solo standard web.
-        Trova: iframe, button, link, input, select, textarea, checkbox, radio, switch, tabs + ARIA roles.
-        Estrae: accessible_name, aria-label, role, testo visibile, checked state, options.
-
-        Preferisce standard WCAG (role/label/text). Se presente, include anche `data-tfa`
-        come fallback "test id" (utile in app corporate) ma con priorità più bassa.
-
-        Blocchi custom senza role (es. KPI circolari): il set dei candidati è il nucleo
-        HTML/WCAG più il registro `PlaywrightConfig.get_inspect_extra_clickable_selectors()`
-        (.env `INSPECT_EXTRA_CLICKABLE_SELECTORS` e default in settings).
-
-        Args:
-            in_iframe: opzionale dict per ispezionare l'interno di un iframe invece
-                       della pagina principale. Stessa semantica usata da altri tool:
-                       {"url_pattern": "..."} oppure {"selector": "..."} oppure
-                       {"iframe_path": [{...}, {...}]} per iframe annidati.
-
-        Returns:
-            dict con:
-            - iframes: Liste iframe con src/name
-            - clickable_elements: Button, link, menu items → click_smart strategies
-            - interactive_controls: Checkbox, radio, switch, tabs, select → click_smart strategies
-            - form_fields: Text input, password, email, textarea → fill_smart strategies
-            - page_info: URL, title
+        Riordina i targets con lo store persistente (no-op se disattivato/errore). La
+        query SQLite gira in un thread, come le scritture, per non bloccare il loop.
+        """
+        store = get_locator_stats_store()
+        if not store or not self.page or not elem_key or len(targets) < 2:
+            return targets
+        try:
+            return await asyncio.to_thread(
+                store.reorder, origin_of(self.page.url), targets, elem_key
+            )
+        except Exception as e:
+            print(f"Locator stats reorder fallito: {e}")
+            return targets
 
-        Example:
-            result = await inspect_interactive_elements()
-            # Returns: {"iframes": [...], "clickable_elements": [...],
-            #           "interactive_controls": [...], "form_fields": [...]}
+    async def _locator_stats_record(
+        self, targets: List[Dict], elem_key: Optional[str], result: dict, started: float
+    ):
         """
+        Registra l'esito di click_smart/fill_smart: le strategie provate prima della
+        vincente sono fallimenti. La latenza viene registrata solo quando è attribuibile
+        alla strategia vincente (primo tentativo o racing). Il commit SQLite gira in un
+        thread per non bloccare il loop.
+        """
+        store = get_locator_stats_store()
+        tried = result.get("strategies_tried")
+        if not store or not self.page or not tried:
+            return
+        origin = origin_of(self.page.url)
         try:
-            if not self.page:
-                return {"status": "error", "message": "Browser non avviato"}
+            if result.get("status") == "success":
+                winner = len(tried) - 1
+                latency_ms = None
+                if winner == 0 or result.get("race"):
+                    latency_ms = (time.perf_counter() - started) * 1000
+                await asyncio.to_thread(
+                    store.record,
+                    origin,
+                    elem_key,
+                    failed=targets[:winner],
+                    succeeded=targets[winner],
+                    latency_ms=latency_ms,
+                )
+            else:
+                await asyncio.to_thread(
+                    store.record, origin, elem_key, failed=targets[: len(tried)]
+                )
+        except Exception as e:
+            print(f"Locator stats record fallito: {e}")
 
-            # Determina il contesto: pagina principale o iframe selezionato
-            context = self.page
-            page_url = self.page.url
-            page_title = await self.page.title()
+    async def _detect_scope(self, locator) -> Optional[dict]:
+        """
+        Scope detection: se il locator matcha più elementi, trova il container
+        padre disambiguante per generare un locator scoped nel codegen.
+        Es: page.locator('card-group').last.get_by_role('button', name='Aggiungi filtro')
+        Best-effort: se fallisce ritorna None senza bloccare il test.
+        """
+        try:
+            count = await locator.count()
+            if count > 1:
+                element = await locator.first.element_handle(timeout=1000)
+                if element:
+                    scope_selectors = AppConfig.UI.get_scope_detection_selectors()
+                    return await element.evaluate(
+                        _SCOPE_DETECTION_JS, list(scope_selectors)
+                    )
+        except Exception:
+            pass
+        return None
+
+    async def _perform_click(self, locator, timeout_per_try: int, log_label: str = None):
+        """
+        Click in 2 tentativi: scroll + click normale (preferito) → click JS.
+        Ritorna (click_type, scope_info); solleva l'errore del click JS se falliscono entrambi.
+        """
+        first = locator.first
+        try:
+            # Scroll nel viewport se necessario (menu lunghi, side nav, toolbar compressa).
+            # Attende anche che l'elemento sia attached/stabile: è la fase "locator_wait".
+            try:
+                with timed_phase("locator_wait"):
+                    await first.scroll_into_view_if_needed()
+            except Exception:
+                # Se lo scroll fallisce non bloccare il test: prova comunque a cliccare
+                pass
+
+            with timed_phase("action"):
+                await first.click(timeout=timeout_per_try)
+            return "normal", await self._detect_scope(locator)
+        except Exception:
+            # Click normale fallito - prova JS
+            if log_label:
+                print(f"   {log_label}: normal click failed")
+
+        with timed_phase("action"):
+            element = await first.element_handle(timeout=timeout_per_try)
+            if not element:
+                raise RuntimeError("Elemento non disponibile per click JS")
+            await element.evaluate("el => el.click()")
+        return "js", None
+
+    async def _perform_fill(
+        self, locator, value: str, timeout_per_try: int, clear_first: bool
+    ) -> Optional[dict]:
+        """Clear (best-effort) + fill sul primo match. Ritorna scope_info."""
+        with timed_phase("action"):
+            if clear_first:
+                try:
+                    await locator.first.clear(timeout=timeout_per_try)
+                except Exception:
+                    # Se clear fallisce (input readonly), continua
+                    pass
+            await locator.first.fill(value, timeout=timeout_per_try)
+        return await self._detect_scope(locator)
+
+    async def _race_targets(
+        self, context, targets: List[Dict], mode: str, timeout_per_try: int
+    ):
+        """
+        Risolve in parallelo tutti i locator e attende che siano attached + visible + enabled
+        (+ editable per fill), entro un unico timeout_per_try complessivo.
+
+        Vince la strategia più prioritaria (ordine dei targets) pronta: quando una
+        meno prioritaria è pronta, le precedenti ancora pendenti hanno RACE_GRACE_MS
+        per diventarlo anche loro.
+
+        Returns:
+            (indici pronti in ordine di priorità, ultimo errore)
+        """
+        loop = asyncio.get_running_loop()
+        results: Dict[int, bool] = {}
+        last_error = ""
+
+        async def probe(locator):
+            first = locator.first
+            await first.wait_for(state="visible", timeout=timeout_per_try)
+            if not await first.is_enabled(timeout=timeout_per_try):
+                raise RuntimeError("Elemento visibile ma disabilitato")
+            if mode == "fill" and not await first.is_editable(timeout=timeout_per_try):
+                raise RuntimeError("Elemento visibile ma non editabile")
+
+        tasks = {}
+        for idx, target in enumerate(targets):
+            try:
+                locator = _build_target_locator(context, target, mode=mode)
+            except Exception as e:
+                locator = None
+                last_error = str(e)[:150]
+            if locator is None:
+                results[idx] = False
+                if not last_error:
+                    last_error = (
+                        f"Impossibile creare locator per strategia '{target.get('by')}'"
+                    )
+                continue
+            tasks[asyncio.ensure_future(probe(locator))] = idx
+
+        pending = set(tasks)
+        grace_deadline = None
+        try:
+            while True:
+                # Decidibile: prima strategia (in ordine) ancora non fallita è pronta
+                for idx in range(len(targets)):
+                    if idx not in results:
+                        break
+                    if results[idx]:
+                        return [i for i in sorted(results) if results[i]], last_error
+                if not pending:
+                    break
+
+                wait_timeout = None
+                if grace_deadline is not None:
+                    wait_timeout = max(0.0, grace_deadline - loop.time())
+                done, pending = await asyncio.wait(
+                    pending, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Finestra di grazia scaduta: vince la più prioritaria già pronta
+                    break
+                for task in done:
+                    idx = tasks[task]
+                    error = task.exception()
+                    results[idx] = error is None
+                    if error is not None:
+                        last_error = str(error)[:150]
+                if grace_deadline is None and any(results.values()):
+                    grace_deadline = loop.time() + AppConfig.AGENT.RACE_GRACE_MS / 1000
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return [i for i in sorted(results) if results[i]], last_error
+
+    async def _click_smart_race(
+        self, context, targets: List[Dict], timeout_per_try: int
+    ) -> dict:
+        """click_smart in modalità racing (stesso formato di risposta della fallback chain)."""
+        with timed_phase("locator_wait"):
+            ready, last_error_msg = await self._race_targets(
+                context, targets, "click", timeout_per_try
+            )
+        for idx in ready:
+            target = targets[idx]
+            by = target.get("by")
+            try:
+                locator = _build_target_locator(context, target, mode="click")
+                click_type, scope_info = await self._perform_click(
+                    locator, timeout_per_try
+                )
+            except Exception as e:
+                last_error_msg = str(e)[:100]
+                print(f"   Race winner {idx+1}/{len(targets)} ({by}): failed, trying next...")
+                continue
+
+            return_target = dict(target)
+            if scope_info:
+                return_target["scope"] = scope_info
+            return {
+                "status": "success",
+                "message": (
+                    f"Clicked using {by}"
+                    if click_type == "normal"
+                    else f"Clicked (JS) using {by}"
+                ),
+                "strategy": by,
+                "target": return_target,
+                "click_type": click_type,
+                # Stessa semantica della chain: le strategie più prioritarie sono "provate" e fallite
+                "strategies_tried": [t.get("by") for t in targets[: idx + 1]],
+                "fallback_used": idx > 0,
+                "race": True,
+            }
+
+        strategies_tried = [t.get("by") for t in targets]
+        return {
+            "status": "error",
+            "message": f"All {len(strategies_tried)} strategies failed. Last error: {last_error_msg}",
+            "strategies_tried": strategies_tried,
+            "last_error": last_error_msg,
+            "race": True,
+        }
+
+    async def _fill_smart_race(
+        self,
+        context,
+        targets: List[Dict],
+        value: str,
+        timeout_per_try: int,
+        clear_first: bool,
+    ) -> dict:
+        """fill_smart in modalità racing (stesso formato di risposta della fallback chain)."""
+        with timed_phase("locator_wait"):
+            ready, last_error_msg = await self._race_targets(
+                context, targets, "fill", timeout_per_try
+            )
+        for idx in ready:
+            target = targets[idx]
+            by = target.get("by")
+            try:
+                locator = _build_target_locator(context, target, mode="fill")
+                scope_info = await self._perform_fill(
+                    locator, value, timeout_per_try, clear_first
+                )
+            except Exception as e:
+                last_error_msg = str(e)[:150]
+                print(f"   Race winner {idx+1}/{len(targets)} ({by}): failed, trying next...")
+                continue
+
+            return_target = dict(target)
+            if scope_info:
+                return_target["scope"] = scope_info
+            return {
+                "status": "success",
+                "message": f"Filled using {by}",
+                "strategy": by,
+                "target": return_target,
+                "value_length": len(value),
+                "strategies_tried": [t.get("by") for t in targets[: idx + 1]],
+                "fallback_used": idx > 0,
+                "race": True,
+            }
+
+        strategies_tried = [t.get("by") for t in targets]
+        return {
+            "status": "error",
+            "message": f"All {len(strategies_tried)} strategies failed. Last error: {last_error_msg}",
+            "strategies_tried": strategies_tried,
+            "last_error": last_error_msg,
+            "race": True,
+        }
+
+    # =====================================================================
+    # INSPECT CACHE - Generazione DOM per frame (MutationObserver in-page)
+    # =====================================================================
+
+    def _reset_inspect_cache(self):
+        """Azzera cache inspect, generazioni per frame e contatori."""
+        self._inspect_cache: Dict = {}
+        self._dom_generation: Dict = {}
+        self._tracked_frames = set()
+        self._inspect_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+        # Frame risolti da get_frame: spec in_iframe normalizzata -> (Frame, metadata)
+        self._frame_cache: Dict[str, dict] = {}
+        self._frame_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+        # Sessione CDP della pagina per il backend AX (creata al primo inspect)
+        self._ax_session = None
+        # Snapshot per inspect_token (output incrementale con since)
+        self._inspect_snapshots = InspectSnapshots()
+
+    async def _install_dom_generation_tracking(self):
+        """
+        Installa nel contesto la binding + init script che notificano le mutazioni DOM.
+        Va chiamato prima di aprire la pagina: lo script gira in ogni nuovo documento/frame.
+        """
+        if not AppConfig.PLAYWRIGHT.INSPECT_CACHE_ENABLED or not self.context:
+            return
+        await self.context.expose_binding(DOM_GENERATION_BINDING, self._on_dom_mutated)
+        await self.context.add_init_script(DOM_GENERATION_INIT_JS)
+
+    def _attach_frame_listeners(self, page):
+        if not (
+            AppConfig.PLAYWRIGHT.INSPECT_CACHE_ENABLED or AppConfig.PLAYWRIGHT.FRAME_CACHE_ENABLED
+        ):
+            return
+        page.on("framenavigated", self._on_frame_navigated)
+        page.on("framedetached", self._on_frame_detached)
+
+    def _on_dom_mutated(self, source, generation=None):
+        """Callback della binding in-page: il DOM del frame sorgente è cambiato."""
+        frame = source.get("frame") if isinstance(source, dict) else None
+        if frame is None:
+            return
+        self._tracked_frames.add(frame)
+        self._dom_generation[frame] = self._dom_generation.get(frame, 0) + 1
+
+    def _on_frame_navigated(self, frame):
+        self._dom_generation[frame] = self._dom_generation.get(frame, 0) + 1
+        self._invalidate_frame_cache(frame)
+
+    def _on_frame_detached(self, frame):
+        self._invalidate_frame_cache(frame)
+        self._tracked_frames.discard(frame)
+        self._dom_generation.pop(frame, None)
+        for key in [k for k in self._inspect_cache if k[0] is frame]:
+            self._inspect_cache.pop(key, None)
+
+    def _invalidate_inspect_cache(self):
+        """Chiamato dai tool che agiscono sulla pagina: copre il ritardo della notifica in-page."""
+        if self._inspect_cache:
+            self._inspect_cache.clear()
+            self._inspect_cache_stats["invalidations"] += 1
+
+    @staticmethod
+    def _frame_of(context):
+        return context.main_frame if hasattr(context, "main_frame") else context
+
+    def _inspect_cache_get(self, context, root_selector: Optional[str]):
+        """Ritorna una copia del risultato in cache (con cached=True) se il DOM non è cambiato."""
+        if not AppConfig.PLAYWRIGHT.INSPECT_CACHE_ENABLED:
+            return None
+        frame = self._frame_of(context)
+        entry = self._inspect_cache.get((frame, root_selector))
+        if entry and entry[0] == self._dom_generation.get(frame, 0):
+            self._inspect_cache_stats["hits"] += 1
+            result = copy.deepcopy(entry[1])
+            result["cached"] = True
+            return result
+        self._inspect_cache_stats["misses"] += 1
+        return None
+
+    def _inspect_cache_generation(self, context) -> int:
+        return self._dom_generation.get(self._frame_of(context), 0)
+
+    def _inspect_cache_put(
+        self, context, root_selector: Optional[str], generation: int, result: dict
+    ):
+        """
+        Salva il risultato solo se il frame è tracciato dall'observer in-page e la
+        generazione non è cambiata durante l'harvest.
+        """
+        if not AppConfig.PLAYWRIGHT.INSPECT_CACHE_ENABLED:
+            return
+        frame = self._frame_of(context)
+        if frame not in self._tracked_frames:
+            return
+        if generation != self._dom_generation.get(frame, 0):
+            return
+        self._inspect_cache[(frame, root_selector)] = (generation, copy.deepcopy(result))
+
+    def get_inspect_cache_stats(self) -> dict:
+        """Contatori hit/miss/invalidazioni della cache inspect (per tuning)."""
+        stats = dict(self._inspect_cache_stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "status": "success",
+            "enabled": AppConfig.PLAYWRIGHT.INSPECT_CACHE_ENABLED,
+            **stats,
+            "entries": len(self._inspect_cache),
+            "tracked_frames": len(self._tracked_frames),
+            "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+            "frame_cache": {
+                "enabled": AppConfig.PLAYWRIGHT.FRAME_CACHE_ENABLED,
+                **self._frame_cache_stats,
+                "entries": len(self._frame_cache),
+            },
+        }
+
+    # =====================================================================
+    # FRAME CACHE - Frame risolti da get_frame (invalidati da navigazione/detach)
+    # =====================================================================
+
+    @staticmethod
+    def _frame_cache_key(
+        selector: Optional[str], url_pattern: Optional[str], iframe_path: Optional[list]
+    ) -> str:
+        """Chiave normalizzata della spec in_iframe (stessa spec → stesso frame)."""
+        if iframe_path:
+            spec = [
+                {k: level[k] for k in ("selector", "url_pattern") if level.get(k)}
+                for level in iframe_path
+            ]
+        else:
+            spec = {"selector": selector, "url_pattern": url_pattern}
+        return json.dumps(spec, sort_keys=True)
+
+    def _frame_cache_get(self, key: str) -> Optional[dict]:
+        if not AppConfig.PLAYWRIGHT.FRAME_CACHE_ENABLED:
+            return None
+        entry = self._frame_cache.get(key)
+        if entry is not None and not entry["frame"].is_detached():
+            self._frame_cache_stats["hits"] += 1
+            return entry
+        if entry is not None:
+            self._frame_cache.pop(key, None)
+        self._frame_cache_stats["misses"] += 1
+        return None
+
+    def _frame_cache_put(self, key: str, frame, result: dict):
+        if AppConfig.PLAYWRIGHT.FRAME_CACHE_ENABLED:
+            self._frame_cache[key] = {"frame": frame, "result": dict(result)}
+
+    def _invalidate_frame_cache(self, frame):
+        """Rimuove le entry del frame navigato/staccato e dei frame annidati al suo interno."""
+        stale = []
+        for key, entry in self._frame_cache.items():
+            current = entry["frame"]
+            while current is not None:
+                if current is frame:
+                    stale.append(key)
+                    break
+                current = current.parent_frame
+        for key in stale:
+            self._frame_cache.pop(key, None)
+        if stale:
+            self._frame_cache_stats["invalidations"] += 1
+
+    def _maybe_compact_inspect(
+        self,
+        result: dict,
+        in_iframe: Optional[dict],
+        compact: Optional[bool],
+        max_elements: Optional[int],
+        max_chars: Optional[int],
+    ) -> dict:
+        """
+        Applica (se richiesto) il formato compatto al risultato di inspect_* e
+        registra gli id (chiavi stabili degli elementi) per click_smart/fill_smart. Il risultato verbose in
+        cache non viene modificato.
+        """
+        if compact is None:
+            compact = AppConfig.PLAYWRIGHT.INSPECT_COMPACT
+        if not compact or result.get("status") != "success":
+            return result
+        compact_result, refs = compact_inspect_result(
+            result,
+            max_elements=max_elements or AppConfig.PLAYWRIGHT.INSPECT_MAX_ELEMENTS,
+            max_chars=max_chars or AppConfig.PLAYWRIGHT.INSPECT_MAX_CHARS,
+            in_iframe=in_iframe,
+        )
+        # Gli id valgono fino al prossimo inspect compatto
+        self._element_refs = refs
+        return compact_result
+
+    def _finish_inspect(
+        self,
+        result: dict,
+        in_iframe: Optional[dict],
+        root_selector: Optional[str],
+        since: Optional[str],
+        compact: Optional[bool],
+        max_elements: Optional[int],
+        max_chars: Optional[int],
+    ) -> dict:
+        """
+        Chiavi stabili per elemento + inspect_token; con `since` valido sullo stesso ambito
+        restituisce solo aggiunti/rimossi/cambiati (vedi agent/inspect_diff.py), altrimenti
+        il risultato completo con since_ignored. Infine il formato compatto, se richiesto.
+        """
+        if result.get("status") != "success":
+            return result
+        result, index = add_element_keys(result)
+        scope = InspectSnapshots.scope(root_selector, in_iframe)
+        old_index, since_ignored = (
+            self._inspect_snapshots.get(since, scope) if since else (None, None)
+        )
+        token = self._inspect_snapshots.put(scope, index)
+
+        if old_index is None:
+            result["inspect_token"] = token
+            if since_ignored:
+                result["since_ignored"] = since_ignored
+            return self._maybe_compact_inspect(result, in_iframe, compact, max_elements, max_chars)
+
+        diff = diff_inspect(result, old_index, index, since)
+        diff["inspect_token"] = token
+        if compact is None:
+            compact = AppConfig.PLAYWRIGHT.INSPECT_COMPACT
+        if not compact:
+            return diff
+        # Id = chiavi stabili (come nell'inspect compatto completo): validi per tutti gli
+        # elementi correnti, anche quelli invariati e quindi non elencati nel diff
+        self._element_refs = key_refs(index, in_iframe)
+        return compact_diff_result(
+            diff,
+            max_elements=max_elements or AppConfig.PLAYWRIGHT.INSPECT_MAX_ELEMENTS,
+            max_chars=max_chars or AppConfig.PLAYWRIGHT.INSPECT_MAX_CHARS,
+        )
+
+    def _expand_element_refs(
+        self, targets: List[Dict], in_iframe: Optional[dict]
+    ) -> Tuple[Optional[List[Dict]], Optional[dict], Optional[str]]:
+        """
+        Espande i target {"by": "ref", "ref": "<id>"} nelle strategie dell'ultimo inspect
+        compatto. Se in_iframe non è passato usa quello dell'inspect che ha prodotto l'id.
+        Returns: (targets, in_iframe, messaggio d'errore o None)
+        """
+        expanded, ref_iframe, error = expand_ref_targets(targets, self._element_refs)
+        if error:
+            return None, in_iframe, error
+        return expanded, in_iframe or ref_iframe, None
+
+    # =====================================================================
+    # INSPECTION - Scansione elementi interattivi (per smart/advanced)
+    # =====================================================================
+
+    async def inspect_interactive_elements(
+        self,
+        in_iframe: dict = None,
+        compact: bool = None,
+        max_elements: int = None,
+        max_chars: int = None,
+        backend: str = None,
+        since: str = None,
+    ):
+        """
+        Scansiona TUTTI gli elementi interattivi della pagina usando solo standard web.
+        Trova: iframe, button, link, input, select, textarea, checkbox, radio, switch, tabs + ARIA roles.
+        Estrae: accessible_name, aria-label, role, testo visibile, checked state, options.
+
+        Preferisce standard WCAG (role/label/text). Se presente, include anche `data-tfa`
+        come fallback "test id" (utile in app corporate) ma con priorità più bassa.
+
+        Blocchi custom senza role (es. KPI circolari): il set dei candidati è il nucleo
+        HTML/WCAG più il registro `PlaywrightConfig.get_inspect_extra_clickable_selectors()`
+        (.env `INSPECT_EXTRA_CLICKABLE_SELECTORS` e default in settings).
+
+        La raccolta dati avviene con un solo script in-page per frame (vedi agent/dom_harvest.py);
+        in Python restano solo la costruzione delle suggestions e il formato di output.
+
+        Args:
+            in_iframe: opzionale dict per ispezionare l'interno di un iframe invece
+                       della pagina principale. Stessa semantica usata da altri tool:
+                       {"url_pattern": "..."} oppure {"selector": "..."} oppure
+                       {"iframe_path": [{...}, {...}]} per iframe annidati.
+            compact: True → formato compatto per l'LLM (vedi agent/inspect_compact.py):
+                     una riga per elemento con id = chiave stabile (es. "c32275e button
+                     \"Salva\"") da passare a click_smart/fill_smart come
+                     {"by": "ref", "ref": "c32275e"}; stessi id nei diff con since.
+                     None → PlaywrightConfig.INSPECT_COMPACT (default False).
+            max_elements / max_chars: budget rigido del formato compatto (righe / caratteri);
+                     None → PlaywrightConfig.INSPECT_MAX_ELEMENTS / INSPECT_MAX_CHARS.
+            backend: "dom" (script in-page) o "ax" (albero di accessibilità calcolato da
+                     Chromium via CDP, vedi agent/ax_inspect.py); None → PLAYWRIGHT_INSPECT_BACKEND.
+                     Se l'albero AX non è leggibile si usa il backend DOM (backend_fallback).
+            since: inspect_token di un inspect precedente sullo stesso ambito: restituisce
+                   solo gli elementi aggiunti/cambiati (completi) e le chiavi dei rimossi
+                   (vedi agent/inspect_diff.py). Token sconosciuto/scaduto o di un altro
+                   ambito → risultato completo con since_ignored.
+
+        Returns:
+            dict con (ogni elemento ha una chiave stabile `key`, più inspect_token):
+            - iframes: Liste iframe con src/name
+            - clickable_elements: Button, link, menu items → click_smart strategies
+            - interactive_controls: Checkbox, radio, switch, tabs, select → click_smart strategies
+            - form_fields: Text input, password, email, textarea → fill_smart strategies
+            - page_info: URL, title
+
+        Example:
+            result = await inspect_interactive_elements()
+            # Returns: {"iframes": [...], "clickable_elements": [...],
+            #           "interactive_controls": [...], "form_fields": [...]}
+        """
+        result = await self._inspect_interactive_elements(in_iframe=in_iframe, backend=backend)
+        return self._finish_inspect(
+            result, in_iframe, None, since, compact, max_elements, max_chars
+        )
+
+    async def _inspect_interactive_elements(self, in_iframe: dict = None, backend: str = None) -> dict:
+        """Ispezione completa (formato verbose, con cache); vedi inspect_interactive_elements."""
+        try:
+            if not self.page:
+                return {"status": "error", "message": "Browser non avviato"}
+            backend = (backend or AppConfig.PLAYWRIGHT.INSPECT_BACKEND or "dom").strip().lower()
+            if backend not in INSPECT_BACKENDS:
+                return {
+                    "status": "error",
+                    "message": f"backend '{backend}' non valido (ammessi: {', '.join(INSPECT_BACKENDS)})",
+                }
+            cache_key = _AX_CACHE_KEY if backend == "ax" else None
+
+            # Determina il contesto: pagina principale o iframe selezionato
+            context = self.page
+            if not in_iframe:
+                cached = self._inspect_cache_get(context, cache_key)
+                if cached:
+                    return cached
+            page_url = self.page.url
+            page_title = await self.page.title()
 
             if in_iframe:
                 # Usa get_frame per individuare il frame corretto (singolo o annidato)
@@ -1350,524 +2319,36 @@ class PlaywrightTools:
                 page_url = frame_result.get("frame_url") or getattr(
                     context, "url", page_url
                 )
+                cached = self._inspect_cache_get(context, cache_key)
+                if cached:
+                    return cached
                 try:
                     page_title = await context.title()
                 except Exception:
                     # Alcuni frame potrebbero non avere titolo accessibile
                     pass
 
-            # === 1. IFRAME (nel contesto corrente) ===
-            iframes = await context.locator("iframe").all()
-            iframe_info = []
+            generation = self._inspect_cache_generation(context)
 
-            for idx, iframe in enumerate(iframes):
+            fallback_reason = None
+            raw = None
+            if backend == "ax":
                 try:
-                    src = await iframe.get_attribute("src") or ""
-                    title = await iframe.get_attribute("title") or ""
-                    name = await iframe.get_attribute("name") or ""
-
-                    iframe_info.append(
-                        {
-                            "index": idx,
-                            "src": src,
-                            "title": title,
-                            "name": name,
-                            "selector": (
-                                f"iframe[src*='{src.split('/')[-1][:30]}']"
-                                if src
-                                else f"iframe >> nth={idx}"
-                            ),
-                        }
-                    )
-                except Exception as e:
-                    print(f"Error inspecting iframe {idx}: {e}")
-                    continue
-
-            # === 2. ELEMENTI CLICCABILI ===
-            clickable_selector = _build_clickable_selector_for_inspect()
-            clickables = await context.locator(clickable_selector).all()
-            clickable_info = []
-
-            for idx, elem in enumerate(clickables):
-                try:
-                    tag = await elem.evaluate("el => el.tagName.toLowerCase()")
-                    accessible_name = await elem.evaluate(
-                        """
-                        el => {
-                            if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
-                            if (el.getAttribute('aria-labelledby')) {
-                                const labelId = el.getAttribute('aria-labelledby');
-                                const labelEl = document.getElementById(labelId);
-                                if (labelEl) return labelEl.textContent.trim();
-                            }
-                            if (el.textContent && el.textContent.trim()) return el.textContent.trim();
-                            if (el.title) return el.title;
-                            if (el.value) return el.value;
-                            return null;
-                        }
-                    """
-                    )
-                    role = await elem.get_attribute("role")
-                    aria_label = await elem.get_attribute("aria-label")
-                    data_tfa = await elem.get_attribute("data-tfa")
-                    effective_role = (
-                        role
-                        if role
-                        else {"button": "button", "a": "link", "input": "button"}.get(
-                            tag, None
-                        )
-                    )
-                    visible_text = ""
-                    try:
-                        visible_text = await elem.inner_text()
-                        visible_text = visible_text.strip()[:100]
-                    except Exception:
-                        pass
-                    suggestions = []
-                    # KPI dashboard cerchi: div senza role; il titolo navigabile è in h4 (es. "Campioni con Check-in")
-                    if tag == "div":
-                        kpi_heading = await elem.evaluate(
-                            """
-                            el => {
-                                if (!el.classList || !el.classList.contains('circle-card')
-                                    || !el.classList.contains('pointer')) return null;
-                                const h4 = el.querySelector('h4');
-                                return h4 ? h4.textContent.trim() : null;
-                            }
-                            """
-                        )
-                        if kpi_heading:
-                            suggestions.append(
-                                {
-                                    "strategy": "text_kpi_heading",
-                                    "click_smart": {
-                                        "by": "text",
-                                        "text": kpi_heading,
-                                    },
-                                }
-                            )
-                    if effective_role and accessible_name:
-                        clean_name = _strip_material_icon_prefix(accessible_name)
-                        suggestions.append(
-                            {
-                                "strategy": "role",
-                                "click_smart": {
-                                    "by": "role",
-                                    "role": effective_role,
-                                    "name": clean_name,
-                                },
-                            }
-                        )
-                    if aria_label:
-                        suggestions.append(
-                            {
-                                "strategy": "css_aria",
-                                "click_smart": {
-                                    "by": "css",
-                                    "selector": f'[aria-label="{aria_label}"]',
-                                },
-                            }
-                        )
-                    # Icon+label buttons (e.g. "add\n\nAGGIUNGI FILTRO"): add text with label only first,
-                    # so get_by_text("AGGIUNGI FILTRO") is tried before the full string (which often times out).
-                    if visible_text and "\n" in visible_text:
-                        parts = [
-                            p.strip() for p in visible_text.split("\n") if p.strip()
-                        ]
-                        if parts:
-                            label_only = parts[-1]
-                            if (
-                                len(label_only) >= 2
-                                and label_only != visible_text.strip()
-                            ):
-                                suggestions.append(
-                                    {
-                                        "strategy": "text",
-                                        "click_smart": {
-                                            "by": "text",
-                                            "text": label_only,
-                                        },
-                                    }
-                                )
-                    if visible_text:
-                        suggestions.append(
-                            {
-                                "strategy": "text",
-                                "click_smart": {"by": "text", "text": visible_text},
-                            }
-                        )
-                    if data_tfa:
-                        suggestions.append(
-                            {
-                                "strategy": "tfa",
-                                "click_smart": {"by": "tfa", "tfa": data_tfa},
-                            }
-                        )
-                    clickable_info.append(
-                        {
-                            "index": idx,
-                            "tag": tag,
-                            "role": effective_role,
-                            "accessible_name": accessible_name,
-                            "text": visible_text,
-                            "aria_label": aria_label,
-                            "data_tfa": data_tfa,
-                            "playwright_suggestions": suggestions,
-                        }
-                    )
+                    raw = await self._harvest_ax(context)
                 except Exception as e:
-                    print(f"Error inspecting clickable {idx}: {e}")
-                    continue
-
-            # === 2b. RIGHE DI TABELLA CLICCABILI (euristica per liste campioni) ===
-            try:
-                row_selector = (
-                    "table tbody tr, tr[role='row'], .mat-row, .mat-mdc-row, .cdk-row"
+                    fallback_reason = f"albero AX non disponibile: {e}"
+            if raw is None:
+                # === HARVEST: un solo round-trip per frame (iframe, cliccabili, righe, campi, controlli) ===
+                raw = await harvest_document(
+                    context, harvest_options(_build_clickable_selector_for_inspect())
                 )
-                rows = await context.locator(row_selector).all()
-                base_index = len(clickable_info)
-                for r_idx, row in enumerate(rows):
-                    try:
-                        # Salta eventuali righe di intestazione
-                        in_header = await row.evaluate("el => !!el.closest('thead')")
-                        if in_header:
-                            continue
-
-                        full_text = ""
-                        try:
-                            full_text = await row.inner_text()
-                        except Exception:
-                            pass
-                        if not full_text:
-                            continue
-
-                        # Normalizza e tronca il testo per usarlo come "nome" riga
-                        normalized = " ".join(full_text.split()).strip()
-                        if not normalized:
-                            continue
-                        short_text = normalized[:200]
-
-                        suggestions = []
-                        # Costruisce un selettore CSS stabile basato sulla posizione nella tbody
-                        nth_selector = await row.evaluate(
-                            """
-                            (el) => {
-                                const table = el.closest('table');
-                                if (!table) return null;
-                                const rows = Array.from(table.querySelectorAll('tbody tr'));
-                                const index = rows.indexOf(el);
-                                if (index < 0) return null;
-                                return `tbody tr:nth-of-type(${index + 1})`;
-                            }
-                            """
-                        )
-                        if nth_selector:
-                            suggestions.append(
-                                {
-                                    "strategy": "css_row",
-                                    "click_smart": {
-                                        "by": "css",
-                                        "selector": nth_selector,
-                                    },
-                                }
-                            )
-
-                        clickable_info.append(
-                            {
-                                "index": base_index + r_idx,
-                                "tag": "tr",
-                                "role": "row",
-                                "accessible_name": short_text,
-                                "text": short_text,
-                                "aria_label": None,
-                                "data_tfa": None,
-                                "playwright_suggestions": suggestions,
-                            }
-                        )
-                    except Exception as e:
-                        print(f"Error inspecting table row {r_idx}: {e}")
-                        continue
-            except Exception as e:
-                print(f"Error inspecting table rows: {e}")
-
-            # === 3. FORM FIELDS ===
-            form_fields = await context.locator("input, select, textarea").all()
-            field_info = []
-            for idx, field in enumerate(form_fields):
-                try:
-                    tag = await field.evaluate("el => el.tagName.toLowerCase()")
-                    field_type = (
-                        await field.get_attribute("type") if tag == "input" else tag
-                    )
-                    accessible_name = await field.evaluate(
-                        """
-                        el => {
-                            if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
-                            if (el.id) {
-                                const label = document.querySelector(`label[for="${el.id}"]`);
-                                if (label) return label.textContent.trim();
-                            }
-                            if (el.placeholder) return el.placeholder;
-                            if (el.name) return el.name;
-                            return null;
-                        }
-                    """
-                    )
-                    aria_label = await field.get_attribute("aria-label")
-                    placeholder = await field.get_attribute("placeholder") or ""
-                    name = await field.get_attribute("name") or ""
-                    input_id = await field.get_attribute("id") or ""
-                    suggestions = []
-                    if accessible_name:
-                        suggestions.append(
-                            {
-                                "strategy": "label",
-                                "fill_smart": {"by": "label", "label": accessible_name},
-                            }
-                        )
-                    if placeholder:
-                        suggestions.append(
-                            {
-                                "strategy": "placeholder",
-                                "fill_smart": {
-                                    "by": "placeholder",
-                                    "placeholder": placeholder,
-                                },
-                            }
-                        )
-                    if field_type:
-                        role_map = {
-                            "text": "textbox",
-                            "email": "textbox",
-                            "password": "textbox",
-                            "search": "searchbox",
-                            "tel": "textbox",
-                            "url": "textbox",
-                            "select": "combobox",
-                            "textarea": "textbox",
-                        }
-                        role_name = role_map.get(field_type)
-                        if role_name and accessible_name:
-                            suggestions.append(
-                                {
-                                    "strategy": "role",
-                                    "fill_smart": {
-                                        "by": "role",
-                                        "role": role_name,
-                                        "name": accessible_name,
-                                    },
-                                }
-                            )
-                    if name:
-                        suggestions.append(
-                            {
-                                "strategy": "css_name",
-                                "fill_smart": {
-                                    "by": "css",
-                                    "selector": f'[name="{name}"]',
-                                },
-                            }
-                        )
-                    if input_id:
-                        suggestions.append(
-                            {
-                                "strategy": "css_id",
-                                "fill_smart": {"by": "css", "selector": f"#{input_id}"},
-                            }
-                        )
-                    if aria_label:
-                        suggestions.append(
-                            {
-                                "strategy": "css_aria",
-                                "fill_smart": {
-                                    "by": "css",
-                                    "selector": f'[aria-label="{aria_label}"]',
-                                },
-                            }
-                        )
-                    data_tfa = await field.get_attribute("data-tfa")
-                    if data_tfa:
-                        suggestions.append(
-                            {
-                                "strategy": "tfa",
-                                "fill_smart": {"by": "tfa", "tfa": data_tfa},
-                            }
-                        )
-                    field_info.append(
-                        {
-                            "index": idx,
-                            "tag": tag,
-                            "type": field_type,
-                            "accessible_name": accessible_name,
-                            "aria_label": aria_label,
-                            "placeholder": placeholder,
-                            "name": name,
-                            "id": input_id,
-                            "playwright_suggestions": suggestions,
-                        }
-                    )
-                except Exception as e:
-                    print(f"Error inspecting field {idx}: {e}")
-                    continue
-
-            # === 4. INTERACTIVE CONTROLS ===
-            interactive_selector = """
-                input[type='checkbox'], input[type='radio'], select, input[type='file'],
-                input[type='range'], input[type='color'],
-                [role='checkbox'], [role='radio'], [role='switch'], [role='tab'], [role='combobox']
-            """
-            interactives = await context.locator(interactive_selector).all()
-            interactive_info = []
-            for idx, elem in enumerate(interactives):
-                try:
-                    tag = await elem.evaluate("el => el.tagName.toLowerCase()")
-                    elem_type = (
-                        await elem.get_attribute("type") if tag == "input" else tag
-                    )
-                    role = await elem.get_attribute("role")
-                    effective_type = role if role else elem_type
-                    accessible_name = await elem.evaluate(
-                        """
-                        el => {
-                            if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
-                            if (el.id) {
-                                const label = document.querySelector(`label[for="${el.id}"]`);
-                                if (label) return label.textContent.trim();
-                            }
-                            if (el.getAttribute('aria-labelledby')) {
-                                const labelId = el.getAttribute('aria-labelledby');
-                                const labelEl = document.getElementById(labelId);
-                                if (labelEl) return labelEl.textContent.trim();
-                            }
-                            if (el.title) return el.title;
-                            if (el.name) return el.name;
-                            return null;
-                        }
-                    """
-                    )
-                    aria_label = await elem.get_attribute("aria-label")
-                    name = await elem.get_attribute("name") or ""
-                    elem_id = await elem.get_attribute("id") or ""
-                    data_tfa = await elem.get_attribute("data-tfa")
-                    checked = None
-                    if effective_type in ["checkbox", "radio", "switch"]:
-                        checked = await elem.is_checked()
-                    selected = None
-                    if effective_type == "tab":
-                        selected = await elem.get_attribute("aria-selected") == "true"
-                    options = []
-                    if tag == "select":
-                        option_elements = await elem.locator("option").all()
-                        for opt in option_elements:
-                            opt_text = await opt.inner_text()
-                            opt_value = await opt.get_attribute("value")
-                            options.append(
-                                {"text": opt_text.strip(), "value": opt_value}
-                            )
-                    suggestions = []
-                    if effective_type in ["checkbox", "radio", "switch", "tab"]:
-                        if accessible_name:
-                            suggestions.append(
-                                {
-                                    "strategy": "role",
-                                    "click_smart": {
-                                        "by": "role",
-                                        "role": effective_type,
-                                        "name": accessible_name,
-                                    },
-                                }
-                            )
-                        if accessible_name and tag == "input":
-                            suggestions.append(
-                                {
-                                    "strategy": "label",
-                                    "click_smart": {
-                                        "by": "label",
-                                        "label": accessible_name,
-                                    },
-                                }
-                            )
-                        if accessible_name:
-                            suggestions.append(
-                                {
-                                    "strategy": "text",
-                                    "click_smart": {
-                                        "by": "text",
-                                        "text": accessible_name,
-                                    },
-                                }
-                            )
-                        if aria_label:
-                            suggestions.append(
-                                {
-                                    "strategy": "css_aria",
-                                    "click_smart": {
-                                        "by": "css",
-                                        "selector": f'[aria-label="{aria_label}"]',
-                                    },
-                                }
-                            )
-                        if name:
-                            suggestions.append(
-                                {
-                                    "strategy": "css_name",
-                                    "click_smart": {
-                                        "by": "css",
-                                        "selector": f'[name="{name}"]',
-                                    },
-                                }
-                            )
-                        if data_tfa:
-                            suggestions.append(
-                                {
-                                    "strategy": "tfa",
-                                    "click_smart": {"by": "tfa", "tfa": data_tfa},
-                                }
-                            )
-                    elif tag == "select":
-                        suggestions.append(
-                            {
-                                "strategy": "note",
-                                "action": "select_option",
-                                "message": "Use fill_smart with value, or click_smart to open dropdown then click option",
-                            }
-                        )
-                    elif elem_type == "file":
-                        suggestions.append(
-                            {
-                                "strategy": "note",
-                                "action": "set_input_files",
-                                "message": "File upload requires dedicated tool (not yet implemented)",
-                            }
-                        )
-                    elif elem_type in ["range", "color"] and accessible_name:
-                        suggestions.append(
-                            {
-                                "strategy": "fill",
-                                "fill_smart": {"by": "label", "label": accessible_name},
-                            }
-                        )
-                    interactive_info.append(
-                        {
-                            "index": idx,
-                            "tag": tag,
-                            "type": effective_type,
-                            "accessible_name": accessible_name,
-                            "aria_label": aria_label,
-                            "name": name,
-                            "id": elem_id,
-                            "data_tfa": data_tfa,
-                            "checked": checked,
-                            "selected": selected,
-                            "options": options if options else None,
-                            "playwright_suggestions": suggestions,
-                        }
-                    )
-                except Exception as e:
-                    print(f"Error inspecting interactive {idx}: {e}")
-                    continue
+            sections = build_inspect_sections(raw)
+            iframe_info = sections["iframes"]
+            clickable_info = sections["clickable_elements"]
+            field_info = sections["form_fields"]
+            interactive_info = sections["interactive_controls"]
 
-            return {
+            result = {
                 "status": "success",
                 "message": f"Found: {len(iframe_info)} iframes, {len(clickable_info)} clickable, {len(interactive_info)} interactive controls, {len(field_info)} form fields",
                 "page_info": {"url": page_url, "title": page_title},
@@ -1876,10 +2357,55 @@ class PlaywrightTools:
                 "interactive_controls": interactive_info,
                 "form_fields": field_info,
             }
+            if backend == "ax":
+                result["backend"] = "dom" if fallback_reason else "ax"
+                if fallback_reason:
+                    result["backend_fallback"] = fallback_reason
+            self._inspect_cache_put(context, cache_key, generation, result)
+            return result
         except Exception as e:
             return {"status": "error", "message": f"Error inspecting page: {str(e)}"}
 
-    async def inspect_region(self, root_selector: str, in_iframe: dict = None) -> dict:
+    async def _harvest_ax(self, context) -> Dict[str, list]:
+        """
+        Dati grezzi dall'albero di accessibilità (2 chiamate CDP per frame) più i blocchi
+        del registro extra senza ruolo, raccolti in-page come nel backend DOM.
+        """
+        if self._ax_session is None:
+            self._ax_session = await self.context.new_cdp_session(self.page)
+        frame = None if context is self.page else context
+        try:
+            session, frame_id, owned = await frame_session(
+                self.context, self.page, frame, self._ax_session
+            )
+            try:
+                raw = await ax_harvest(session, frame_id)
+            finally:
+                if owned:
+                    await session.detach()
+        except Exception:
+            # al prossimo inspect una sessione nuova (questa può essere stata staccata)
+            stale, self._ax_session = self._ax_session, None
+            try:
+                await stale.detach()
+            except Exception:
+                pass
+            raise
+        extra = extra_clickable_selector(AppConfig.UI.get_inspect_extra_clickable_selectors())
+        if extra:
+            extras = await harvest_document(context, {"clickable": extra})
+            raw["clickables"].extend(extras.get("clickables") or [])
+        return raw
+
+    async def inspect_region(
+        self,
+        root_selector: str,
+        in_iframe: dict = None,
+        compact: bool = None,
+        max_elements: int = None,
+        max_chars: int = None,
+        since: str = None,
+    ) -> dict:
         """
         Come inspect_interactive_elements, ma limitato a una REGIONE specifica della pagina.
 
@@ -1889,14 +2415,28 @@ class PlaywrightTools:
         - campi form
         all'interno di quel contenitore.
 
-        Utile insieme a wait_for_dom_change per evitare di riscanalizzare l'intera pagina.
+        Utile insieme a wait_for_dom_change per evitare di riscanalizzare l'intera pagina:
+        con since=<inspect_token> del precedente inspect_region sullo stesso root_selector
+        restituisce solo ciò che è cambiato.
+        compact / max_elements / max_chars / since: come in inspect_interactive_elements.
         """
+        result = await self._inspect_region(root_selector, in_iframe=in_iframe)
+        return self._finish_inspect(
+            result, in_iframe, root_selector, since, compact, max_elements, max_chars
+        )
+
+    async def _inspect_region(self, root_selector: str, in_iframe: dict = None) -> dict:
+        """Ispezione di una regione (formato verbose, con cache); vedi inspect_region."""
         try:
             if not self.page:
                 return {"status": "error", "message": "Browser non avviato"}
 
             # Determina il contesto: pagina principale o iframe selezionato
             context = self.page
+            if not in_iframe:
+                cached = self._inspect_cache_get(context, root_selector)
+                if cached:
+                    return cached
             page_url = self.page.url
             page_title = await self.page.title()
 
@@ -1915,11 +2455,16 @@ class PlaywrightTools:
                 page_url = frame_result.get("frame_url") or getattr(
                     context, "url", page_url
                 )
+                cached = self._inspect_cache_get(context, root_selector)
+                if cached:
+                    return cached
                 try:
                     page_title = await context.title()
                 except Exception:
                     pass
 
+            generation = self._inspect_cache_generation(context)
+
             # Trova il contenitore radice
             try:
                 root = context.locator(root_selector).first
@@ -1936,8 +2481,10 @@ class PlaywrightTools:
                 # Fallback: se il contenuto è "inline" (non in dialog), root_selector può non esistere.
                 # Per non bloccare l'esecuzione, degradamo automaticamente a una ispezione globale.
                 try:
-                    global_result = await self.inspect_interactive_elements(in_iframe=in_iframe)
+                    global_result = await self._inspect_interactive_elements(in_iframe=in_iframe)
                     if isinstance(global_result, dict) and global_result.get("status") == "success":
+                        # copia: il risultato globale può essere quello in cache
+                        global_result = dict(global_result)
                         global_result["fallback_used"] = True
                         global_result["root_selector_missing"] = True
                         global_result["fallback_from"] = root_selector
@@ -1954,485 +2501,19 @@ class PlaywrightTools:
                     "message": f"Contenitore non trovato per selector '{root_selector}'",
                 }
 
-            # === 1. ELEMENTI CLICCABILI NELLA REGIONE ===
-            clickable_selector = _build_clickable_selector_for_inspect()
-            clickables = await root.locator(clickable_selector).all()
-            clickable_info = []
-
-            for idx, elem in enumerate(clickables):
-                try:
-                    tag = await elem.evaluate("el => el.tagName.toLowerCase()")
-                    accessible_name = await elem.evaluate(
-                        """
-                        el => {
-                            if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
-                            if (el.getAttribute('aria-labelledby')) {
-                                const labelId = el.getAttribute('aria-labelledby');
-                                const labelEl = document.getElementById(labelId);
-                                if (labelEl) return labelEl.textContent.trim();
-                            }
-                            if (el.textContent && el.textContent.trim()) return el.textContent.trim();
-                            if (el.title) return el.title;
-                            if (el.value) return el.value;
-                            return null;
-                        }
-                    """
-                    )
-                    role = await elem.get_attribute("role")
-                    aria_label = await elem.get_attribute("aria-label")
-                    data_tfa = await elem.get_attribute("data-tfa")
-                    effective_role = (
-                        role
-                        if role
-                        else {"button": "button", "a": "link", "input": "button"}.get(
-                            tag, None
-                        )
-                    )
-                    visible_text = ""
-                    try:
-                        visible_text = await elem.inner_text()
-                        visible_text = visible_text.strip()[:100]
-                    except Exception:
-                        pass
-                    suggestions = []
-                    if tag == "div":
-                        kpi_heading = await elem.evaluate(
-                            """
-                            el => {
-                                if (!el.classList || !el.classList.contains('circle-card')
-                                    || !el.classList.contains('pointer')) return null;
-                                const h4 = el.querySelector('h4');
-                                return h4 ? h4.textContent.trim() : null;
-                            }
-                            """
-                        )
-                        if kpi_heading:
-                            suggestions.append(
-                                {
-                                    "strategy": "text_kpi_heading",
-                                    "click_smart": {
-                                        "by": "text",
-                                        "text": kpi_heading,
-                                    },
-                                }
-                            )
-                    if effective_role and accessible_name:
-                        clean_name = _strip_material_icon_prefix(accessible_name)
-                        suggestions.append(
-                            {
-                                "strategy": "role",
-                                "click_smart": {
-                                    "by": "role",
-                                    "role": effective_role,
-                                    "name": clean_name,
-                                },
-                            }
-                        )
-                    if aria_label:
-                        suggestions.append(
-                            {
-                                "strategy": "css_aria",
-                                "click_smart": {
-                                    "by": "css",
-                                    "selector": f'[aria-label="{aria_label}"]',
-                                },
-                            }
-                        )
-                    if visible_text and "\n" in visible_text:
-                        parts = [
-                            p.strip() for p in visible_text.split("\n") if p.strip()
-                        ]
-                        if parts:
-                            label_only = parts[-1]
-                            if (
-                                len(label_only) >= 2
-                                and label_only != visible_text.strip()
-                            ):
-                                suggestions.append(
-                                    {
-                                        "strategy": "text",
-                                        "click_smart": {
-                                            "by": "text",
-                                            "text": label_only,
-                                        },
-                                    }
-                                )
-                    if visible_text:
-                        suggestions.append(
-                            {
-                                "strategy": "text",
-                                "click_smart": {"by": "text", "text": visible_text},
-                            }
-                        )
-                    if data_tfa:
-                        suggestions.append(
-                            {
-                                "strategy": "tfa",
-                                "click_smart": {"by": "tfa", "tfa": data_tfa},
-                            }
-                        )
-                    clickable_info.append(
-                        {
-                            "index": idx,
-                            "tag": tag,
-                            "role": effective_role,
-                            "accessible_name": accessible_name,
-                            "text": visible_text,
-                            "aria_label": aria_label,
-                            "data_tfa": data_tfa,
-                            "playwright_suggestions": suggestions,
-                        }
-                    )
-                except Exception as e:
-                    print(f"Error inspecting regional clickable {idx}: {e}")
-                    continue
-
-            # === 1b. RIGHE DI TABELLA CLICCABILI NELLA REGIONE (euristica per liste campioni) ===
-            try:
-                row_selector = (
-                    "table tbody tr, tr[role='row'], .mat-row, .mat-mdc-row, .cdk-row"
-                )
-                rows = await root.locator(row_selector).all()
-                base_index = len(clickable_info)
-                for r_idx, row in enumerate(rows):
-                    try:
-                        in_header = await row.evaluate("el => !!el.closest('thead')")
-                        if in_header:
-                            continue
-
-                        full_text = ""
-                        try:
-                            full_text = await row.inner_text()
-                        except Exception:
-                            pass
-                        if not full_text:
-                            continue
-
-                        normalized = " ".join(full_text.split()).strip()
-                        if not normalized:
-                            continue
-                        short_text = normalized[:200]
-
-                        suggestions = []
-                        nth_selector = await row.evaluate(
-                            """
-                            (el) => {
-                                const table = el.closest('table');
-                                if (!table) return null;
-                                const rows = Array.from(table.querySelectorAll('tbody tr'));
-                                const index = rows.indexOf(el);
-                                if (index < 0) return null;
-                                return `tbody tr:nth-of-type(${index + 1})`;
-                            }
-                            """
-                        )
-                        if nth_selector:
-                            suggestions.append(
-                                {
-                                    "strategy": "css_row",
-                                    "click_smart": {
-                                        "by": "css",
-                                        "selector": nth_selector,
-                                    },
-                                }
-                            )
-
-                        clickable_info.append(
-                            {
-                                "index": base_index + r_idx,
-                                "tag": "tr",
-                                "role": "row",
-                                "accessible_name": short_text,
-                                "text": short_text,
-                                "aria_label": None,
-                                "data_tfa": None,
-                                "playwright_suggestions": suggestions,
-                            }
-                        )
-                    except Exception as e:
-                        print(f"Error inspecting table row in region {r_idx}: {e}")
-                        continue
-            except Exception as e:
-                print(f"Error inspecting table rows in region: {e}")
-
-            # === 2. FORM FIELDS NELLA REGIONE ===
-            form_fields = await root.locator("input, select, textarea").all()
-            field_info = []
-            for idx, field in enumerate(form_fields):
-                try:
-                    tag = await field.evaluate("el => el.tagName.toLowerCase()")
-                    field_type = (
-                        await field.get_attribute("type") if tag == "input" else tag
-                    )
-                    accessible_name = await field.evaluate(
-                        """
-                        el => {
-                            if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
-                            if (el.id) {
-                                const label = document.querySelector(`label[for="${el.id}"]`);
-                                if (label) return label.textContent.trim();
-                            }
-                            if (el.placeholder) return el.placeholder;
-                            if (el.name) return el.name;
-                            return null;
-                        }
-                    """
-                    )
-                    aria_label = await field.get_attribute("aria-label")
-                    placeholder = await field.get_attribute("placeholder") or ""
-                    name = await field.get_attribute("name") or ""
-                    input_id = await field.get_attribute("id") or ""
-                    suggestions = []
-                    if accessible_name:
-                        suggestions.append(
-                            {
-                                "strategy": "label",
-                                "fill_smart": {"by": "label", "label": accessible_name},
-                            }
-                        )
-                    if placeholder:
-                        suggestions.append(
-                            {
-                                "strategy": "placeholder",
-                                "fill_smart": {
-                                    "by": "placeholder",
-                                    "placeholder": placeholder,
-                                },
-                            }
-                        )
-                    if field_type:
-                        role_map = {
-                            "text": "textbox",
-                            "email": "textbox",
-                            "password": "textbox",
-                            "search": "searchbox",
-                            "tel": "textbox",
-                            "url": "textbox",
-                            "select": "combobox",
-                            "textarea": "textbox",
-                        }
-                        role_name = role_map.get(field_type)
-                        if role_name and accessible_name:
-                            suggestions.append(
-                                {
-                                    "strategy": "role",
-                                    "fill_smart": {
-                                        "by": "role",
-                                        "role": role_name,
-                                        "name": accessible_name,
-                                    },
-                                }
-                            )
-                    if name:
-                        suggestions.append(
-                            {
-                                "strategy": "css_name",
-                                "fill_smart": {
-                                    "by": "css",
-                                    "selector": f'[name="{name}"]',
-                                },
-                            }
-                        )
-                    if input_id:
-                        suggestions.append(
-                            {
-                                "strategy": "css_id",
-                                "fill_smart": {"by": "css", "selector": f"#{input_id}"},
-                            }
-                        )
-                    if aria_label:
-                        suggestions.append(
-                            {
-                                "strategy": "css_aria",
-                                "fill_smart": {
-                                    "by": "css",
-                                    "selector": f'[aria-label="{aria_label}"]',
-                                },
-                            }
-                        )
-                    data_tfa = await field.get_attribute("data-tfa")
-                    if data_tfa:
-                        suggestions.append(
-                            {
-                                "strategy": "tfa",
-                                "fill_smart": {"by": "tfa", "tfa": data_tfa},
-                            }
-                        )
-                    field_info.append(
-                        {
-                            "index": idx,
-                            "tag": tag,
-                            "type": field_type,
-                            "accessible_name": accessible_name,
-                            "aria_label": aria_label,
-                            "placeholder": placeholder,
-                            "name": name,
-                            "id": input_id,
-                            "playwright_suggestions": suggestions,
-                        }
-                    )
-                except Exception as e:
-                    print(f"Error inspecting regional field {idx}: {e}")
-                    continue
-
-            # === 3. CONTROLLI INTERATTIVI NELLA REGIONE ===
-            interactive_selector = """
-                input[type='checkbox'], input[type='radio'], select, input[type='file'],
-                input[type='range'], input[type='color'],
-                [role='checkbox'], [role='radio'], [role='switch'], [role='tab'], [role='combobox']
-            """
-            interactives = await root.locator(interactive_selector).all()
-            interactive_info = []
-            for idx, elem in enumerate(interactives):
-                try:
-                    tag = await elem.evaluate("el => el.tagName.toLowerCase()")
-                    elem_type = (
-                        await elem.get_attribute("type") if tag == "input" else tag
-                    )
-                    role = await elem.get_attribute("role")
-                    effective_type = role if role else elem_type
-                    accessible_name = await elem.evaluate(
-                        """
-                        el => {
-                            if (el.getAttribute('aria-label')) return el.getAttribute('aria-label');
-                            if (el.id) {
-                                const label = document.querySelector(`label[for="${el.id}"]`);
-                                if (label) return label.textContent.trim();
-                            }
-                            if (el.getAttribute('aria-labelledby')) {
-                                const labelId = el.getAttribute('aria-labelledby');
-                                const labelEl = document.getElementById(labelId);
-                                if (labelEl) return labelEl.textContent.trim();
-                            }
-                            if (el.title) return el.title;
-                            if (el.name) return el.name;
-                            return null;
-                        }
-                    """
-                    )
-                    aria_label = await elem.get_attribute("aria-label")
-                    name = await elem.get_attribute("name") or ""
-                    elem_id = await elem.get_attribute("id") or ""
-                    data_tfa = await elem.get_attribute("data-tfa")
-                    checked = None
-                    if effective_type in ["checkbox", "radio", "switch"]:
-                        checked = await elem.is_checked()
-                    selected = None
-                    if effective_type == "tab":
-                        selected = await elem.get_attribute("aria-selected") == "true"
-                    options = []
-                    if tag == "select":
-                        option_elements = await elem.locator("option").all()
-                        for opt in option_elements:
-                            opt_text = await opt.inner_text()
-                            opt_value = await opt.get_attribute("value")
-                            options.append(
-                                {"text": opt_text.strip(), "value": opt_value}
-                            )
-                    suggestions = []
-                    if effective_type in ["checkbox", "radio", "switch", "tab"]:
-                        if accessible_name:
-                            suggestions.append(
-                                {
-                                    "strategy": "role",
-                                    "click_smart": {
-                                        "by": "role",
-                                        "role": effective_type,
-                                        "name": accessible_name,
-                                    },
-                                }
-                            )
-                        if accessible_name and tag == "input":
-                            suggestions.append(
-                                {
-                                    "strategy": "label",
-                                    "click_smart": {
-                                        "by": "label",
-                                        "label": accessible_name,
-                                    },
-                                }
-                            )
-                        if accessible_name:
-                            suggestions.append(
-                                {
-                                    "strategy": "text",
-                                    "click_smart": {
-                                        "by": "text",
-                                        "text": accessible_name,
-                                    },
-                                }
-                            )
-                        if aria_label:
-                            suggestions.append(
-                                {
-                                    "strategy": "css_aria",
-                                    "click_smart": {
-                                        "by": "css",
-                                        "selector": f'[aria-label="{aria_label}"]',
-                                    },
-                                }
-                            )
-                        if name:
-                            suggestions.append(
-                                {
-                                    "strategy": "css_name",
-                                    "click_smart": {
-                                        "by": "css",
-                                        "selector": f'[name="{name}"]',
-                                    },
-                                }
-                            )
-                        if data_tfa:
-                            suggestions.append(
-                                {
-                                    "strategy": "tfa",
-                                    "click_smart": {"by": "tfa", "tfa": data_tfa},
-                                }
-                            )
-                    elif tag == "select":
-                        suggestions.append(
-                            {
-                                "strategy": "note",
-                                "action": "select_option",
-                                "message": "Use fill_smart with value, or click_smart to open dropdown then click option",
-                            }
-                        )
-                    elif elem_type == "file":
-                        suggestions.append(
-                            {
-                                "strategy": "note",
-                                "action": "set_input_files",
-                                "message": "File upload requires dedicated tool (not yet implemented)",
-                            }
-                        )
-                    elif elem_type in ["range", "color"] and accessible_name:
-                        suggestions.append(
-                            {
-                                "strategy": "fill",
-                                "fill_smart": {"by": "label", "label": accessible_name},
-                            }
-                        )
-                    interactive_info.append(
-                        {
-                            "index": idx,
-                            "tag": tag,
-                            "type": effective_type,
-                            "accessible_name": accessible_name,
-                            "aria_label": aria_label,
-                            "name": name,
-                            "id": elem_id,
-                            "data_tfa": data_tfa,
-                            "checked": checked,
-                            "selected": selected,
-                            "options": options if options else None,
-                            "playwright_suggestions": suggestions,
-                        }
-                    )
-                except Exception as e:
-                    print(f"Error inspecting regional interactive {idx}: {e}")
-                    continue
+            # === HARVEST NELLA REGIONE: un solo round-trip con radice il contenitore ===
+            raw = await harvest_element(
+                root,
+                harvest_options(
+                    _build_clickable_selector_for_inspect(), include_iframes=False
+                ),
+            )
+            sections = build_inspect_sections(raw, region=True)
+            clickable_info = sections["clickable_elements"]
+            field_info = sections["form_fields"]
+            interactive_info = sections["interactive_controls"]
 
-            return {
+            result = {
                 "status": "success",
                 "message": f"Region '{root_selector}': {len(clickable_info)} clickable, {len(interactive_info)} interactive controls, {len(field_info)} form fields",
                 "page_info": {"url": page_url, "title": page_title},
@@ -2441,6 +2522,8 @@ class PlaywrightTools:
                 "interactive_controls": interactive_info,
                 "form_fields": field_info,
             }
+            self._inspect_cache_put(context, root_selector, generation, result)
+            return result
         except Exception as e:
             return {
                 "status": "error",
@@ -2451,6 +2534,61 @@ class PlaywrightTools:
     # ADVANCED - Wait by name, cookie banner, composed
     # =====================================================================
 
+    async def _wait_for_visible_match(
+        self, category: str, name_substring: str, timeout: int, case_insensitive: bool,
+        select, control_type: str = None,
+    ):
+        """
+        Motore comune dei wait_for_*_by_name: attende in-page (MutationObserver) un
+        candidato visibile che matcha, poi applica `select(sections)` sugli elementi
+        visibili costruiti come in inspect_interactive_elements.
+        Se la pagina naviga durante l'attesa (contesto distrutto) riprova sul nuovo documento.
+
+        Returns:
+            (elemento selezionato o None, ultimo errore o None)
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout / 1000
+        last_error = None
+
+        while True:
+            remaining_ms = int((deadline - loop.time()) * 1000)
+            if remaining_ms <= 0:
+                return None, last_error
+            try:
+                outcome = await wait_for_match(
+                    self.page,
+                    category=category,
+                    needle=name_substring,
+                    timeout=remaining_ms,
+                    clickable_selector=_build_clickable_selector_for_inspect(),
+                    case_insensitive=case_insensitive,
+                    control_type=control_type,
+                )
+            except Exception as e:
+                last_error = str(e)
+                # Tipicamente "Execution context was destroyed": aspetta il nuovo documento
+                try:
+                    await self.page.wait_for_load_state(
+                        "domcontentloaded", timeout=max(remaining_ms, 1)
+                    )
+                except Exception:
+                    pass
+                await asyncio.sleep(0.05)
+                continue
+
+            if not outcome.get("matched"):
+                return None, last_error
+
+            raw = outcome.get("raw") or {}
+            sections = visible_sections(raw, build_inspect_sections(raw))
+            elem = select(sections)
+            if elem is not None:
+                return elem, None
+            # Predicato in-page e selezione Python possono divergere su casi limite
+            # (es. trim unicode): breve pausa e nuova attesa
+            await asyncio.sleep(0.1)
+
     async def wait_for_clickable_by_name(
         self,
         name_substring: str,
@@ -2458,12 +2596,12 @@ class PlaywrightTools:
         case_insensitive: bool = True,
     ):
         """
-        Aspetta in modo POLLING che compaia un elemento CLICCABILE, usando solo
-        i dati di `inspect_interactive_elements`.
+        Aspetta (event-driven, senza polling) che compaia un elemento CLICCABILE visibile,
+        con gli stessi dati di `inspect_interactive_elements`.
 
         Logica:
-        - chiama ripetutamente `inspect_interactive_elements()` entro `timeout`
-        - guarda tutti i `clickable_elements`
+        - un matcher in-page rivaluta il nome dei candidati a ogni mutazione DOM entro `timeout`
+        - guarda tutti i `clickable_elements` visibili
         - se trova un elemento il cui `accessible_name` o testo visibile contiene
           `name_substring` (case-insensitive di default), lo restituisce subito,
           insieme a tutti i `click_smart` suggeriti.
@@ -2488,8 +2626,6 @@ class PlaywrightTools:
             if res["status"] == "success":
                 await tools.click_smart(res["targets"])
         """
-        import time
-
         if not self.page:
             return {
                 "status": "error",
@@ -2499,81 +2635,71 @@ class PlaywrightTools:
         if timeout is None:
             timeout = AppConfig.PLAYWRIGHT.TIMEOUT
 
-        start = time.time()
         needle = name_substring.lower() if case_insensitive else name_substring
 
-        last_error = None
+        def select(sections):
+            clickables = sections.get("clickable_elements") or []
 
-        while (time.time() - start) * 1000 < timeout:
-            try:
-                result = await self.inspect_interactive_elements()
-                if result.get("status") != "success":
-                    last_error = result.get("message")
-                    await self.page.wait_for_timeout(500)
-                    continue
+            # Prima raccogli tutti i candidati che contengono il testo,
+            # poi scegli il migliore:
+            #   1) match esatto (case-insensitive) se presente
+            #   2) altrimenti il più "vicino" → stringa più corta
+            candidates = []
 
-                clickables = result.get("clickable_elements") or []
-
-                # Prima raccogli tutti i candidati che contengono il testo,
-                # poi scegli il migliore:
-                #   1) match esatto (case-insensitive) se presente
-                #   2) altrimenti il più "vicino" → stringa più corta
-                candidates = []
-
-                for elem in clickables:
-                    raw_name = elem.get("accessible_name") or elem.get("text") or ""
-                    haystack = raw_name.lower() if case_insensitive else raw_name
-
-                    if needle in haystack:
-                        candidates.append(
-                            {
-                                "elem": elem,
-                                "raw_name": raw_name,
-                                "haystack": haystack,
-                                "exact": haystack == needle,
-                            }
-                        )
+            for elem in clickables:
+                raw_name = elem.get("accessible_name") or elem.get("text") or ""
+                haystack = raw_name.lower() if case_insensitive else raw_name
 
-                if candidates:
-                    # 1) Preferisci match esatto
-                    exact_candidates = [c for c in candidates if c["exact"]]
-                    if exact_candidates:
-                        # se ce ne sono più di uno, prendi il più corto
-                        best = min(exact_candidates, key=lambda c: len(c["haystack"]))
-                    else:
-                        # 2) Nessun match esatto → prendi comunque il più corto
-                        best = min(candidates, key=lambda c: len(c["haystack"]))
+                if needle in haystack:
+                    candidates.append(
+                        {
+                            "elem": elem,
+                            "raw_name": raw_name,
+                            "haystack": haystack,
+                            "exact": haystack == needle,
+                        }
+                    )
 
-                    elem = best["elem"]
+            if not candidates:
+                return None
+            # 1) Preferisci match esatto
+            exact_candidates = [c for c in candidates if c["exact"]]
+            if exact_candidates:
+                # se ce ne sono più di uno, prendi il più corto
+                best = min(exact_candidates, key=lambda c: len(c["haystack"]))
+            else:
+                # 2) Nessun match esatto → prendi comunque il più corto
+                best = min(candidates, key=lambda c: len(c["haystack"]))
+            return best["elem"]
 
-                    suggestions = elem.get("playwright_suggestions") or []
-                    targets = [
-                        s["click_smart"]
-                        for s in suggestions
-                        if isinstance(s, dict) and "click_smart" in s
-                    ]
+        elem, last_error = await self._wait_for_visible_match(
+            "clickable", name_substring, timeout, case_insensitive, select
+        )
 
-                    # Fallback: usa role+name se non ci sono suggerimenti espliciti
-                    if not targets and elem.get("role") and elem.get("accessible_name"):
-                        targets = [
-                            {
-                                "by": "role",
-                                "role": elem["role"],
-                                "name": elem["accessible_name"],
-                            }
-                        ]
+        if elem is not None:
+            suggestions = elem.get("playwright_suggestions") or []
+            targets = [
+                s["click_smart"]
+                for s in suggestions
+                if isinstance(s, dict) and "click_smart" in s
+            ]
 
-                    return {
-                        "status": "success",
-                        "message": f"Trovato clickable contenente '{name_substring}'",
-                        "element": elem,
-                        "targets": targets,
+            # Fallback: usa role+name se non ci sono suggerimenti espliciti
+            if not targets and elem.get("role") and elem.get("accessible_name"):
+                targets = [
+                    {
+                        "by": "role",
+                        "role": elem["role"],
+                        "name": elem["accessible_name"],
                     }
+                ]
 
-                await self.page.wait_for_timeout(500)
-            except Exception as e:
-                last_error = str(e)
-                await self.page.wait_for_timeout(500)
+            return {
+                "status": "success",
+                "message": f"Trovato clickable contenente '{name_substring}'",
+                "element": elem,
+                "targets": targets,
+            }
 
         return {
             "status": "error",
@@ -2591,8 +2717,9 @@ class PlaywrightTools:
         case_insensitive: bool = True,
     ):
         """
-        Aspetta in modo POLLING che compaia un CONTROLLO interattivo specifico,
-        usando i dati di `inspect_interactive_elements()["interactive_controls"]`.
+        Aspetta (event-driven, senza polling) che compaia un CONTROLLO interattivo
+        specifico e visibile, con gli stessi dati di
+        `inspect_interactive_elements()["interactive_controls"]`.
 
         È pensato per elementi come:
         - combobox (Angular Material `mat-select`, select HTML, ecc.)
@@ -2623,8 +2750,6 @@ class PlaywrightTools:
             if res["status"] == "success":
                 await tools.click_smart(res["targets"])
         """
-        import time
-
         if not self.page:
             return {
                 "status": "error",
@@ -2634,66 +2759,58 @@ class PlaywrightTools:
         if timeout is None:
             timeout = AppConfig.PLAYWRIGHT.TIMEOUT
 
-        start = time.time()
         needle = name_substring.lower() if case_insensitive else name_substring
         desired_type = control_type.lower() if case_insensitive else control_type
 
-        last_error = None
-
-        while (time.time() - start) * 1000 < timeout:
-            try:
-                result = await self.inspect_interactive_elements()
-                if result.get("status") != "success":
-                    last_error = result.get("message")
-                    await self.page.wait_for_timeout(500)
-                    continue
-
-                controls = result.get("interactive_controls") or []
+        def select(sections):
+            for ctrl in sections.get("interactive_controls") or []:
+                ctrl_type = (
+                    (ctrl.get("type") or "").lower()
+                    if case_insensitive
+                    else (ctrl.get("type") or "")
+                )
+                raw_name = ctrl.get("accessible_name") or ""
+                haystack = raw_name.lower() if case_insensitive else raw_name
+
+                if desired_type == ctrl_type and needle in haystack:
+                    return ctrl
+            return None
+
+        ctrl, last_error = await self._wait_for_visible_match(
+            "control",
+            name_substring,
+            timeout,
+            case_insensitive,
+            select,
+            control_type=control_type,
+        )
 
-                for ctrl in controls:
-                    ctrl_type = (
-                        (ctrl.get("type") or "").lower()
-                        if case_insensitive
-                        else (ctrl.get("type") or "")
-                    )
-                    raw_name = ctrl.get("accessible_name") or ""
-                    haystack = raw_name.lower() if case_insensitive else raw_name
-
-                    if desired_type == ctrl_type and needle in haystack:
-                        suggestions = ctrl.get("playwright_suggestions") or []
-                        targets = [
-                            s["click_smart"]
-                            for s in suggestions
-                            if isinstance(s, dict) and "click_smart" in s
-                        ]
-
-                        # Fallback: prova role+name se non ci sono suggerimenti
-                        if (
-                            not targets
-                            and ctrl.get("type")
-                            and ctrl.get("accessible_name")
-                        ):
-                            targets = [
-                                {
-                                    "by": "role",
-                                    "role": ctrl["type"],
-                                    "name": ctrl["accessible_name"],
-                                }
-                            ]
+        if ctrl is not None:
+            suggestions = ctrl.get("playwright_suggestions") or []
+            targets = [
+                s["click_smart"]
+                for s in suggestions
+                if isinstance(s, dict) and "click_smart" in s
+            ]
 
-                        return {
-                            "status": "success",
-                            "message": (
-                                f"Controllo '{control_type}' contenente '{name_substring}' trovato"
-                            ),
-                            "element": ctrl,
-                            "targets": targets,
-                        }
+            # Fallback: prova role+name se non ci sono suggerimenti
+            if not targets and ctrl.get("type") and ctrl.get("accessible_name"):
+                targets = [
+                    {
+                        "by": "role",
+                        "role": ctrl["type"],
+                        "name": ctrl["accessible_name"],
+                    }
+                ]
 
-                await self.page.wait_for_timeout(500)
-            except Exception as e:
-                last_error = str(e)
-                await self.page.wait_for_timeout(500)
+            return {
+                "status": "success",
+                "message": (
+                    f"Controllo '{control_type}' contenente '{name_substring}' trovato"
+                ),
+                "element": ctrl,
+                "targets": targets,
+            }
 
         return {
             "status": "error",
@@ -2710,8 +2827,9 @@ class PlaywrightTools:
         case_insensitive: bool = True,
     ):
         """
-        Aspetta in modo POLLING che compaia un CAMPO FORM (input/textarea/select),
-        utilizzando `inspect_interactive_elements()["form_fields"]`.
+        Aspetta (event-driven, senza polling) che compaia un CAMPO FORM visibile
+        (input/textarea/select), con gli stessi dati di
+        `inspect_interactive_elements()["form_fields"]`.
 
         Matcha se il campo ha:
         - `accessible_name` che contiene `name_substring`, oppure
@@ -2736,8 +2854,6 @@ class PlaywrightTools:
             if res["status"] == "success":
                 await tools.fill_smart(res["targets"], "vdentato")
         """
-        import time
-
         if not self.page:
             return {
                 "status": "error",
@@ -2747,63 +2863,52 @@ class PlaywrightTools:
         if timeout is None:
             timeout = AppConfig.PLAYWRIGHT.TIMEOUT
 
-        start = time.time()
         needle = name_substring.lower() if case_insensitive else name_substring
 
-        last_error = None
+        def select(sections):
+            for field in sections.get("form_fields") or []:
+                candidates = [
+                    field.get("accessible_name") or "",
+                    field.get("placeholder") or "",
+                    field.get("name") or "",
+                ]
+                haystacks = [c.lower() if case_insensitive else c for c in candidates]
 
-        while (time.time() - start) * 1000 < timeout:
-            try:
-                result = await self.inspect_interactive_elements()
-                if result.get("status") != "success":
-                    last_error = result.get("message")
-                    await self.page.wait_for_timeout(500)
-                    continue
+                if any(needle in h for h in haystacks if h):
+                    return field
+            return None
 
-                fields = result.get("form_fields") or []
+        field, last_error = await self._wait_for_visible_match(
+            "field", name_substring, timeout, case_insensitive, select
+        )
 
-                for field in fields:
-                    candidates = [
-                        field.get("accessible_name") or "",
-                        field.get("placeholder") or "",
-                        field.get("name") or "",
-                    ]
-                    haystacks = [
-                        c.lower() if case_insensitive else c for c in candidates
-                    ]
+        if field is not None:
+            suggestions = field.get("playwright_suggestions") or []
+            targets = [
+                s["fill_smart"]
+                for s in suggestions
+                if isinstance(s, dict) and "fill_smart" in s
+            ]
 
-                    if any(needle in h for h in haystacks if h):
-                        suggestions = field.get("playwright_suggestions") or []
-                        targets = [
-                            s["fill_smart"]
-                            for s in suggestions
-                            if isinstance(s, dict) and "fill_smart" in s
-                        ]
-
-                        # Fallback: se non ci sono suggerimenti, prova con css id/name generico
-                        if not targets:
-                            selector = None
-                            if field.get("id"):
-                                selector = f"#{field['id']}"
-                            elif field.get("name"):
-                                selector = f'[name="{field["name"]}"]'
-
-                            if selector:
-                                targets = [
-                                    {"by": "css", "selector": selector},
-                                ]
+            # Fallback: se non ci sono suggerimenti, prova con css id/name generico
+            if not targets:
+                selector = None
+                if field.get("id"):
+                    selector = f"#{field['id']}"
+                elif field.get("name"):
+                    selector = f'[name="{field["name"]}"]'
 
-                        return {
-                            "status": "success",
-                            "message": f"Campo form contenente '{name_substring}' trovato",
-                            "element": field,
-                            "targets": targets,
-                        }
+                if selector:
+                    targets = [
+                        {"by": "css", "selector": selector},
+                    ]
 
-                await self.page.wait_for_timeout(500)
-            except Exception as e:
-                last_error = str(e)
-                await self.page.wait_for_timeout(500)
+            return {
+                "status": "success",
+                "message": f"Campo form contenente '{name_substring}' trovato",
+                "element": field,
+                "targets": targets,
+            }
 
         return {
             "status": "error",
@@ -2835,6 +2940,8 @@ class PlaywrightTools:
                 "message": "Browser non avviato. Chiama start_browser() prima.",
             }
 
+        self._invalidate_inspect_cache()
+
         # Default: prova tutte le strategie comuni
         if strategies is None:
             strategies = ["generic_accept", "generic_agree"]
@@ -3102,3 +3209,169 @@ class PlaywrightTools:
             "click": click_result,
             "text_check": text_result,
         }
+
+    # =====================================================================
+    # PLAN - Sequenza di azioni eseguita lato server (execute_plan)
+    # =====================================================================
+
+    async def execute_plan(self, actions: List[Dict], guard_timeout: int = None) -> dict:
+        """
+        Esegue in ordine una lista di azioni (click/fill/wait...) con guard per step,
+        fermandosi al primo fallimento. Un sotto-flusso noto (es. login) diventa una
+        sola tool call invece di un turno LLM per azione.
+
+        Args:
+            actions: lista di dict
+                {
+                  "tool": "fill_smart",             # uno di PLAN_ACTION_TOOLS
+                  "args": {...},                    # argomenti del tool
+                  "expect_dom_change": true|"css",  # opz.: mutazione DOM attesa sotto body/selector
+                  "wait_text": "Benvenuto",         # opz.: testo atteso dopo l'azione
+                  "guard_timeout": 10000            # opz.: timeout guard (ms)
+                }
+                I guard usano l'eventuale in_iframe dell'azione.
+            guard_timeout: timeout di default dei guard (ms); None → AppConfig.PLAYWRIGHT.TIMEOUT.
+
+        Returns:
+            dict con status, completed/total, failed_at (indice azione o None) e steps:
+            uno step per azione e per guard, nello schema di evaluation.py
+            ({"type": "tool_end", "tool", "output", "input", "plan_index"}).
+        """
+        if not self.page:
+            return {"status": "error", "message": "Browser non avviato"}
+        if not actions:
+            return {"status": "error", "message": "Piano vuoto (actions vuoto)"}
+
+        # Validazione completa prima di eseguire qualsiasi azione
+        for idx, action in enumerate(actions):
+            tool = action.get("tool") if isinstance(action, dict) else None
+            if tool not in PLAN_ACTION_TOOLS:
+                return {
+                    "status": "error",
+                    "message": f"Azione {idx}: tool '{tool}' non ammesso in execute_plan "
+                    f"(ammessi: {', '.join(sorted(PLAN_ACTION_TOOLS))})",
+                }
+            if not isinstance(action.get("args") or {}, dict):
+                return {"status": "error", "message": f"Azione {idx}: args deve essere un oggetto"}
+
+        started = time.perf_counter()
+        steps: List[Dict] = []
+        failed_at = None
+
+        def _step(idx: int, tool: str, args: dict, output: dict) -> bool:
+            steps.append(
+                {
+                    "type": "tool_end",
+                    "tool": tool,
+                    "output": output,
+                    "input": args,
+                    "plan_index": idx,
+                }
+            )
+            return isinstance(output, dict) and output.get("status") == "success"
+
+        for idx, action in enumerate(actions):
+            tool = action["tool"]
+            args = dict(action.get("args") or {})
+            in_iframe = args.get("in_iframe")
+            timeout = action.get("guard_timeout") or guard_timeout or AppConfig.PLAYWRIGHT.TIMEOUT
+            dom_root = action.get("expect_dom_change")
+            if dom_root is True:
+                dom_root = "body"
+
+            guard = None
+            if dom_root:
+                guard = await self._arm_plan_dom_guard(dom_root, in_iframe, timeout)
+                if guard.get("status") == "error":
+                    _step(idx, "wait_for_dom_change", {"root_selector": dom_root}, guard)
+                    failed_at = idx
+                    break
+
+            try:
+                with tracing.span(f"PlaywrightTools.{tool}", cat="playwright", plan_index=idx):
+                    output = await getattr(self, tool)(**args)
+            except TypeError as e:
+                output = {"status": "error", "message": f"Argomenti non validi per {tool}: {e}"}
+            if not _step(idx, tool, args, output):
+                failed_at = idx
+                break
+
+            if guard:
+                guard_args = {"root_selector": dom_root, "timeout": timeout}
+                if in_iframe:
+                    guard_args["in_iframe"] = in_iframe
+                if not _step(
+                    idx, "wait_for_dom_change", guard_args,
+                    await self._await_plan_dom_guard(guard, dom_root, timeout),
+                ):
+                    failed_at = idx
+                    break
+
+            if action.get("wait_text"):
+                text_args = {"text": action["wait_text"], "timeout": timeout}
+                if in_iframe:
+                    text_args["in_iframe"] = in_iframe
+                if not _step(
+                    idx, "wait_for_text_content", text_args,
+                    await self.wait_for_text_content(**text_args),
+                ):
+                    failed_at = idx
+                    break
+
+        completed = len(actions) if failed_at is None else failed_at
+        if failed_at is None:
+            message = f"Piano completato: {completed}/{len(actions)} azioni"
+        else:
+            last = steps[-1]
+            message = (
+                f"Piano interrotto all'azione {failed_at} ({last['tool']}): "
+                f"{(last.get('output') or {}).get('message')}"
+            )
+        return {
+            "status": "success" if failed_at is None else "error",
+            "message": message,
+            "completed": completed,
+            "total": len(actions),
+            "failed_at": failed_at,
+            "steps": steps,
+            "duration_ms": int((time.perf_counter() - started) * 1000),
+        }
+
+    async def _arm_plan_dom_guard(self, root_selector: str, in_iframe: Optional[dict], timeout: int) -> dict:
+        """Installa il MutationObserver del guard expect_dom_change prima dell'azione."""
+        context = self.page
+        if in_iframe:
+            frame_result = await self.get_frame(**in_iframe, timeout=timeout, return_frame=True)
+            if frame_result.get("status") == "error":
+                return frame_result
+            context = frame_result["frame"]
+        key = f"__planDomGuard_{time.monotonic_ns()}"
+        try:
+            armed = await context.evaluate(_PLAN_DOM_GUARD_ARM_JS, [root_selector, key])
+        except Exception as e:
+            return {"status": "error", "message": f"Errore guard expect_dom_change: {e}"}
+        if not armed:
+            return {"status": "error", "message": f"Root selector not found: {root_selector}"}
+        return {"status": "success", "context": context, "key": key}
+
+    async def _await_plan_dom_guard(self, guard: dict, root_selector: str, timeout: int) -> dict:
+        try:
+            await guard["context"].wait_for_function(
+                _PLAN_DOM_GUARD_WAIT_JS, arg=guard["key"], timeout=timeout
+            )
+        except Exception as e:
+            text = str(e)
+            # Contesto distrutto da una navigazione: la pagina è cambiata
+            if not any(k in text.lower() for k in ("destroyed", "navigat", "detached")):
+                return {
+                    "status": "error",
+                    "message": f"Nessun cambiamento DOM rilevato entro {timeout} ms sotto '{root_selector}'",
+                    "root_selector": root_selector,
+                    "timeout_ms": timeout,
+                }
+        return {
+            "status": "success",
+            "message": f"Cambiamento DOM rilevato sotto '{root_selector}'",
+            "root_selector": root_selector,
+            "timeout_ms": timeout,
+        }
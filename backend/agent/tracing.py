@@ -0,0 +1,339 @@
+# backend/agent/tracing.py
+"""
+Span tracing leggero end-to-end: handler Flask → BatchTestRunner → TestAgentMCP
+(chiamate LLM e tool) → server MCP remoto → metodi/fasi di PlaywrightTools.
+
+- Contesto corrente in una ContextVar (segue task asyncio e tool call LangChain).
+- Propagazione tra processi con l'header W3C `traceparent` (00-<trace>-<span>-01):
+  il client MCP lo aggiunge a ogni richiesta HTTP, il server remoto lo legge.
+- Export: una riga JSON per span (JSONL) già nel formato evento "complete" (ph=X) del
+  Chrome trace; export_chrome_trace() / `python -m agent.tracing` producono il file
+  {"traceEvents": [...]} di una run da aprire in chrome://tracing o ui.perfetto.dev.
+
+Disattivato di default (TRACING_ENABLED): con tracing spento span() non scrive nulla.
+"""
+
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterator, Optional
+
+from config.settings import AppConfig
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """Identità di uno span: trace (32 hex), span (16 hex) e corsia (tid nel Chrome trace)."""
+
+    trace_id: str
+    span_id: str
+    lane: int
+
+
+_current: ContextVar[Optional[SpanContext]] = ContextVar("_current_span", default=None)
+
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_write_lock = threading.Lock()
+_lanes: Dict[Hashable, int] = {}
+_lane_ids = itertools.count(1)
+_service = "backend"
+
+
+def is_enabled() -> bool:
+    return AppConfig.TRACING.ENABLED
+
+
+def set_service_name(name: str):
+    """Nome del processo negli eventi (es. "flask", "mcp-server"), una riga per processo nel viewer."""
+    global _service
+    _service = name
+
+
+def _lane(key: Hashable) -> int:
+    """Corsia stabile per chiave: span concorrenti su corsie diverse, annidamento per corsia."""
+    with _write_lock:
+        if key not in _lanes:
+            _lanes[key] = next(_lane_ids)
+        return _lanes[key]
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+def _write(event: dict):
+    path = AppConfig.TRACING.FILE
+    line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+    try:
+        with _write_lock:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        print(f"[tracing] scrittura span fallita su {path}: {e}", file=sys.stderr)
+
+
+class Span:
+    """
+    Span aperto: end() scrive l'evento. Usato direttamente quando inizio e fine arrivano
+    da callback diversi (eventi LangGraph, before/teardown_request Flask); altrimenti span().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cat: str = "app",
+        parent: Optional[SpanContext] = None,
+        lane: Optional[Hashable] = None,
+        span_id: Optional[str] = None,
+        attrs: Optional[Dict[str, Any]] = None,
+    ):
+        parent = parent if parent is not None else _current.get()
+        self.name = name
+        self.cat = cat
+        self.parent = parent
+        if lane is not None:
+            lane_id = _lane(lane)
+        elif parent is not None:
+            lane_id = parent.lane
+        else:
+            lane_id = _lane(("thread", threading.get_ident()))
+        self.context = SpanContext(
+            trace_id=parent.trace_id if parent else _new_id(16),
+            span_id=span_id or _new_id(8),
+            lane=lane_id,
+        )
+        self.attrs: Dict[str, Any] = dict(attrs or {})
+        self._ts_us = time.time() * 1e6
+        self._started = time.perf_counter()
+        self._ended = False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, **attrs):
+        if self._ended:
+            return
+        self._ended = True
+        self.attrs.update(attrs)
+        args = {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "service": _service,
+        }
+        args.update(self.attrs)
+        _write(
+            {
+                "name": self.name,
+                "cat": self.cat,
+                "ph": "X",
+                "ts": round(self._ts_us, 1),
+                "dur": round((time.perf_counter() - self._started) * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": self.context.lane,
+                "args": args,
+            }
+        )
+
+
+def start_span(name: str, cat: str = "app", **kwargs) -> Optional[Span]:
+    """Apre uno span senza renderlo corrente (None se il tracing è spento)."""
+    if not is_enabled():
+        return None
+    return Span(name, cat=cat, **kwargs)
+
+
+@contextmanager
+def span(
+    name: str,
+    cat: str = "app",
+    lane: Optional[Hashable] = None,
+    parent: Optional[SpanContext] = None,
+    span_id: Optional[str] = None,
+    **attrs,
+) -> Iterator[Optional[Span]]:
+    """
+    Span corrente per la durata del blocco (sync o async). Le eccezioni vengono
+    registrate in args.error e rilanciate.
+    """
+    if not is_enabled():
+        yield None
+        return
+    s = Span(name, cat=cat, parent=parent, lane=lane, span_id=span_id, attrs=attrs)
+    token = _current.set(s.context)
+    try:
+        yield s
+    except BaseException as e:
+        s.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+
+def current_context() -> Optional[SpanContext]:
+    return _current.get()
+
+
+def activate(context: Optional[SpanContext]):
+    """Rende corrente un contesto (token per deactivate)."""
+    return _current.set(context)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def format_traceparent(context: Optional[SpanContext]) -> Optional[str]:
+    if context is None:
+        return None
+    return f"00-{context.trace_id}-{context.span_id}-01"
+
+
+def parse_traceparent(value: Optional[str], lane: Optional[Hashable] = None) -> Optional[SpanContext]:
+    """Contesto remoto dall'header traceparent (None se assente o non valido)."""
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match:
+        return None
+    return SpanContext(
+        trace_id=match.group(1),
+        span_id=match.group(2),
+        lane=_lane(lane if lane is not None else ("remote", match.group(1))),
+    )
+
+
+def span_id_for_run(run_id: Any) -> str:
+    """Span id deterministico per un run LangChain (stesso valore lato eventi e lato HTTP)."""
+    return str(run_id).replace("-", "")[:16]
+
+
+def outgoing_traceparent() -> Optional[str]:
+    """
+    traceparent per una richiesta in uscita. Dentro una tool call LangChain il parent è
+    lo span del tool (id derivato dal run_id, vedi span_id_for_run), altrimenti lo span
+    corrente.
+    """
+    context = _current.get()
+    if context is None:
+        return None
+    try:
+        from langchain_core.runnables.config import var_child_runnable_config
+
+        callbacks = (var_child_runnable_config.get() or {}).get("callbacks")
+        run_id = getattr(callbacks, "parent_run_id", None)
+    except ImportError:
+        run_id = None
+    if run_id is not None:
+        context = SpanContext(context.trace_id, span_id_for_run(run_id), context.lane)
+    return format_traceparent(context)
+
+
+_EVENT_KINDS = {
+    "on_chat_model_start": ("llm", True),
+    "on_chat_model_end": ("llm", False),
+    "on_tool_start": ("tool", True),
+    "on_tool_end": ("tool", False),
+    "on_tool_error": ("tool", False),
+}
+
+
+def trace_agent_event(ev: dict, open_spans: Dict[str, Span]):
+    """
+    Span per chiamata LLM e tool call dagli eventi di astream_events (v2): aperto su
+    *_start, chiuso su *_end/*_error. Lo span id deriva dal run_id, così lo span del
+    server MCP (traceparent della richiesta HTTP) risulta figlio della tool call.
+    """
+    event_type = ev.get("event")
+    kind = _EVENT_KINDS.get(event_type)
+    run_id = ev.get("run_id")
+    if kind is None or run_id is None or not is_enabled():
+        return
+    cat, starting = kind
+    key = str(run_id)
+    if starting:
+        metadata = ev.get("metadata") or {}
+        label = metadata.get("ls_model_name") if cat == "llm" else None
+        open_spans[key] = Span(
+            f"{cat}.{label or ev.get('name')}",
+            cat=cat,
+            span_id=span_id_for_run(run_id),
+            attrs={"langgraph_step": metadata.get("langgraph_step")},
+        )
+        return
+    s = open_spans.pop(key, None)
+    if s is None:
+        return
+    data = ev.get("data") or {}
+    if event_type == "on_tool_error":
+        s.end(error=str(data.get("error")))
+    elif cat == "llm":
+        usage = getattr(data.get("output"), "usage_metadata", None) or {}
+        s.end(
+            input_tokens=usage.get("input_tokens"),
+            output_tokens=usage.get("output_tokens"),
+        )
+    else:
+        s.end()
+
+
+def end_open_spans(open_spans: Dict[str, Span]):
+    """Chiude gli span rimasti aperti (run interrotta) marcandoli come incompleti."""
+    for s in open_spans.values():
+        s.end(incomplete=True)
+    open_spans.clear()
+
+
+def export_chrome_trace(
+    path: Optional[str] = None, out: Optional[str] = None, trace_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Converte il JSONL degli span in un Chrome trace ({"traceEvents": [...]}), opzionalmente
+    filtrato su una trace. Se `out` è indicato scrive anche il file.
+    """
+    path = path or AppConfig.TRACING.FILE
+    events = []
+    services = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if trace_id and event.get("args", {}).get("trace_id") != trace_id:
+                continue
+            events.append(event)
+            services.setdefault(event.get("pid"), event.get("args", {}).get("service"))
+
+    # Metadati: nome del processo per riga nel viewer
+    meta = [
+        {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"{name} ({pid})"}}
+        for pid, name in services.items()
+    ]
+    trace = {"traceEvents": meta + sorted(events, key=lambda e: e.get("ts", 0)), "displayTimeUnit": "ms"}
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+    return trace
+
+
+if __name__ == "__main__":
+    # python -m agent.tracing [spans.jsonl] [trace_id] → <spans>.trace.json
+    src = sys.argv[1] if len(sys.argv) > 1 else AppConfig.TRACING.FILE
+    wanted = sys.argv[2] if len(sys.argv) > 2 else None
+    dst = os.path.splitext(src)[0] + (f".{wanted[:8]}" if wanted else "") + ".trace.json"
+    result = export_chrome_trace(src, dst, wanted)
+    print(f"{len(result['traceEvents'])} eventi → {dst} (apri in chrome://tracing o ui.perfetto.dev)")
@@ -14,18 +14,19 @@ from flask import (
     Response,
     stream_with_context,
     send_from_directory,
+    g,
 )
 from flask_cors import CORS
 
 # from agent.tools import PlaywrightTools
 from config.settings import AppConfig
 import json
-import asyncio
 from datetime import datetime
-import queue
-import threading
 
 from agent.utils import make_json_serializable
+from agent import tracing
+from agent.background_loop import get_background_loop
+from agent.event_log import get_stream_registry
 import subprocess
 import tempfile
 import os
@@ -37,6 +38,48 @@ AppConfig.validate_all()
 app = Flask(__name__)
 CORS(app)
 
+tracing.set_service_name("flask")
+
+# Loop asyncio di processo: tutte le run async degli endpoint passano da qui
+background_loop = get_background_loop()
+# Log eventi degli stream di batch (replay con Last-Event-ID, più subscriber)
+stream_registry = get_stream_registry()
+
+
+@app.before_request
+def _start_request_span():
+    """Span della richiesta API (TRACING_ENABLED); accetta un traceparent in ingresso."""
+    if not tracing.is_enabled() or not request.path.startswith("/api/"):
+        return
+    span = tracing.start_span(
+        f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+        cat="flask",
+        parent=tracing.parse_traceparent(request.headers.get(AppConfig.TRACING.HEADER)),
+    )
+    g.trace_span = span
+    g.trace_token = tracing.activate(span.context)
+
+
+@app.after_request
+def _tag_request_span(response):
+    span = g.get("trace_span")
+    if span is not None:
+        span.set(status_code=response.status_code)
+    return response
+
+
+@app.teardown_request
+def _end_request_span(exc):
+    span = g.pop("trace_span", None)
+    if span is None:
+        return
+    token = g.pop("trace_token", None)
+    try:
+        tracing.deactivate(token)
+    except ValueError:
+        pass  # risposta in streaming: teardown in un altro contesto
+    span.end(error=str(exc) if exc else None)
+
 # Istanza globale dei tool Playwright (per endpoint diretti)
 # playwright_tools = PlaywrightTools()
 
@@ -50,7 +93,13 @@ try:
     from agent.lab_scenarios import LAB_SCENARIOS
     from codegen.script_generator import generate_playwright_script
 
+    from agent.jobs import get_job_manager, JobQueueFull
+    from agent.pipelines.jobs import attach_generated_scripts, register_job_kinds
+
     test_agent_mcp = TestAgentMCP()
+    # Job asincroni (/api/jobs): worker sul loop di background condiviso
+    job_manager = get_job_manager()
+    register_job_kinds(job_manager)
     AGENT_MCP_AVAILABLE = True
     ORCHESTRATOR_AVAILABLE = True
     print(" AI Agent MCP e orchestrator caricati con successo!")
@@ -62,6 +111,7 @@ except ImportError as e:
     run_prefix_to_home = None
     run_lab_scenario = None
     LAB_SCENARIOS = []
+    job_manager = None
     ORCHESTRATOR_AVAILABLE = False
 
 # ==================== ENDPOINT BASE ====================
@@ -281,6 +331,8 @@ def agent_mcp_run_test():
             "screenshot": screenshot_base64,
             "test_description": result["test_description"],
             "mcp_mode": AppConfig.MCP.MODE,
+            "duration_ms": result.get("duration_ms"),
+            "timing": result.get("timing"),
             "timestamp": datetime.now().isoformat(),
         }
 
@@ -341,23 +393,9 @@ def agent_mcp_stream_test():
         except Exception as e:
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
-    def generate():
-        """Wrapper sincrono per il generator async"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            async_gen = stream_events()
-            while True:
-                try:
-                    chunk = loop.run_until_complete(async_gen.__anext__())
-                    yield chunk
-                except StopAsyncIteration:
-                    break
-        finally:
-            loop.close()
-
     return Response(
-        stream_with_context(generate()),
+        # Wrapper sincrono: ogni chunk è prodotto sul loop di background
+        stream_with_context(background_loop.iterate(stream_events())),
         mimetype="text/event-stream",
         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -492,6 +530,7 @@ def test_lab_full():
             "errors": result.get("errors", []),
             "artifacts": result.get("artifacts", []),
             "duration_ms": result.get("duration_ms"),
+            "timing": result.get("timing"),
         }
         generate_script = bool(data.get("generate_script", False))
         if generate_script and result.get("passed", False) and result.get("scenario"):
@@ -554,9 +593,7 @@ def test_lab_prefix():
 
         # Esegue SOLO il prefix (login → org → Continua → tile modulo su home)
         # Il browser resta aperto per eventuale uso successivo.
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        prefix_result = loop.run_until_complete(
+        prefix_result = background_loop.run_sync(
             run_prefix_to_home(
                 verbose=True,
                 url=lab_url,
@@ -566,7 +603,6 @@ def test_lab_prefix():
                 module_label_alt=mod_alt,
             )
         )
-        loop.close()
 
         # Sanitize per evitare 500 (steps/result possono contenere oggetti non serializzabili)
         safe_result = make_json_serializable(prefix_result)
@@ -620,12 +656,9 @@ def test_lab_run_scenario():
             400,
         )
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    scenario_result = loop.run_until_complete(
+    scenario_result = background_loop.run_sync(
         run_lab_scenario(scenario_id=scenario_id, verbose=True)
     )
-    loop.close()
 
     safe_result = make_json_serializable(scenario_result)
     response_body = {
@@ -956,7 +989,11 @@ def run_batch_test():
         "url": "https://...",  // opzionale
         "username": "...",     // opzionale
         "password": "...",     // opzionale
-        "save_results": true   // opzionale, default true
+        "save_results": true,  // opzionale, default true
+        "max_concurrency": 4,  // opzionale, scenari in parallelo (default AGENT_BATCH_MAX_CONCURRENCY)
+        "reuse_login": true,   // opzionale, riusa la sessione del primo login (default AGENT_BATCH_REUSE_LOGIN)
+        "replay": true,        // opzionale, replay senza LLM delle trace salvate (default AGENT_REPLAY_TRACES)
+        "har_mode": "record"   // opzionale, "record"/"replay" HAR di rete per scenario (default PLAYWRIGHT_HAR_MODE)
     }
     """
     if not ORCHESTRATOR_AVAILABLE:
@@ -1059,6 +1096,10 @@ def run_batch_test():
     save_results = data.get("save_results", True)
     mod_label = data.get("module_label") or data.get("home_module_label")
     mod_alt = data.get("module_label_alt") or data.get("home_module_label_alt")
+    max_concurrency = data.get("max_concurrency")
+    reuse_login = data.get("reuse_login")
+    replay = data.get("replay")
+    har_mode = data.get("har_mode")
 
     try:
         # Esegui batch (sincrono, bloccante)
@@ -1071,43 +1112,20 @@ def run_batch_test():
             module_label_alt=mod_alt,
             verbose=True,  # Non stampare in console per API
             save_results=save_results,
+            max_concurrency=max_concurrency,
+            reuse_login=reuse_login,
+            replay=replay,
+            har_mode=har_mode,
         )
 
         generate_script = bool(data.get("generate_script", False))
         if generate_script:
-            try:
-                scenario_results = results.get("scenarios", [])
-                generated_count = 0
-                for idx, scenario_data in enumerate(scenario_results):
-                    if scenario_data.get("overall_status") != "success":
-                        continue
-                    sr = scenario_data.get("scenario_result") or {}
-                    if not sr:
-                        continue
-                    scenario_id_value = scenario_data.get("scenario_id") or (
-                        scenarios[idx].id if idx < len(scenarios) else f"scenario_{idx+1}"
-                    )
-                    scenario_name_value = scenario_data.get("scenario_name") or (
-                        scenarios[idx].name
-                        if idx < len(scenarios)
-                        else scenario_id_value
-                    )
-                    script = generate_playwright_script(
-                        scenario_result=sr,
-                        scenario_id=scenario_id_value,
-                        scenario_name=scenario_name_value,
-                    )
-                    scenario_data["playwright_script"] = script or ""
-                    generated_count += 1
-
-                results["generated_scripts_count"] = generated_count
-
-                # Backward compatibility: mantieni i campi top-level quando c'e' un solo scenario.
-                if len(scenario_results) == 1 and scenario_results[0].get("playwright_script"):
-                    results["playwright_script"] = scenario_results[0]["playwright_script"]
-                    results["scenario_id"] = scenario_results[0].get("scenario_id")
-            except Exception as e:
-                results["codegen_error"] = str(e)
+            attach_generated_scripts(results, scenarios)
+            # Backward compatibility: mantieni i campi top-level quando c'e' un solo scenario.
+            scenario_results = results.get("scenarios", [])
+            if len(scenario_results) == 1 and scenario_results[0].get("playwright_script"):
+                results["playwright_script"] = scenario_results[0]["playwright_script"]
+                results["scenario_id"] = scenario_results[0].get("scenario_id")
 
         return jsonify(results)
 
@@ -1124,6 +1142,45 @@ def run_batch_test():
         )
 
 
+def _last_event_id() -> int:
+    """Seq da cui riprendere uno stream SSE: header Last-Event-ID o ?last_event_id=."""
+    try:
+        return int(
+            request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or 0
+        )
+    except ValueError:
+        return 0
+
+
+def _sse_response(log, last_seq: int = 0, on_close=None) -> Response:
+    """
+    Stream SSE degli eventi di un EventLog dopo `last_seq` ("id: <seq>" per evento).
+    Attesa su condition (nessun polling), commento keepalive ogni STREAM_KEEPALIVE_S;
+    a log chiuso emette l'eventuale evento finale on_close() e termina.
+    """
+
+    def generate():
+        seq = last_seq
+        while True:
+            events = log.events_after(seq, timeout=AppConfig.STREAM.KEEPALIVE_S)
+            for ev in events:
+                seq = ev["seq"]
+                payload = json.dumps(make_json_serializable(ev["data"]))
+                yield f"id: {seq}\nevent: {ev['event']}\ndata: {payload}\n\n"
+            if log.closed and seq >= log.last_seq:
+                if on_close is not None:
+                    yield on_close()
+                return
+            if not events:
+                yield ": keepalive\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/api/test/batch/stream", methods=["POST"])
 def run_batch_test_stream():
     """
@@ -1131,7 +1188,12 @@ def run_batch_test_stream():
 
     Body JSON: vedi run_batch_test() per formato
 
+    La run non dipende dalla connessione: gli eventi (con "id: <seq>") restano nel log
+    della run e GET /api/test/batch/stream/<run_id> si riaggancia con Last-Event-ID.
+    L'id della run è nell'header X-Stream-Id e nel primo evento.
+
     Returns: Server-Sent Events stream con eventi:
+    - stream_started: run_id e URL per riagganciarsi
     - scenario_start: inizio scenario
     - phase_update: cambio fase (prefix/scenario)
     - step_update: completamento step
@@ -1226,123 +1288,215 @@ def run_batch_test_stream():
     generate_script = bool(data.get("generate_script", False))
     mod_label = data.get("module_label") or data.get("home_module_label")
     mod_alt = data.get("module_label_alt") or data.get("home_module_label_alt")
+    max_concurrency = data.get("max_concurrency")
+    reuse_login = data.get("reuse_login")
+    replay = data.get("replay")
+    har_mode = data.get("har_mode")
 
-    # Crea una queue per gli eventi SSE
-    event_queue = queue.Queue()
+    # Log eventi della run: sopravvive alla connessione che l'ha avviata
+    run_id, log = stream_registry.create()
 
-    def progress_callback(event_type: str, event_data: dict):
-        """Callback chiamato dal BatchTestRunner per emettere eventi."""
-        event_queue.put({"event": event_type, "data": event_data})
-
-    def generate():
-        """Generator function per SSE stream."""
+    async def run_batch_async():
         try:
-            # Esegui batch in un thread separato
             runner = BatchTestRunner(
                 url=url,
                 username=username,
                 password=password,
                 module_label=mod_label,
                 module_label_alt=mod_alt,
-                progress_callback=progress_callback,
+                progress_callback=log.emit,
+                max_concurrency=max_concurrency,
+                reuse_login=reuse_login,
+                replay=replay,
+                har_mode=har_mode,
             )
+            batch_results = await runner.run_batch(scenarios, verbose=True)
 
-            results = {"error": None}
-
-            def run_batch_async():
-                try:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    batch_results = loop.run_until_complete(
-                        runner.run_batch(scenarios, verbose=True)
-                    )
-
-                    if generate_script:
-                        generated_count = 0
-                        scenario_results = batch_results.get("scenarios", [])
-                        for idx, scenario_data in enumerate(scenario_results):
-                            if scenario_data.get("overall_status") != "success":
-                                continue
-                            sr = scenario_data.get("scenario_result") or {}
-                            if not sr:
-                                continue
-                            scenario_id_value = scenario_data.get(
-                                "scenario_id"
-                            ) or (
-                                scenarios[idx].id
-                                if idx < len(scenarios)
-                                else f"scenario_{idx+1}"
-                            )
-                            scenario_name_value = scenario_data.get(
-                                "scenario_name"
-                            ) or (
-                                scenarios[idx].name
-                                if idx < len(scenarios)
-                                else scenario_id_value
-                            )
-                            script = generate_playwright_script(
-                                scenario_result=sr,
-                                scenario_id=scenario_id_value,
-                                scenario_name=scenario_name_value,
-                            )
-                            scenario_data["playwright_script"] = script or ""
-                            generated_count += 1
-                        batch_results["generated_scripts_count"] = generated_count
-
-                    if save_results:
-                        filepath = runner.save_results(batch_results)
-                        batch_results["saved_to"] = filepath
-
-                    results["data"] = batch_results
-
-                    # Segnala fine
-                    event_queue.put(None)
-
-                except Exception as e:
-                    results["error"] = str(e)
-                    event_queue.put(None)
-
-            # Avvia thread
-            thread = threading.Thread(target=run_batch_async)
-            thread.start()
-
-            # Stream eventi dalla queue
-            while True:
-                try:
-                    event = event_queue.get(timeout=0.5)
-
-                    if event is None:
-                        # Fine stream
-                        if results.get("error"):
-                            yield f"event: error\ndata: {json.dumps({'error': results['error']})}\n\n"
-                        elif results.get("data"):
-                            # Invia risultati finali
-                            final_data = results["data"]
-                            yield f"event: batch_complete\ndata: {json.dumps(make_json_serializable(final_data))}\n\n"
-                        break
-
-                    # Emetti evento SSE
-                    event_type = event["event"]
-                    event_data = make_json_serializable(event["data"])
-                    yield f"event: {event_type}\ndata: {json.dumps(event_data)}\n\n"
-
-                except queue.Empty:
-                    # Invia keepalive ogni 0.5s
-                    yield f": keepalive\n\n"
-                    continue
-
-            thread.join(timeout=1)
+            if generate_script:
+                attach_generated_scripts(batch_results, scenarios)
+
+            if save_results:
+                filepath = runner.save_results(batch_results)
+                batch_results["saved_to"] = filepath
 
+            log.emit("batch_complete", batch_results)
         except Exception as e:
-            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            log.emit("error", {"error": str(e)})
+        finally:
+            log.close()
 
-    return Response(
-        stream_with_context(generate()),
-        mimetype="text/event-stream",
-        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    log.emit(
+        "stream_started",
+        {
+            "run_id": run_id,
+            "scenarios": [s.id for s in scenarios],
+            "attach": f"/api/test/batch/stream/{run_id}",
+        },
+    )
+    # Avvia il batch sul loop di background (il task eredita il contesto
+    # della richiesta: gli span del batch restano figli della richiesta)
+    background_loop.submit(run_batch_async())
+
+    response = _sse_response(log)
+    response.headers["X-Stream-Id"] = run_id
+    return response
+
+
+@app.route("/api/test/batch/stream/<run_id>", methods=["GET"])
+def attach_batch_stream(run_id):
+    """
+    Si (ri)aggancia allo stream di un batch avviato con POST /api/test/batch/stream:
+    replay degli eventi dopo Last-Event-ID (o ?last_event_id=, 0 = dall'inizio) e poi
+    eventi live. Più client possono seguire la stessa run.
+    """
+    log = stream_registry.get(run_id)
+    if log is None:
+        return (
+            jsonify({"status": "error", "message": f"Stream '{run_id}' non trovato"}),
+            404,
+        )
+    response = _sse_response(log, _last_event_id())
+    response.headers["X-Stream-Id"] = run_id
+    return response
+
+
+@app.route("/api/test/batch/streams", methods=["GET"])
+def list_batch_streams():
+    """Stream di batch in memoria (in corso e ultimi finiti), più recenti prima."""
+    return jsonify({"status": "success", "streams": stream_registry.list()})
+
+
+# ==================== ENDPOINT JOB ASINCRONI ====================
+
+
+def _job_links(job_id: str) -> dict:
+    return {
+        "self": f"/api/jobs/{job_id}",
+        "events": f"/api/jobs/{job_id}/events",
+        "cancel": f"/api/jobs/{job_id}/cancel",
+    }
+
+
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    """
+    Accoda una run lunga e risponde subito (202) con l'id del job.
+
+    Body JSON:
+    {
+        "kind": "agent_test" | "lab_full" | "batch" | "playwright_script",
+        "params": {...}   // stesso body dell'endpoint bloccante corrispondente:
+                          // /api/agent/mcp/test/run, /api/test/lab/full,
+                          // /api/test/batch, /api/test/playwright/run
+    }
+    Senza "params" i campi del body (tranne "kind") sono usati come parametri.
+    Coda piena → 429 con Retry-After.
+    """
+    if job_manager is None:
+        return (
+            jsonify({"status": "error", "message": "Job non disponibili (orchestrator non caricato)"}),
+            503,
+        )
+
+    data = request.get_json() or {}
+    kind = data.get("kind")
+    params = data.get("params")
+    if params is None:
+        params = {k: v for k, v in data.items() if k != "kind"}
+    if not kind or not isinstance(params, dict):
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "Body JSON richiesto con 'kind' e 'params' (oggetto)",
+                    "available_kinds": job_manager.kinds,
+                }
+            ),
+            400,
+        )
+
+    try:
+        job = job_manager.submit(kind, params)
+    except JobQueueFull as e:
+        response = jsonify({"status": "error", "message": str(e), **job_manager.stats()})
+        response.headers["Retry-After"] = "30"
+        return response, 429
+    except ValueError as e:
+        return (
+            jsonify(
+                {"status": "error", "message": str(e), "available_kinds": job_manager.kinds}
+            ),
+            400,
+        )
+
+    return (
+        jsonify(
+            {
+                "status": "success",
+                "job_id": job.id,
+                "job": job_manager.describe(job, include_result=False),
+                "links": _job_links(job.id),
+            }
+        ),
+        202,
     )
 
 
+@app.route("/api/jobs", methods=["GET"])
+def list_jobs():
+    """Elenco job (più recenti prima), filtrabile con ?status=queued|running|succeeded|failed|cancelled."""
+    if job_manager is None:
+        return jsonify({"status": "error", "message": "Job non disponibili"}), 503
+    return jsonify(
+        {
+            "status": "success",
+            "jobs": job_manager.list(request.args.get("status")),
+            "stats": job_manager.stats(),
+        }
+    )
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Stato del job; a job finito include "result" (stesso formato dell'endpoint bloccante)."""
+    job = job_manager.get(job_id) if job_manager is not None else None
+    if job is None:
+        return jsonify({"status": "error", "message": f"Job '{job_id}' non trovato"}), 404
+    return jsonify(
+        {"status": "success", "job": job_manager.describe(job), "links": _job_links(job_id)}
+    )
+
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+@app.route("/api/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Annulla un job in coda o in esecuzione (idempotente sui job già finiti)."""
+    job = job_manager.cancel(job_id) if job_manager is not None else None
+    if job is None:
+        return jsonify({"status": "error", "message": f"Job '{job_id}' non trovato"}), 404
+    return jsonify(
+        {"status": "success", "job": job_manager.describe(job, include_result=False)}
+    )
+
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Progress del job in SSE: "id: <seq>" per evento, ripresa con header Last-Event-ID
+    (o ?last_event_id=). Eventi: job_status + quelli del tipo di job (scenario_start,
+    step_update, ...); lo stream termina con job_complete quando il job è finito.
+    """
+    job = job_manager.get(job_id) if job_manager is not None else None
+    if job is None:
+        return jsonify({"status": "error", "message": f"Job '{job_id}' non trovato"}), 404
+
+    def job_complete():
+        final = job_manager.describe(job, include_result=False)
+        return f"event: job_complete\ndata: {json.dumps(final)}\n\n"
+
+    return _sse_response(job.log, _last_event_id(), on_close=job_complete)
+
+
 # ==================== ENDPOINT AMC LOGIN ====================
 
 
@@ -1542,6 +1696,12 @@ if __name__ == "__main__":
             "   - POST /api/test/extract-scenarios → Estrai scenari da documento (LLM)"
         )
         print("   - POST /api/test/batch            → Esegui batch di scenari")
+
+        print("\n[JOB ASINCRONI]")
+        print("   - POST /api/jobs                  → Accoda run (agent_test/lab_full/batch/playwright_script)")
+        print("   - GET  /api/jobs/<id>             → Stato e risultato")
+        print("   - GET  /api/jobs/<id>/events      → Progress SSE (Last-Event-ID)")
+        print("   - POST /api/jobs/<id>/cancel      → Annulla")
         print("   - GET  /api/test/lab/scenarios    → Lista scenari LAB disponibili")
     else:
         print("\n[AI AGENT MCP] Non disponibile")
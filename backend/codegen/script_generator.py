@@ -5,14 +5,18 @@ Genera uno script Playwright Python da una trace normalizzata.
 Versione attuale: compilazione DETERMINISTICA senza LLM.
 Le regole di traduzione MCP → Playwright sono implementate in trace_to_playwright.py.
 
+Con lo store strategie attivo (AGENT_LOCATOR_LEARNING) il locator di click_smart/fill_smart
+è quello più affidabile registrato per l'elemento (best_target), se è tra i targets dello step.
+
 Gli script generati vengono salvati in backend/generated/ (creata automaticamente).
 """
 import logging
 from pathlib import Path
 from typing import Optional
 
+from agent.locator_stats import element_key, get_locator_stats_store, origin_of, target_key
 from codegen.trace_extractor import extract_trace
-from codegen.trace_to_playwright import generate_script_from_trace
+from codegen.trace_to_playwright import _unwrap_suggestion, generate_script_from_trace
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +69,11 @@ def generate_playwright_script(
             )
             prefix_trace = None
 
+    origin = _run_origin(scenario_result, prefix_result)
+    _apply_learned_targets(trace, origin)
+    if prefix_trace:
+        _apply_learned_targets(prefix_trace, origin)
+
     try:
         script = generate_script_from_trace(
             trace=trace,
@@ -84,6 +93,50 @@ def generate_playwright_script(
     return script
 
 
+def _run_origin(*results: Optional[dict]) -> str:
+    """Origin dell'app dalla prima navigate_to_url della run (prefix o scenario)."""
+    for result in results:
+        for step in (result or {}).get("steps") or []:
+            if step.get("tool") == "navigate_to_url":
+                origin = origin_of((step.get("input") or {}).get("url") or "")
+                if origin:
+                    return origin
+    return ""
+
+
+def _apply_learned_targets(trace: list, origin: str) -> None:
+    """
+    Per click_smart/fill_smart usa come target dello step il best_target dello store
+    strategie, solo se è uno dei targets dello step (stesso elemento). No-op senza store.
+    """
+    store = get_locator_stats_store()
+    if not store or not origin:
+        return
+    for step in trace:
+        mode = {"click_smart": "click", "fill_smart": "fill"}.get(step.get("tool"))
+        if mode is None:
+            continue
+        targets = [_unwrap_suggestion(t) for t in (step.get("args") or {}).get("targets") or []]
+        key = element_key(targets, mode)
+        if not key:
+            continue
+        try:
+            best = store.best_target(origin, key)
+        except Exception as e:
+            logger.warning(f"best_target fallito per {key}: {e}")
+            continue
+        if not best or target_key(best) not in {target_key(t) for t in targets}:
+            continue
+        result = step.setdefault("result", {})
+        used = result.get("target") if isinstance(result.get("target"), dict) else {}
+        if target_key(used) == target_key(best):
+            continue  # già il target della run (con l'eventuale scope)
+        if used.get("scope"):
+            continue  # target della run disambiguato da uno scope: non sostituibile
+        result["target"] = best
+        result["strategy"] = f"{best.get('by')} (store strategie)"
+
+
 def _save_script(script: str, scenario_id: str) -> Optional[Path]:
     """
     Salva lo script in backend/generated/test_<scenario_id>.py.
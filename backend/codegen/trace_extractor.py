@@ -53,6 +53,8 @@ _SKIP_TOOLS = {
     "wait_for_clickable_by_name",
     "wait_for_field_by_name",
     "wait_for_control_by_name_and_type",
+    # Riepilogo execute_plan: le azioni del piano sono già step autonomi
+    "execute_plan",
 }
 
 
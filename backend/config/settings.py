@@ -27,6 +27,15 @@ class MCPConfig:
     REMOTE_HOST = os.getenv("MCP_REMOTE_HOST", "localhost")
     REMOTE_PORT = int(os.getenv("MCP_REMOTE_PORT", "8001"))
 
+    # Sessioni browser del server remoto: ogni valore dell'header SESSION_HEADER ha il suo
+    # BrowserContext + pagina su un browser condiviso. Senza header -> sessione "default".
+    SESSION_HEADER = os.getenv("MCP_SESSION_HEADER", "X-Browser-Session")
+    DEFAULT_SESSION_ID = os.getenv("MCP_DEFAULT_SESSION_ID", "default")
+    MAX_SESSIONS = int(os.getenv("MCP_MAX_SESSIONS", "8"))
+    SESSION_IDLE_TIMEOUT = float(os.getenv("MCP_SESSION_IDLE_TIMEOUT", "900"))  # secondi, 0 = mai
+    # Endpoint metriche (testo Prometheus) del server remoto, accanto a /mcp/
+    METRICS_PATH = os.getenv("MCP_METRICS_PATH", "/metrics")
+
     @classmethod
     def use_remote(cls) -> bool:
         """Returns True if using remote MCP server"""
@@ -126,6 +135,49 @@ class PlaywrightConfig:
     LOCALE = os.getenv("PLAYWRIGHT_LOCALE", "it-IT")
     TIMEZONE = os.getenv("PLAYWRIGHT_TIMEZONE", "Europe/Rome")
 
+    # Cache risultati inspect_* invalidata da MutationObserver in-page (generazione DOM per frame)
+    INSPECT_CACHE_ENABLED = (
+        os.getenv("PLAYWRIGHT_INSPECT_CACHE", "true").lower() == "true"
+    )
+    # Cache dei frame risolti da get_frame / in_iframe (invalidata su framenavigated/framedetached)
+    FRAME_CACHE_ENABLED = os.getenv("PLAYWRIGHT_FRAME_CACHE", "true").lower() == "true"
+
+    # Backend di inspect_interactive_elements: "dom" (script in-page, agent/dom_harvest.py)
+    # o "ax" (albero di accessibilità via CDP, agent/ax_inspect.py; solo Chromium)
+    INSPECT_BACKEND = os.getenv("PLAYWRIGHT_INSPECT_BACKEND", "dom").strip().lower()
+
+    # Formato compatto di inspect_* per l'LLM (una riga per elemento, id corti) e budget
+    INSPECT_COMPACT = os.getenv("PLAYWRIGHT_INSPECT_COMPACT", "false").lower() == "true"
+    INSPECT_MAX_ELEMENTS = int(os.getenv("PLAYWRIGHT_INSPECT_MAX_ELEMENTS", "150"))
+    INSPECT_MAX_CHARS = int(os.getenv("PLAYWRIGHT_INSPECT_MAX_CHARS", "12000"))
+
+    # Snapshot sessione autenticata (save_storage_state / restore_storage_state)
+    STORAGE_STATE_DIR = os.getenv(
+        "PLAYWRIGHT_STORAGE_STATE_DIR", os.path.join("data", "storage_states")
+    )
+    STORAGE_STATE_TTL = int(os.getenv("PLAYWRIGHT_STORAGE_STATE_TTL", "1800"))  # secondi, 0 = mai
+
+    # Filtro risorse di rete (agent/resource_filter.py, registro in config/ui_overrides.py):
+    # "off", "auto" (profilo dall'host della pagina) o nome profilo (default/lab/amc)
+    RESOURCE_FILTER = os.getenv("PLAYWRIGHT_RESOURCE_FILTER", "off").strip().lower()
+    # Byte risparmiati: HEAD in background sulle risorse bloccate (Content-Length)
+    RESOURCE_FILTER_MEASURE = (
+        os.getenv("PLAYWRIGHT_RESOURCE_FILTER_MEASURE", "false").lower() == "true"
+    )
+
+    # HAR di rete (route_from_har) per benchmark offline dei tool: "off", "record" (salva
+    # il traffico in HAR_DIR/<nome>.har.zip) o "replay" (risposte dall'archivio, niente rete)
+    HAR_MODE = os.getenv("PLAYWRIGHT_HAR_MODE", "off").strip().lower()
+    HAR_DIR = os.getenv("PLAYWRIGHT_HAR_DIR", os.path.join("data", "har"))
+    # Replay: richieste assenti dall'archivio "abort" (deterministico) o "fallback" (rete)
+    HAR_NOT_FOUND = os.getenv("PLAYWRIGHT_HAR_NOT_FOUND", "abort").strip().lower()
+
+    # Pool dei server MCP (agent/browser_pool.py): browser tenuti vivi tra scenari e
+    # BrowserContext pre-creati in background, consegnati da start_browser
+    POOL_BROWSERS = int(os.getenv("PLAYWRIGHT_POOL_BROWSERS", "1"))  # per valore di headless
+    POOL_WARM_CONTEXTS = int(os.getenv("PLAYWRIGHT_POOL_WARM_CONTEXTS", "1"))  # 0 = nessun pre-warm
+    POOL_RECYCLE_AFTER = int(os.getenv("PLAYWRIGHT_POOL_RECYCLE_AFTER", "50"))  # contesti per browser, 0 = mai
+
 
 class FlaskConfig:
     """Configurazione Flask Server"""
@@ -146,6 +198,67 @@ class AgentConfig:
     ALWAYS_WAIT_FOR_LOAD_STATE = True
     DEFAULT_TIMEOUT_PER_TRY = 2000  # ms per ogni strategia in click_smart/fill_smart
 
+    # Racing strategie (opt-in): click_smart/fill_smart risolvono tutti i locator in parallelo
+    # e agiscono sul primo in ordine di priorità attached+visible+enabled
+    RACE_STRATEGIES = os.getenv("AGENT_RACE_STRATEGIES", "false").lower() == "true"
+    # Finestra concessa alle strategie più prioritarie quando una meno prioritaria è già pronta
+    RACE_GRACE_MS = int(os.getenv("AGENT_RACE_GRACE_MS", "150"))
+
+    # Store SQLite dell'esito delle strategie per origin+elemento: riordina i targets
+    # di click_smart/fill_smart in base ai successi passati (sperimentale, opt-in)
+    LOCATOR_LEARNING = os.getenv("AGENT_LOCATOR_LEARNING", "false").lower() == "true"
+    LOCATOR_STATS_PATH = os.getenv(
+        "AGENT_LOCATOR_STATS_PATH", os.path.join("data", "locator_stats.sqlite3")
+    )
+
+    # Batch LAB: scenari eseguiti in parallelo (1 = in sequenza). Con valori > 1 ogni scenario
+    # usa una propria sessione browser sul server MCP remoto (vedi MCP_MAX_SESSIONS)
+    BATCH_MAX_CONCURRENCY = int(os.getenv("AGENT_BATCH_MAX_CONCURRENCY", "1"))
+    # Batch LAB: dopo il primo prefix riuscito salva la sessione autenticata e la ripristina
+    # negli scenari successivi (prefix completo solo se la sessione viene rifiutata)
+    BATCH_REUSE_LOGIN = os.getenv("AGENT_BATCH_REUSE_LOGIN", "true").lower() == "true"
+
+    # Pool di processo dei MCPAgentRuntime (LLM + tool discovery + agent compilati per prompt)
+    RUNTIME_POOL_SIZE = int(os.getenv("AGENT_RUNTIME_POOL_SIZE", "16"))
+
+    # Replay deterministico delle trace di scenari già passati (senza LLM, fallback
+    # all'agent al primo step divergente). Le trace vengono salvate comunque.
+    REPLAY_TRACES = os.getenv("AGENT_REPLAY_TRACES", "false").lower() == "true"
+    TRACE_STORE_DIR = os.getenv("AGENT_TRACE_STORE_DIR", os.path.join("data", "traces"))
+
+    # Compattazione history (pre_model_hook): output inspect_*/get_frame precedenti
+    # all'ultimo cambio pagina → stub di una riga nell'input dell'LLM
+    HISTORY_COMPACTION = os.getenv("AGENT_HISTORY_COMPACTION", "true").lower() == "true"
+
+
+class JobsConfig:
+    """Job asincroni (/api/jobs): worker sul loop di background e admission control"""
+
+    MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))  # job eseguiti in parallelo
+    MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "50"))  # oltre → 429
+    RETENTION = int(os.getenv("JOBS_RETENTION", "200"))  # job finiti tenuti in memoria
+    EVENT_BUFFER = int(os.getenv("JOBS_EVENT_BUFFER", "1000"))  # eventi progress per job
+
+
+class StreamConfig:
+    """Stream SSE di progress (batch stream, job): log eventi con replay e più subscriber"""
+
+    EVENT_BUFFER = int(os.getenv("STREAM_EVENT_BUFFER", "1000"))  # eventi in memoria per run
+    RETENTION = int(os.getenv("STREAM_RETENTION", "50"))  # run di batch stream finite riagganciabili
+    # Directory JSONL con tutti gli eventi di ogni run (vuoto = solo memoria)
+    SPILL_DIR = os.getenv("STREAM_SPILL_DIR", "")
+    KEEPALIVE_S = float(os.getenv("STREAM_KEEPALIVE_S", "15"))  # commento keepalive SSE
+
+
+class TracingConfig:
+    """Span tracing end-to-end (Flask → agent → server MCP → Playwright), vedi agent/tracing.py"""
+
+    ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    # JSONL con un evento Chrome trace per riga (export: python -m agent.tracing)
+    FILE = os.getenv("TRACING_FILE", os.path.join("data", "spans.jsonl"))
+    # Header HTTP con cui il contesto passa al server MCP remoto (W3C Trace Context)
+    HEADER = os.getenv("TRACING_HEADER", "traceparent")
+
 
 class AppConfig:
     """Configurazione globale dell'applicazione"""
@@ -159,6 +272,9 @@ class AppConfig:
     AMC = AMCConfig
     LAB = LABConfig
     AGENT = AgentConfig
+    TRACING = TracingConfig
+    JOBS = JobsConfig
+    STREAM = StreamConfig
 
     @classmethod
     def validate_all(cls):
@@ -9,8 +9,11 @@ Queste impostazioni possono essere estese via variabili d'ambiente (comma-separa
 
 from __future__ import annotations
 
+import fnmatch
 import os
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
 
 
 class UIOverridesConfig:
@@ -18,6 +21,7 @@ class UIOverridesConfig:
     Override UI/app-specific per:
     - inspect_interactive_elements: selettori extra cliccabili (oltre a HTML/WCAG standard)
     - scroll_to_bottom: gestione wrapper noti che richiedono scroll su lista interna + footer
+    - resource filter: risorse di rete bloccate/stubbate per profilo app (PLAYWRIGHT_RESOURCE_FILTER)
     """
 
     # Registro incrementale per inspect_interactive_elements / inspect_region:
@@ -82,6 +86,35 @@ class UIOverridesConfig:
         "mat-expansion-panel",
     )
 
+    # Filtro risorse di rete (agent/resource_filter.py): per profilo app, tipi di risorsa
+    # Playwright (request.resource_type) e pattern URL da bloccare (abort) o stubbare
+    # (risposta vuota/pixel trasparente, l'elemento resta e onload scatta). Pattern URL:
+    # sottostringa, oppure glob fnmatch se contiene '*' (confrontato con l'URL senza query
+    # string e fragment). allow_url_patterns vince su tutto; document/script/xhr/fetch non
+    # sono mai filtrati per tipo (servono ai test).
+    # Profili per app: {"extends": "default", "hosts": (host delle pagine per cui il profilo
+    # vale in modalità auto,), ...pattern}; da aggiungere solo con pattern misurati su una run.
+    _RESOURCE_FILTER_PROFILES: Dict[str, Dict[str, Any]] = {
+        "default": {
+            "block_types": ("font", "media"),
+            "stub_types": ("image",),
+            "block_url_patterns": (
+                # analytics / beacon / tag manager: i test non li asseriscono mai
+                "google-analytics.com",
+                "googletagmanager.com",
+                "doubleclick.net",
+                "hotjar.com",
+                "clarity.ms",
+                "newrelic.com",
+                "nr-data.net",
+                "matomo",
+            ),
+            "stub_url_patterns": (),
+            "allow_url_patterns": (),
+        },
+    }
+    _RESOURCE_FILTER_NEVER_TYPES: Tuple[str, ...] = ("document", "script", "xhr", "fetch")
+
     @classmethod
     def is_scroll_sample_table_wrapper(cls, selector: str) -> bool:
         return selector.strip() in cls._SCROLL_SAMPLE_TABLE_WRAPPER_ALIASES
@@ -126,3 +159,55 @@ class UIOverridesConfig:
                 merged.append(s)
         return tuple(merged)
 
+    @classmethod
+    def get_resource_filter_profile(cls, name: str) -> Optional[Dict[str, Tuple[str, ...]]]:
+        """
+        Regole del profilo (con "extends" risolto) + pattern extra da .env (comma-separated).
+        None se il profilo non esiste.
+        Esempio: RESOURCE_FILTER_BLOCK_PATTERNS=cdn.example.com/fonts,*.mp4
+                 RESOURCE_FILTER_ALLOW_PATTERNS=/assets/icons/logo.svg
+        """
+        chain = []
+        while name and name in cls._RESOURCE_FILTER_PROFILES and name not in chain:
+            chain.append(name)
+            name = cls._RESOURCE_FILTER_PROFILES[name].get("extends")
+        if not chain:
+            return None
+        keys = (
+            "block_types",
+            "stub_types",
+            "block_url_patterns",
+            "stub_url_patterns",
+            "allow_url_patterns",
+        )
+        merged: Dict[str, list] = {k: [] for k in keys}
+        for profile in reversed(chain):  # base prima, profilo specifico dopo
+            for k in keys:
+                merged[k] += [v for v in cls._RESOURCE_FILTER_PROFILES[profile].get(k, ()) if v]
+        for k, env in (
+            ("block_url_patterns", "RESOURCE_FILTER_BLOCK_PATTERNS"),
+            ("allow_url_patterns", "RESOURCE_FILTER_ALLOW_PATTERNS"),
+        ):
+            merged[k] += [p.strip() for p in os.getenv(env, "").split(",") if p.strip()]
+        for k in ("block_types", "stub_types"):
+            merged[k] = [t for t in merged[k] if t not in cls._RESOURCE_FILTER_NEVER_TYPES]
+        return {k: tuple(dict.fromkeys(v)) for k, v in merged.items()}
+
+    @classmethod
+    def get_resource_filter_profile_for_url(cls, url: str) -> str:
+        """Profilo il cui host corrisponde alla pagina (modalità auto); "default" altrimenti."""
+        host = urlparse(url or "").hostname or ""
+        for name, profile in cls._RESOURCE_FILTER_PROFILES.items():
+            if host and host in profile.get("hosts", ()):
+                return name
+        return "default"
+
+    @staticmethod
+    def url_matches(url: str, pattern: str) -> bool:
+        """
+        Pattern del filtro risorse: glob fnmatch se contiene '*' (sull'URL senza query string
+        e fragment, così "*.mp4" vale anche per "video.mp4?v=3"), altrimenti sottostringa.
+        """
+        if "*" in pattern:
+            return fnmatch.fnmatchcase(url.split("#", 1)[0].split("?", 1)[0], pattern)
+        return pattern in url
@@ -18,18 +18,23 @@ load_dotenv()
 
 from config.settings import AppConfig
 from agent.tools import PlaywrightTools
+from agent.browser_pool import BrowserPool
 from mcp.server.fastmcp import FastMCP
 from tool_names import TOOL_NAMES
 
 # MCP server (stdio)
 mcp = FastMCP("PlaywrightTools")
 
-# Istanza globale tool Playwright (stato condiviso nella sessione MCP)
-playwright = PlaywrightTools()
+# Istanza globale tool Playwright (stato condiviso nella sessione MCP); il pool tiene
+# vivo il browser tra close_browser/start_browser e pre-crea i contesti
+playwright = PlaywrightTools(browser_pool=BrowserPool())
 
 
 def to_json(result: dict) -> str:
     """Standard output: sempre JSON string."""
+    if isinstance(result, dict) and result.get("format") == "compact":
+        # formato compatto di inspect_*: niente indentazione (token)
+        return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
     return json.dumps(result, indent=2, ensure_ascii=False)
 
 
@@ -38,9 +43,9 @@ def to_json(result: dict) -> str:
 # =========================
 
 @mcp.tool()
-async def start_browser(headless: bool = False) -> str:
-    """Avvia browser Chromium."""
-    result = await playwright.start_browser(headless=headless)
+async def start_browser(headless: bool = False, har_mode: str | None = None, har_name: str | None = None) -> str:
+    """Avvia browser Chromium. har_mode/har_name: registrazione o replay HAR (uso benchmark, di solito omessi)."""
+    result = await playwright.start_browser(headless=headless, har_mode=har_mode, har_name=har_name)
     return to_json(result)
 
 
@@ -176,7 +181,13 @@ async def wait_for_control_by_name_and_type(name_substring: str, control_type: s
 # =========================
 
 @mcp.tool()
-async def inspect_interactive_elements(in_iframe: dict | None = None) -> str:
+async def inspect_interactive_elements(
+    in_iframe: dict | None = None,
+    compact: bool | None = None,
+    max_elements: int | None = None,
+    max_chars: int | None = None,
+    since: str | None = None,
+) -> str:
     """
     Scansiona TUTTI gli elementi interattivi usando solo standard web (NO attributi custom).
     Trova: iframe, button, link, input, select, textarea + ARIA roles.
@@ -206,13 +217,39 @@ async def inspect_interactive_elements(in_iframe: dict | None = None) -> str:
         - iframes: [{src, title, selector}]
         - clickable_elements: [{role, accessible_name, text, playwright_suggestions}]
         - form_fields: [{type, accessible_name, placeholder, playwright_suggestions}]
+
+    Formato compatto (compact=True, o PLAYWRIGHT_INSPECT_COMPACT=true):
+        "elements" è una stringa con una riga per elemento; l'id è la chiave stabile
+        dell'elemento (fr=iframe, f=campo, i=controllo, c=cliccabile + hash), es:
+            c5e1a2f button "Causali"
+            f08b3c4 password "Password" ph="Password"
+        Usa l'id così com'è come target: click_smart(targets=[{"by": "ref", "ref": "c5e1a2f"}]),
+        fill_smart(targets=[{"by": "ref", "ref": "f08b3c4"}], value=...). Gli id valgono fino al
+        prossimo inspect e restano gli stessi nei diff con since (righe "+"/"~", "removed").
+        max_elements/max_chars limitano l'output: gli elementi oltre il budget sono contati in
+        "omitted" (usa inspect_region per restringere).
+
+    Output incrementale: ogni risposta ha "inspect_token" e una "key" stabile per elemento.
+    Ripassando since=<inspect_token> dopo un'azione o wait_for_dom_change ricevi solo
+    "added"/"changed" (elementi completi) e "removed" (chiavi), non l'intera pagina.
+    Se il token non vale (scaduto o altro ambito) ricevi l'elenco completo con "since_ignored".
     """
-    result = await playwright.inspect_interactive_elements(in_iframe=in_iframe)
+    result = await playwright.inspect_interactive_elements(
+        in_iframe=in_iframe, compact=compact, max_elements=max_elements, max_chars=max_chars,
+        since=since,
+    )
     return to_json(result)
 
 
 @mcp.tool()
-async def inspect_region(root_selector: str, in_iframe: dict | None = None) -> str:
+async def inspect_region(
+    root_selector: str,
+    in_iframe: dict | None = None,
+    compact: bool | None = None,
+    max_elements: int | None = None,
+    max_chars: int | None = None,
+    since: str | None = None,
+) -> str:
     """
     Ispeziona SOLO una regione della pagina, identificata da root_selector (CSS).
 
@@ -227,8 +264,18 @@ async def inspect_region(root_selector: str, in_iframe: dict | None = None) -> s
     - Usa inspect_region SOLO quando sai che esiste un contenitore specifico, ad esempio:
         - dopo "Aggiungi filtro" → root_selector=".mat-mdc-dialog-container"  (vera dialog)
         - dopo "Modifica" → il contenuto è inline: usa inspect_interactive_elements() invece
+
+    compact / max_elements / max_chars / since: come in inspect_interactive_elements
+    (since = inspect_token del precedente inspect_region sullo stesso root_selector).
     """
-    result = await playwright.inspect_region(root_selector=root_selector, in_iframe=in_iframe)
+    result = await playwright.inspect_region(
+        root_selector=root_selector,
+        in_iframe=in_iframe,
+        compact=compact,
+        max_elements=max_elements,
+        max_chars=max_chars,
+        since=since,
+    )
     return to_json(result)
 
 
@@ -284,6 +331,7 @@ async def click_smart(targets: List[Dict[str, str]], timeout_per_try: int = 8000
             [{"by": "role", "role": "button", "name": "Login"},
              {"by": "css", "selector": "[aria-label='Login']"},
              {"by": "text", "text": "Login"}]
+            Con inspect compatto: [{"by": "ref", "ref": "<id>"}] (espanso lato server).
         timeout_per_try: Timeout per ogni tentativo in ms (default: 8000)
         in_iframe: dict per iframe (singolo o annidati)
             - Singolo: {"selector": "..."} o {"url_pattern": "..."}
@@ -307,6 +355,7 @@ async def fill_smart(targets: list[dict], value: str, timeout_per_try: int = 800
             [{"by": "label", "label": "Username"},
              {"by": "placeholder", "placeholder": "Enter username"},
              {"by": "role", "role": "textbox", "name": "Username"}]
+            Con inspect compatto: [{"by": "ref", "ref": "<id>"}] (espanso lato server).
         value: Valore da inserire
         timeout_per_try: Timeout per ogni tentativo in ms (default: 8000)
         in_iframe: dict per iframe (singolo o annidati)
@@ -391,6 +440,38 @@ async def click_and_wait_for_text(
     return to_json(result)
 
 
+@mcp.tool()
+async def execute_plan(actions: list[dict], guard_timeout: int | None = None) -> str:
+    """
+    Esegue lato server una SEQUENZA di azioni, fermandosi alla prima che fallisce.
+    Usalo per sotto-flussi noti i cui elementi sono già nell'ultimo inspect
+    (es. login: fill username, fill password, click Accedi) → una tool call invece di N.
+
+    Args:
+        actions: lista ordinata di azioni:
+            {"tool": "<click_smart|fill_smart|press_key|wait_for_text_content|...>",
+             "args": {...argomenti del tool...},
+             "expect_dom_change": true | "<css root>",   # opz.: mutazione DOM attesa dopo l'azione
+             "wait_text": "<testo>",                      # opz.: testo atteso dopo l'azione
+             "guard_timeout": 10000}                      # opz.: timeout dei guard (ms)
+        guard_timeout: timeout di default dei guard in ms (default: PLAYWRIGHT_TIMEOUT)
+
+    Returns:
+        JSON con status, completed/total, failed_at e steps (un risultato per azione e per guard).
+        Se failed_at non è null: ri-ispeziona la pagina e prosegui dall'azione fallita.
+
+    Example (login):
+        execute_plan(actions=[
+            {"tool": "fill_smart", "args": {"targets": [{"by": "label", "label": "Username"}], "value": "user"}},
+            {"tool": "fill_smart", "args": {"targets": [{"by": "label", "label": "Password"}], "value": "***"}},
+            {"tool": "click_smart", "args": {"targets": [{"by": "role", "role": "button", "name": "Accedi"}]},
+             "wait_text": "Laboratorio"}
+        ])
+    """
+    result = await playwright.execute_plan(actions=actions, guard_timeout=guard_timeout)
+    return to_json(result)
+
+
 @mcp.tool()
 async def get_frame(selector: str = None, url_pattern: str = None, iframe_path: list = None, timeout: int = 10000) -> str:
     """
@@ -414,6 +495,44 @@ async def get_frame(selector: str = None, url_pattern: str = None, iframe_path:
     return to_json(result)
 
 
+# =========================
+# Snapshot sessione (orchestrator)
+# =========================
+
+@mcp.tool()
+async def configure_har(mode: str = "off", name: str = "default") -> str:
+    """HAR (off/record/replay) dei prossimi start_browser della sessione (uso orchestrator)."""
+    result = await playwright.configure_har(mode=mode, name=name)
+    return to_json(result)
+
+
+@mcp.tool()
+async def get_resource_filter_stats() -> str:
+    """Richieste/byte risparmiati dal filtro risorse di rete nella run (uso orchestrator)."""
+    result = await playwright.get_resource_filter_stats()
+    return to_json(result)
+
+
+@mcp.tool()
+async def save_storage_state(name: str = "default") -> str:
+    """
+    Salva cookie/storage della sessione autenticata e l'URL corrente (uso orchestrator,
+    dopo un prefix riuscito).
+    """
+    result = await playwright.save_storage_state(name=name)
+    return to_json(result)
+
+
+@mcp.tool()
+async def restore_storage_state(name: str = "default", max_age_s: int | None = None, headless: bool | None = None) -> str:
+    """
+    Ripristina uno stato salvato con save_storage_state in un contesto nuovo e naviga
+    all'URL salvato. rejected=True se l'app richiede di nuovo il login.
+    """
+    result = await playwright.restore_storage_state(name=name, max_age_s=max_age_s, headless=headless)
+    return to_json(result)
+
+
 # =========================
 # Avvio (stdio)
 # =========================
@@ -16,17 +16,44 @@ load_dotenv()
 
 # Ora possiamo importare i moduli locali
 from config.settings import AppConfig
-from agent.tools import PlaywrightTools
+from agent.browser_pool import BrowserPool, BrowserSessionRegistry, SessionLimitError
+from agent.metrics import get_metrics, timed_phase
+from agent import tracing
+import functools
 import json
-from mcp.server.fastmcp import FastMCP
+import time
+from contextvars import ContextVar
+from mcp.server.fastmcp import Context, FastMCP
+from starlette.responses import PlainTextResponse
 from tool_names import TOOL_NAMES
 
 
+# status del risultato serializzato nella tool call corrente (letto da timed_tool)
+_result_status: ContextVar = ContextVar("_result_status", default=None)
+# inizio della tool call corrente (perf_counter, impostato da timed_tool)
+_tool_started: ContextVar = ContextVar("_tool_started", default=None)
+
+
 def to_json(result: dict) -> str:
     """
     Converte il risultato di PlaywrightTools in JSON string.
-    Garantisce output strutturato per MCP.
+    Garantisce output strutturato per MCP. Aggiunge server_ms (esecuzione lato server)
+    per la scomposizione dei tempi lato client (agent/core/timing.py, che lo toglie dal
+    ToolMessage prima che arrivi all'LLM).
     """
+    if isinstance(result, dict):
+        _result_status.set(result.get("status"))
+        started = _tool_started.get()
+        if started is not None:
+            result = {**result, "server_ms": int((time.perf_counter() - started) * 1000)}
+    with timed_phase("serialization"):
+        return _to_json(result)
+
+
+def _to_json(result: dict) -> str:
+    if isinstance(result, dict) and result.get("format") == "compact":
+        # formato compatto di inspect_*: niente indentazione (token)
+        return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
     return json.dumps(result, indent=2, ensure_ascii=False)
 
 
@@ -37,56 +64,156 @@ mcp = FastMCP(
     port=AppConfig.MCP.REMOTE_PORT
 )
 
-# Istanza globale dei tool Playwright
-playwright = PlaywrightTools()
+tracing.set_service_name("mcp-server")
+
+
+def timed_tool():
+    """
+    @mcp.tool() con metriche per tool: istogramma latenze, errori (status=error o
+    eccezione) e dimensione del payload restituito. Esposte su AppConfig.MCP.METRICS_PATH.
+    Con tracing attivo apre lo span del tool, figlio del traceparent ricevuto dal client.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            token = _result_status.set(None)
+            started = time.perf_counter()
+            started_token = _tool_started.set(started)
+            error, payload = True, None
+            try:
+                with _tool_span(fn.__name__, kwargs.get("ctx")) as span:
+                    output = await fn(*args, **kwargs)
+                    if isinstance(output, str):
+                        payload = len(output.encode("utf-8"))
+                    error = _result_status.get() == "error"
+                    if span is not None:
+                        span.set(status=_result_status.get(), payload_bytes=payload)
+                    return output
+            finally:
+                get_metrics().observe_tool(
+                    fn.__name__, time.perf_counter() - started, error, payload
+                )
+                _result_status.reset(token)
+                _tool_started.reset(started_token)
+
+        return mcp.tool()(wrapper)
+
+    return decorator
+
+
+@mcp.custom_route(AppConfig.MCP.METRICS_PATH, methods=["GET"])
+async def metrics(request) -> PlainTextResponse:
+    """Metriche tool/fasi e pool browser in formato testo Prometheus."""
+    return PlainTextResponse(
+        get_metrics().render_prometheus() + sessions.pool.render_prometheus(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+# Sessioni browser: un PlaywrightTools (BrowserContext + pagina) per sessione,
+# tutti sullo stesso processo browser. La sessione arriva nell'header HTTP
+# AppConfig.MCP.SESSION_HEADER (il client MCP apre una sessione MCP per ogni tool call,
+# quindi l'id sessione MCP non è stabile tra le chiamate di uno stesso scenario).
+sessions = BrowserSessionRegistry(
+    BrowserPool(),
+    max_sessions=AppConfig.MCP.MAX_SESSIONS,
+    idle_timeout_s=AppConfig.MCP.SESSION_IDLE_TIMEOUT,
+)
+
+
+def _header(ctx: Context, name: str) -> str:
+    """Valore di un header della richiesta HTTP corrente ("" se assente)."""
+    try:
+        request = ctx.request_context.request
+    except (AttributeError, ValueError):
+        request = None
+    headers = getattr(request, "headers", None)
+    if headers is None:
+        return ""
+    return (headers.get(name) or "").strip()
+
+
+def _session_id(ctx: Context) -> str:
+    """Id sessione browser dalla richiesta HTTP corrente (default se assente)."""
+    return _header(ctx, AppConfig.MCP.SESSION_HEADER) or AppConfig.MCP.DEFAULT_SESSION_ID
+
+
+def _tool_span(tool: str, ctx: Context | None):
+    """Span del tool MCP: parent dal traceparent del client, una corsia per sessione browser."""
+    if not tracing.is_enabled() or ctx is None:
+        return tracing.span(f"mcp.{tool}", cat="mcp")
+    session_id = _session_id(ctx)
+    parent = tracing.parse_traceparent(
+        _header(ctx, AppConfig.TRACING.HEADER), lane=("session", session_id)
+    )
+    return tracing.span(
+        f"mcp.{tool}",
+        cat="mcp",
+        parent=parent,
+        lane=None if parent else ("session", session_id),
+        session_id=session_id,
+    )
+
+
+async def _call(ctx: Context, method: str, **kwargs) -> dict:
+    """Esegue PlaywrightTools.<method> nella sessione browser del chiamante."""
+    try:
+        async with sessions.use(_session_id(ctx)) as tools:
+            with tracing.span(f"PlaywrightTools.{method}", cat="playwright"):
+                return await getattr(tools, method)(**kwargs)
+    except SessionLimitError as e:
+        return {"status": "error", "message": str(e)}
 
 
 # =========================
 # Tool base browser
 # =========================
 
-@mcp.tool()
-async def start_browser(headless: bool = False) -> str:
-    """Avvia browser Chromium."""
-    result = await playwright.start_browser(headless=headless)
+@timed_tool()
+async def start_browser(ctx: Context, headless: bool = False, har_mode: str | None = None, har_name: str | None = None) -> str:
+    """Avvia browser Chromium. har_mode/har_name: registrazione o replay HAR (uso benchmark, di solito omessi)."""
+    result = await _call(ctx, "start_browser", headless=headless, har_mode=har_mode, har_name=har_name)
     return to_json(result)
 
 
-@mcp.tool()
-async def navigate_to_url(url: str) -> str:
+@timed_tool()
+async def navigate_to_url(ctx: Context, url: str) -> str:
     """Naviga verso un URL e aspetta il caricamento."""
-    result = await playwright.navigate_to_url(url)
+    result = await _call(ctx, "navigate_to_url", url=url)
     return to_json(result)
 
 
-@mcp.tool()
-async def wait_for_load_state(state: str = "domcontentloaded", timeout: int = 30000) -> str:
+@timed_tool()
+async def wait_for_load_state(ctx: Context, state: str = "domcontentloaded", timeout: int = 30000) -> str:
     """Attende un load state Playwright (load/domcontentloaded/networkidle)."""
-    result = await playwright.wait_for_load_state(state=state, timeout=timeout)
+    result = await _call(ctx, "wait_for_load_state", state=state, timeout=timeout)
     return to_json(result)
 
 
-@mcp.tool()
-async def capture_screenshot(filename: str = None, return_base64: bool = False) -> str:
+@timed_tool()
+async def capture_screenshot(ctx: Context, filename: str = None, return_base64: bool = False) -> str:
     """
     Cattura screenshot full-page.
     Se return_base64=True include base64 nel JSON (attenzione ai token).
     """
-    result = await playwright.capture_screenshot(filename=filename, return_base64=return_base64)
+    result = await _call(ctx, "capture_screenshot", filename=filename, return_base64=return_base64)
     return to_json(result)
 
 
-@mcp.tool()
-async def close_browser() -> str:
+@timed_tool()
+async def close_browser(ctx: Context) -> str:
     """Chiude il browser e libera risorse."""
-    result = await playwright.close_browser()
+    result = await sessions.close_session(_session_id(ctx))
+    if result is None:
+        result = {"status": "success", "message": "Browser chiuso correttamente"}
     return to_json(result)
 
 
-@mcp.tool()
-async def get_page_info() -> str:
+@timed_tool()
+async def get_page_info(ctx: Context) -> str:
     """Ritorna info sulla pagina corrente (url, title, viewport)."""
-    result = await playwright.get_page_info()
+    result = await _call(ctx, "get_page_info")
     return to_json(result)
 
 
@@ -94,8 +221,9 @@ async def get_page_info() -> str:
 # Tool interazione pagina
 # =========================
 
-@mcp.tool()
+@timed_tool()
 async def wait_for_element_state(
+    ctx: Context,
     targets: List[Dict],
     state: str = "visible",
     timeout: int | None = None,
@@ -109,7 +237,9 @@ async def wait_for_element_state(
         - Playwright nativi: "visible", "hidden", "attached", "detached"
         - Logici: "enabled", "disabled" (polling su is_enabled()).
     """
-    result = await playwright.wait_for_element_state(
+    result = await _call(
+        ctx,
+        "wait_for_element_state",
         targets=targets,
         state=state,
         timeout=timeout,
@@ -118,33 +248,33 @@ async def wait_for_element_state(
     return to_json(result)
 
 
-@mcp.tool()
-async def get_text(selector: str, selector_type: str = "css") -> str:
+@timed_tool()
+async def get_text(ctx: Context, selector: str, selector_type: str = "css") -> str:
     """Estrae testo da elemento."""
-    result = await playwright.get_text(selector=selector, selector_type=selector_type)
+    result = await _call(ctx, "get_text", selector=selector, selector_type=selector_type)
     return to_json(result)
 
 
-@mcp.tool()
-async def get_text_by_visible_content(search_text: str, timeout: int = 10000) -> str:
+@timed_tool()
+async def get_text_by_visible_content(ctx: Context, search_text: str, timeout: int = 10000) -> str:
     """
     Trova il primo elemento visibile che contiene search_text e ne restituisce il testo (innerText).
     Utile per leggere il footer elenco campioni, es. get_text_by_visible_content("Totale righe visualizzate")
     restituisce "Totale righe visualizzate: 32 su 32".
     """
-    result = await playwright.get_text_by_visible_content(search_text=search_text, timeout=timeout)
+    result = await _call(ctx, "get_text_by_visible_content", search_text=search_text, timeout=timeout)
     return to_json(result)
 
 
-@mcp.tool()
-async def press_key(key: str) -> str:
+@timed_tool()
+async def press_key(ctx: Context, key: str) -> str:
     """Premi un tasto (Enter/Escape/etc.)."""
-    result = await playwright.press_key(key=key)
+    result = await _call(ctx, "press_key", key=key)
     return to_json(result)
 
 
-@mcp.tool()
-async def scroll_to_bottom(selector: str | None = None) -> str:
+@timed_tool()
+async def scroll_to_bottom(ctx: Context, selector: str | None = None) -> str:
     """
     Scorre fino in fondo la pagina o un contenitore specifico.
 
@@ -154,28 +284,28 @@ async def scroll_to_bottom(selector: str | None = None) -> str:
                   Per i wrapper elenco campioni (PlaywrightConfig): scroll sulla lista configurata
                   e scroll_into_view del testo footer, con fallback sul selettore passato.
     """
-    result = await playwright.scroll_to_bottom(selector=selector)
+    result = await _call(ctx, "scroll_to_bottom", selector=selector)
     return to_json(result)
 
 
-@mcp.tool()
-async def wait_for_clickable_by_name(name_substring: str, timeout: int = None, case_insensitive: bool = True) -> str:
+@timed_tool()
+async def wait_for_clickable_by_name(ctx: Context, name_substring: str, timeout: int = None, case_insensitive: bool = True) -> str:
     """Attende che compaia un elemento cliccabile il cui nome contiene name_substring (usa inspect)."""
-    result = await playwright.wait_for_clickable_by_name(name_substring=name_substring, timeout=timeout, case_insensitive=case_insensitive)
+    result = await _call(ctx, "wait_for_clickable_by_name", name_substring=name_substring, timeout=timeout, case_insensitive=case_insensitive)
     return to_json(result)
 
 
-@mcp.tool()
-async def wait_for_field_by_name(name_substring: str, timeout: int = None, case_insensitive: bool = True) -> str:
+@timed_tool()
+async def wait_for_field_by_name(ctx: Context, name_substring: str, timeout: int = None, case_insensitive: bool = True) -> str:
     """Attende che compaia un campo form il cui nome/placeholder contiene name_substring (usa inspect)."""
-    result = await playwright.wait_for_field_by_name(name_substring=name_substring, timeout=timeout, case_insensitive=case_insensitive)
+    result = await _call(ctx, "wait_for_field_by_name", name_substring=name_substring, timeout=timeout, case_insensitive=case_insensitive)
     return to_json(result)
 
 
-@mcp.tool()
-async def wait_for_control_by_name_and_type(name_substring: str, control_type: str, timeout: int = None, case_insensitive: bool = True) -> str:
+@timed_tool()
+async def wait_for_control_by_name_and_type(ctx: Context, name_substring: str, control_type: str, timeout: int = None, case_insensitive: bool = True) -> str:
     """Attende un controllo (es. combobox) con nome e tipo (usa inspect)."""
-    result = await playwright.wait_for_control_by_name_and_type(name_substring=name_substring, control_type=control_type, timeout=timeout, case_insensitive=case_insensitive)
+    result = await _call(ctx, "wait_for_control_by_name_and_type", name_substring=name_substring, control_type=control_type, timeout=timeout, case_insensitive=case_insensitive)
     return to_json(result)
 
 
@@ -183,8 +313,14 @@ async def wait_for_control_by_name_and_type(name_substring: str, control_type: s
 # Tool avanzati
 # =========================
 
-@mcp.tool()
-async def inspect_interactive_elements(in_iframe: dict | None = None) -> str:
+@timed_tool()
+async def inspect_interactive_elements(
+    ctx: Context, in_iframe: dict | None = None,
+    compact: bool | None = None,
+    max_elements: int | None = None,
+    max_chars: int | None = None,
+    since: str | None = None,
+) -> str:
     """
     Scansiona TUTTI gli elementi interattivi usando solo standard web (NO attributi custom).
     Trova: iframe, button, link, input, select, textarea + ARIA roles.
@@ -227,13 +363,44 @@ async def inspect_interactive_elements(in_iframe: dict | None = None) -> str:
              "playwright_suggestions": [{"strategy": "label", "fill_smart": {"by": "label", "label": "Password"}}]}
           ]
         }
+
+    Formato compatto (compact=True, o PLAYWRIGHT_INSPECT_COMPACT=true):
+        "elements" è una stringa con una riga per elemento; l'id è la chiave stabile
+        dell'elemento (fr=iframe, f=campo, i=controllo, c=cliccabile + hash), es:
+            c5e1a2f button "Causali"
+            f08b3c4 password "Password" ph="Password"
+        Usa l'id così com'è come target: click_smart(targets=[{"by": "ref", "ref": "c5e1a2f"}]),
+        fill_smart(targets=[{"by": "ref", "ref": "f08b3c4"}], value=...). Gli id valgono fino al
+        prossimo inspect e restano gli stessi nei diff con since (righe "+"/"~", "removed").
+        max_elements/max_chars limitano l'output: gli elementi oltre il budget sono contati in
+        "omitted" (usa inspect_region per restringere).
+
+    Output incrementale: ogni risposta ha "inspect_token" e una "key" stabile per elemento.
+    Ripassando since=<inspect_token> dopo un'azione o wait_for_dom_change ricevi solo
+    "added"/"changed" (elementi completi) e "removed" (chiavi), non l'intera pagina.
+    Se il token non vale (scaduto o altro ambito) ricevi l'elenco completo con "since_ignored".
     """
-    result = await playwright.inspect_interactive_elements(in_iframe=in_iframe)
+    result = await _call(
+        ctx,
+        "inspect_interactive_elements",
+        in_iframe=in_iframe,
+        compact=compact,
+        max_elements=max_elements,
+        max_chars=max_chars,
+        since=since,
+    )
     return to_json(result)
 
 
-@mcp.tool()
-async def inspect_region(root_selector: str, in_iframe: dict | None = None) -> str:
+@timed_tool()
+async def inspect_region(
+    ctx: Context, root_selector: str,
+    in_iframe: dict | None = None,
+    compact: bool | None = None,
+    max_elements: int | None = None,
+    max_chars: int | None = None,
+    since: str | None = None,
+) -> str:
     """
     Ispeziona SOLO una regione della pagina, identificata da root_selector (CSS).
 
@@ -248,23 +415,36 @@ async def inspect_region(root_selector: str, in_iframe: dict | None = None) -> s
     - Usa inspect_region SOLO quando sai che esiste un contenitore specifico, ad esempio:
         - dopo "Aggiungi filtro" → root_selector=".mat-mdc-dialog-container"  (vera dialog)
         - dopo "Modifica" → il contenuto è inline: usa inspect_interactive_elements() invece
+
+    compact / max_elements / max_chars / since: come in inspect_interactive_elements
+    (since = inspect_token del precedente inspect_region sullo stesso root_selector).
     """
-    result = await playwright.inspect_region(root_selector=root_selector, in_iframe=in_iframe)
+    result = await _call(
+        ctx,
+        "inspect_region",
+        root_selector=root_selector,
+        in_iframe=in_iframe,
+        compact=compact,
+        max_elements=max_elements,
+        max_chars=max_chars,
+        since=since,
+    )
     return to_json(result)
 
 
-@mcp.tool()
-async def handle_cookie_banner(strategies: list[str] | None = None, timeout: int = 5000) -> str:
+@timed_tool()
+async def handle_cookie_banner(ctx: Context, strategies: list[str] | None = None, timeout: int = 5000) -> str:
     """
     Gestisce cookie banner con strategie multiple.
     Output: JSON con strategia usata e selector cliccato (se trovato).
     """
-    result = await playwright.handle_cookie_banner(strategies=strategies, timeout=timeout)
+    result = await _call(ctx, "handle_cookie_banner", strategies=strategies, timeout=timeout)
     return to_json(result)
 
 
-@mcp.tool()
+@timed_tool()
 async def wait_for_dom_change(
+    ctx: Context,
     root_selector: str = "body",
     timeout: int | None = None,
     attributes: bool = True,
@@ -281,7 +461,9 @@ async def wait_for_dom_change(
       per sapere quando la card/modal ha cambiato struttura, poi chiama inspect_region(root_selector)
       per scoprire i nuovi controlli senza re-ispezionare l'intera pagina.
     """
-    result = await playwright.wait_for_dom_change(
+    result = await _call(
+        ctx,
+        "wait_for_dom_change",
         root_selector=root_selector,
         timeout=timeout,
         attributes=attributes,
@@ -293,8 +475,8 @@ async def wait_for_dom_change(
     return to_json(result)
 
 
-@mcp.tool()
-async def click_smart(targets: List[Dict[str, str]], timeout_per_try: int = 8000, in_iframe: dict = None) -> str:
+@timed_tool()
+async def click_smart(ctx: Context, targets: List[Dict[str, str]], timeout_per_try: int = 8000, in_iframe: dict = None) -> str:
     """
     Click elemento con FALLBACK CHAIN automatico - prova tutte le strategie fino al successo.
     Resilienza massima: role fallisce su duplicato? Prova css_aria. css_aria manca? Prova text.
@@ -305,6 +487,7 @@ async def click_smart(targets: List[Dict[str, str]], timeout_per_try: int = 8000
             [{"by": "role", "role": "button", "name": "Login"},
              {"by": "css", "selector": "[aria-label='Login']"},
              {"by": "text", "text": "Login"}]
+            Con inspect compatto: [{"by": "ref", "ref": "<id>"}] (espanso lato server).
         timeout_per_try: Timeout per ogni tentativo in ms (default: 8000)
         in_iframe: dict per iframe (singolo o annidati)
             - Singolo: {"selector": "..."} o {"url_pattern": "..."}
@@ -344,12 +527,12 @@ async def click_smart(targets: List[Dict[str, str]], timeout_per_try: int = 8000
     
     Best practice: Usa inspect_interactive_elements() e copia TUTTE le strategie da playwright_suggestions.
     """
-    result = await playwright.click_smart(targets=targets, timeout_per_try=timeout_per_try, in_iframe=in_iframe)
+    result = await _call(ctx, "click_smart", targets=targets, timeout_per_try=timeout_per_try, in_iframe=in_iframe)
     return to_json(result)
 
 
-@mcp.tool()
-async def fill_smart(targets: list[dict], value: str, timeout_per_try: int = 8000, in_iframe: dict = None) -> str:
+@timed_tool()
+async def fill_smart(ctx: Context, targets: list[dict], value: str, timeout_per_try: int = 8000, in_iframe: dict = None) -> str:
     """
     Fill input con FALLBACK CHAIN automatico - prova tutte le strategie fino al successo.
     Resilienza massima: label manca? Prova placeholder. Placeholder vuoto? Prova role.
@@ -360,6 +543,7 @@ async def fill_smart(targets: list[dict], value: str, timeout_per_try: int = 800
             [{"by": "label", "label": "Username"},
              {"by": "placeholder", "placeholder": "Enter username"},
              {"by": "role", "role": "textbox", "name": "Username"}]
+            Con inspect compatto: [{"by": "ref", "ref": "<id>"}] (espanso lato server).
         value: Valore da inserire
         timeout_per_try: Timeout per ogni tentativo in ms (default: 8000)
         in_iframe: dict per iframe (singolo o annidati)
@@ -407,7 +591,7 @@ async def fill_smart(targets: list[dict], value: str, timeout_per_try: int = 800
     print(f"   Timeout: {timeout_per_try}ms")
     print(f"   In iframe: {in_iframe}")
     
-    result = await playwright.fill_smart(targets=targets, value=value, timeout_per_try=timeout_per_try, in_iframe=in_iframe)
+    result = await _call(ctx, "fill_smart", targets=targets, value=value, timeout_per_try=timeout_per_try, in_iframe=in_iframe)
     
     print(f"   Result: {result.get('status')} - {result.get('message', 'N/A')}")
     if result.get('status') == 'success':
@@ -416,8 +600,8 @@ async def fill_smart(targets: list[dict], value: str, timeout_per_try: int = 800
     return to_json(result)
 
 
-@mcp.tool()
-async def wait_for_text_content(text: str, timeout: int = 30000, case_sensitive: bool = False, in_iframe: dict = None) -> str:
+@timed_tool()
+async def wait_for_text_content(ctx: Context, text: str, timeout: int = 30000, case_sensitive: bool = False, in_iframe: dict = None) -> str:
     """
     Aspetta che un testo specifico appaia OVUNQUE nella pagina o dentro un iframe.
     Utile per verificare caricamenti AJAX, messaggi success/error, risultati search in iframe.
@@ -454,12 +638,13 @@ async def wait_for_text_content(text: str, timeout: int = 30000, case_sensitive:
             in_iframe={"url_pattern": "movementreason"}
         )
     """
-    result = await playwright.wait_for_text_content(text=text, timeout=timeout, case_sensitive=case_sensitive, in_iframe=in_iframe)
+    result = await _call(ctx, "wait_for_text_content", text=text, timeout=timeout, case_sensitive=case_sensitive, in_iframe=in_iframe)
     return to_json(result)
 
 
-@mcp.tool()
+@timed_tool()
 async def click_and_wait_for_text(
+    ctx: Context,
     targets: list[dict] | None = None,
     text: str = "",
     timeout_per_try: int = 8000,
@@ -471,14 +656,46 @@ async def click_and_wait_for_text(
     Se targets è vuoto, esegue solo wait_for_text_content(text).
     """
     if not targets:
-        result = await playwright.wait_for_text_content(text=text, timeout=text_timeout, case_sensitive=False, in_iframe=in_iframe)
+        result = await _call(ctx, "wait_for_text_content", text=text, timeout=text_timeout, case_sensitive=False, in_iframe=in_iframe)
         return to_json({"status": result.get("status"), "message": result.get("message"), "click": None, "text_check": result, "fallback_mode": "wait_for_text_content_only"})
-    result = await playwright.click_and_wait_for_text(targets=targets, text=text, timeout_per_try=timeout_per_try, text_timeout=text_timeout, in_iframe=in_iframe)
+    result = await _call(ctx, "click_and_wait_for_text", targets=targets, text=text, timeout_per_try=timeout_per_try, text_timeout=text_timeout, in_iframe=in_iframe)
     return to_json(result)
 
 
-@mcp.tool()
-async def get_frame(selector: str = None, url_pattern: str = None, iframe_path: list = None, timeout: int = 10000) -> str:
+@timed_tool()
+async def execute_plan(ctx: Context, actions: list[dict], guard_timeout: int | None = None) -> str:
+    """
+    Esegue lato server una SEQUENZA di azioni, fermandosi alla prima che fallisce.
+    Usalo per sotto-flussi noti i cui elementi sono già nell'ultimo inspect
+    (es. login: fill username, fill password, click Accedi) → una tool call invece di N.
+
+    Args:
+        actions: lista ordinata di azioni:
+            {"tool": "<click_smart|fill_smart|press_key|wait_for_text_content|...>",
+             "args": {...argomenti del tool...},
+             "expect_dom_change": true | "<css root>",   # opz.: mutazione DOM attesa dopo l'azione
+             "wait_text": "<testo>",                      # opz.: testo atteso dopo l'azione
+             "guard_timeout": 10000}                      # opz.: timeout dei guard (ms)
+        guard_timeout: timeout di default dei guard in ms (default: PLAYWRIGHT_TIMEOUT)
+
+    Returns:
+        JSON con status, completed/total, failed_at e steps (un risultato per azione e per guard).
+        Se failed_at non è null: ri-ispeziona la pagina e prosegui dall'azione fallita.
+
+    Example (login):
+        execute_plan(actions=[
+            {"tool": "fill_smart", "args": {"targets": [{"by": "label", "label": "Username"}], "value": "user"}},
+            {"tool": "fill_smart", "args": {"targets": [{"by": "label", "label": "Password"}], "value": "***"}},
+            {"tool": "click_smart", "args": {"targets": [{"by": "role", "role": "button", "name": "Accedi"}]},
+             "wait_text": "Laboratorio"}
+        ])
+    """
+    result = await _call(ctx, "execute_plan", actions=actions, guard_timeout=guard_timeout)
+    return to_json(result)
+
+
+@timed_tool()
+async def get_frame(ctx: Context, selector: str = None, url_pattern: str = None, iframe_path: list = None, timeout: int = 10000) -> str:
     """
     Accede al contenuto di un iframe (singolo o annidati) per interagire con elementi al suo interno.
     Risolve il problema delle pagine dentro iframe (es: Gestione Causali in AMC).
@@ -518,7 +735,45 @@ async def get_frame(selector: str = None, url_pattern: str = None, iframe_path:
             ]}
         )
     """
-    result = await playwright.get_frame(selector=selector, url_pattern=url_pattern, iframe_path=iframe_path, timeout=timeout)
+    result = await _call(ctx, "get_frame", selector=selector, url_pattern=url_pattern, iframe_path=iframe_path, timeout=timeout)
+    return to_json(result)
+
+
+# =========================
+# Snapshot sessione (orchestrator)
+# =========================
+
+@timed_tool()
+async def configure_har(ctx: Context, mode: str = "off", name: str = "default") -> str:
+    """HAR (off/record/replay) dei prossimi start_browser della sessione (uso orchestrator)."""
+    result = await _call(ctx, "configure_har", mode=mode, name=name)
+    return to_json(result)
+
+
+@timed_tool()
+async def get_resource_filter_stats(ctx: Context) -> str:
+    """Richieste/byte risparmiati dal filtro risorse di rete nella run (uso orchestrator)."""
+    result = await _call(ctx, "get_resource_filter_stats")
+    return to_json(result)
+
+
+@timed_tool()
+async def save_storage_state(ctx: Context, name: str = "default") -> str:
+    """
+    Salva cookie/storage della sessione autenticata e l'URL corrente (uso orchestrator,
+    dopo un prefix riuscito).
+    """
+    result = await _call(ctx, "save_storage_state", name=name)
+    return to_json(result)
+
+
+@timed_tool()
+async def restore_storage_state(ctx: Context, name: str = "default", max_age_s: int | None = None, headless: bool | None = None) -> str:
+    """
+    Ripristina uno stato salvato con save_storage_state in un contesto nuovo e naviga
+    all'URL salvato. rejected=True se l'app richiede di nuovo il login.
+    """
+    result = await _call(ctx, "restore_storage_state", name=name, max_age_s=max_age_s, headless=headless)
     return to_json(result)
 
 
@@ -534,7 +789,16 @@ if __name__ == "__main__":
     print("  MCP Playwright Server (HTTP transport) - ASYNC Version")
     print("=" * 80)
     print(f"  Server URL: http://{host}:{port}/mcp/")
+    print(f"  Metriche:   http://{host}:{port}{AppConfig.MCP.METRICS_PATH}")
     print(f"  Tool disponibili: {len(TOOL_NAMES)}")
+    print(
+        f"  Sessioni browser: max {AppConfig.MCP.MAX_SESSIONS} "
+        f"(header {AppConfig.MCP.SESSION_HEADER}, idle {AppConfig.MCP.SESSION_IDLE_TIMEOUT:g}s)"
+    )
+    print(
+        f"  Pool browser: {sessions.pool.size} browser, {sessions.pool.warm_contexts} contesti warm, "
+        f"riciclo ogni {sessions.pool.recycle_after or '∞'} contesti"
+    )
     print("  Tool list:")
     for name in TOOL_NAMES:
         print(f"   - {name}")
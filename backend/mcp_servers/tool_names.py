@@ -32,4 +32,21 @@ TOOL_NAMES = [
     "wait_for_field_by_name",
     "handle_cookie_banner",
     "click_and_wait_for_text",
-]
\ No newline at end of file
+
+    # PLAN - sequenza di azioni con guard eseguita lato server
+    "execute_plan",
+
+    # ORCHESTRATOR - snapshot sessione e statistiche (chiamati dal codice, esclusi dai tool dell'agent)
+    "save_storage_state",
+    "restore_storage_state",
+    "get_resource_filter_stats",
+    "configure_har",
+]
+
+# Tool invocati direttamente dall'orchestrator (MCPAgentRuntime.call_tool), non esposti all'LLM.
+ORCHESTRATOR_TOOL_NAMES = [
+    "save_storage_state",
+    "restore_storage_state",
+    "get_resource_filter_stats",
+    "configure_har",
+]
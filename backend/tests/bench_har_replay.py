@@ -0,0 +1,80 @@
+"""
+Benchmark latenze dei tool di PlaywrightTools su una copia congelata della UI (HAR).
+
+1) Registrazione (rete verso LAB/AMC):
+     BENCH_HAR_MODE=record python tests/bench_har_replay.py <url> [nome]
+   apre la pagina, esegue gli inspect e alla chiusura salva PLAYWRIGHT_HAR_DIR/<nome>.har.zip.
+2) Replay (offline, deterministico):
+     python tests/bench_har_replay.py <url> [nome]
+   serve la pagina dall'archivio (richieste non registrate abortite, PLAYWRIGHT_HAR_NOT_FOUND)
+   e misura le latenze di navigate_to_url e degli inspect_*: confrontabili tra una modifica
+   ai tool e l'altra senza il rumore della rete.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Aggiungi backend al path (parent directory di tests/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.tools import PlaywrightTools
+from config.settings import AppConfig
+
+REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+MODE = os.getenv("BENCH_HAR_MODE", "replay")
+
+
+async def timed(label: str, coro_factory, samples: dict):
+    started = time.perf_counter()
+    result = await coro_factory()
+    samples.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+    if result.get("status") != "success":
+        print(f"   ⚠️  {label}: {result.get('message')}")
+    return result
+
+
+async def main(url: str, name: str):
+    print("\n" + "=" * 80)
+    print(f"BENCHMARK tool su HAR ({MODE}) - {url}")
+    print(f"Archivio: {name}  |  ripetizioni: {REPEAT}")
+    print("=" * 80)
+
+    tools = PlaywrightTools()
+    started = await tools.start_browser(
+        headless=AppConfig.PLAYWRIGHT.HEADLESS, har_mode=MODE, har_name=name
+    )
+    print(f"   {started['status']}: {started['message']}")
+    if started.get("status") != "success":
+        return
+
+    samples: dict = {}
+    try:
+        for _ in range(REPEAT):
+            await timed("navigate_to_url", lambda: tools.navigate_to_url(url), samples)
+            await timed("inspect_interactive_elements", tools.inspect_interactive_elements, samples)
+            await timed(
+                "inspect (compact)",
+                lambda: tools.inspect_interactive_elements(compact=True),
+                samples,
+            )
+    finally:
+        closed = await tools.close_browser()
+
+    print()
+    for label, values in samples.items():
+        print(
+            f"   {label:30s}: mediana {statistics.median(values):8.1f} ms  "
+            f"min {min(values):8.1f}  max {max(values):8.1f}"
+        )
+    har = closed.get("har") or {}
+    if har.get("mode") == "record":
+        print(f"\n💾 HAR salvato: {har.get('path')} ({har.get('bytes')} byte)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python tests/bench_har_replay.py <url> [nome_archivio]")
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "bench"))
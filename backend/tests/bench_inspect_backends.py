@@ -0,0 +1,87 @@
+"""
+Benchmark backend di inspect_interactive_elements: "dom" (script in-page) vs "ax"
+(albero di accessibilità via CDP) sulle stesse pagine.
+
+- Senza argomenti: pagina locale (set_content) con menu, tab, form e BENCH_ROWS righe,
+  la stessa di bench_inspect_compact.py.
+- Con un URL: la pagina reale; con BENCH_HAR=<nome> servita dall'archivio HAR registrato
+  (vedi bench_har_replay.py), quindi offline e ripetibile.
+
+Per ogni backend: mediana/min dei tempi (cache inspect disattivata) e numero di elementi
+per sezione; in fondo i nomi accessibili che differiscono tra i due backend.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Aggiungi backend al path (parent directory di tests/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.tools import PlaywrightTools
+from config.settings import AppConfig
+from bench_inspect_compact import build_page
+
+ROWS = int(os.getenv("BENCH_ROWS", "300"))
+REPEAT = int(os.getenv("BENCH_REPEAT", "10"))
+HAR = os.getenv("BENCH_HAR")
+SECTIONS = ("iframes", "clickable_elements", "interactive_controls", "form_fields")
+
+
+def names(result: dict, section: str) -> set:
+    return {e.get("accessible_name") or e.get("text") for e in result.get(section) or []}
+
+
+async def main(url: str = None):
+    # Ogni ripetizione deve rifare l'harvest
+    AppConfig.PLAYWRIGHT.INSPECT_CACHE_ENABLED = False
+    print("\n" + "=" * 80)
+    print("BENCHMARK inspect_interactive_elements - backend dom vs ax")
+    print(f"Pagina: {url or f'locale ({ROWS} righe)'}  |  ripetizioni: {REPEAT}")
+    print("=" * 80)
+
+    tools = PlaywrightTools()
+    started = await tools.start_browser(
+        headless=AppConfig.PLAYWRIGHT.HEADLESS,
+        har_mode="replay" if HAR else None,
+        har_name=HAR,
+    )
+    print(f"   {started['status']}: {started['message']}")
+    if started.get("status") != "success":
+        return
+
+    results = {}
+    try:
+        if url:
+            await tools.navigate_to_url(url)
+            await tools.wait_for_load_state("networkidle")
+        else:
+            await tools.page.set_content(build_page(ROWS))
+
+        for backend in ("dom", "ax"):
+            samples = []
+            for _ in range(REPEAT):
+                t0 = time.perf_counter()
+                result = await tools.inspect_interactive_elements(compact=False, backend=backend)
+                samples.append((time.perf_counter() - t0) * 1000)
+            results[backend] = result
+            counts = "  ".join(f"{s.split('_')[0]}={len(result.get(s) or [])}" for s in SECTIONS)
+            note = f"  (fallback: {result['backend_fallback']})" if result.get("backend_fallback") else ""
+            print(
+                f"\n   {backend:4s}: mediana {statistics.median(samples):8.1f} ms  "
+                f"min {min(samples):8.1f} ms  |  {counts}{note}"
+            )
+    finally:
+        await tools.close_browser()
+
+    print("\n🔎 Nomi accessibili diversi (solo dom / solo ax):")
+    for section in SECTIONS[1:]:
+        dom_names, ax_names = names(results["dom"], section), names(results["ax"], section)
+        only_dom = sorted(str(n) for n in dom_names - ax_names)[:10]
+        only_ax = sorted(str(n) for n in ax_names - dom_names)[:10]
+        print(f"   {section}:\n      dom: {only_dom}\n      ax : {only_ax}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else None))
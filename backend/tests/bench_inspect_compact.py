@@ -0,0 +1,118 @@
+"""
+Benchmark dimensione output di inspect_interactive_elements: formato verbose
+(to_json con indent=2, come oggi nei server MCP) vs formato compatto (compact=True).
+
+Una pagina locale (set_content) simula una dashboard con menu, tabella, form e tab;
+si misurano caratteri e token (tiktoken se installato, altrimenti stima chars/4)
+del payload che finisce nel contesto dell'LLM a ogni step.
+"""
+import asyncio
+import json
+import os
+import sys
+
+# Aggiungi backend al path (parent directory di tests/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.tools import PlaywrightTools
+from config.settings import AppConfig
+
+ROWS = int(os.getenv("BENCH_ROWS", "30"))
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_ENCODING.encode(text))
+
+    TOKENIZER = "tiktoken cl100k_base"
+except Exception:  # tiktoken assente o encoding non scaricabile (offline)
+
+    def count_tokens(text: str) -> int:
+        return len(text) // 4
+
+    TOKENIZER = "stima chars/4"
+
+
+def to_json(result: dict) -> str:
+    """Stessa serializzazione di to_json nei server MCP."""
+    if result.get("format") == "compact":
+        return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(result, indent=2, ensure_ascii=False)
+
+
+def build_page(rows: int) -> str:
+    menu = "".join(
+        f"<a href='#' role='menuitem'>Voce menu {i}</a>" for i in range(12)
+    )
+    table_rows = "".join(
+        f"<tr class='mat-mdc-row'><td>CAMP-{i:04d}</td><td>Campione {i}</td>"
+        f"<td>In attesa</td><td><button aria-label='Modifica riga {i}'>✎</button></td></tr>"
+        for i in range(rows)
+    )
+    return f"""
+<html><body>
+  <nav>{menu}</nav>
+  <div role="tablist">
+    <div role="tab" aria-selected="true">Attivi</div>
+    <div role="tab" aria-selected="false">Storico</div>
+  </div>
+  <form>
+    <label>Codice <input name="code" placeholder="Codice campione"></label>
+    <label>Descrizione <input name="desc"></label>
+    <label>Password <input type="password" name="pwd"></label>
+    <label>Stato <select name="state"><option>Tutti</option><option>Attivi</option></select></label>
+    <label><input type="checkbox" name="urgent"> Urgente</label>
+    <button type="submit">Cerca</button>
+  </form>
+  <table><tbody>{table_rows}</tbody></table>
+</body></html>
+"""
+
+
+def report(label: str, payload: str, baseline: int = None):
+    tokens = count_tokens(payload)
+    saving = f"  (-{100 * (1 - tokens / baseline):.0f}% token)" if baseline else ""
+    print(f"   {label:24s}: {len(payload):7d} chars  {tokens:6d} token{saving}")
+    return tokens
+
+
+async def main():
+    print("\n" + "=" * 80)
+    print("BENCHMARK inspect_interactive_elements - verbose vs compact")
+    print(f"Tokenizer: {TOKENIZER}  |  righe tabella: {ROWS}")
+    print("=" * 80)
+
+    tools = PlaywrightTools()
+    result = await tools.start_browser(headless=AppConfig.PLAYWRIGHT.HEADLESS)
+    print(f"   {result['status']}: {result['message']}")
+
+    try:
+        await tools.page.set_content(build_page(ROWS))
+        verbose = await tools.inspect_interactive_elements(compact=False)
+        print(f"\n🔎 {verbose.get('message')}")
+        baseline = report("verbose (indent=2)", to_json(verbose))
+        compact = await tools.inspect_interactive_elements(compact=True)
+        report("compact", to_json(compact), baseline)
+        small = await tools.inspect_interactive_elements(
+            compact=True, max_elements=20, max_chars=2000
+        )
+        report("compact (budget 20/2000)", to_json(small), baseline)
+        print(f"   omessi con budget: {small.get('omitted')}")
+
+        # Verifica: l'id corto (chiave stabile) viene espanso lato server da click_smart/fill_smart
+        ids = [line.split(" ", 1)[0] for line in small["elements"].splitlines()]
+        field_id = next(i for i in ids if i.startswith("f") and not i.startswith("fr"))
+        click_id = next(i for i in ids if i.startswith("c"))
+        fill = await tools.fill_smart([{"by": "ref", "ref": field_id}], "CAMP-0001")
+        click = await tools.click_smart([{"by": "ref", "ref": click_id}])
+        print(f"\n   fill_smart ref {field_id} : {fill['status']} ({fill.get('message')})")
+        print(f"   click_smart ref {click_id}: {click['status']} ({click.get('message')})")
+    finally:
+        await tools.close_browser()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
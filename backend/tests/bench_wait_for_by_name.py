@@ -0,0 +1,130 @@
+"""
+Benchmark time-to-detect dei wait_for_*_by_name: matcher in-page event-driven
+vs il vecchio polling su inspect_interactive_elements() ogni 500 ms.
+
+Una pagina locale (set_content) aggiunge l'elemento dopo un ritardo casuale;
+si misura quanto tempo passa tra la comparsa dell'elemento e il ritorno del tool.
+I casi "*+churn" aggiungono un ticker che muta il DOM ogni 4 ms (pagina con
+molte mutation): gli harvest coalescenti devono tenere il time-to-detect basso.
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+# Aggiungi backend al path (parent directory di tests/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.tools import PlaywrightTools
+from config.settings import AppConfig
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "10"))
+
+PAGE_TEMPLATE = """
+<html><body>
+  <div id="app"><button>Altro</button><span id="ticker"></span></div>
+  <script>
+    if ({churn}) {{
+      let n = 0;
+      setInterval(() => {{ document.getElementById('ticker').textContent = String(n++); }}, 4);
+    }}
+    setTimeout(() => {{
+      window.__appearedAt = performance.timeOrigin + performance.now();
+      const app = document.getElementById('app');
+      app.insertAdjacentHTML('beforeend', {html!r});
+    }}, {delay});
+  </script>
+</body></html>
+"""
+
+CASES = {
+    "clickable": ("<button>Conferma ordine</button>", "Conferma"),
+    "field": ("<input placeholder='Codice campione' name='code'>", "Codice"),
+    "control": ("<div role='tab' aria-label='Storico'>Storico</div>", "Storico"),
+}
+
+
+async def legacy_polling(tools, category, name_substring, timeout=10000):
+    """Baseline: il comportamento precedente (inspect completo ogni 500 ms)."""
+    start = time.time()
+    key = {
+        "clickable": "clickable_elements",
+        "field": "form_fields",
+        "control": "interactive_controls",
+    }[category]
+    needle = name_substring.lower()
+    while (time.time() - start) * 1000 < timeout:
+        result = await tools.inspect_interactive_elements()
+        for elem in result.get(key) or []:
+            haystacks = [
+                elem.get("accessible_name") or "",
+                elem.get("text") or "",
+                elem.get("placeholder") or "",
+                elem.get("name") or "",
+            ]
+            if any(needle in h.lower() for h in haystacks if h):
+                return {"status": "success"}
+        await tools.page.wait_for_timeout(500)
+    return {"status": "error"}
+
+
+async def event_driven(tools, category, name_substring, timeout=10000):
+    if category == "clickable":
+        return await tools.wait_for_clickable_by_name(name_substring, timeout=timeout)
+    if category == "field":
+        return await tools.wait_for_field_by_name(name_substring, timeout=timeout)
+    return await tools.wait_for_control_by_name_and_type(
+        name_substring, control_type="tab", timeout=timeout
+    )
+
+
+async def measure(tools, waiter, category, churn=False):
+    html, needle = CASES[category]
+    delay = random.randint(100, 900)
+    await tools.page.set_content(
+        PAGE_TEMPLATE.format(html=html, delay=delay, churn="true" if churn else "false")
+    )
+    result = await waiter(tools, category, needle)
+    detected_at = await tools.page.evaluate(
+        "() => performance.timeOrigin + performance.now()"
+    )
+    appeared_at = await tools.page.evaluate("() => window.__appearedAt")
+    if result.get("status") != "success" or appeared_at is None:
+        return None
+    return detected_at - appeared_at
+
+
+async def main():
+    print("\n" + "=" * 80)
+    print("BENCHMARK wait_for_*_by_name - event-driven vs polling")
+    print("=" * 80)
+
+    tools = PlaywrightTools()
+    result = await tools.start_browser(headless=AppConfig.PLAYWRIGHT.HEADLESS)
+    print(f"   {result['status']}: {result['message']}")
+
+    try:
+        for category, churn in [(c, False) for c in CASES] + [(c, True) for c in CASES]:
+            print(f"\n🔎 {category}{'+churn' if churn else ''}")
+            for label, waiter in (("polling", legacy_polling), ("event", event_driven)):
+                samples = []
+                for _ in range(ITERATIONS):
+                    ms = await measure(tools, waiter, category, churn)
+                    if ms is not None:
+                        samples.append(ms)
+                if not samples:
+                    print(f"   {label:8s}: nessun match")
+                    continue
+                print(
+                    f"   {label:8s}: mean={statistics.mean(samples):7.1f} ms  "
+                    f"p50={statistics.median(samples):7.1f} ms  "
+                    f"max={max(samples):7.1f} ms  (n={len(samples)})"
+                )
+    finally:
+        await tools.close_browser()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+# test_inspect_diff.py
+"""
+Test dell'output incrementale degli inspect (agent/inspect_diff.py): chiavi stabili,
+diff added/removed/changed, token `since` (ambito, scadenza) e compattazione history.
+Non serve un browser: i risultati di inspect sono costruiti a mano.
+"""
+
+import copy
+import json
+import os
+import sys
+
+# Aggiungi la directory parent al path per gli import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import ToolMessage
+
+from agent.core.history import _inspect_chain, compact_messages
+from agent.inspect_diff import SNAPSHOTS_MAX, InspectSnapshots, add_element_keys, diff_inspect
+from agent.tools import PlaywrightTools
+
+
+def _button(name: str, index: int = 0) -> dict:
+    return {
+        "index": index,
+        "tag": "button",
+        "role": "button",
+        "accessible_name": name,
+        "text": name,
+        "playwright_suggestions": [
+            {"strategy": "role", "click_smart": {"by": "role", "role": "button", "name": name}}
+        ],
+    }
+
+
+def _page(buttons=("Salva", "Annulla"), checked=False, field_id="mat-input-1") -> dict:
+    return {
+        "status": "success",
+        "message": "ok",
+        "page_info": {"url": "https://lab.example/home", "title": "Home"},
+        "iframes": [],
+        "clickable_elements": [_button(name, i) for i, name in enumerate(buttons)],
+        "interactive_controls": [
+            {"index": 0, "tag": "input", "type": "checkbox", "accessible_name": "Urgente",
+             "checked": checked, "playwright_suggestions": []}
+        ],
+        "form_fields": [
+            {"index": 0, "tag": "input", "type": "text", "accessible_name": "Codice",
+             "id": field_id, "playwright_suggestions": []}
+        ],
+    }
+
+
+def _keys(result: dict, section: str) -> list:
+    return [e["key"] for e in result[section]]
+
+
+def test_keys_stable_and_duplicates_suffixed():
+    keyed, index = add_element_keys(_page(buttons=("Salva", "Salva", "Annulla")))
+    keys = _keys(keyed, "clickable_elements")
+    assert keys[1] == f"{keys[0]}-2"
+    assert keys[0].startswith("c") and keys[2].startswith("c")
+    assert [k for k in index if k.startswith("c")] == keys
+    # stessa pagina con l'id Angular cambiato: stesse chiavi
+    again, _ = add_element_keys(_page(buttons=("Salva", "Salva", "Annulla"), field_id="mat-input-9"))
+    assert _keys(again, "form_fields") == _keys(keyed, "form_fields")
+    # il risultato originale (cache inspect) non viene modificato
+    page = _page()
+    add_element_keys(page)
+    assert "key" not in page["clickable_elements"][0]
+
+
+def test_diff_added_removed_changed():
+    old, old_index = add_element_keys(_page(buttons=("Salva", "Salva", "Annulla")))
+    new, new_index = add_element_keys(
+        _page(buttons=("Salva", "Nuovo"), checked=True, field_id="mat-input-7")
+    )
+    diff = diff_inspect(new, old_index, new_index, "tok")
+
+    salva, salva_2, annulla = _keys(old, "clickable_elements")
+    nuovo = _keys(new, "clickable_elements")[1]
+    assert diff["diff"] is True and diff["since"] == "tok"
+    assert [e["key"] for e in diff["added"]["clickable_elements"]] == [nuovo]
+    assert sorted(diff["removed"]["clickable_elements"]) == sorted([salva_2, annulla])
+    assert {e["key"] for e in diff["changed"]["interactive_controls"]} == set(
+        _keys(new, "interactive_controls")
+    )
+    assert {e["key"] for e in diff["changed"]["form_fields"]} == set(_keys(new, "form_fields"))
+    # "Salva" ha cambiato solo posizione (index): invariato
+    assert diff["unchanged"] == 1
+    assert salva not in json.dumps(diff["added"]) + json.dumps(diff["changed"])
+
+
+def test_since_other_scope_is_ignored():
+    tools = PlaywrightTools()
+    full = tools._finish_inspect(_page(), None, None, None, False, None, None)
+    assert "inspect_token" in full and "diff" not in full
+
+    region = tools._finish_inspect(
+        _page(), None, ".mat-dialog-container", full["inspect_token"], False, None, None
+    )
+    assert "diff" not in region
+    assert "altro ambito" in region["since_ignored"]
+    assert region["inspect_token"] != full["inspect_token"]
+
+    same_scope = tools._finish_inspect(
+        _page(checked=True), None, None, full["inspect_token"], False, None, None
+    )
+    assert same_scope["diff"] is True
+    assert "since_ignored" not in same_scope
+
+
+def test_compact_ids_match_diff_keys():
+    tools = PlaywrightTools()
+    full = tools._finish_inspect(_page(), None, None, None, True, None, None)
+    ids = [line.split(" ", 1)[0] for line in full["elements"].splitlines()]
+
+    diff = tools._finish_inspect(
+        _page(buttons=("Salva",), checked=True), None, None, full["inspect_token"], True, None, None
+    )
+    changed = [line.split(" ")[1] for line in diff["elements"].splitlines() if line.startswith("~")]
+    assert set(diff["removed"]) <= set(ids)
+    assert set(changed) <= set(ids)
+
+
+def test_snapshots_evicted_beyond_capacity():
+    snapshots = InspectSnapshots()
+    scope = InspectSnapshots.scope(None, None)
+    tokens = [snapshots.put(scope, {}) for _ in range(SNAPSHOTS_MAX + 1)]
+
+    index, reason = snapshots.get(tokens[0], scope)
+    assert index is None and "scaduto" in reason
+    for token in tokens[1:]:
+        assert snapshots.get(token, scope) == ({}, None)
+
+
+def _tool_message(name: str, content: dict, call_id: str) -> ToolMessage:
+    return ToolMessage(content=json.dumps(content), name=name, tool_call_id=call_id)
+
+
+def test_history_keeps_base_inspect_of_diff():
+    tools = PlaywrightTools()
+    base = tools._finish_inspect(_page(), None, None, None, False, None, None)
+    other = tools._finish_inspect(_page(buttons=("Esci",)), None, None, None, False, None, None)
+    diff = tools._finish_inspect(
+        _page(checked=True), None, None, base["inspect_token"], False, None, None
+    )
+    messages = [
+        _tool_message("inspect_interactive_elements", base, "1"),
+        _tool_message("click_smart", {"status": "success"}, "2"),
+        _tool_message("inspect_interactive_elements", other, "3"),
+        _tool_message("click_smart", {"status": "success"}, "4"),
+        _tool_message("inspect_interactive_elements", diff, "5"),
+        _tool_message("click_smart", {"status": "success"}, "6"),
+    ]
+    assert _inspect_chain(messages, 4) == {4, 0}
+
+    compacted = compact_messages(copy.deepcopy(messages))
+    assert compacted[0].content == messages[0].content
+    assert compacted[4].content == messages[4].content
+    assert compacted[2].content != messages[2].content  # inspect non in catena: stub